@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Time the blocklist compiler on a synthetic multi-million-entry hosts file, then on an incremental update."""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbound_dns import blocklist
+
+
+def write_hosts(path, entries, seed=1, batch=100000):
+    """A hosts file where about a tenth of the entries repeat a name or sit beneath another one."""
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("# synthetic blocklist\n127.0.0.1 localhost\n")
+        for start in range(0, entries, batch):
+            lines = []
+            for i in range(start, min(entries, start + batch)):
+                roll = rng.random()
+                if roll < 0.05:
+                    i = rng.randrange(i + 1)
+                name = f"ads{i}.tracker{i % 50000}.example{i % 7}.com"
+                if 0.05 <= roll < 0.1:
+                    name = f"cdn{i}.{name}"
+                lines.append(f"0.0.0.0 {name}\n")
+            f.write("".join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=2000000)
+    parser.add_argument("--run-size", type=int, default=blocklist.DEFAULT_RUN_SIZE)
+    parser.add_argument("--measure", action="store_true", help="Also start Unbound with the result")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-blocklist-")
+    source = os.path.join(workdir, "hosts.txt")
+    output = os.path.join(workdir, "blocklist.conf")
+    started = time.perf_counter()
+    write_hosts(source, args.entries)
+    print(f"Generated {args.entries:,} entries ({os.path.getsize(source) / 2 ** 20:.0f} MiB) "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    stats = blocklist.compile_lists([source], output, run_size=args.run_size)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"compile      {stats.read / stats.seconds / 1e6:5.2f}M names/s  {stats.seconds:6.2f}s  "
+          f"{stats.zones:,} zones  {stats.runs} runs  peak RSS {rss:,.0f} MiB")
+
+    with open(source, "a") as f:
+        f.write("0.0.0.0 new-tracker.example.net\n")
+    stats = blocklist.compile_lists([source], output, run_size=args.run_size)
+    print(f"incremental  {stats.seconds:6.2f}s  +{stats.added} -{stats.removed}")
+
+    if args.measure:
+        baseline, loaded = blocklist.measure_load(None), blocklist.measure_load(output)
+        print(blocklist.format_load(baseline, loaded, stats.zones))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Time the cache advisor on a synthetic query log and compare its sampled curve with an exact one."""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_log_analyzer import write_log
+from unbound_dns import cache_advisor
+
+
+def run(path, max_keys):
+    return cache_advisor.simulate(path, cache_advisor.StackSimulator(max_keys=max_keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lookups", type=int, default=2000000)
+    parser.add_argument("--names", type=int, default=500000)
+    parser.add_argument("--log", help="Use this log instead of generating one")
+    parser.add_argument("--max-keys", type=int, default=cache_advisor.DEFAULT_MAX_KEYS)
+    parser.add_argument("--exact", action="store_true", help="Also run unsampled and report the curve error")
+    args = parser.parse_args()
+
+    path = args.log
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), f"unbound_advisor_{args.lookups}_{args.names}.log")
+        if not os.path.exists(path):
+            print(f"Generating {args.lookups:,} lookups over {args.names:,} names into {path} ...", flush=True)
+            write_log(path, args.lookups, args.names, replies=False)
+
+    sampled = run(path, args.max_keys)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"sampled  {sampled.references:12,.0f} queries in {sampled.seconds:6.2f}s  "
+          f"{sampled.references / sampled.seconds / 1e6:5.2f}M queries/s  rate {sampled.rate:.4f}  "
+          f"{sampled.tracked:,} keys tracked  peak RSS {rss:,.0f} MiB")
+    if not args.exact:
+        return 0
+    exact = run(path, 1 << 22)
+    print(f"exact    {exact.references:12,.0f} queries in {exact.seconds:6.2f}s  "
+          f"{exact.references / exact.seconds / 1e6:5.2f}M queries/s")
+    sizes = [size for size in exact.sizes if size >= 100]
+    errors = [abs(sampled.hit_rate_at(size) - exact.hit_rate_at(size)) for size in sizes]
+    print(f"hit-rate error over {len(sizes)} sizes: mean {sum(errors) / len(errors) * 100:.2f} points, "
+          f"max {max(errors) * 100:.2f} points")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Compare control commands over the socket client with forking unbound-control for each one."""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbound_dns import control_socket, fake_control
+
+
+def per_call(fn, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--count", type=int, default=200)
+    parser.add_argument("--config", help="Also time a real Unbound: its unbound.conf (needs remote-control)")
+    args = parser.parse_args()
+
+    if args.config:
+        endpoint = control_socket.read_endpoint(args.config)
+        if not endpoint or not endpoint.usable():
+            sys.exit(f"{args.config}: remote-control is off or its socket/keys aren't accessible")
+        client = control_socket.ControlClient(endpoint)
+        binary = lambda: subprocess.run(["unbound-control", "-c", args.config, "status"], capture_output=True)
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "control.sock")
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(fake_control.FakeControlServer(path=path, stats="total.num.queries=1\n").start())
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        client = control_socket.ControlClient(control_socket.Endpoint(path))
+        # Without Unbound, a bare interpreter start stands in for the fork/exec of unbound-control.
+        binary = lambda: subprocess.run([sys.executable, "-S", "-c", "pass"])
+
+    print(f"endpoint: {client.endpoint}")
+    rows = [
+        ("fork + exec per command", per_call(binary, max(args.count // 10, 5))),
+        ("socket, one connection each", per_call(lambda: client.control("status"), args.count)),
+        ("socket, 10 pipelined", per_call(lambda: client.pipeline([("stats_noreset",)] * 10), args.count // 10) / 10),
+    ]
+    for name, seconds in rows:
+        print(f"{name:<30} {seconds * 1e6:9.0f}us per command")
+    if client.endpoint.tls:
+        print(f"TLS sessions resumed: {client.resumed}/{client.connections}")
+
+
+if __name__ == "__main__":
+    main()
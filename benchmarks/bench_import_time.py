@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Measure how long unbound-dns takes to start for each subcommand and what it imports."""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAUNCHER = os.path.join(ROOT, "unbound-dns")
+COMMANDS = ["--help", "status", "test", "bench", "stats", "flush", "apply-config", "logs", "config", "cache",
+            "exporter", "histogram", "history", "cache-advisor"]
+HEAVY = ("tkinter", "asyncio", "ssl", "concurrent.futures")
+
+
+def startup(argv, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def heavy_imports(command):
+    """Heavy modules loaded once the parser for `command` has been built."""
+    code = ("import sys; from unbound_dns import cli; cli.build_parser({%r}); "
+            "print(' '.join(m for m in %r if m in sys.modules))" % (command, HEAVY))
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--iterations", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--importtime", metavar="COMMAND",
+                        help="Print the 15 slowest imports for one subcommand (python -X importtime)")
+    args = parser.parse_args()
+
+    if args.importtime:
+        result = subprocess.run([sys.executable, "-X", "importtime", LAUNCHER, args.importtime, "--help"],
+                                capture_output=True, text=True)
+        rows = [line for line in result.stderr.splitlines() if line.startswith("import time:") and "|" in line]
+        rows = [row for row in rows if row.split("|")[1].strip().isdigit()]
+        for row in sorted(rows, key=lambda r: int(r.split("|")[1]), reverse=True)[:15]:
+            print(row)
+        return
+
+    baseline = startup([sys.executable, "-c", "pass"], args.iterations)
+    print(f"{'python -c pass':<22} {baseline * 1000:7.1f}ms")
+    over = 0
+    for command in COMMANDS:
+        argv = [sys.executable, LAUNCHER] + ([command, "--help"] if command != "--help" else [command])
+        seconds = startup(argv, args.iterations)
+        flag = "" if seconds * 1000 <= args.budget_ms else "  over budget"
+        over += bool(flag)
+        name = command if command == "--help" else f"{command} --help"
+        print(f"{name:<22} {seconds * 1000:7.1f}ms  heavy imports: "
+              f"{heavy_imports(None if command == '--help' else command)}{flag}")
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
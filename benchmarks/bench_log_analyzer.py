@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Generate synthetic Unbound query/reply logs and measure how fast log_analyzer summarises them."""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbound_dns import log_analyzer
+
+QTYPES = (("A", 60), ("AAAA", 30), ("HTTPS", 6), ("MX", 2), ("TXT", 2))
+RCODES = (("NOERROR", 90), ("NXDOMAIN", 8), ("SERVFAIL", 2))
+
+
+def write_log(path, lookups, names=10000, clients=200, zipf=1.1, seed=1, syslog=False,
+              replies=True, queries=True, batch=100000):
+    """Write `lookups` Zipf-distributed lookups and return the exact counts for checking results."""
+    rng = random.Random(seed)
+    pool = [f"host{i}.example{i % 97}.com." for i in range(names)]
+    weights = [1 / (rank + 1) ** zipf for rank in range(names)]
+    addresses = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(clients)]
+    truth = {"names": Counter(), "clients": Counter(), "qtypes": Counter(), "rcodes": Counter(),
+             "cached": 0}
+    prefix = "Oct 18 10:00:01 resolver unbound: [812:0] info: " if syslog else "[1760781601] unbound[812:0] info: "
+    with open(path, "w") as f:
+        for start in range(0, lookups, batch):
+            k = min(batch, lookups - start)
+            picked = rng.choices(pool, weights, k=k)
+            who = rng.choices(addresses, k=k)
+            types = rng.choices([t for t, _ in QTYPES], [w for _, w in QTYPES], k=k)
+            rcodes = rng.choices([r for r, _ in RCODES], [w for _, w in RCODES], k=k)
+            lines = []
+            for name, client, qtype, rcode in zip(picked, who, types, rcodes):
+                cached = rng.random() < 0.7
+                seconds = 0.0 if cached else rng.expovariate(1 / 0.03)
+                if queries:
+                    lines.append(f"{prefix}{client} {name} {qtype} IN\n")
+                if replies:
+                    lines.append(f"{prefix}{client} {name} {qtype} IN {rcode} {seconds:.6f} "
+                                 f"{int(cached)} {rng.randint(40, 300)}\n")
+                truth["cached"] += cached
+            f.writelines(lines)
+            truth["names"].update(name.rstrip(".") for name in picked)
+            truth["clients"].update(who)
+            truth["qtypes"].update(types)
+            truth["rcodes"].update(rcodes)
+    return truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=1024, help="Size of the generated log")
+    parser.add_argument("--log", help="Analyse this file instead of generating one")
+    parser.add_argument("--generate", metavar="FILE", help="Only write a log of --lookups lookups to FILE")
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--names", type=int, default=100000)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if args.generate:
+        write_log(args.generate, args.lookups, args.names)
+        return
+
+    path = args.log
+    if not path:
+        # Each lookup writes a query and a reply line of roughly 170 bytes together.
+        path = os.path.join(tempfile.gettempdir(), f"unbound_bench_{args.size_mb}mb.log")
+        if not os.path.exists(path):
+            lookups = args.size_mb * (1 << 20) // 170
+            print(f"Generating {lookups:,} lookups into {path} ...", flush=True)
+            started = time.perf_counter()
+            write_log(path, lookups, args.names)
+            print(f"  done in {time.perf_counter() - started:.1f}s")
+
+    size = os.path.getsize(path) / (1 << 20)
+    for jobs in sorted({1, args.jobs}):
+        started = time.perf_counter()
+        stats = log_analyzer.analyze(path, jobs=jobs)
+        seconds = time.perf_counter() - started
+        print(f"jobs={jobs:<3} {size:,.0f} MiB in {seconds:6.2f}s  {size / seconds:7.1f} MiB/s  "
+              f"{(stats.queries + stats.replies) / seconds / 1e6:5.2f}M lines/s  "
+              f"~{len(stats.unique_names):,} unique names")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Push 100k log lines through the batched log pipeline and report time and peak memory."""
+
+import argparse
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbound_dns import log_sink
+
+COLORS = (None, "#28a745", "#ff6b6b", None, "#0066cc")
+
+
+def produce(sink, lines, threads):
+    per_thread = lines // threads
+
+    def worker(tid):
+        for i in range(per_thread):
+            sink.push(f"[worker {tid}] Unpacking libunbound8 (1.17.1-2) line {i} ...", COLORS[i % 5])
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    return workers
+
+
+def bench_pump(root, text, lines, threads, max_lines):
+    pump = log_sink.TextLogPump(root, text, max_lines=max_lines)
+    started = time.perf_counter()
+    workers = produce(pump.sink, lines, threads)
+    flushed = 0
+    while any(w.is_alive() for w in workers) or flushed < lines - lines % threads:
+        flushed += pump.flush()
+        root.update_idletasks()
+    return time.perf_counter() - started, int(text.index("end-1c").split(".")[0]) - 1
+
+
+def bench_legacy(root, text, lines):
+    started = time.perf_counter()
+    for i in range(lines):
+        message = f"Unpacking libunbound8 (1.17.1-2) line {i} ..."
+        color = COLORS[i % 5]
+        text.insert("end", message + "\n")
+        if color:
+            start_idx = text.index(f"end-{len(message)+1}c")
+            tag_name = f"color_{color}"
+            text.tag_config(tag_name, foreground=color)
+            text.tag_add(tag_name, start_idx, text.index("end-1c"))
+        text.see("end")
+        root.update()
+    return time.perf_counter() - started
+
+
+def bench_sink_only(lines, threads):
+    sink = log_sink.LogSink()
+    started = time.perf_counter()
+    workers = produce(sink, lines, threads)
+    drained = 0
+    while any(w.is_alive() for w in workers) or drained < lines - lines % threads:
+        drained += len(sink.drain())
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--lines", type=int, default=100_000)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    parser.add_argument("--max-lines", type=int, default=log_sink.DEFAULT_MAX_LINES)
+    parser.add_argument("--legacy-lines", type=int, default=2000,
+                        help="Lines to push through the old per-line log() for comparison")
+    args = parser.parse_args()
+
+    try:
+        import tkinter as tk
+        from tkinter import scrolledtext
+        root = tk.Tk()
+        root.withdraw()
+    except Exception as e:
+        print(f"No Tk display available ({e}); measuring the queue alone")
+        tracemalloc.start()
+        elapsed = bench_sink_only(args.lines, args.threads)
+        peak = tracemalloc.get_traced_memory()[1]
+        print(f"queue: {args.lines} lines in {elapsed:.3f}s ({args.lines / elapsed:,.0f} lines/s), "
+              f"peak Python memory {peak / 1e6:.1f} MB")
+        return
+
+    text = scrolledtext.ScrolledText(root)
+    tracemalloc.start()
+    elapsed, kept = bench_pump(root, text, args.lines, args.threads, args.max_lines)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 1e6 if sys.platform == "darwin" else rss / 1e3
+    print(f"batched: {args.lines} lines in {elapsed:.3f}s ({args.lines / elapsed:,.0f} lines/s), "
+          f"{kept} lines kept, peak Python memory {peak / 1e6:.1f} MB, max RSS {rss_mb:.0f} MB")
+
+    if args.legacy_lines:
+        text.delete("1.0", "end")
+        legacy = bench_legacy(root, text, args.legacy_lines)
+        per_line = legacy / args.legacy_lines
+        print(f"legacy:  {args.legacy_lines} lines in {legacy:.3f}s ({1 / per_line:,.0f} lines/s), "
+              f"projected {per_line * args.lines:.1f}s for {args.lines} lines")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Fill a metrics store with 30 days of 5-second samples and time the GUI's range queries."""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbound_dns import metrics_store
+
+BUDGET = 0.2
+
+
+def fill(store, now, days, interval):
+    started = time.perf_counter()
+    t = now - days * 86400
+    batch = []
+    while t < now:
+        minute = (t // 60) % 1440
+        queries = interval * (200 + 150 * (minute > 480))
+        batch.append((t, interval, queries, queries * 0.85, queries * 0.15, 3.0, 0.04, 0.03))
+        t += interval
+        if len(batch) == 720:
+            store.add_samples(batch)
+            batch = []
+    store.add_samples(batch)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between samples")
+    parser.add_argument("--db", help="Store to use (default: a temporary file)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "metrics.db")
+    store = metrics_store.MetricsStore(path)
+    now = time.time()
+    print(f"filled {args.days:g} days in {fill(store, now, args.days, args.interval):.1f}s; "
+          f"{os.path.getsize(path) / 1e6:.1f} MB")
+
+    failed = False
+    for label, span in (("1 hour", 3600), ("24 hours", 86400), ("7 days", 7 * 86400), ("30 days", 30 * 86400)):
+        series = min((store.query(now - span, now) for _ in range(5)), key=lambda s: s.seconds)
+        over = series.seconds > BUDGET
+        failed |= over
+        print(f"{label:<9} {len(series.times):4} points from {series.rows:7,} {series.source:<8} rows "
+              f"{series.seconds * 1000:7.1f}ms{'  OVER BUDGET' if over else ''}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Compare the cost of the /proc status probe with the old systemctl/pgrep + lsof probe."""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbound_dns import status_probe
+
+
+def measure(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2], timings[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("--proc-root", default="/proc")
+    args = parser.parse_args()
+
+    os_type = "macos" if sys.platform == "darwin" else "linux"
+    probes = []
+    if os.path.isdir(os.path.join(args.proc_root, "net")):
+        probes.append(("proc", lambda: status_probe.probe_proc(53, args.proc_root)))
+    tools = ["pgrep" if os_type == "macos" else "systemctl", "lsof", "sudo"]
+    missing = [tool for tool in tools if not shutil.which(tool)]
+    if missing:
+        print(f"subprocess probe skipped ({', '.join(missing)} not found)")
+    else:
+        probes.append(("subprocess", lambda: status_probe.probe_subprocess(os_type)))
+
+    results = {}
+    for name, fn in probes:
+        median, worst = measure(fn, args.iterations)
+        results[name] = median
+        print(f"{name:<11} median {median * 1000:8.3f}ms   max {worst * 1000:8.3f}ms   "
+              f"({args.iterations} iterations)")
+    if len(results) == 2 and results["proc"]:
+        print(f"proc probe is {results['subprocess'] / results['proc']:.0f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -46,6 +46,71 @@ test_dns_over_tls() {
     fi
 }
 
+test_chaos_survival_mode() {
+    if ! command -v unbound &> /dev/null; then
+        echo -e "${YELLOW}⊘${NC} Chaos harness skipped (unbound not installed)"
+        ((SKIPPED++))
+        return
+    fi
+
+    local root
+    root="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+    if (cd "$root" && python3 -m unbound_dns.chaos --scale "${CHAOS_SCALE:-0.5}" --check \
+            --json "${CHAOS_REPORT:-/dev/null}"); then
+        echo -e "${GREEN}✓${NC} Unbound kept answering from expired cache through an upstream outage"
+        ((PASSED++))
+    else
+        echo -e "${RED}✗${NC} Chaos harness: serve-expired did not hold up during the outage"
+        ((FAILED++))
+    fi
+}
+
+test_autotune_scratch_sweep() {
+    if ! command -v unbound &> /dev/null; then
+        echo -e "${YELLOW}⊘${NC} Auto-tuner skipped (unbound not installed)"
+        ((SKIPPED++))
+        return
+    fi
+
+    local root store
+    root="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+    store="$(mktemp -d)"
+    if (cd "$root" && python3 -m unbound_dns.autotune --param num-threads=1,2 --param slabs=2 \
+            --param so-rcvbuf=0 --param outgoing-range=1024 --param num-queries-per-thread=512 \
+            --duration 2 --store "$store/results.jsonl" --output "$store/tuned.conf") \
+            && grep -q "msg-cache-slabs: 2" "$store/tuned.conf"; then
+        echo -e "${GREEN}✓${NC} Auto-tuner measured a scratch Unbound and wrote the chosen config"
+        ((PASSED++))
+    else
+        echo -e "${RED}✗${NC} Auto-tuner sweep failed"
+        ((FAILED++))
+    fi
+    rm -rf "$store"
+}
+
+test_blocklist_loads_in_unbound() {
+    if ! command -v unbound &> /dev/null; then
+        echo -e "${YELLOW}⊘${NC} Blocklist load skipped (unbound not installed)"
+        ((SKIPPED++))
+        return
+    fi
+
+    local root work
+    root="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+    work="$(mktemp -d)"
+    python3 -c "print(''.join(f'0.0.0.0 ads{i}.tracker{i % 500}.example.com\\n' for i in range(100000)))" \
+        > "$work/hosts.txt"
+    if (cd "$root" && python3 -m unbound_dns.blocklist "$work/hosts.txt" -o "$work/blocklist.conf" --measure) \
+            && grep -q 'local-zone: "ads1.tracker1.example.com." always_nxdomain' "$work/blocklist.conf"; then
+        echo -e "${GREEN}✓${NC} Unbound started with a compiled 100,000-zone blocklist"
+        ((PASSED++))
+    else
+        echo -e "${RED}✗${NC} Blocklist include failed to load"
+        ((FAILED++))
+    fi
+    rm -rf "$work"
+}
+
 echo "Running Integration Tests..."
 echo "============================"
 echo ""
@@ -54,6 +119,9 @@ test_dns_provider "1.1.1.1" "Cloudflare"
 test_dns_provider "9.9.9.9" "Quad9"
 test_dns_provider "8.8.8.8" "Google DNS"
 test_dns_over_tls
+test_chaos_survival_mode
+test_autotune_scratch_sweep
+test_blocklist_loads_in_unbound
 
 echo ""
 echo "============================"
@@ -12,43 +12,117 @@ NC='\033[0m'
 PASSED=0
 FAILED=0
 
+TMP_DIR="$(mktemp -d)"
+FAKE_DNS_PIDS=""
+
+cleanup() {
+    for pid in $FAKE_DNS_PIDS; do
+        kill "$pid" 2>/dev/null || true
+    done
+    rm -rf "$TMP_DIR"
+}
+trap cleanup EXIT
+
+pass() {
+    echo -e "${GREEN}✓${NC} $1"
+    PASSED=$((PASSED + 1))
+}
+
+fail() {
+    echo -e "${RED}✗${NC} $1"
+    FAILED=$((FAILED + 1))
+}
+
+start_fake_dns() {
+    local port=$1
+    shift
+    PYTHONPATH="$PROJECT_ROOT" python3 -m unbound_dns.fake_dns --port "$port" "$@" > "$TMP_DIR/fake_dns_$port.log" 2>&1 &
+    FAKE_DNS_PIDS="$FAKE_DNS_PIDS $!"
+    for _ in $(seq 1 50); do
+        if grep -q "listening" "$TMP_DIR/fake_dns_$port.log" 2>/dev/null; then
+            return 0
+        fi
+        sleep 0.1
+    done
+    return 1
+}
+
+install_fake_control() {
+    mkdir -p "$TMP_DIR/bin"
+    cat > "$TMP_DIR/bin/unbound-control" <<EOF
+#!/usr/bin/env bash
+if [ "\$1" = "-c" ]; then
+    shift 2
+fi
+echo "\$*" >> "$TMP_DIR/control.log"
+if [ "\$1" = "\${FAIL_CONTROL:-}" ]; then
+    echo "error \$1 failed" >&2
+    exit 1
+fi
+if [ "\$1" = "\${UNKNOWN_CONTROL:-}" ]; then
+    echo "error unknown command '\$1'" >&2
+    exit 1
+fi
+case "\$1" in
+    status) echo "unbound (pid 4242) is running..." ;;
+    flush_zone) echo "ok removed 3 rrsets, 2 messages and 0 key entries" ;;
+    flush|flush_type|flush_bogus|flush_negative|flush_infra|reload|reload_keep_cache) echo "ok" ;;
+    dump_cache) cat "$SCRIPT_DIR/fixtures/cache_dump.txt" ;;
+    load_cache) cat > "$TMP_DIR/loaded_cache.txt"; echo "ok" ;;
+    stats_noreset) sleep "\${STATS_DELAY:-0}"; cat "$SCRIPT_DIR/fixtures/stats_extended.txt" ;;
+    *) echo "error unknown command '\$1'" >&2; exit 1 ;;
+esac
+EOF
+    chmod +x "$TMP_DIR/bin/unbound-control"
+
+    cat > "$TMP_DIR/bin/unbound-checkconf" <<'EOF'
+#!/usr/bin/env bash
+if grep -q "bogus-option" "$1"; then
+    echo "$1:3: error: unknown keyword 'bogus-option'" >&2
+    exit 1
+fi
+echo "unbound-checkconf: no errors in $1"
+EOF
+    chmod +x "$TMP_DIR/bin/unbound-checkconf"
+}
+
 test_readme_exists() {
     if [ -f "$PROJECT_ROOT/README.md" ]; then
         echo -e "${GREEN}✓${NC} README.md exists"
-        ((PASSED++))
+        PASSED=$((PASSED + 1))
     else
         echo -e "${RED}✗${NC} README.md missing"
-        ((FAILED++))
+        FAILED=$((FAILED + 1))
     fi
 }
 
 test_installation_script_exists() {
     if [ -f "$PROJECT_ROOT/unbound_dns.sh" ]; then
         echo -e "${GREEN}✓${NC} unbound_dns.sh exists"
-        ((PASSED++))
+        PASSED=$((PASSED + 1))
     else
         echo -e "${RED}✗${NC} unbound_dns.sh missing"
-        ((FAILED++))
+        FAILED=$((FAILED + 1))
     fi
 }
 
 test_script_is_executable() {
     if [ -x "$PROJECT_ROOT/unbound_dns.sh" ]; then
         echo -e "${GREEN}✓${NC} unbound_dns.sh is executable"
-        ((PASSED++))
+        PASSED=$((PASSED + 1))
     else
         echo -e "${RED}✗${NC} unbound_dns.sh is not executable"
-        ((FAILED++))
+        FAILED=$((FAILED + 1))
     fi
 }
 
 test_script_has_shebang() {
     if head -n1 "$PROJECT_ROOT/unbound_dns.sh" | grep -q "^#!"; then
         echo -e "${GREEN}✓${NC} Script has shebang"
-        ((PASSED++))
+        PASSED=$((PASSED + 1))
     else
         echo -e "${RED}✗${NC} Script missing shebang"
-        ((FAILED++))
+        FAILED=$((FAILED + 1))
     fi
 }
 
@@ -56,10 +130,1620 @@ test_readme_has_content() {
     local word_count=$(wc -w < "$PROJECT_ROOT/README.md" | tr -d ' ')
     if [ "$word_count" -gt 100 ]; then
         echo -e "${GREEN}✓${NC} README has substantial content ($word_count words)"
-        ((PASSED++))
+        PASSED=$((PASSED + 1))
     else
         echo -e "${RED}✗${NC} README too short ($word_count words)"
-        ((FAILED++))
+        FAILED=$((FAILED + 1))
+    fi
+}
+
+test_dns_probe_udp() {
+    start_fake_dns 25353
+    local output
+    output=$("$PROJECT_ROOT/unbound-dns" test -p 25353 google.com github.com 2>&1) || true
+    if echo "$output" | grep -q "2/2 queries succeeded" && echo "$output" | grep -q "NOERROR .*ms udp 10\."; then
+        pass "DNS probe resolves concurrently against stub server"
+    else
+        fail "DNS probe against stub server: $output"
+    fi
+}
+
+test_dns_probe_tcp_fallback() {
+    start_fake_dns 25354 --truncate
+    local output
+    output=$("$PROJECT_ROOT/unbound-dns" test -p 25354 example.com 2>&1) || true
+    if echo "$output" | grep -q "NOERROR .*ms tcp 10\."; then
+        pass "DNS probe falls back to TCP on truncation"
+    else
+        fail "DNS probe TCP fallback: $output"
+    fi
+}
+
+test_dns_probe_reports_failures() {
+    if "$PROJECT_ROOT/unbound-dns" test -p 25353 missing.invalid > "$TMP_DIR/nx.out" 2>&1; then
+        fail "DNS probe should exit non-zero on NXDOMAIN"
+    elif grep -q "NXDOMAIN" "$TMP_DIR/nx.out"; then
+        pass "DNS probe reports NXDOMAIN"
+    else
+        fail "DNS probe NXDOMAIN: $(cat "$TMP_DIR/nx.out")"
+    fi
+}
+
+test_dns_probe_rejects_truncated_messages() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && python3 - <<'PYEOF' 2>&1
+import struct
+
+from unbound_dns import dns_probe
+
+query = dns_probe.build_query("a.test", "MX", qid=1, edns=False)
+# An MX answer whose rdata is one byte: too short even for the preference.
+mx = (struct.pack("!HHHHHH", 1, 0x8180, 1, 1, 0, 0) + query[12:]
+      + b"\xc0\x0c" + struct.pack("!HHIH", 15, 1, 60, 1) + b"\x00")
+for message, error in ((query[:-3], "Truncated question"), (mx, "Truncated MX rdata")):
+    try:
+        dns_probe.parse_message(message)
+        raise AssertionError(f"parsed {message!r}")
+    except dns_probe.DNSError as e:
+        assert str(e) == error, e
+# A bad name from a domain list is an error for that query, not an exception out of the whole run.
+for name in ("ä" * 70 + ".com", "a\udcff.com"):
+    try:
+        dns_probe.encode_name(name)
+        raise AssertionError(f"encoded {name!r}")
+    except dns_probe.DNSError as e:
+        assert str(e).startswith("Invalid label"), e
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "DNS probe rejects truncated questions and records as DNS errors"
+    else
+        fail "DNS probe truncated messages: $output"
+    fi
+}
+
+test_benchmark_closed_loop() {
+    local output
+    output=$("$PROJECT_ROOT/unbound-dns" benchmark --fake -n 2000 -c 20 --json 2>&1) || true
+    if echo "$output" | grep -q '"answered": 2000' && echo "$output" | grep -q '"p99.9"'; then
+        pass "Benchmark replays queries against fake responder"
+    else
+        fail "Benchmark closed loop: $output"
+    fi
+}
+
+test_benchmark_counts_timeouts() {
+    local output
+    output=$("$PROJECT_ROOT/unbound-dns" benchmark --fake -Q 500 -d 1 --timeout 0.2 \
+        --fake-drop 0.5 --json 2>&1) || true
+    if echo "$output" | grep -Eq '"timeouts": [1-9][0-9]*' && echo "$output" | grep -q '"mode": "qps"'; then
+        pass "Benchmark reports timeouts at a target QPS"
+    else
+        fail "Benchmark timeouts: $output"
+    fi
+}
+
+test_benchmark_stops_when_query_ids_run_out() {
+    # Nothing answers on port 9, so every query ID stays in flight until the target rate exhausts them.
+    local output
+    output=$(timeout 20 "$PROJECT_ROOT/unbound-dns" benchmark -p 9 -Q 200000 -d 1 --timeout 2 --json \
+        a.test 2>&1) || true
+    if echo "$output" | grep -q '"sent": 65536' && echo "$output" | grep -q '"timeouts": 65536'; then
+        pass "Benchmark waits for timeouts when every query ID is in flight"
+    else
+        fail "Benchmark with all IDs in flight: $output"
+    fi
+}
+
+test_cache_profile_cold_vs_warm() {
+    if ! start_fake_dns 25355 --miss-delay-ms 30; then
+        fail "Could not start fake DNS server on port 25355"
+        return
+    fi
+    local output
+    output=$("$PROJECT_ROOT/unbound-dns" profile-cache -p 25355 \
+        -o "$TMP_DIR/profile.json" a.example b.example 2>&1) || true
+    if grep -q '"cold_median_ms"' "$TMP_DIR/profile.json" 2>/dev/null && \
+        python3 -c "import json,sys; a=json.load(open(sys.argv[1]))['aggregate']; sys.exit(a['median_speedup'] < 5)" \
+        "$TMP_DIR/profile.json"; then
+        pass "Cache profiler measures cold vs warm speedup"
+    else
+        fail "Cache profiler: $output"
+    fi
+}
+
+test_stats_interval_from_fixtures() {
+    local output
+    output=$("$PROJECT_ROOT/unbound-dns" stats --from-file \
+        "$SCRIPT_DIR/fixtures/stats_noreset_1.txt" "$SCRIPT_DIR/fixtures/stats_noreset_2.txt" 2>&1) || true
+    if echo "$output" | grep -q "qps= *200.0" && echo "$output" | grep -q "hit= 90.0%" && \
+        echo "$output" | grep -q "reqlist.avg=4.00" && echo "$output" | grep -q "t0=120qps t1=80qps"; then
+        pass "Stats collector computes interval rates from fixtures"
+    else
+        fail "Stats collector: $output"
+    fi
+}
+
+test_status_probe_from_proc_fixture() {
+    local output
+    output=$("$PROJECT_ROOT/unbound-dns" status --proc-root "$SCRIPT_DIR/fixtures/proc" 2>&1) || true
+    if echo "$output" | grep -q "running (pid 812); port 53 in use by Unbound" && \
+        echo "$output" | grep -q "udp6 ::1"; then
+        pass "Status probe reads listeners and owner from /proc"
+    else
+        fail "Status probe: $output"
+    fi
+}
+
+test_command_runner_streams_phases() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && python3 - <<'PYEOF' 2>&1
+from unbound_dns import command_runner
+
+script = "echo -e '\\033[0;32m[INFO]\\033[0m Step one'; sleep 0.2; echo oops >&2; " \
+         "echo -e '\\033[0;32m[INFO]\\033[0m Step two'"
+runner = command_runner.StreamingCommand(["bash", "-c", script], shell=False)
+lines = list(runner.lines())
+assert ("stderr", "oops", "STDERR") in lines, lines
+assert [p.label for p in runner.result.phases] == ["Step one", "Step two"], runner.result
+assert runner.result.phases[0].seconds >= 0.2 and runner.result.ok
+
+stalled = command_runner.StreamingCommand("echo start; sleep 30", inactivity_timeout=0.5)
+list(stalled.lines())
+assert stalled.result.timed_out and stalled.result.seconds < 5, stalled.result
+
+# A grandchild that ignores SIGTERM and keeps the pipes open is killed with the whole group.
+command_runner.KILL_GRACE = 0.5
+orphan = command_runner.StreamingCommand("(trap '' TERM; sleep 30) & echo start; wait", inactivity_timeout=0.5)
+list(orphan.lines())
+assert orphan.result.timed_out and orphan.result.seconds < 5, orphan.result
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Command runner streams lines, times phases and stops idle commands"
+    else
+        fail "Command runner: $output"
+    fi
+}
+
+test_config_gen_sizes_for_hardware() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && python3 - <<'PYEOF' 2>&1
+from unbound_dns import config_gen
+
+GB = 1024 ** 3
+big = config_gen.tune(config_gen.Hardware(32, 64 * GB, 48 * GB, 1024, 65536), "high-performance")
+assert big["num-threads"] == 32 and big["rrset-cache-slabs"] == 32, big
+assert big["rrset-cache-size"] == "6144m" and big["msg-cache-size"] == "3072m" and big["key-cache-size"] == "64m", big
+assert big["outgoing-range"] == 2040 and big["num-queries-per-thread"] == 1020, big
+
+six = config_gen.tune(config_gen.Hardware(6, 8 * GB, 4 * GB, 1024, 1024), "default")
+assert six["msg-cache-slabs"] == 8 and six["outgoing-range"] == 128, six
+
+small = config_gen.tune(config_gen.Hardware(2, 512 * 1024 ** 2, 128 * 1024 ** 2, 1024, 1024), "default")
+total = sum(int(small[k][:-1]) for k in ("rrset-cache-size", "msg-cache-size", "key-cache-size", "neg-cache-size"))
+assert total <= 64 and small["rrset-cache-size"] == f"{2 * int(small['msg-cache-size'][:-1])}m", small
+
+text = config_gen.render_config(config_gen.tune(config_gen.Hardware(1, GB, GB, 1024, 1024), "low-memory"))
+assert "{" not in text and "num-threads: 1" in text and "control-enable: yes" in text
+assert "control-interface: /" in text and "control-use-cert" not in text
+assert config_gen.diff_config(text, text) == ""
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Config generator sizes threads, slabs, caches and sockets for the host"
+    else
+        fail "Config generator: $output"
+    fi
+}
+
+test_upstreams_rank_and_prune_tls() {
+    if ! command -v openssl &> /dev/null; then
+        echo "  - skipped upstream evaluator test (openssl not installed)"
+        return
+    fi
+    openssl req -x509 -newkey rsa:2048 -nodes -days 1 -subj /CN=dns.test \
+        -addext subjectAltName=DNS:dns.test \
+        -keyout "$TMP_DIR/dot.key" -out "$TMP_DIR/dot.pem" &> /dev/null
+
+    local output
+    output=$(cd "$PROJECT_ROOT" && CERT="$TMP_DIR/dot.pem" KEY="$TMP_DIR/dot.key" python3 - <<'PYEOF' 2>&1
+import asyncio
+import os
+
+from unbound_dns import fake_dns
+from unbound_dns import upstreams
+
+
+async def main():
+    tls = fake_dns.server_context(os.environ["CERT"], os.environ["KEY"])
+    fast = await fake_dns.FakeDNSServer(tls=tls).start()
+    slow = await fake_dns.FakeDNSServer(tls=tls, delay=0.1).start()
+    dead = await fake_dns.FakeDNSServer(tls=tls, drop=1.0).start()
+    specs = [f"127.0.0.1@{s.port}#dns.test" for s in (dead, slow, fast)] + \
+        [f"127.0.0.1@{fast.port}#wrong.test"]
+    config = ('server:\n    verbosity: 1\n\nforward-zone:\n    name: "."\n'
+              '    forward-tls-upstream: yes\n\n' +
+              "".join(f"    forward-addr: {spec}\n\n" for spec in specs) +
+              'forward-zone:\n    name: "example."\n    forward-addr: 192.0.2.1\n')
+
+    targets = upstreams.forward_addrs(config)
+    assert [t.spec for t in targets] == specs, targets
+    evaluator = upstreams.UpstreamEvaluator(targets, timeout=0.3,
+                                            context=upstreams.client_context(os.environ["CERT"]))
+    ranking = await evaluator.run(rounds=3, interval=0)
+    order = [s.upstream.port for s in ranking]
+    assert order[:2] == [fast.port, slow.port], [upstreams.format_stats(s) for s in ranking]
+    assert ranking[0].rtt_ms < ranking[1].rtt_ms and ranking[0].handshake_ms > 0
+    assert all(s.loss == 1.0 for s in ranking[2:]), [upstreams.format_stats(s) for s in ranking]
+
+    kept, pruned = upstreams.plan(ranking)
+    assert [s.upstream.spec for s in kept] == specs[2:0:-1], kept
+    assert {s.upstream.spec for s, _ in pruned} == {specs[0], specs[3]}, pruned
+
+    updated = upstreams.rewrite_forward_zone(config, [s.upstream for s in kept],
+                                             [(s.upstream, r) for s, r in pruned])
+    assert [u.spec for u in upstreams.forward_addrs(updated)] == specs[2:0:-1], updated
+    assert updated.count("# forward-addr:") == 2 and "forward-addr: 192.0.2.1" in updated
+    assert updated.splitlines().count("") == config.splitlines().count(""), updated
+
+    # A second run replaces the earlier pruned lines instead of piling up more, and an upstream
+    # that recovered is restored; one this run did not measure keeps its comment.
+    assert {u.spec for u in upstreams.pruned_addrs(updated)} == {specs[0], specs[3]}
+    again = upstreams.rewrite_forward_zone(updated, [s.upstream for s in kept],
+                                           [(s.upstream, r) for s, r in pruned])
+    assert again == updated, again
+    recovered = upstreams.Upstream.parse(specs[0])
+    restored = upstreams.rewrite_forward_zone(updated, [s.upstream for s in kept] + [recovered])
+    assert [u.spec for u in upstreams.forward_addrs(restored)] == specs[2:0:-1] + specs[:1], restored
+    assert [u.spec for u in upstreams.pruned_addrs(restored)] == specs[3:], restored
+    for server in (fast, slow, dead):
+        await server.stop()
+    print("ok")
+
+
+asyncio.run(main())
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Upstream evaluator ranks TLS stand-ins by latency and prunes dead ones"
+    else
+        fail "Upstream evaluator: $output"
+    fi
+}
+
+test_cache_dump_and_warm_up() {
+    install_fake_control
+    start_fake_dns 25356 || { fail "Cache warm-up: fake DNS server did not start"; return; }
+    printf 'Oct 18 10:00:01 host unbound: [812:0] info: 127.0.0.1 github.com. A IN\n%.0s' 1 2 3 \
+        > "$TMP_DIR/queries.log"
+    printf 'Oct 18 10:00:02 host unbound: [812:0] info: ::1 example.org. AAAA IN\n' >> "$TMP_DIR/queries.log"
+    printf 'wikipedia.org\n' > "$TMP_DIR/names.txt"
+
+    local output
+    output=$(cd "$PROJECT_ROOT" && PATH="$TMP_DIR/bin:$PATH" TMP_DIR="$TMP_DIR" \
+        FIXTURES="$SCRIPT_DIR/fixtures" python3 - <<'PYEOF' 2>&1
+import gzip
+import os
+
+from unbound_dns import cache_warmup
+
+tmp, fixtures = os.environ["TMP_DIR"], os.environ["FIXTURES"]
+dump_path = os.path.join(tmp, "dumps", "cache.dump.gz")
+saved = cache_warmup.save_cache(dump_path, use_sudo=False)
+assert (saved.rrsets, saved.messages) == (2, 2), saved
+with open(os.path.join(fixtures, "cache_dump.txt"), "rb") as f:
+    original = f.read()
+with gzip.open(dump_path, "rb") as f:
+    assert f.read() == original
+
+names = cache_warmup.top_domains([os.path.join(tmp, "queries.log"), os.path.join(tmp, "names.txt")], 2)
+assert names == ["github.com", ("example.org", "AAAA")], names
+
+texts = iter(open(os.path.join(fixtures, f"stats_noreset_{i}.txt")).read() for i in (1, 2))
+report = cache_warmup.restore(dump_path, names, port=25356, use_sudo=False, fetch=lambda: next(texts))
+with open(os.path.join(tmp, "loaded_cache.txt"), "rb") as f:
+    assert f.read() == original
+assert report.loaded.rrsets == 2 and report.warmed == 2 and report.failed == 0, report
+assert abs(report.hit_rate_after - 0.9) < 1e-9 and report.time_to_warm > 0, report
+
+os.utime(dump_path, (0, 0))
+stale = cache_warmup.restore(dump_path, use_sudo=False)
+assert stale.loaded is None and "old" in stale.skipped, stale
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Cache dump round-trips through gzip and restores with a warm-up pass"
+    else
+        fail "Cache warm-up: $output"
+    fi
+}
+
+test_cache_flush_commands_and_impact() {
+    install_fake_control
+    start_fake_dns 25357 || { fail "Cache flush: fake DNS server did not start"; return; }
+    : > "$TMP_DIR/control.log"
+
+    local output
+    output=$(cd "$PROJECT_ROOT" && PATH="$TMP_DIR/bin:$PATH" TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import os
+
+from unbound_dns import cache_flush
+
+impact = cache_flush.measure_impact("type", "GitHub.com.", "aaaa", port=25357, use_sudo=False)
+assert impact.result.ok and [r.name for r in impact.after][0] == "GitHub.com", impact
+assert len(impact.before) == len(impact.after) == 3 and all(r.ok for r in impact.after), impact
+assert "Median" in cache_flush.format_impact(impact)
+
+everything = cache_flush.flush("all", use_sudo=False)
+assert everything.ok and "removed 3 rrsets" in everything.outputs[0], everything
+
+os.environ["FAIL_CONTROL"] = "flush_negative"
+failed = cache_flush.flush("all", use_sudo=False)
+assert not failed.ok and len(failed.outputs) == 2, failed
+
+try:
+    cache_flush.flush("zone", use_sudo=False)
+    raise AssertionError("zone flush without a name should be rejected")
+except ValueError:
+    pass
+
+with open(os.path.join(os.environ["TMP_DIR"], "control.log")) as f:
+    assert f.read().splitlines() == [
+        "flush_type GitHub.com. AAAA",
+        "flush_zone .", "flush_negative", "flush_infra all",
+        "flush_zone .", "flush_negative",
+    ]
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Targeted flushes issue the right unbound-control commands and measure impact"
+    else
+        fail "Cache flush: $output"
+    fi
+}
+
+test_apply_config_reloads_and_measures_gap() {
+    install_fake_control
+    start_fake_dns 25358 || { fail "Apply config: fake DNS server did not start"; return; }
+    mkdir -p "$TMP_DIR/etc"
+    : > "$TMP_DIR/control.log"
+
+    local output
+    output=$(cd "$PROJECT_ROOT" && PATH="$TMP_DIR/bin:$PATH" TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import os
+import subprocess
+import sys
+import time
+
+from unbound_dns import config_apply
+
+tmp = os.environ["TMP_DIR"]
+target = os.path.join(tmp, "etc", "unbound.conf")
+base = ("server:\n    port: {port}\n    num-threads: {threads}\n\nforward-zone:\n"
+        '    name: "."\n    forward-addr: 1.1.1.1@853#cloudflare-dns.com\n')
+with open(target, "w") as f:
+    f.write(base.format(port=25358, threads=1))
+
+assert config_apply.changed_options(base.format(port=25358, threads=1),
+                                    base.format(port=25358, threads=4)) == ["num-threads"]
+assert config_apply.needs_restart(["num-threads", "port"]) == ["port"]
+
+result = config_apply.apply_config(base.format(port=25358, threads=4), target, use_sudo=False, port=25358)
+assert result.method == "reload_keep_cache" and result.changed == ["num-threads"], result
+assert result.ready_seconds is not None and result.gap_seconds == 0.0 and result.probes > 0, result
+assert os.path.exists(result.backup) and "num-threads: 4" in open(target).read()
+
+try:
+    config_apply.apply_config(base.format(port=25358, threads=2) + "    bogus-option: yes\n", target,
+                              use_sudo=False, port=25358)
+    raise AssertionError("invalid config was accepted")
+except config_apply.ConfigError as e:
+    assert "bogus-option" in str(e)
+assert "num-threads: 4" in open(target).read()
+assert not [n for n in os.listdir(os.path.dirname(target)) if n.startswith(".unbound.conf.")]
+
+os.environ["UNKNOWN_CONTROL"] = "reload_keep_cache"
+result = config_apply.apply_config(base.format(port=25358, threads=2), target, use_sudo=False, port=25358)
+assert result.method == "reload", result
+del os.environ["UNKNOWN_CONTROL"]
+
+# Unbound is up but unbound-control can't reach it: restart instead of installing without applying.
+os.environ["FAIL_CONTROL"] = "status"
+config_apply.process_running = lambda: True
+result = config_apply.apply_config(base.format(port=25358, threads=3), target, restart=lambda: True,
+                                   use_sudo=False, port=25358)
+assert result.method == "restart" and "could not reach" in config_apply.format_result(result), result
+config_apply.process_running = lambda: False
+result = config_apply.apply_config(base.format(port=25358, threads=2), target, use_sudo=False, port=25358)
+assert result.method is None and "not running" in config_apply.format_result(result), result
+del os.environ["FAIL_CONTROL"]
+
+server = subprocess.Popen([sys.executable, "-m", "unbound_dns.fake_dns", "--port", "25359"],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+assert config_apply.wait_for_port(port=25359, timeout=10) is not None
+
+
+def restart():
+    global server
+    server.terminate()
+    server.wait()
+    time.sleep(0.3)
+    server = subprocess.Popen([sys.executable, "-m", "unbound_dns.fake_dns", "--port", "25359"],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return True
+
+
+try:
+    result = config_apply.apply_config(base.format(port=25359, threads=2), target, restart=restart,
+                                       use_sudo=False, port=25359)
+finally:
+    server.terminate()
+assert result.method == "restart" and result.changed == ["port"], result
+assert result.gap_seconds >= 0.3 and result.failed_probes > 0, result
+
+with open(os.path.join(tmp, "control.log")) as f:
+    log = f.read().split()
+assert log.count("reload_keep_cache") == 2 and log.count("reload") == 1, log
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Apply-config validates, swaps atomically, reloads and measures the gap"
+    else
+        fail "Apply config: $output"
+    fi
+}
+
+test_log_analyzer_summarises_generated_logs() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, "benchmarks")
+import bench_log_analyzer
+from unbound_dns import log_analyzer
+
+tmp = os.environ["TMP_DIR"]
+log = os.path.join(tmp, "unbound.log")
+truth = bench_log_analyzer.write_log(log, 40000, names=3000, clients=150, syslog=True)
+
+# Force several chunks and worker processes so the split/merge path is exercised.
+log_analyzer.CHUNK_SIZE = 256 << 10
+stats = log_analyzer.analyze(log, jobs=3, capacity=5000)
+assert stats.queries == stats.replies == stats.lookups == 40000, (stats.queries, stats.replies)
+assert stats.count_from == "queries"
+for name, count, error in stats.names.top(10):
+    assert count == truth["names"][name.decode()] and error == 0, (name, count)
+assert [c for _, c, _ in stats.names.top(10)] == [c for _, c in truth["names"].most_common(10)]
+assert {k.decode(): v for k, v in stats.qtypes.items()} == truth["qtypes"]
+assert {k.decode(): v for k, v in stats.rcodes.items()} == truth["rcodes"]
+assert stats.cached == truth["cached"]
+unique = len(truth["names"])
+assert abs(len(stats.unique_names) - unique) < unique * 0.03, (len(stats.unique_names), unique)
+assert abs(len(stats.unique_clients) - len(truth["clients"])) <= 3, len(stats.unique_clients)
+assert 0 <= stats.latency_percentile(0.5) <= stats.latency_percentile(0.99)
+
+# Heavy hitters survive a summary far smaller than the number of distinct names.
+small = log_analyzer.analyze(log, capacity=50)
+heavy = [name for name, _ in truth["names"].most_common(5)]
+assert [n.decode() for n, _, _ in small.names.top(5)] == heavy, small.names.top(5)
+
+with open(log, "rb") as src, gzip.open(log + ".gz", "wb") as dst:
+    shutil.copyfileobj(src, dst)
+assert log_analyzer.analyze([log + ".gz"]).names.top(3) == stats.names.top(3)
+
+replies_only = os.path.join(tmp, "replies.log")
+bench_log_analyzer.write_log(replies_only, 500, names=50, queries=False)
+only = log_analyzer.analyze(replies_only)
+assert (only.count_from, only.queries, only.replies, only.lookups) == ("replies", 0, 500, 500)
+
+# Follow the log across a rotation.
+live = os.path.join(tmp, "live.log")
+open(live, "w").close()
+done = threading.Event()
+followed = log_analyzer.LogStats()
+worker = threading.Thread(target=log_analyzer.follow,
+                          kwargs=dict(path=live, stats=followed, interval=0.05, from_start=True,
+                                      stop=done.is_set))
+worker.start()
+with open(live, "a") as f:
+    f.write("[1] unbound[1:0] info: 10.0.0.1 a.test. A IN\n")
+time.sleep(0.3)
+os.rename(live, live + ".1")
+with open(live, "w") as f:
+    f.write("[2] unbound[1:0] info: 10.0.0.2 b.test. AAAA IN NOERROR 0.001000 0 60\n"
+            "[2] unbound[1:0] info: start of service (unbound 1.19.0).\n")
+time.sleep(0.3)
+done.set()
+worker.join()
+assert followed.queries == 1 and followed.replies == 1, (followed.queries, followed.replies)
+
+cli = subprocess.run([sys.executable, "unbound-dns", "logs", log, "--json", "-n", "3"],
+                     capture_output=True, text=True)
+summary = json.loads(cli.stdout)
+assert [e["name"] for e in summary["top_names"]] == heavy[:3], summary["top_names"]
+assert summary["rcodes"] == dict(truth["rcodes"].most_common())
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Log analyzer aggregates top names, types, rcodes and latency from generated logs"
+    else
+        fail "Log analyzer: $output"
+    fi
+}
+
+test_cli_starts_without_gui_or_asyncio() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && FIXTURES="$SCRIPT_DIR/fixtures" python3 - <<'PYEOF' 2>&1
+import contextlib
+import io
+import os
+import sys
+
+from unbound_dns import cli
+
+out = io.StringIO()
+with contextlib.redirect_stdout(out):
+    assert cli.main(["status", "--proc-root", os.path.join(os.environ["FIXTURES"], "proc")]) == 0
+assert "running (pid 812)" in out.getvalue(), out.getvalue()
+for argv in (["flush", "zone", "example.com"], ["apply-config", "--target", "x"], ["logs", "a.log"],
+             ["cache", "save"]):
+    cli.build_parser({argv[0]}).parse_args(argv)
+loaded = [m for m in ("tkinter", "asyncio", "ssl", "concurrent.futures") if m in sys.modules]
+assert not loaded, loaded
+
+parser = cli.build_parser()
+assert parser.parse_args(["bench", "--fake"]).func is cli.cmd_benchmark
+assert parser.parse_args(["flush", "zone", "example.com"]).kind == "zone"
+assert "tkinter" not in sys.modules
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "CLI runs status and builds parsers without tkinter or asyncio"
+    else
+        fail "CLI startup: $output"
+    fi
+}
+
+test_exporter_serves_cached_metrics() {
+    install_fake_control
+    : > "$TMP_DIR/control.log"
+
+    local output
+    output=$(cd "$PROJECT_ROOT" && PATH="$TMP_DIR/bin:$PATH" TMP_DIR="$TMP_DIR" STATS_DELAY=0.3 \
+        python3 - <<'PYEOF' 2>&1
+import asyncio
+import gzip
+import os
+
+from unbound_dns import exporter, stats
+
+log_path = os.path.join(os.environ["TMP_DIR"], "control.log")
+
+
+async def get(port, path="/metrics", headers=""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n{headers}\r\n".encode())
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    if b"Content-Encoding: gzip" in head:
+        body = gzip.decompress(body)
+    return head.decode(), body.decode()
+
+
+def stats_calls():
+    with open(log_path) as f:
+        return sum(line.startswith("stats_noreset") for line in f)
+
+
+async def main():
+    metrics = exporter.Exporter(lambda: stats.fetch_stats(), ttl=0.5)
+    server = await metrics.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    results = await asyncio.gather(*(get(port) for _ in range(20)))
+    assert stats_calls() == 1, stats_calls()
+    head, body = results[0]
+    assert "200 OK" in head and "version=0.0.4" in head, head
+    lines = set(body.splitlines())
+    for expected in ('unbound_queries_total{thread="0"} 6000', 'unbound_cache_misses_total{thread="1"} 1000',
+                     "# TYPE unbound_queries_total counter", 'unbound_memory_bytes{component="cache.rrset"} 4250148',
+                     'unbound_query_types_total{type="AAAA"} 2500', 'unbound_answer_rcodes_total{rcode="nodata"} 310',
+                     'unbound_cache_entries{cache="msg"} 1830', 'unbound_query_transport_total{kind="tcpout"} 4',
+                     'unbound_response_time_seconds_bucket{le="0.008192"} 300',
+                     'unbound_response_time_seconds_bucket{le="0.032768"} 1400',
+                     'unbound_response_time_seconds_bucket{le="+Inf"} 2000',
+                     "unbound_response_time_seconds_count 2000", "unbound_response_time_seconds_sum 100",
+                     "unbound_uptime_seconds 3600", "unbound_up 1", "unbound_exporter_control_calls_total 1"):
+        assert expected in lines, expected
+    assert not any(line.startswith("unbound_queries_total{thread=\"total") for line in lines)
+
+    head, body = await get(port, headers="Accept: application/openmetrics-text; version=1.0.0\r\n"
+                                         "Accept-Encoding: gzip\r\n")
+    assert "application/openmetrics-text" in head and "Content-Encoding: gzip" in head, head
+    assert body.endswith("# EOF\n") and "# TYPE unbound_queries counter" in body, body[-200:]
+    assert stats_calls() == 1, stats_calls()
+    assert "404" in (await get(port, "/nope"))[0]
+
+    await asyncio.sleep(0.6)
+    os.environ["FAIL_CONTROL"] = "stats_noreset"
+    head, body = await get(port)
+    assert "200 OK" in head and "unbound_up 0" in body.splitlines(), body
+    assert "unbound_exporter_control_errors_total 1" in body.splitlines(), body
+    assert stats_calls() == 2, stats_calls()
+    server.close()
+    await server.wait_closed()
+
+
+asyncio.run(main())
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Exporter translates stats_noreset and shares one control call across concurrent scrapes"
+    else
+        fail "Exporter: $output"
+    fi
+}
+
+test_control_socket_against_fake_server() {
+    local have_openssl=""
+    if command -v openssl &> /dev/null; then
+        have_openssl=1
+        openssl req -x509 -newkey rsa:2048 -nodes -days 1 -subj /CN=unbound \
+            -keyout "$TMP_DIR/unbound_server.key" -out "$TMP_DIR/unbound_server.pem" &> /dev/null
+        openssl req -x509 -newkey rsa:2048 -nodes -days 1 -subj /CN=unbound-control \
+            -keyout "$TMP_DIR/unbound_control.key" -out "$TMP_DIR/unbound_control.pem" &> /dev/null
+    fi
+
+    local output
+    output=$(cd "$PROJECT_ROOT" && TMP_DIR="$TMP_DIR" FIXTURES="$SCRIPT_DIR/fixtures" TLS="$have_openssl" \
+        python3 - <<'PYEOF' 2>&1
+import asyncio
+import os
+import ssl
+import tracemalloc
+
+from unbound_dns import cache_warmup, fake_control, fake_dns, stats, unbound_control
+
+tmp, fixtures = os.environ["TMP_DIR"], os.environ["FIXTURES"]
+RRSETS = 50000
+
+
+def big_dump():
+    yield b"START_RRSET_CACHE\n"
+    for i in range(RRSETS):
+        yield f";rrset 3600 1 0 8 3\nhost{i}.example.com.\t3600\tIN\tA\t10.0.{i // 256 % 256}.{i % 256}\n".encode()
+    yield b"END_RRSET_CACHE\nSTART_MSG_CACHE\nEND_MSG_CACHE\nEOF\n"
+
+
+def write_config(name, remote_control):
+    path = os.path.join(tmp, name)
+    with open(path, "w") as f:
+        f.write("server:\n    verbosity: 1\n\nremote-control:\n    control-enable: yes\n" + remote_control)
+    return path
+
+
+def over_unix_socket(fake, conf):
+    result = unbound_control.run_control("status", config=conf)
+    assert result.ok and "is running" in result.output, result
+    assert stats.parse_stats(stats.fetch_stats(conf))["total.num.queries"] == 10000
+
+    client = unbound_control.socket_client(conf)
+    assert client is unbound_control.socket_client(conf) and client.endpoint.is_unix
+    results = client.pipeline([("flush_zone", "example.com"), ("stats_noreset",), ("bogus",)])
+    assert [r.ok for r in results] == [True, True, False], results
+    assert results[0].output.startswith("ok removed") and "unknown command" in results[2].output
+    try:
+        client.control("bogus")
+        raise AssertionError("error reply was not raised")
+    except unbound_control.ControlError:
+        pass
+
+    path = os.path.join(tmp, "socket.dump.gz")
+    tracemalloc.start()
+    saved = cache_warmup.save_cache(path, config=conf)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert saved.rrsets == RRSETS and peak < saved.bytes / 4, (saved, peak)
+    loaded = cache_warmup.load_cache(path, config=conf)
+    assert loaded.rrsets == RRSETS and len(fake.loaded) == 2 * RRSETS + 5, (loaded, len(fake.loaded))
+    assert fake.loaded[-1] == b"EOF\n"
+    assert fake.commands[:4] == ["status", "stats_noreset", "flush_zone example.com", "stats_noreset"]
+    assert fake.commands[-2:] == ["dump_cache", "load_cache"], fake.commands
+
+
+def over_tls(fake, conf):
+    client = unbound_control.socket_client(conf)
+    assert client.endpoint.tls and client.endpoint.port == fake.port
+    for _ in range(3):
+        assert unbound_control.control("status", config=conf).endswith("is running...")
+    context = client.context()
+    assert client.context() is context and client.connections == 3 == fake.connections
+
+
+async def main():
+    with open(os.path.join(fixtures, "stats_noreset_1.txt")) as f:
+        stats_text = f.read()
+    loop = asyncio.get_running_loop()
+    fake = await fake_control.FakeControlServer(path=os.path.join(tmp, "control.sock"), stats=stats_text,
+                                                dump=big_dump).start()
+    conf = write_config("socket.conf", f'    control-interface: "{fake.path}"\n')
+    await loop.run_in_executor(None, over_unix_socket, fake, conf)
+    await fake.stop()
+    assert unbound_control.socket_client(write_config("gone.conf", "    control-interface: /nonexistent\n")) is None
+
+    if os.environ["TLS"]:
+        tls = fake_dns.server_context(os.path.join(tmp, "unbound_server.pem"),
+                                      os.path.join(tmp, "unbound_server.key"))
+        tls.verify_mode = ssl.CERT_REQUIRED
+        tls.load_verify_locations(os.path.join(tmp, "unbound_control.pem"))
+        fake = await fake_control.FakeControlServer(tls=tls).start()
+        conf = write_config("tls.conf", f"    control-interface: 127.0.0.1\n    control-port: {fake.port}\n")
+        await loop.run_in_executor(None, over_tls, fake, conf)
+        await fake.stop()
+
+
+asyncio.run(main())
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Control socket client runs, pipelines and streams commands against the fake control server"
+    else
+        fail "Control socket: $output"
+    fi
+}
+
+test_histogram_records_and_flags_tail_regression() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import os
+import random
+import shutil
+import subprocess
+
+from unbound_dns import config_gen, histogram
+
+hw = config_gen.Hardware(2, 1 << 30, 1 << 30, 1024, 1024)
+assert "extended-statistics: no" in config_gen.generate(hw=hw)
+text = config_gen.generate(hw=hw, extended_statistics=True)
+assert "extended-statistics: yes" in text and "statistics-cumulative: yes" in text
+
+assert histogram.percentile([(0.0, 1.0), (1.0, 2.0)], [0, 10], 0.5) == 1.5
+assert histogram.percentile([(0.0, 1.0)], [0], 0.5) is None
+
+
+def key(us):
+    return f"{us // 1000000:06d}.{us % 1000000:06d}"
+
+
+# Unbound's 40 power-of-two buckets: 0-1us, 1-2us, 2-4us, ...
+edges = [0] + [1 << i for i in range(40)]
+keys = [f"histogram.{key(lo)}.to.{key(hi)}" for lo, hi in zip(edges, edges[1:])]
+rng = random.Random(7)
+totals = [0] * 40
+path = os.path.join(os.environ["TMP_DIR"], "hist", "recursion.hist")
+series = histogram.HistogramSeries(path=path)
+for step in range(61):
+    if step == 20:
+        totals = [0] * 40  # Unbound restarted: the counters start again from zero
+    slow = step > 30
+    for _ in range(500):
+        ms = rng.lognormvariate(3.0, 0.5) * (4 if slow and rng.random() < 0.05 else 1)
+        totals[min(39, int(ms * 1000).bit_length())] += 1
+    counts = series.record({k: float(v) for k, v in zip(keys, totals)}, timestamp=1000.0 + 10 * step)
+    assert (counts is None) == (step == 0)
+    assert step == 0 or sum(counts) == 500, (step, sum(counts))
+
+assert len(series) == 60 and len(series.bounds) == 40
+size = os.path.getsize(path)
+assert size < 60 * 100, size
+loaded = histogram.HistogramSeries.load(path)
+assert loaded.bounds == series.bounds and loaded.times == series.times and loaded.counts == series.counts
+assert sum(series.last(300)) == 30 * 500 and sum(series.window()) == 60 * 500
+
+comparison = histogram.compare(series.bounds, series.last(300, 300), series.last(300))
+assert 0.99 in comparison.regressions and 0.5 not in comparison.regressions, histogram.format_comparison(comparison)
+assert not histogram.compare(series.bounds, series.last(100, 400), series.last(100, 300)).regressions
+
+cli = subprocess.run(["./unbound-dns", "histogram", "compare", "-f", path], capture_output=True, text=True)
+assert cli.returncode == 1 and "p99" in cli.stdout and "REGRESSION" in cli.stdout, cli.stdout + cli.stderr
+cli = subprocess.run(["./unbound-dns", "histogram", "show", "-f", path, "-w", "60"], capture_output=True, text=True)
+assert cli.returncode == 0 and "3,000 replies" in cli.stdout, cli.stdout + cli.stderr
+
+# A sample cut short by a crash is dropped from the file before new samples are appended after it.
+torn = os.path.join(os.environ["TMP_DIR"], "hist", "torn.hist")
+shutil.copy(path, torn)
+os.truncate(torn, size - 3)
+resumed = histogram.HistogramSeries.load(torn, append=True)
+assert resumed.times == series.times[:-1] and os.path.getsize(torn) < size - 3
+resumed.record({k: float(v) for k, v in zip(keys, totals)}, timestamp=2000.0)
+totals[5] += 7
+resumed.record({k: float(v) for k, v in zip(keys, totals)}, timestamp=2010.0)
+reloaded = histogram.HistogramSeries.load(torn)
+assert list(reloaded.times) == list(series.times[:-1]) + [2010.0] and reloaded.sample(59)[5] == 7, reloaded.times[-3:]
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Histogram series records compactly, survives restarts and flags a p99 regression"
+    else
+        fail "Histogram: $output"
+    fi
+}
+
+test_metrics_store_rollups_retention_and_range_queries() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import csv
+import os
+import subprocess
+
+from unbound_dns import metrics_store, status_probe
+
+path = os.path.join(os.environ["TMP_DIR"], "metrics", "metrics.db")
+store = metrics_store.MetricsStore(path)
+now = 1_700_000_000.0
+# 35 days of one-minute samples, then the last day again at five-second resolution.
+rows = [(t, 60.0, 600.0, 540.0, 60.0, 2.0, 0.05, 0.04) for t in range(int(now - 35 * 86400), int(now - 86400), 60)]
+rows += [(now - 86400 + i * 5, 5.0, 50.0, 40.0, 10.0, 4.0, 0.02, 0.01) for i in range(1, 17281)]
+for i in range(0, len(rows), 1000):
+    store.add_samples(rows[i:i + 1000])
+store.add_status(status_probe.Status(running=True, port_in_use=True), now - 30)
+store.add_status(status_probe.Status(running=False, port_in_use=False), now - 20)
+store.maintain(now)
+
+raw = store.rows("samples")
+assert raw[0][0] >= now - 86400 and len(raw) == 17280, (raw[0], len(raw))
+rollups = store.rows("rollups")
+assert rollups[0][0] >= now - 30 * 86400, rollups[0]
+# An old minute holds its one sample; a recent one sums twelve five-second samples exactly.
+assert rollups[0][1:6] == (1, 60.0, 600.0, 540.0, 60.0), rollups[0]
+recent = dict((r[0], r) for r in rollups)[int(now // 60) * 60 - 600]
+assert recent[1:6] == (12, 60.0, 600.0, 480.0, 120.0) and abs(recent[7] / recent[5] - 0.02) < 1e-9, recent
+
+week = store.query(now - 7 * 86400, now)
+assert week.source == "rollups" and len(week.times) <= metrics_store.DEFAULT_POINTS, week.source
+assert week.seconds < 0.2, week.seconds
+assert abs(week.qps[0] - 10.0) < 1e-9 and abs(week.hit_rate[0] - 0.9) < 1e-9, (week.qps[0], week.hit_rate[0])
+assert abs(week.qps[-1] - 10.0) < 1e-9 and abs(week.hit_rate[-1] - 0.8) < 1e-9, (week.qps[-1], week.hit_rate[-1])
+hour = store.query(now - 3600, now)
+assert hour.source == "samples" and hour.rows == 722 and abs(hour.recursion_avg[-1] - 0.02) < 1e-9, hour
+assert [r for r in hour.running if r is not None] == [1.0, 0.0], hour.running[-10:]
+
+csv_path = os.path.join(os.environ["TMP_DIR"], "metrics", "rollups.csv")
+assert store.export_csv(csv_path, "rollups") == len(rollups)
+with open(csv_path) as f:
+    exported = list(csv.reader(f))
+assert exported[0][:2] == ["minute", "samples"] and len(exported) == len(rollups) + 1
+col_path = os.path.join(os.environ["TMP_DIR"], "metrics", "samples.ubcol")
+assert store.export_columns(col_path) == len(raw)
+columns = metrics_store.read_columns(col_path)
+assert list(columns["ts"]) == [r[0] for r in raw] and sum(columns["queries"]) == 50.0 * len(raw)
+store.close()
+
+assert metrics_store.parse_duration("90m") == 5400 and metrics_store.parse_duration("7d") == 7 * 86400
+cli_db = os.path.join(os.environ["TMP_DIR"], "metrics", "cli.db")
+cli = subprocess.run(["./unbound-dns", "stats", "--from-file", "tests/fixtures/stats_noreset_1.txt",
+                      "tests/fixtures/stats_noreset_2.txt", "--store", cli_db], capture_output=True, text=True)
+assert cli.returncode == 0, cli.stderr
+cli = subprocess.run(["./unbound-dns", "history", "--db", cli_db, "--since", "10000d"], capture_output=True, text=True)
+assert cli.returncode == 0 and "200.0" in cli.stdout and "90.0%" in cli.stdout, cli.stdout + cli.stderr
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Metrics store rolls up minutes exactly, applies retention and answers a week in under 200ms"
+    else
+        fail "Metrics store: $output"
+    fi
+}
+
+test_chaos_harness_injects_faults_and_rewrites_config() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import asyncio
+import os
+import shutil
+import subprocess
+
+from unbound_dns import chaos, dns_probe
+
+phase = chaos.Phase.parse("outage:30:loss=1")
+assert (phase.name, phase.seconds, phase.loss, phase.delay) == ("outage", 30.0, 1.0, 0.0)
+assert chaos.Phase.parse("slow:5:delay=250").delay == 0.25
+variant = chaos.Variant.parse("fast-stale:serve-expired-client-timeout=0,prefetch=no")
+assert variant.options == {"serve-expired-client-timeout": "0", "prefetch": "no"}
+
+text = chaos.harness_config(variant, os.environ["TMP_DIR"], 5399, [6001, 6002], "/tmp/bundle.pem")
+lines = [line.strip() for line in text.splitlines()]
+assert "port: 5399" in lines and "port: 53" not in lines and "interface: ::1" not in lines
+assert lines.count("serve-expired-client-timeout: 0") == 1 and "serve-expired-client-timeout: 1800" not in lines
+assert "serve-expired: yes" in lines and "control-enable: no" in lines and "use-syslog: no" in lines
+assert "forward-addr: 127.0.0.1@6001#upstream.chaos.test" in lines and "forward-addr: 1.1.1.1@853#cloudflare-dns.com" not in lines
+assert lines.index("prefetch: no") < lines.index("remote-control:")
+if shutil.which("unbound-checkconf"):
+    path = os.path.join(os.environ["TMP_DIR"], "chaos.conf")
+    with open(path, "w") as f:
+        f.write(text.replace('"/tmp/bundle.pem"', '""'))
+    check = subprocess.run(["unbound-checkconf", path], capture_output=True, text=True)
+    assert check.returncode == 0, check.stdout + check.stderr
+
+fresh = dns_probe.ProbeResult("127.0.0.1", 53, "a.test", "A", rcode="NOERROR",
+                              answers=[dns_probe.Record("a.test", "A", chaos.UPSTREAM_TTL, "10.0.0.1")])
+stale = dns_probe.ProbeResult("127.0.0.1", 53, "a.test", "A", rcode="NOERROR",
+                              answers=[dns_probe.Record("a.test", "A", chaos.STALE_REPLY_TTL, "10.0.0.1")])
+assert chaos.classify(fresh) == "fresh" and chaos.classify(stale) == "stale"
+assert chaos.classify(dns_probe.ProbeResult("127.0.0.1", 53, "a.test", "A", rcode="SERVFAIL")) == "servfail"
+
+
+# Driven straight at one stand-in upstream, so every answer is fresh and the faults show up unfiltered.
+async def drive():
+    harness = await chaos.ChaosHarness(1, rate=100, timeout=0.3, seed=5).start()
+    phases = [chaos.Phase("baseline", 0.5), chaos.Phase("latency", 0.5, delay=0.1),
+              chaos.Phase("loss", 1.0, loss=0.5), chaos.Phase("outage", 0.5, loss=1.0)]
+    try:
+        return phases, await harness.drive(harness.ports[0], phases)
+    finally:
+        assert all(upstream.drop == 0 and upstream.delay == 0 for upstream in harness.upstreams)
+        await harness.stop()
+
+phases, samples = asyncio.run(drive())
+summary = chaos.by_phase(samples, phases)
+assert summary["baseline"]["fresh"] == 1.0 and summary["baseline"]["p99"] < 0.1, summary["baseline"]
+assert summary["latency"]["p50"] >= 0.1 and summary["latency"]["fresh"] == 1.0, summary["latency"]
+assert 0.3 < summary["loss"]["timeout"] < 0.7, summary["loss"]
+assert summary["outage"]["timeout"] == 1.0, summary["outage"]
+assert 180 <= sum(s["queries"] for s in summary.values()) <= 260
+results = [(chaos.Variant("direct"), samples)]
+assert chaos.survival_failures(results, phases) == ["direct: 100.0% of queries failed during outage"]
+assert chaos.survival_failures([(chaos.Variant("off", {"serve-expired": "no"}), samples)], phases) == []
+report = chaos.format_report(results, phases)
+assert "outage" in report and "100.0%" in report, report
+assert chaos.report_dict(results, phases)["direct"]["phases"]["outage"]["timeout"] == 1.0
+
+missing = subprocess.run(["./unbound-dns", "chaos", "--unbound", "/nonexistent/unbound"], capture_output=True, text=True)
+assert missing.returncode == 1 and "not found" in missing.stderr, missing.stderr
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Chaos harness rewrites the shipped config and measures injected latency, loss and outage"
+    else
+        fail "Chaos harness: $output"
+    fi
+}
+
+test_fleet_runs_bounded_and_aggregates() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import os
+import subprocess
+import sys
+import time
+
+from unbound_dns import fake_fleet, fleet
+
+hosts = fleet.parse_inventory(fake_fleet.inventory(40) + "edge1 target=root@edge1.example port=2222 config=/usr/local/etc/unbound/unbound.conf sudo=no  # lab\n")
+assert len(hosts) == 41 and hosts[0].name == "unbound01" and hosts[0].destination == "admin@10.0.0.2"
+edge = hosts[-1]
+assert (edge.port, edge.config, edge.sudo) == (2222, "/usr/local/etc/unbound/unbound.conf", False)
+for bad in ("a\na\n", "a user=x\n"):
+    try:
+        fleet.parse_inventory(bad)
+        raise AssertionError(bad)
+    except ValueError:
+        pass
+
+ssh = fleet.SSHTransport(control_dir="/tmp/cm").argv(edge, ["sh", "-c", "echo 'a b'", "sh", "/etc/x y"])
+assert ssh[:3] == ["ssh", "-o", "BatchMode=yes"] and ssh[ssh.index("-p") + 1] == "2222"
+assert ssh[-3:] == ["root@edge1.example", "--", "sh -c 'echo '\"'\"'a b'\"'\"'' sh '/etc/x y'"], ssh[-3:]
+
+transport = fake_fleet.SimulatedTransport(latency=(0.05, 0.15), unreachable={"unbound07"})
+started = []
+done = []
+began = time.monotonic()
+results = fleet.run_fleet(hosts, fleet.action("stats"), transport, workers=8,
+                          on_start=lambda host: started.append(host.name), on_done=done.append)
+elapsed = time.monotonic() - began
+sequential = sum(transport.delay(host) for host in hosts)
+assert 1 < transport.peak <= 8, transport.peak
+assert elapsed < sequential / 4, (elapsed, sequential)
+assert [r.host.name for r in results] == [h.name for h in hosts] and len(done) == len(started) == 41
+assert [r.host.name for r in results if not r.ok] == ["unbound07"] and "Connection refused" in results[6].summary
+summary = fleet.summarize(results)
+assert (summary["ok"], summary["failed"], summary["skipped"]) == (40, 1, 0), summary
+assert summary["queries"] == sum(r.data["queries"] for r in results if r.ok)
+assert 0.7 <= summary["hit_rate"] <= 0.95, summary
+assert "40/41 hosts OK" in fleet.format_summary(summary)
+
+transport = fake_fleet.SimulatedTransport(latency=(0.01, 0.02))
+results = fleet.run_fleet(hosts, fleet.action("apply", text="BROKEN config"), transport, workers=4, max_failures=3)
+assert not any(r.ok for r in results) and not transport.configs
+assert 3 <= sum(not r.skipped for r in results) < 8 and sum(r.skipped for r in results) > 30
+results = fleet.run_fleet(hosts[:5], fleet.action("apply", text="server:\n"), transport, workers=4)
+assert all(r.ok for r in results) and sorted(transport.configs) == [h.name for h in hosts[:5]]
+_, argv = next(call for call in transport.calls if call[0] == "unbound01" and "sh" in call[1])
+assert argv[:2] == ("sudo", "-n") and argv[-1] == "/etc/unbound/unbound.conf" and "unbound-checkconf" in argv[4]
+
+results = fleet.run_fleet([edge], fleet.action("flush", kind="all"), transport)
+commands = [call[1] for call in transport.calls if call[0] == "edge1"]
+assert results[0].ok and [c[3:] for c in commands] == [("flush_zone", "."), ("flush_negative",), ("flush_infra", "all")]
+assert commands[0][:3] == ("unbound-control", "-c", "/usr/local/etc/unbound/unbound.conf")
+try:
+    fleet.action("flush", kind="zone")
+    raise AssertionError("zone flush without a name")
+except ValueError:
+    pass
+
+# Commands given no input read nothing from the caller's stdin; those given input read only it.
+read, write = os.pipe()
+os.write(write, b"edge2\n")
+os.close(write)
+saved = os.dup(0)
+os.dup2(read, 0)
+try:
+    count = [sys.executable, "-c", "import sys; print(len(sys.stdin.read()))"]
+    assert fleet.LocalTransport().run(edge, count).stdout == "0\n"
+    assert fleet.LocalTransport().run(edge, count, input="server:\n").stdout == "8\n"
+finally:
+    os.dup2(saved, 0)
+    os.close(read)
+
+path = os.path.join(os.environ["TMP_DIR"], "fleet.txt")
+with open(path, "w") as f:
+    f.write(fake_fleet.inventory(6))
+cli = subprocess.run(["./unbound-dns", "fleet", "status", "-i", path, "--transport", "fake", "-j", "3",
+                      "--host", "unbound02", "--host", "unbound05"], capture_output=True, text=True)
+assert cli.returncode == 0 and "2/2 hosts OK" in cli.stdout and "running 1.19.0" in cli.stdout, cli.stdout + cli.stderr
+cli = subprocess.run(["./unbound-dns", "fleet", "status", "-i", path, "--transport", "nope"], capture_output=True, text=True)
+assert cli.returncode == 1 and "Unknown transport" in cli.stderr, cli.stderr
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Fleet runs actions on simulated hosts with a bounded pool, stops a bad apply and aggregates stats"
+    else
+        fail "Fleet: $output"
+    fi
+}
+
+test_cache_advisor_curve_matches_lru_and_stays_bounded() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import gzip
+import os
+import random
+import struct
+import subprocess
+from collections import OrderedDict
+
+from unbound_dns import cache_advisor, config_gen, dns_probe
+
+
+def lru_hit_rate(trace, capacity, ttl):
+    cache, hits = OrderedDict(), 0
+    for now, key in trace:
+        expires = cache.get(key)
+        if expires is not None and now < expires:
+            hits += 1
+        else:
+            cache[key] = now + ttl
+        cache.move_to_end(key)
+        if len(cache) > capacity:
+            cache.popitem(last=False)
+    return hits / len(trace)
+
+
+rng = random.Random(7)
+keys = [f"host{i}.example.com A".encode() for i in range(2000)]
+weights = [1 / (rank + 1) for rank in range(len(keys))]
+trace = [(i * 0.01, key) for i, key in enumerate(rng.choices(keys, weights, k=40000))]
+
+exact = cache_advisor.StackSimulator(ttl=60)
+exact.feed([(now, key, None) for now, key in trace if exact.keep(key)])
+curve = exact.curve()
+assert curve.rate == 1.0 and curve.references == 40000 and curve.expired > 0
+for size in (1, 10, 100, 250, 1000, 5000):
+    assert abs(curve.hit_rate_at(size) - lru_hit_rate(trace, size, 60)) < 0.01, size
+
+sampled = cache_advisor.StackSimulator(max_keys=256, ttl=60)
+sampled.feed([(now, key, None) for now, key in trace if sampled.keep(key)])
+small = sampled.curve()
+assert small.rate < 1.0 and small.tracked < 256 and len(sampled.tree) == 4 * 256 + 1
+assert small.references == 40000
+for size in (250, 1000, 5000):
+    assert abs(small.hit_rate_at(size) - lru_hit_rate(trace, size, 60)) < 0.06, size
+
+# Serve-expired turns the expired misses into hits; a reply's TTL overrides the default.
+stale = cache_advisor.StackSimulator(ttl=60, serve_expired=True)
+stale.feed([(now, key, None) for now, key in trace])
+assert stale.curve().expired == 0 and stale.curve().max_hit_rate > curve.max_hit_rate
+short = cache_advisor.StackSimulator(ttl=3600)
+short.feed([(0, b"a A", None), (0, b"a A", 5), (10, b"a A", None), (11, b"a A", None)])
+assert (short.expired, short.curve().hit_rates) == (1, [1 / 3]), (short.expired, short.curve().hit_rates)
+
+advice = cache_advisor.recommend(curve, 0.8)
+assert advice["reachable"] and advice["hit_rate"] >= 0.8
+assert curve.hit_rate_at(advice["entries"] - 1) < 0.8 <= curve.hit_rate_at(advice["entries"])
+assert config_gen.parse_size(advice["msg-cache-size"]) >= advice["entries"] * cache_advisor.MESSAGE_BYTES
+assert not cache_advisor.recommend(curve, 0.999)["reachable"]
+sizes = cache_advisor.EntrySizes.from_stats({"mem.cache.message": 1000000, "msg.cache.count": 2000,
+                                             "mem.cache.rrset": 3000000, "rrset.cache.count": 6000})
+assert (sizes.message, sizes.rrset, sizes.rrsets_per_message) == (500, 500, 3)
+assert config_gen.parse_size("4m") == 4 << 20 and config_gen.parse_size("1500k") == 1536000
+assert cache_advisor.current(curve, {"msg-cache-size": "1m", "rrset-cache-size": "100m"}, sizes)["entries"] == 2097
+
+# Syslog timestamps drive expiry; with log-queries and log-replies both on, each lookup counts once.
+log = os.path.join(os.environ["TMP_DIR"], "advisor.log")
+with open(log, "w") as f:
+    for minute, name in enumerate(["a.test.", "b.test.", "A.test", "a.test.", "c.test."]):
+        stamp = f"Oct 18 10:{minute * 4:02d}:00 host unbound: [812:0] info: 10.0.0.1 {name} A IN"
+        f.write(f"{stamp}\n{stamp} NOERROR 0.001000 0 60\n")
+batches = list(cache_advisor.read_trace(log))
+assert [key for batch in batches for _, key, _ in batch] == [b"a.test A", b"b.test A", b"a.test A", b"a.test A",
+                                                            b"c.test A"]
+cli = subprocess.run(["./unbound-dns", "cache-advisor", log, "--ttl", "600", "-t", "0.2"],
+                     capture_output=True, text=True)
+assert cli.returncode == 0 and "5 queries" in cli.stdout and "1 expired" not in cli.stdout, cli.stdout + cli.stderr
+assert "20.0% expired" in cli.stdout and "Recommended:  msg-cache-size: 1m" in cli.stdout, cli.stdout
+names = os.path.join(os.environ["TMP_DIR"], "advisor.txt.gz")
+with gzip.open(names, "wt") as f:
+    f.write("# names\na.test\nb.test AAAA\na.test\n")
+assert [key for batch in cache_advisor.read_trace(names) for _, key, _ in batch] == [b"a.test A", b"b.test AAAA",
+                                                                                     b"a.test A"]
+
+
+def frame(source, destination, payload):
+    udp = struct.pack("!HHHH", source, destination, 8 + len(payload), 0) + payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0, bytes(4), bytes(4))
+    return bytes(12) + b"\x08\x00" + ip + udp
+
+
+query = dns_probe.build_query("a.test", "A", qid=7, edns=False)
+reply = (struct.pack("!HHHHHH", 7, 0x8180, 1, 1, 0, 0) + query[12:]
+         + b"\xc0\x0c" + struct.pack("!HHIH", 1, 1, 30, 4) + bytes(4))
+capture = os.path.join(os.environ["TMP_DIR"], "advisor.pcap.gz")
+with gzip.open(capture, "wb") as f:
+    f.write(struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+    # Frames cut short by a small snaplen, before their IPv4 or IPv6 header ends, are skipped.
+    short = [frame(40000, 53, query)[:cut] for cut in (10, 20)] + [bytes(12) + b"\x86\xdd\x60" + bytes(20)]
+    for usec, packet in [(0, frame(40000, 53, query)), (500, frame(53, 40000, reply))] + [(900, p) for p in short]:
+        f.write(struct.pack("<IIII", 1, usec, len(packet), len(packet) + 100) + packet)
+assert cache_advisor.detect_format(capture) == "pcap"
+with gzip.open(capture, "rb") as f:
+    assert cache_advisor.benchmark.load_pcap(f) == [("a.test.", "A")]
+assert [(key, ttl) for batch in cache_advisor.read_trace(capture) for _, key, ttl in batch] == [(b"a.test A", None),
+                                                                                              (b"a.test A", 30)]
+cli = subprocess.run(["./unbound-dns", "cache-advisor", log + ".missing"], capture_output=True, text=True)
+assert cli.returncode == 1 and cli.stderr.startswith("ERROR:"), cli.stderr
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Cache advisor matches an exact LRU with TTLs, stays bounded when sampling and recommends sizes"
+    else
+        fail "Cache advisor: $output"
+    fi
+}
+
+test_autotune_sweeps_resumes_and_keeps_pareto_front() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import asyncio
+import os
+import subprocess
+
+from unbound_dns import autotune, config_gen
+
+hw = config_gen.Hardware(cpus=4, memory_total=8 << 30, memory_available=4 << 30, fd_soft=1024, fd_hard=4096)
+grid = autotune.default_grid(hw)
+assert grid["num-threads"] == [1, 2, 4] and grid["slabs"] == [4, 8], grid
+assert autotune.parse_param(" slabs = 2, 3 ,") == ("slabs", ["2", "3"])
+for bad in ("slabs", "threads=2", "slabs="):
+    try:
+        autotune.parse_param(bad)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError(bad)
+points = autotune.expand({"num-threads": [1, 2], "slabs": [2, 3], "so-reuseport": ["yes", "no"],
+                          "outgoing-range": [1024], "num-queries-per-thread": [512, 2048]})
+# slabs=3 and 2048 queries over a 1024 range are dropped; one thread folds both reuseport values together.
+assert len(points) == 3, points
+assert {"num-threads": "1", "slabs": "2", "so-reuseport": "no", "outgoing-range": "1024",
+        "num-queries-per-thread": "512"} in points
+
+config = autotune.tuned_config({"num-threads": "2", "slabs": "8", "so-rcvbuf": "4m"}, hw)
+lines = [line.strip() for line in config.splitlines()]
+assert "num-threads: 2" in lines and "so-rcvbuf: 4m" in lines and lines.count("key-cache-slabs: 8") == 1
+assert all(f"{option}: 8" in lines for option in autotune.SLAB_OPTIONS)
+assert lines.index("so-rcvbuf: 4m") < lines.index("remote-control:")
+
+scores = {"1": (10000, 2.0, 20), "2": (18000, 1.5, 30), "4": (17000, 3.0, 40)}
+measured = []
+
+async def measure(point):
+    measured.append(point["num-threads"])
+    qps, p99, rss = scores[point["num-threads"]]
+    return autotune.Measurement(point, qps=qps, p99=p99, rss=rss)
+
+path = os.path.join(os.environ["TMP_DIR"], "autotune.jsonl")
+environment = {"unbound": "Version 1.19.0", "cpus": 4}
+grid_points = [{"num-threads": n} for n in ("1", "2", "4")]
+store = autotune.ResultStore(path)
+first = asyncio.run(autotune.sweep(grid_points[:2], measure, store, environment))
+assert measured == ["1", "2"]
+# A new run from the same file measures only the point it has not seen.
+second = asyncio.run(autotune.sweep(grid_points, measure, autotune.ResultStore(path), environment))
+assert measured == ["1", "2", "4"] and [m.qps for m in second] == [10000, 18000, 17000]
+asyncio.run(autotune.sweep(grid_points, measure, autotune.ResultStore(path), {"unbound": "Version 1.20.0"}))
+assert measured == ["1", "2", "4", "1", "2", "4"]
+# A failed point is stored but measured again by the next run; good ones are still reused.
+failing = {"4"}
+
+async def flaky(point):
+    if point["num-threads"] in failing:
+        failing.discard(point["num-threads"])
+        measured.append(point["num-threads"])
+        return autotune.Measurement(point, error="port in use")
+    return await measure(point)
+
+environment = {"unbound": "Version 1.21.0"}
+assert not asyncio.run(autotune.sweep(grid_points, flaky, autotune.ResultStore(path), environment))[2].ok
+del measured[:]
+resumed = asyncio.run(autotune.sweep(grid_points, flaky, autotune.ResultStore(path), environment))
+assert measured == ["4"] and all(m.ok for m in resumed), measured
+environment = {"unbound": "Version 1.19.0", "cpus": 4}
+
+front = autotune.pareto_front(second)
+assert [m.options["num-threads"] for m in front] == ["1", "2"]
+assert autotune.choose(front).options["num-threads"] == "2"
+assert autotune.choose(front, "rss").options["num-threads"] == "1"
+assert autotune.choose(front, max_rss=25).options["num-threads"] == "1"
+assert autotune.choose(front, max_p99=1.0) is None
+report = autotune.format_results(second + [autotune.Measurement({"num-threads": "8"}, error="exited")], front,
+                                 front[1])
+assert "> " in report and "failed" in report and "exited" in report, report
+
+cli = subprocess.run(["./unbound-dns", "autotune", "--dry-run", "--param", "num-threads=1,2", "--param", "slabs=2",
+                      "--param", "so-rcvbuf=0", "--param", "outgoing-range=1024",
+                      "--param", "num-queries-per-thread=512"], capture_output=True, text=True)
+assert cli.returncode == 0 and "3 points" in cli.stdout, cli.stdout + cli.stderr
+cli = subprocess.run(["./unbound-dns", "autotune", "--unbound", "/nonexistent/unbound"], capture_output=True,
+                     text=True)
+assert cli.returncode == 1 and "not found" in cli.stderr, cli.stderr
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Auto-tuner expands the grid, resumes from stored measurements and picks from the Pareto front"
+    else
+        fail "Auto-tuner: $output"
+    fi
+}
+
+test_preflight_checks_limits_and_attributes_udp_drops() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && TMP_DIR="$TMP_DIR" FIXTURES="$SCRIPT_DIR/fixtures" python3 - <<'PYEOF' 2>&1
+import os
+import shutil
+import subprocess
+
+from unbound_dns import config_gen, preflight
+
+settings = preflight.socket_settings("server:\n    num-threads: 4\n    so-rcvbuf: 4m  # burst headroom\n"
+                                     "remote-control:\n    outgoing-range: 99\n")
+assert settings["num-threads"] == "4" and settings["so-rcvbuf"] == "4m" and settings["outgoing-range"] == "4096"
+assert preflight.fds_needed(settings) == 4 * (4096 + 20) + config_gen.FD_RESERVE
+
+proc = os.path.join(os.environ["TMP_DIR"], "proc")
+shutil.copytree(os.path.join(os.environ["FIXTURES"], "proc"), proc, symlinks=True)
+checks = {c.name: c for c in preflight.preflight(settings, proc, pid=812)}
+assert not checks["so-rcvbuf"].ok and "net.core.rmem_max is 212992" in checks["so-rcvbuf"].detail
+assert "net.core.rmem_max=4194304" in checks["so-rcvbuf"].fix
+assert checks["so-sndbuf"].ok and "not set" in checks["so-sndbuf"].detail
+assert not checks["open files"].ok and "pid 812 allows 4096" in checks["open files"].detail
+assert "fs.nr_open" not in checks
+fixed = dict(settings, **{"num-threads": "1", "outgoing-range": "1024", "so-rcvbuf": "200k"})
+assert all(c.ok for c in preflight.preflight(fixed, proc, pid=812))
+
+counters = preflight.read_udp_counters(proc)
+assert counters["RcvbufErrors"] == 41 and counters["InDatagrams"] == 1520344 + 2210, counters
+sample = preflight.sample_drops(proc, timestamp=100.0)
+assert sample.pids == (812,) and [(s.port, s.drops) for s in sample.sockets] == [(53, 41)], sample
+assert "41 drops" in preflight.format_drops(sample)
+
+
+def no_access(pid, proc_root):
+    raise PermissionError(13, "Permission denied", os.path.join(proc_root, str(pid), "fd"))
+
+
+# Without access to Unbound's fds, its sockets are matched by its uid and the DNS port instead.
+socket_inodes, preflight.status_probe.socket_inodes = preflight.status_probe.socket_inodes, no_access
+guessed = preflight.sample_drops(proc, timestamp=100.0)
+assert guessed.unreadable == (812,)
+assert [(s.port, s.drops) for s in guessed.sockets] == [(53, 41), (50000, 3), (53, 0)], guessed.sockets
+assert "matched by owner and port" in preflight.format_drops(guessed)
+os.remove(os.path.join(proc, "812", "status"))
+hidden = preflight.sample_drops(proc, timestamp=100.0, port=5353)
+assert not hidden.sockets and "drops unknown" in preflight.format_drops(hidden), hidden
+assert preflight.drop_rate(hidden, hidden).watched == 0
+preflight.status_probe.socket_inodes = socket_inodes
+
+monitor = preflight.DropMonitor(proc)
+assert monitor.poll(timestamp=100.0) is None
+path = os.path.join(proc, "net", "udp")
+with open(path) as f:
+    text = f.read()
+with open(path, "w") as f:
+    # Unbound's listener loses 50 more; the dhcp socket's drops are not Unbound's.
+    f.write(text.replace(" 20001 2 0000000000000000 41", " 20001 2 0000000000000000 91")
+                .replace(" 15001 2 0000000000000000 0", " 15001 2 0000000000000000 7"))
+with open(os.path.join(proc, "net", "snmp"), "w") as f:
+    f.write("Udp: InDatagrams NoPorts InErrors OutDatagrams RcvbufErrors\nUdp: 1530294 112 98 1519872 98\n")
+rate = monitor.poll(timestamp=110.0)
+assert rate.socket_drops == 50 and rate.drop_rate == 5.0 and rate.rcvbuf_errors == 57, rate
+assert abs(rate.drop_ratio - 50 / (1530294 + 2210 - 1522554 + 50)) < 1e-9, rate.drop_ratio
+assert rate.sockets == {("udp", "127.0.0.1", 53, 20001): 50}
+assert "5.0/s" in preflight.format_rate(rate)
+assert any("so-rcvbuf" in advice for advice in preflight.drop_advice(rate, settings))
+assert preflight.drop_advice(preflight.drop_rate(sample, sample), settings) == []
+os.remove(os.path.join(proc, "812", "comm"))
+assert monitor.poll(timestamp=120.0) is None
+
+config = os.path.join(os.environ["TMP_DIR"], "preflight.conf")
+with open(config, "w") as f:
+    f.write("server:\n    so-rcvbuf: 8m\n    outgoing-range: 512\n")
+cli = subprocess.run(["./unbound-dns", "preflight", "--config", config, "--proc-root",
+                      os.path.join(os.environ["FIXTURES"], "proc")], capture_output=True, text=True)
+assert cli.returncode == 1 and "FAIL  so-rcvbuf    8m requested" in cli.stdout, cli.stdout + cli.stderr
+assert "OK    open files" in cli.stdout and "41 drops" in cli.stdout, cli.stdout
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Preflight flags clamped socket buffers and fd limits and attributes UDP drops to Unbound"
+    else
+        fail "Preflight: $output"
+    fi
+}
+
+test_blocklist_compiles_collapses_and_diffs() {
+    local output
+    output=$(cd "$PROJECT_ROOT" && TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+
+from unbound_dns import blocklist, fake_control
+
+tmp = os.path.join(os.environ["TMP_DIR"], "blocklist")
+os.makedirs(tmp)
+
+
+def write(name, text):
+    path = os.path.join(tmp, name)
+    with (gzip.open(path, "wt") if name.endswith(".gz") else open(path, "w")) as f:
+        f.write(text)
+    return path
+
+
+def zones(path):
+    with open(path) as f:
+        return [line.split('"')[1] + " " + line.split()[-1] for line in f if "local-zone" in line]
+
+
+hosts = write("hosts.txt", "# hosts\n127.0.0.1 localhost\n0.0.0.0 0.0.0.0\n0.0.0.0 Ads.Example.COM tracker.example.com\n"
+                           "0.0.0.0\tx.y.doubleclick.net # inline\r\n0.0.0.0 bad..name\n0.0.0.0 ads.example.com.\n")
+adblock = write("adblock.txt.gz", "[Adblock Plus 2.0]\n! comment\n||doubleclick.net^\n||ok.doubleclick.net^$third-party\n"
+                                  "@@||good.doubleclick.net^\n||example.org/path\n||münchen-ads.de^\n")
+domains = write("domains.txt", "# list\nfoo.test\n*.bar.test\nbar.test\nsub.good.doubleclick.net\n")
+allow = write("allow.txt", "foo.test\n")
+assert blocklist.detect_format(open(hosts).read()) == "hosts"
+assert blocklist.detect_format(open(domains).read()) == "domains"
+assert blocklist.to_keys(["a.com", "a.com.", "1.2.3.4", "-x.com", "x" * 64 + ".com", "localhost"]) == ["moc.a."] * 2
+
+out = os.path.join(tmp, "blocklist.conf")
+stats = blocklist.compile_lists([hosts, adblock, domains], out, allow=[allow])
+assert stats.sources[adblock]["format"] == "adblock" and stats.sources[hosts]["invalid"] == 3, stats.sources
+assert (stats.read, stats.invalid, stats.duplicates, stats.covered) == (15, 3, 2, 3), stats
+assert (stats.zones, stats.transparent, stats.unblocked, stats.added) == (5, 1, 1, 6), stats
+assert zones(out) == ["xn--mnchen-ads-9db.de. always_nxdomain", "tracker.example.com. always_nxdomain",
+                      "ads.example.com. always_nxdomain", "doubleclick.net. always_nxdomain",
+                      "good.doubleclick.net. transparent", "bar.test. always_nxdomain"], zones(out)
+
+# Spilled runs and small chunks give the same file as one sort in memory.
+names = [f"h{i % 997}.d{i % 31}.example{i % 3}.net" for i in range(5000)] + [f"d{i}.example1.net" for i in range(0, 31, 3)]
+big = write("big.txt", "".join(f"0.0.0.0 {name}\n" for name in names))
+whole = blocklist.compile_lists([big], os.path.join(tmp, "whole.conf"), allow=[allow])
+blocklist.CHUNK_ZONES, blocklist.BLOCK_SIZE = 64, 4096
+runs = blocklist.compile_lists([big], os.path.join(tmp, "runs.conf"), allow=[allow], run_size=700)
+assert runs.runs == 7 and open(os.path.join(tmp, "whole.conf")).read() == open(os.path.join(tmp, "runs.conf")).read()
+assert (whole.zones, whole.duplicates, whole.covered) == (runs.zones, runs.duplicates, runs.covered), (whole, runs)
+assert whole.zones + whole.duplicates + whole.covered == len(names) and whole.covered == 594, whole
+
+# Only the difference from the previous compile is reported, and an unchanged compile leaves the file alone.
+changes = os.path.join(tmp, "changes")
+os.makedirs(changes)
+with open(hosts, "a") as f:
+    f.write("0.0.0.0 new.example.net\n")
+write("domains.txt", "foo.test\n")
+stats = blocklist.compile_lists([hosts, adblock, domains], out, "always_null", allow=[allow], changes=changes)
+assert (stats.added, stats.removed, stats.zones) == (5, 5, 5), stats
+added, removed = (open(os.path.join(changes, name)).read() for name in ("added.txt", "removed.txt"))
+assert sorted(added.splitlines())[-1] == "xn--mnchen-ads-9db.de. always_null" and "new.example.net. always_null" in added
+assert sorted(removed.splitlines()) == ["ads.example.com.", "bar.test.", "doubleclick.net.", "tracker.example.com.",
+                                        "xn--mnchen-ads-9db.de."], removed
+modified = os.stat(out).st_mtime_ns
+again = blocklist.compile_lists([hosts, adblock, domains], out, "always_null", allow=[allow])
+assert not again.changed and (again.added, again.removed) == (0, 0) and os.stat(out).st_mtime_ns == modified
+
+
+async def main():
+    fake = await fake_control.FakeControlServer(path=os.path.join(tmp, "control.sock")).start()
+    conf = write("unbound.conf", f'server:\n\nremote-control:\n    control-enable: yes\n'
+                                 f'    control-interface: "{fake.path}"\n')
+    replies = await asyncio.get_running_loop().run_in_executor(None, blocklist.apply_changes, changes, conf)
+    await fake.stop()
+    assert replies == {"local_zones_remove": "ok", "local_zones": "ok"}, replies
+    assert fake.commands == ["local_zones_remove", "local_zones"], fake.commands
+    assert b"".join(fake.loaded[:-1]).decode() == added and fake.loaded[-1] == b"\x04\n", fake.loaded
+
+
+asyncio.run(main())
+
+cli = subprocess.run(["./unbound-dns", "blocklist", domains, "-o", os.path.join(tmp, "cli.conf"), "--json"],
+                     capture_output=True, text=True)
+assert cli.returncode == 0 and json.loads(cli.stdout)["compile"]["zones"] == 1, cli.stdout + cli.stderr
+cli = subprocess.run(["./unbound-dns", "blocklist", os.path.join(tmp, "missing.txt")], capture_output=True, text=True)
+assert cli.returncode == 1 and cli.stderr.startswith("ERROR:"), cli.stderr
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Blocklist compiler collapses covered names, merges spilled runs and applies only the changes"
+    else
+        fail "Blocklist: $output"
+    fi
+}
+
+test_config_model_follows_includes_and_patches_in_place() {
+    install_fake_control
+    start_fake_dns 25360 || { fail "Config model: fake DNS server did not start"; return; }
+    : > "$TMP_DIR/control.log"
+
+    local output
+    output=$(cd "$PROJECT_ROOT" && PATH="$TMP_DIR/bin:$PATH" TMP_DIR="$TMP_DIR" python3 - <<'PYEOF' 2>&1
+import os
+import subprocess
+
+from unbound_dns import config_gen, config_model
+
+tmp = os.path.join(os.environ["TMP_DIR"], "config_model")
+os.makedirs(os.path.join(tmp, "zones.d"))
+
+
+def write(name, text):
+    path = os.path.join(tmp, name)
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+
+main = write("unbound.conf", "server:\n    verbosity: 1  # quiet\n    port: 25360\n    include: blocks.conf\n"
+                             "    verbosity: 2\n    access-control: 127.0.0.0/8 allow\n"
+                             "include-toplevel: zones.d/*.conf\ninclude: missing.conf\n")
+blocks = write("blocks.conf", "".join(f'local-zone: "ads{i}.example." always_nxdomain\n' for i in range(3000)))
+write("zones.d/a.conf", 'forward-zone:\n    name: "corp.example."\n    forward-addr: 10.0.0.53\n')
+write("zones.d/b.conf", 'stub-zone:\n    name: "lab.example"\n    stub-addr: 10.0.1.53\n')
+
+# Small blocks so the blocklist spans many of them; it is still indexed as one span, not 3000 options.
+config_model.BLOCK_SIZE = 4096
+model = config_model.ConfigModel(main)
+assert [os.path.relpath(path, tmp) for path in model.files] == ["unbound.conf", "blocks.conf", "zones.d/a.conf",
+                                                                 "zones.d/b.conf"], model.files
+assert [(c.name, c.label) for c in model.clauses] == [("server", None), ("forward-zone", "corp.example."),
+                                                       ("stub-zone", "lab.example")], model.clauses
+assert len(model.errors) == 1 and "missing.conf" in model.errors[0], model.errors
+spans = model.spans("local-zone")
+assert model.count("local-zone") == 3000 and len(spans) == 1 and len(model._parsed[blocks].blocks) > 10, spans
+assert model.get("verbosity") == "2" and model.get("forward-addr", "forward-zone", "corp.example") == "10.0.0.53"
+assert [option.line for option in model.options("verbosity")] == [2, 5]
+assert model.line(blocks, 2500) == 'local-zone: "ads2499.example." always_nxdomain'
+assert model.lines(blocks, 2999, 5) == ['local-zone: "ads2998.example." always_nxdomain',
+                                        'local-zone: "ads2999.example." always_nxdomain']
+assert model.search("ADS2999.") == ([(blocks, 3000)], 1)
+assert model.search("example.", limit=2) == ([(blocks, 1), (blocks, 2)], 3001)
+
+# Edits rewrite the line Unbound reads last, keeping its indent and comment; the rest of the file is untouched.
+patches = model.set("verbosity", "3") + model.set("port", "25360") + model.unset("access-control")
+patches += model.add("forward-addr", "10.0.0.54", "forward-zone", "corp.example.")
+text = model.patched(patches)
+assert text[main].splitlines()[4:6] == ["    verbosity: 3", "include-toplevel: zones.d/*.conf"], text[main]
+assert "forward-addr: 10.0.0.54" in text[os.path.join(tmp, "zones.d", "a.conf")]
+assert config_model.patch_keys(patches) == ["access-control", "forward-addr", "verbosity"]
+stale = config_model.Patch(main, 2, "    verbosity: 0", None)
+try:
+    model.patched([stale])
+    raise AssertionError("stale patch was applied")
+except ValueError:
+    pass
+
+# A clause header may share its line with the first option; edits keep the header.
+oneline = write("oneline.conf", 'server: verbosity: 1  # quiet\n    port: 53\nforward-zone: name: "."\n'
+                                '    forward-addr: 9.9.9.9\n')
+short = config_model.ConfigModel(oneline)
+assert short.get("verbosity") == "1" and short.clause("forward-zone", ".").line == 3, short.clauses
+assert short.patched(short.set("verbosity", "3"))[oneline].startswith("server: verbosity: 3 # quiet\n")
+assert short.patched(short.unset("verbosity"))[oneline].startswith("server:\n    port: 53\n")
+assert short.patched(short.set("name", '"example."', "forward-zone", "."))[oneline].split("\n")[2] == \
+    'forward-zone: name: "example."'
+
+# The generated config only changes what differs: includes, the blocklist and extra zones stay.
+generated = config_gen.generate("default", config_gen.Hardware(4, 8 << 30, 4 << 30, 1024, 65536))
+planned = config_model.plan_generated(model, generated)
+assert planned and all(patch.new is not None for patch in planned), config_model.format_patches(planned)
+texts = model.patched(planned)
+assert list(texts) == [main] and "include: blocks.conf" in texts[main] and "port: 25360" not in texts[main]
+
+os.remove(os.path.join(tmp, "zones.d", "b.conf"))
+write("missing.conf", "server:\n    cache-min-ttl: 30\n")
+assert model.refresh() == [os.path.join(tmp, "missing.conf")] and not model.errors
+assert model.get("cache-min-ttl") == "30" and model.clause("stub-zone") is None
+
+result = config_model.apply_patches(model, model.set("verbosity", "4") + model.unset("local-zone"),
+                                    use_sudo=False, port=25360)
+assert result.method == "reload_keep_cache" and result.changed == ["local-zone", "verbosity"], result
+assert model.get("verbosity") == "4" and not model.count("local-zone") and os.path.getsize(blocks) == 0
+assert [path for path in result.backup.split(", ") if path.startswith(blocks + ".backup.")], result.backup
+with open(os.path.join(os.environ["TMP_DIR"], "control.log")) as f:
+    assert "reload_keep_cache" in f.read()
+
+# A config unbound-checkconf rejects leaves every file as it was.
+included = os.path.join(tmp, "missing.conf")
+before = open(included).read()
+try:
+    config_model.apply_patches(model, model.add("bogus-option", "yes", "remote-control") + model.add("local-zone", '"x." static'),
+                               use_sudo=False, port=25360)
+    raise AssertionError("invalid config was accepted")
+except config_model.config_apply.ConfigError as e:
+    assert "bogus-option" in str(e)
+assert open(included).read() == before and "bogus" not in open(main).read()
+
+cli = subprocess.run(["./unbound-dns", "config-edit", "--config", main, "--get", "verbosity",
+                      "--set", "cache-min-ttl=60"], capture_output=True, text=True)
+assert cli.returncode == 0 and "unbound.conf:5: verbosity: 4" in cli.stdout, cli.stdout + cli.stderr
+assert "-    cache-min-ttl: 30" in cli.stdout and "+    cache-min-ttl: 60" in cli.stdout, cli.stdout
+cli = subprocess.run(["./unbound-dns", "config-edit", "--config", os.path.join(tmp, "nope.conf")],
+                     capture_output=True, text=True)
+assert cli.returncode == 1 and cli.stderr.startswith("ERROR:"), cli.stderr
+print("ok")
+PYEOF
+) || true
+    if [ "$output" = "ok" ]; then
+        pass "Config model follows includes, reparses only changed files and applies minimal patches"
+    else
+        fail "Config model: $output"
     fi
 }
 
@@ -72,6 +1756,35 @@ test_installation_script_exists
 test_script_is_executable
 test_script_has_shebang
 test_readme_has_content
+test_dns_probe_udp
+test_dns_probe_tcp_fallback
+test_dns_probe_reports_failures
+test_dns_probe_rejects_truncated_messages
+test_benchmark_closed_loop
+test_benchmark_counts_timeouts
+test_benchmark_stops_when_query_ids_run_out
+test_cache_profile_cold_vs_warm
+test_stats_interval_from_fixtures
+test_status_probe_from_proc_fixture
+test_command_runner_streams_phases
+test_config_gen_sizes_for_hardware
+test_upstreams_rank_and_prune_tls
+test_cache_dump_and_warm_up
+test_cache_flush_commands_and_impact
+test_apply_config_reloads_and_measures_gap
+test_log_analyzer_summarises_generated_logs
+test_cli_starts_without_gui_or_asyncio
+test_exporter_serves_cached_metrics
+test_control_socket_against_fake_server
+test_histogram_records_and_flags_tail_regression
+test_metrics_store_rollups_retention_and_range_queries
+test_chaos_harness_injects_faults_and_rewrites_config
+test_fleet_runs_bounded_and_aggregates
+test_cache_advisor_curve_matches_lru_and_stays_bounded
+test_autotune_sweeps_resumes_and_keeps_pareto_front
+test_preflight_checks_limits_and_attributes_udp_drops
+test_blocklist_compiles_collapses_and_diffs
+test_config_model_follows_includes_and_patches_in_place
 
 echo ""
 echo "===================="
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+"""Kept for existing scripts; use ./unbound-dns."""
+
+import sys
+
+from unbound_dns.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,10 @@ YELLOW='\033[1;33m'
 BLUE='\033[0;34m'
 NC='\033[0m'
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+UNBOUND_PROFILE="${UNBOUND_PROFILE:-default}"
+UNBOUND_EXTENDED_STATISTICS="${UNBOUND_EXTENDED_STATISTICS:-no}"
+
 if [[ "$OSTYPE" == "darwin"* ]]; then
     LOG_FILE="$HOME/.unbound_install.log"
 else
@@ -120,6 +124,7 @@ install_unbound_macos() {
     UNBOUND_DIR="$(brew --prefix)/etc/unbound"
     UNBOUND_LOG="$(brew --prefix)/var/log/unbound.log"
     UNBOUND_PID="$(brew --prefix)/var/run/unbound.pid"
+    UNBOUND_CTL="/var/run/unbound.ctl"
     UNBOUND_CONF="$UNBOUND_DIR/unbound.conf"
 
     mkdir -p "$UNBOUND_DIR"
@@ -139,6 +144,7 @@ install_unbound_debian() {
     UNBOUND_DIR="/etc/unbound"
     UNBOUND_LOG="/var/log/unbound/unbound.log"
     UNBOUND_PID="/run/unbound.pid"
+    UNBOUND_CTL="/run/unbound.ctl"
     UNBOUND_CONF="$UNBOUND_DIR/unbound.conf"
 
     mkdir -p /var/log/unbound
@@ -166,6 +172,7 @@ install_unbound_redhat() {
     UNBOUND_DIR="/etc/unbound"
     UNBOUND_LOG="/var/log/unbound.log"
     UNBOUND_PID="/run/unbound.pid"
+    UNBOUND_CTL="/run/unbound.ctl"
     UNBOUND_CONF="$UNBOUND_DIR/unbound.conf"
 
     mkdir -p /var/log
@@ -181,6 +188,7 @@ install_unbound_arch() {
     UNBOUND_DIR="/etc/unbound"
     UNBOUND_LOG="/var/log/unbound.log"
     UNBOUND_PID="/run/unbound.pid"
+    UNBOUND_CTL="/run/unbound.ctl"
     UNBOUND_CONF="$UNBOUND_DIR/unbound.conf"
 
     mkdir -p /var/log
@@ -197,7 +205,19 @@ create_unbound_config() {
         cp "$UNBOUND_CONF" "$BACKUP"
     fi
 
-    cat > "$UNBOUND_CONF" << 'EOF'
+    if command -v python3 &> /dev/null && [[ -f "$SCRIPT_DIR/unbound_dns/config_gen.py" ]]; then
+        log "Sizing configuration for this host ($UNBOUND_PROFILE profile)..."
+        local extra=()
+        [[ "$UNBOUND_EXTENDED_STATISTICS" == "yes" ]] && extra+=(--extended-statistics)
+        if PYTHONPATH="$SCRIPT_DIR" python3 -m unbound_dns.config_gen --profile "$UNBOUND_PROFILE" \
+                "${extra[@]}" --output "$UNBOUND_CONF" 2>> "$LOG_FILE"; then
+            success "Configuration created at $UNBOUND_CONF"
+            return
+        fi
+        warn "Config generator failed, falling back to the built-in configuration"
+    fi
+
+    cat > "$UNBOUND_CONF" << EOF
 server:
     verbosity: 1
     interface: 127.0.0.1
@@ -261,6 +281,10 @@ server:
     log-queries: no
     log-replies: no
 
+remote-control:
+    control-enable: yes
+    control-interface: $UNBOUND_CTL
+
 forward-zone:
     name: "."
 
@@ -0,0 +1 @@
+"""Unbound DNS management: resolver probes, cache tools, config generation and the GUI."""
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""Benchmark a scratch Unbound over a grid of thread, slab and buffer settings and keep the Pareto front."""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from . import benchmark, chaos, config_gen, dns_probe, fake_dns
+
+DEFAULT_STORE = Path.home() / ".unbound_autotune" / "results.jsonl"
+DEFAULT_DURATION = 10.0
+DEFAULT_CONCURRENCY = 64
+DEFAULT_NAMES = 2000
+READY_TIMEOUT = 15.0
+PARAMETERS = ("num-threads", "slabs", "so-reuseport", "so-rcvbuf", "outgoing-range", "num-queries-per-thread")
+# "slabs" stands for all four cache slab counts, which Unbound wants equal and a power of two.
+SLAB_OPTIONS = ("msg-cache-slabs", "rrset-cache-slabs", "infra-cache-slabs", "key-cache-slabs")
+PREFERENCES = ("qps", "p99", "rss")
+
+
+@dataclass
+class Measurement:
+    options: dict
+    key: str = ""
+    qps: float = 0.0
+    p50: float = 0.0
+    p99: float = 0.0
+    rss: float = 0.0
+    timeouts: float = 0.0
+    error: str = ""
+    at: float = 0.0
+    environment: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.error and self.qps > 0
+
+    def dominates(self, other):
+        """At least as good on throughput, p99 and memory, and better on one of them."""
+        mine, theirs = (self.qps, -self.p99, -self.rss), (other.qps, -other.p99, -other.rss)
+        return all(a >= b for a, b in zip(mine, theirs)) and mine != theirs
+
+
+def default_grid(hw=None):
+    """Thread counts up to the CPU count, slabs at and above the largest of them, and two buffer sizes."""
+    hw = hw or config_gen.detect_hardware()
+    threads = sorted({1, hw.cpus, *(2 ** i for i in range(1, 8) if 2 ** i < hw.cpus)})
+    slabs = config_gen.power_of_two_at_least(hw.cpus)
+    fd_budget = max(hw.fd_hard, hw.fd_soft) - config_gen.FD_RESERVE
+    return {
+        "num-threads": threads,
+        "slabs": [slabs, 2 * slabs],
+        "so-reuseport": ["yes", "no"],
+        "so-rcvbuf": ["0", "4m"],
+        "outgoing-range": sorted({min(1024, fd_budget), min(4096, fd_budget)}),
+        "num-queries-per-thread": [512, 2048],
+    }
+
+
+def parse_param(spec):
+    """"name=v1,v2,..." for one grid dimension."""
+    name, sep, values = spec.partition("=")
+    name = name.strip()
+    if not sep or not values.strip():
+        raise ValueError(f"Expected NAME=VALUE[,VALUE...], got {spec!r}")
+    if name not in PARAMETERS:
+        raise ValueError(f"Unknown parameter {name!r}; choose from {', '.join(PARAMETERS)}")
+    return name, [value.strip() for value in values.split(",") if value.strip()]
+
+
+def normalize(point):
+    """The point as Unbound would run it, or None if Unbound would refuse or ignore part of it."""
+    point = {name: str(value) for name, value in point.items()}
+    slabs = point.get("slabs")
+    if slabs and (not slabs.isdigit() or int(slabs) < 1 or int(slabs) & (int(slabs) - 1)):
+        return None
+    outgoing, per_thread = point.get("outgoing-range"), point.get("num-queries-per-thread")
+    if outgoing and per_thread and int(per_thread) > int(outgoing):
+        return None
+    # With one thread there is nothing to share a port with, so both settings measure the same thing.
+    if point.get("num-threads") == "1" and "so-reuseport" in point:
+        point["so-reuseport"] = "no"
+    return point
+
+
+def expand(grid):
+    """Every valid, distinct combination of the grid's values, in grid order."""
+    names = list(grid)
+    points, seen = [], set()
+    for values in itertools.product(*(grid[name] for name in names)):
+        point = normalize(dict(zip(names, values)))
+        identity = point and json.dumps(point, sort_keys=True)
+        if point and identity not in seen:
+            seen.add(identity)
+            points.append(point)
+    return points
+
+
+def unbound_options(point):
+    options = {name: value for name, value in point.items() if name != "slabs"}
+    if "slabs" in point:
+        options.update(dict.fromkeys(SLAB_OPTIONS, point["slabs"]))
+    return options
+
+
+def tuned_config(point, hw=None):
+    """The config this host would be given (config_gen), with the point's settings in place."""
+    return chaos.set_options(config_gen.generate(hw=hw), "server", unbound_options(point))
+
+
+def point_key(point, environment):
+    text = json.dumps({"options": point, "environment": environment}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def unbound_version(unbound="unbound"):
+    try:
+        output = subprocess.run([unbound, "-V"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.splitlines()[0].strip() if output else None
+
+
+class ResultStore:
+    """Measurements appended one JSON line at a time, so an interrupted sweep keeps what it measured."""
+
+    def __init__(self, path=DEFAULT_STORE):
+        self.path = Path(path)
+        self.results = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        measurement = Measurement(**json.loads(line))
+                    except (ValueError, TypeError):
+                        continue
+                    self.results[measurement.key] = measurement
+
+    def get(self, key):
+        return self.results.get(key)
+
+    def add(self, measurement):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(asdict(measurement)) + "\n")
+        self.results[measurement.key] = measurement
+
+
+def peak_rss_mib(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # macOS has no /proc; ps reports the current rather than the peak resident size.
+    try:
+        output = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout
+        return int(output.strip()) / 1024
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _merge(reports):
+    merged = reports[0]
+    for report in reports[1:]:
+        merged.sent += report.sent
+        merged.answered += report.answered
+        merged.timeouts += report.timeouts
+        merged.rcodes.update(report.rcodes)
+        merged.latencies_ns += report.latencies_ns
+        merged.duration = max(merged.duration, report.duration)
+    return merged
+
+
+def _load(queries, port, concurrency, duration):
+    return benchmark.benchmark(queries, server="127.0.0.1", port=port, concurrency=concurrency,
+                               duration=duration)
+
+
+class ScratchTuner:
+    """Runs each point as a throwaway Unbound on a free port, forwarding to an in-process upstream.
+
+    The cache is warmed with every query first, so the timed load measures how fast Unbound
+    answers, not how fast the stand-in upstream does. Load comes from `clients` processes, since
+    one Python client saturates long before a multi-threaded Unbound does.
+    """
+
+    def __init__(self, queries, unbound="unbound", duration=DEFAULT_DURATION, concurrency=DEFAULT_CONCURRENCY,
+                 clients=1, hw=None, workdir=None):
+        self.queries = queries
+        self.unbound = unbound
+        self.duration = duration
+        self.concurrency = concurrency
+        self.clients = max(1, clients)
+        self.hw = hw or config_gen.detect_hardware()
+        self.workdir = workdir or tempfile.mkdtemp(prefix="unbound-autotune-")
+        self.upstream = fake_dns.FakeDNSServer(ttl=86400)
+        self.pool = None
+
+    def environment(self):
+        """What a stored measurement depends on besides its options; a change re-measures everything."""
+        workload = hashlib.sha256(repr(self.queries).encode()).hexdigest()[:12]
+        return {"unbound": unbound_version(self.unbound), "cpus": self.hw.cpus,
+                "memory": self.hw.memory_total, "queries": workload, "duration": self.duration,
+                "concurrency": self.concurrency, "clients": self.clients}
+
+    async def __aenter__(self):
+        await self.upstream.start()
+        if self.clients > 1:
+            self.pool = ProcessPoolExecutor(self.clients)
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.pool:
+            self.pool.shutdown()
+        await self.upstream.stop()
+
+    async def wait_ready(self, process, port):
+        started = time.monotonic()
+        while time.monotonic() - started < READY_TIMEOUT and process.poll() is None:
+            name, qtype = self.queries[0]
+            if (await dns_probe.query("127.0.0.1", name, qtype, port, 0.5)).ok:
+                return True
+            await asyncio.sleep(0.1)
+        return False
+
+    async def measure(self, point):
+        measurement = Measurement(dict(point), at=time.time())
+        workdir = tempfile.mkdtemp(prefix="point-", dir=self.workdir)
+        port = chaos.free_port()
+        path = os.path.join(workdir, "unbound.conf")
+        with open(path, "w") as f:
+            f.write(chaos.scratch_config(tuned_config(point, self.hw), workdir, port, [self.upstream.port]))
+        with open(os.path.join(workdir, "stderr.log"), "wb") as log:
+            process = subprocess.Popen([self.unbound, "-d", "-c", path], stdout=log, stderr=subprocess.STDOUT)
+        try:
+            if not await self.wait_ready(process, port):
+                measurement.error = f"Unbound did not answer on port {port}; see {workdir}"
+                return measurement
+            await benchmark.run_benchmark(self.queries, port=port, count=len(self.queries),
+                                          concurrency=self.concurrency, duration=READY_TIMEOUT * 4)
+            if self.pool:
+                loop = asyncio.get_running_loop()
+                share = max(1, self.concurrency // self.clients)
+                report = _merge(await asyncio.gather(*(
+                    loop.run_in_executor(self.pool, _load, self.queries, port, share, self.duration)
+                    for _ in range(self.clients))))
+            else:
+                report = await benchmark.run_benchmark(self.queries, port=port, concurrency=self.concurrency,
+                                                       duration=self.duration)
+            measurement.rss = peak_rss_mib(process.pid)
+            percentiles = report.percentiles((50, 99))
+            measurement.qps = report.achieved_qps
+            measurement.p50, measurement.p99 = percentiles[50], percentiles[99]
+            measurement.timeouts = report.timeout_rate
+            return measurement
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def sweep(points, measure, store, environment, fresh=False, progress=None):
+    """Measure every point `store` has no good result for in this environment; returns all of their results.
+
+    measure(point) is a coroutine returning a Measurement. Each result is stored as soon as it
+    exists, so an interrupted sweep resumes where it stopped; points that failed are measured again.
+    progress(index, point, measurement, stored) is called after each point.
+    """
+    results = []
+    for index, point in enumerate(points):
+        key = point_key(point, environment)
+        measurement = None if fresh else store.get(key)
+        stored = measurement is not None and measurement.ok
+        if not stored:
+            measurement = await measure(point)
+            measurement.key, measurement.environment = key, environment
+            store.add(measurement)
+        results.append(measurement)
+        if progress:
+            progress(index, point, measurement, stored)
+    return results
+
+
+def pareto_front(measurements):
+    """The measurements no other one beats on throughput, p99 and memory at once."""
+    ok = [m for m in measurements if m.ok]
+    return [m for m in ok if not any(other.dominates(m) for other in ok)]
+
+
+def choose(front, prefer="qps", max_p99=None, max_rss=None):
+    """The front's best point on `prefer` among those within the limits (ms, MiB); None if none are."""
+    allowed = [m for m in front if (max_p99 is None or m.p99 <= max_p99) and (max_rss is None or m.rss <= max_rss)]
+    if not allowed:
+        return None
+    order = {"qps": lambda m: (-m.qps, m.p99, m.rss), "p99": lambda m: (m.p99, -m.qps, m.rss),
+             "rss": lambda m: (m.rss, -m.qps, m.p99)}[prefer]
+    return min(allowed, key=order)
+
+
+def describe(point):
+    return " ".join(f"{name}={value}" for name, value in point.items())
+
+
+def format_results(measurements, front, chosen=None):
+    lines = [f"   {'qps':>9} {'p50':>8} {'p99':>8} {'RSS':>8} {'timeouts':>8}  settings"]
+    on_front = {id(m) for m in front}
+    for m in sorted(measurements, key=lambda m: (not m.ok, -m.qps)):
+        mark = ">" if m is chosen else "*" if id(m) in on_front else " "
+        if not m.ok:
+            lines.append(f"{mark}  {'failed':>9} {'':>8} {'':>8} {'':>8} {'':>8}  {describe(m.options)}: {m.error}")
+            continue
+        lines.append(f"{mark}  {m.qps:9,.0f} {m.p50:6.2f}ms {m.p99:6.2f}ms {m.rss:5.0f}MiB {m.timeouts * 100:7.2f}%  "
+                     f"{describe(m.options)}")
+    lines.append("* Pareto front (no other point is faster, lower p99 and smaller at once); > chosen")
+    return "\n".join(lines)
+
+
+async def run_sweep(args, points, store):
+    queries = benchmark.load_queries(args.queries) if args.queries else [
+        (f"host{i}.autotune.test", "A") for i in range(args.names)]
+    async with ScratchTuner(queries, args.unbound, args.duration, args.concurrency, args.clients) as tuner:
+        environment = tuner.environment()
+
+        def progress(index, point, measurement, stored):
+            state = "stored" if stored else "failed" if not measurement.ok else f"{measurement.qps:,.0f} qps"
+            print(f"[{index + 1}/{len(points)}] {describe(point)}: {state}", file=sys.stderr, flush=True)
+
+        return await sweep(points, tuner.measure, store, environment, args.fresh, progress)
+
+
+def add_arguments(parser):
+    parser.add_argument("--unbound", default="unbound", help="Unbound binary to run")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help=f"Replace one grid dimension ({', '.join(PARAMETERS)}); a single value fixes it")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="Seconds of load per point")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Queries in flight, split across --clients")
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help="Load-generating processes")
+    parser.add_argument("--names", type=int, default=DEFAULT_NAMES, help="Distinct synthetic names to query")
+    parser.add_argument("--queries", help="Replay this query file or pcap instead of synthetic names")
+    parser.add_argument("--store", default=str(DEFAULT_STORE), help="Where measurements are kept between runs")
+    parser.add_argument("--fresh", action="store_true", help="Measure every point again")
+    parser.add_argument("--dry-run", action="store_true", help="List the grid and stop")
+    parser.add_argument("--prefer", choices=PREFERENCES, default="qps",
+                        help="Which objective picks the config from the Pareto front")
+    parser.add_argument("--max-p99", type=float, metavar="MS", help="Only choose points with a lower p99")
+    parser.add_argument("--max-rss", type=float, metavar="MIB", help="Only choose points using less memory")
+    parser.add_argument("-o", "--output", help="Write the chosen config here")
+    parser.add_argument("--json", metavar="FILE", help="Also write every measurement and the front as JSON")
+    return parser
+
+
+def run(args):
+    try:
+        grid = default_grid()
+        grid.update(parse_param(spec) for spec in args.param)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    points = expand(grid)
+    if args.dry_run:
+        for point in points:
+            print(describe(point))
+        print(f"{len(points)} points, about {len(points) * (args.duration + 3) / 60:.0f} minutes unmeasured")
+        return 0
+    if not shutil.which(args.unbound):
+        print(f"ERROR: {args.unbound} not found; install Unbound to run the auto-tuner", file=sys.stderr)
+        return 1
+
+    store = ResultStore(args.store)
+    try:
+        measurements = asyncio.run(run_sweep(args, points, store))
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; measured points are kept in {args.store} and skipped next time", file=sys.stderr)
+        return 130
+
+    front = pareto_front(measurements)
+    chosen = choose(front, args.prefer, args.max_p99, args.max_rss)
+    print(format_results(measurements, front, chosen))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"measurements": [asdict(m) for m in measurements],
+                       "front": [m.key for m in front], "chosen": chosen and chosen.key}, f, indent=2)
+    if not chosen:
+        print("ERROR: no measured point meets the limits", file=sys.stderr)
+        return 1
+    print(f"\nChosen: {describe(chosen.options)}")
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(tuned_config(chosen.options))
+        print(f"Wrote {args.output}; install it with ./unbound-dns apply-config {args.output} --target PATH")
+    return 0
+
+
+def main(argv=None):
+    parser = add_arguments(argparse.ArgumentParser(description=__doc__))
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
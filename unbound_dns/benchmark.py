@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""Query replay load generator for measuring resolver throughput and latency."""
+
+import asyncio
+import itertools
+import math
+import os
+import socket
+import struct
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from . import dns_probe
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+DEFAULT_DOMAINS = [
+    "google.com", "youtube.com", "facebook.com", "wikipedia.org", "amazon.com",
+    "github.com", "cloudflare.com", "apple.com", "microsoft.com", "netflix.com",
+]
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": "<", b"\xa1\xb2\xc3\xd4": ">",
+    b"\x4d\x3c\xb2\xa1": "<", b"\xa1\xb2\x3c\x4d": ">",
+}
+LINK_HEADER = {0: 4, 1: 14, 101: 0, 113: 16, 276: 20}
+
+
+@dataclass
+class BenchmarkReport:
+    server: str
+    port: int
+    mode: str
+    target: float
+    duration: float = 0.0
+    sent: int = 0
+    answered: int = 0
+    timeouts: int = 0
+    rcodes: Counter = field(default_factory=Counter)
+    latencies_ns: list = field(default_factory=list)
+
+    @property
+    def achieved_qps(self):
+        return self.answered / self.duration if self.duration else 0.0
+
+    @property
+    def timeout_rate(self):
+        return self.timeouts / self.sent if self.sent else 0.0
+
+    @property
+    def servfail_rate(self):
+        return self.rcodes["SERVFAIL"] / self.sent if self.sent else 0.0
+
+    def percentiles(self, pcts=PERCENTILES):
+        if not self.latencies_ns:
+            return {p: 0.0 for p in pcts}
+        ordered = sorted(self.latencies_ns)
+        return {p: ordered[max(1, math.ceil(p / 100.0 * len(ordered))) - 1] / 1e6 for p in pcts}
+
+    def as_dict(self):
+        return {
+            "server": self.server, "port": self.port, "mode": self.mode,
+            "target": self.target, "duration": round(self.duration, 3),
+            "sent": self.sent, "answered": self.answered, "timeouts": self.timeouts,
+            "achieved_qps": round(self.achieved_qps, 1),
+            "timeout_rate": self.timeout_rate, "servfail_rate": self.servfail_rate,
+            "rcodes": dict(self.rcodes),
+            "latency_ms": {f"p{p:g}": round(v, 3) for p, v in self.percentiles().items()},
+        }
+
+
+def format_report(report):
+    pcts = report.percentiles()
+    target = f"{report.target:g} qps" if report.mode == "qps" else f"{report.target:g} in flight"
+    lines = [
+        f"Target:        {report.server}:{report.port} ({report.mode}, {target})",
+        f"Duration:      {report.duration:.2f}s",
+        f"Queries:       {report.sent} sent, {report.answered} answered, {report.timeouts} timed out",
+        f"Achieved QPS:  {report.achieved_qps:.1f}",
+        "Latency (ms):  " + "  ".join(f"p{p:g}={v:.3f}" for p, v in pcts.items()),
+        f"Timeout rate:  {report.timeout_rate * 100:.2f}%",
+        f"SERVFAIL rate: {report.servfail_rate * 100:.2f}%",
+    ]
+    if report.rcodes:
+        lines.append("Rcodes:        " + ", ".join(f"{k}={v}" for k, v in report.rcodes.most_common()))
+    return "\n".join(lines)
+
+
+def load_queries(path=None):
+    if not path:
+        return [(domain, "A") for domain in DEFAULT_DOMAINS]
+    if path.endswith((".pcap", ".cap")):
+        return load_pcap(path)
+    return load_query_file(path)
+
+
+def load_query_file(path):
+    queries = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            queries.append((parts[0], parts[1].upper() if len(parts) > 1 else "A"))
+    return queries
+
+
+def _ip_payload(frame, linktype):
+    offset = LINK_HEADER.get(linktype)
+    # A frame cut short by the capture's snaplen may not hold even its link header.
+    if offset is None or len(frame) < offset:
+        return None
+    if linktype == 1:
+        ethertype = struct.unpack("!H", frame[12:14])[0]
+        while ethertype == 0x8100 and len(frame) >= offset + 4:
+            ethertype = struct.unpack("!H", frame[offset + 2:offset + 4])[0]
+            offset += 4
+    return frame[offset:]
+
+
+def _udp_dns_payload(packet, responses=False):
+    if not packet:
+        return None
+    version = packet[0] >> 4
+    if version == 4:
+        if len(packet) < 20 or packet[9] != 17:
+            return None
+        udp = packet[(packet[0] & 0x0F) * 4:]
+    elif version == 6:
+        if len(packet) < 40 or packet[6] != 17:
+            return None
+        udp = packet[40:]
+    else:
+        return None
+    if len(udp) < 8:
+        return None
+    source, destination = struct.unpack("!HH", udp[:4])
+    if destination != 53 and not (responses and source == 53):
+        return None
+    return udp[8:]
+
+
+def iter_pcap(source, responses=False):
+    """(timestamp, DNS payload) for UDP queries to port 53, and replies from it when `responses` is set.
+
+    `source` is a path or a binary file already open on the capture, e.g. a gzip one.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield from iter_pcap(f, responses)
+        return
+    f = source
+    header = f.read(24)
+    if len(header) < 24 or header[:4] not in PCAP_MAGIC:
+        raise ValueError(f"{getattr(f, 'name', 'capture')} is not a classic pcap file (pcapng is not supported)")
+    endian = PCAP_MAGIC[header[:4]]
+    linktype = struct.unpack(endian + "I", header[20:24])[0]
+    # Nanosecond-resolution captures use their own magic; the subsecond field is scaled to match.
+    subsecond = 1e-9 if header[:4] in (b"\x4d\x3c\xb2\xa1", b"\xa1\xb2\x3c\x4d") else 1e-6
+    record = struct.Struct(endian + "IIII")
+    while True:
+        rec = f.read(16)
+        if len(rec) < 16:
+            break
+        seconds, fraction, incl_len, _ = record.unpack(rec)
+        payload = _udp_dns_payload(_ip_payload(f.read(incl_len), linktype), responses)
+        if payload and len(payload) >= 12:
+            yield seconds + fraction * subsecond, payload
+
+
+def load_pcap(path):
+    queries = []
+    for _, payload in iter_pcap(path):
+        if payload[2] & 0x80:
+            continue
+        try:
+            name, end = dns_probe.decode_name(payload, 12)
+            qtype = struct.unpack("!H", payload[end:end + 2])[0]
+        except (dns_probe.DNSError, struct.error):
+            continue
+        queries.append((name, dns_probe.QTYPE_NAMES.get(qtype, f"TYPE{qtype}")))
+    return queries
+
+
+class _LoadClient(asyncio.DatagramProtocol):
+    def __init__(self, report):
+        self.report = report
+        self.pending = {}
+        self.ids = itertools.cycle(range(65536))
+        self.transport = None
+        self.last_received = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        received = time.perf_counter_ns()
+        if len(data) < 12:
+            return
+        entry = self.pending.pop(struct.unpack("!H", data[:2])[0], None)
+        if entry is None:
+            return
+        sent, future = entry
+        self.last_received = received
+        rcode = dns_probe.RCODES.get(data[3] & 0x0F, str(data[3] & 0x0F))
+        self.report.answered += 1
+        self.report.rcodes[rcode] += 1
+        self.report.latencies_ns.append(received - sent)
+        if future is not None and not future.done():
+            future.set_result(rcode)
+
+    def send(self, template, future=None):
+        if len(self.pending) >= 65536:
+            return False
+        qid = next(self.ids)
+        while qid in self.pending:
+            qid = next(self.ids)
+        self.pending[qid] = (time.perf_counter_ns(), future)
+        self.transport.sendto(struct.pack("!H", qid) + template[2:])
+        self.report.sent += 1
+        return True
+
+    def expire(self, timeout_ns, now=None):
+        now = now or time.perf_counter_ns()
+        expired = [qid for qid, (sent, _) in self.pending.items() if now - sent > timeout_ns]
+        for qid in expired:
+            _, future = self.pending.pop(qid)
+            self.report.timeouts += 1
+            if future is not None and not future.done():
+                future.set_result(None)
+
+
+async def run_benchmark(queries, server="127.0.0.1", port=53, qps=None, concurrency=None,
+                        duration=10.0, count=None, timeout=2.0, progress=None):
+    if not queries:
+        raise ValueError("No queries to replay")
+    mode = "qps" if qps else "concurrency"
+    report = BenchmarkReport(server, port, mode, qps or concurrency or 1)
+    templates = [dns_probe.build_query(name, qtype, qid=0) for name, qtype in queries]
+    loop = asyncio.get_running_loop()
+    family = socket.AF_INET6 if ":" in server else socket.AF_INET
+    transport, client = await loop.create_datagram_endpoint(
+        lambda: _LoadClient(report), remote_addr=(server, port), family=family)
+    timeout_ns = int(timeout * 1e9)
+    stop_at = time.perf_counter() + duration
+    replay = itertools.cycle(templates)
+    budget = count if count is not None else math.inf
+
+    def done():
+        return report.sent >= budget or time.perf_counter() >= stop_at
+
+    async def sweeper():
+        while True:
+            await asyncio.sleep(min(0.05, timeout / 4))
+            client.expire(timeout_ns)
+            if progress:
+                progress(report)
+
+    sweep = asyncio.create_task(sweeper())
+    started = time.perf_counter()
+    try:
+        if qps:
+            interval = 1.0 / qps
+            while not done():
+                due = int((time.perf_counter() - started) / interval) + 1
+                while report.sent < min(due, budget) and not done():
+                    # A full ID space means the sweeper has to expire something first.
+                    if not client.send(next(replay)):
+                        break
+                await asyncio.sleep(0.001)
+        else:
+            async def worker():
+                while not done():
+                    future = loop.create_future()
+                    if not client.send(next(replay), future):
+                        await asyncio.sleep(0.001)
+                        continue
+                    await future
+
+            await asyncio.gather(*(worker() for _ in range(concurrency or 1)))
+
+        sending_done = time.perf_counter()
+        drain_until = sending_done + timeout
+        while client.pending and time.perf_counter() < drain_until:
+            await asyncio.sleep(0.005)
+        client.expire(-1)
+        # Replies drained after the last send count as answered, so the window runs until the last of them.
+        report.duration = max(sending_done, client.last_received / 1e9) - started
+    finally:
+        sweep.cancel()
+        transport.close()
+    return report
+
+
+async def _run_with_fake(queries, fake_options, **kwargs):
+    from .fake_dns import FakeDNSServer
+    fake = await FakeDNSServer(**fake_options).start()
+    kwargs.pop("server", None)
+    kwargs.pop("port", None)
+    try:
+        return await run_benchmark(queries, server=fake.host, port=fake.port, **kwargs)
+    finally:
+        await fake.stop()
+
+
+def benchmark(queries, fake=None, **kwargs):
+    if fake is not None:
+        return asyncio.run(_run_with_fake(queries, fake, **kwargs))
+    return asyncio.run(run_benchmark(queries, **kwargs))
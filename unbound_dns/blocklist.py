@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+"""Compile hosts, adblock and domain-list blocklists into a deduplicated local-zone include for Unbound."""
+
+import argparse
+import asyncio
+import gzip
+import heapq
+import io
+import itertools
+import json
+import operator
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from bisect import bisect_left, bisect_right
+from dataclasses import asdict, dataclass, field
+
+from . import autotune, chaos, config_gen, dns_probe, line_blocks, unbound_control
+
+FORMATS = ("auto", "hosts", "adblock", "domains")
+ZONE_TYPES = ("always_nxdomain", "always_null", "always_refuse", "refuse", "static", "deny")
+DEFAULT_ZONE_TYPE = "always_nxdomain"
+# Keys sorted in memory before a run is spilled to disk; about 100 bytes each.
+DEFAULT_RUN_SIZE = 1 << 21
+CHUNK_ZONES = 1 << 16
+BLOCK_SIZE = 4 << 20
+READY_TIMEOUT = 120.0
+HEADER = "# Written by unbound-dns blocklist; edits are lost on the next compile.\nserver:\n"
+ZONE_PREFIX = '    local-zone: "'
+
+# Patterns start with a newline rather than ^ so the regex engine can skip from line to line;
+# the text they search is framed with newlines.
+ADBLOCK_RULE = re.compile(r"\n[ \t]*(@@)?\|\|([^\s^/$|*]+)\^?(?:\$\S*)?[ \t]*(?=\n)")
+HOSTS_LINE = re.compile(r"[ \t]*[0-9a-f:.]+[ \t]+[^#\s]")
+COMMENT = {"hosts": re.compile(r"#[^\n]*"), "domains": re.compile(r"[#!;][^\n]*")}
+# At least two labels of up to 63 characters, at most 253 in all, and a top-level label that
+# cannot be an IPv4 octet. _valid checks whole blocks against the same rules.
+VALID_NAME = re.compile(r"(?:[a-z0-9_][a-z0-9_-]{0,62}\.)+[a-z][a-z0-9_-]{0,62}")
+NAME_BYTES = b"abcdefghijklmnopqrstuvwxyz0123456789_.-\n"
+SINGLE_LABEL = re.compile(r"\n[^.\n]*\n")
+BAD_TOP_LABEL = re.compile(r"\.[^a-z.\n][^.\n]*\n")
+COMPILED_ZONE = re.compile(r'^    local-zone: "[^"\n]+\." \S+$', re.M)
+
+
+@dataclass
+class CompileStats:
+    sources: dict = field(default_factory=dict)
+    read: int = 0
+    invalid: int = 0
+    allowed: int = 0
+    duplicates: int = 0
+    covered: int = 0
+    unblocked: int = 0
+    zones: int = 0
+    transparent: int = 0
+    runs: int = 0
+    added: int = 0
+    removed: int = 0
+    changed: bool = True
+    seconds: float = 0.0
+
+
+def _idna(name):
+    try:
+        return name.encode("idna").decode()
+    except UnicodeError:
+        return ""
+
+
+def _valid(names):
+    """The valid names among `names`, IDNA-encoded and without a trailing dot, one per line.
+
+    A block almost always passes a few checks on its whole text; only one that fails them is
+    matched name by name.
+    """
+    text = "\n".join(names)
+    if not text.isascii():
+        names = list(map(_idna, names))
+        text = "\n".join(names)
+    text = f"\n{text}\n"
+    if ".\n" in text:
+        text = text.replace(".\n", "\n")
+        names = text[1:-1].split("\n")
+    if (text.encode().translate(None, NAME_BYTES) or max(map(len, names)) > 63
+            or any(part in text for part in ("\n\n", "\n.", "..", ".\n", "\n-", ".-"))
+            or SINGLE_LABEL.search(text) or BAD_TOP_LABEL.search(text)):
+        valid = [name for name in text[1:-1].split("\n") if len(name) <= 253 and VALID_NAME.fullmatch(name)]
+        text = "\n" + "\n".join(valid) + "\n" if valid else "\n"
+    return text
+
+
+def to_keys(names):
+    """Keys for the valid names among `names`, in no particular order: the name reversed character
+    by character, plus a dot.
+
+    Sorting keys lists the suffix trie of the names in preorder. A zone sorts directly before
+    everything beneath it ("moc.elpmaxe." < "moc.elpmaxe.sda."), so covered names can be
+    dropped in one pass. Reversing characters instead of labels keeps that property and is a
+    single slice of the whole block.
+    """
+    if not names:
+        return []
+    return _valid(names)[::-1].replace("\n", ".\n").split("\n")[1:-1]
+
+
+def open_source(spec):
+    """Text lines of a file, a .gz file, an http(s) URL or "-" for stdin, read as a stream."""
+    if spec == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, errors="replace")
+    if spec.startswith(("http://", "https://")):
+        response = urllib.request.urlopen(spec, timeout=60)
+        if spec.endswith(".gz"):
+            response = gzip.GzipFile(fileobj=response)
+        return io.TextIOWrapper(response, errors="replace")
+    if spec.endswith(".gz"):
+        return gzip.open(spec, "rt", errors="replace")
+    return open(spec, errors="replace")
+
+
+def _blocks(f):
+    """Lower-cased text in large pieces that end on a line boundary."""
+    return (block.lower() for block in line_blocks.read(f, BLOCK_SIZE))
+
+
+def detect_format(text):
+    """hosts, adblock or domains from the first rules in `text`."""
+    votes = {"hosts": 0, "adblock": 0, "domains": 0}
+    for line in text.splitlines()[:1000]:
+        line = line.strip()
+        if not line or line[0] in "#!":
+            continue
+        if line.startswith(("||", "@@||", "[adblock")):
+            votes["adblock"] += 1
+        elif HOSTS_LINE.match(line):
+            votes["hosts"] += 1
+        else:
+            votes["domains"] += 1
+        if sum(votes.values()) >= 200:
+            break
+    return max(votes, key=votes.get) if any(votes.values()) else "domains"
+
+
+def extract(text, fmt):
+    """(blocked, allowed) names in a block of lower-cased text.
+
+    Every name on a hosts line is blocked, whatever its address; addresses other than 0.0.0.0
+    and 127.0.0.1 are left among the names and counted as invalid.
+    """
+    if "\r" in text:
+        text = text.replace("\r", "")
+    if fmt == "adblock":
+        rules = ADBLOCK_RULE.findall(f"\n{text}\n")
+        return [name for exception, name in rules if not exception], [name for exception, name in rules if exception]
+    if "#" in text or fmt == "domains":
+        text = COMMENT[fmt].sub("", text)
+    text = "\n" + text.replace("\t", " ")
+    if fmt == "hosts":
+        return text.replace("\n0.0.0.0 ", "\n").replace("\n127.0.0.1 ", "\n").split(), []
+    return text.replace("\n*.", "\n").split(), []
+
+
+def read_source(spec, fmt="auto", stats=None):
+    """Yield (keys, allowed_keys) per block of `spec`; invalid names are counted in `stats` and skipped."""
+    stats = stats if stats is not None else CompileStats()
+    with open_source(spec) as f:
+        source = {"format": fmt, "names": 0, "invalid": 0}
+        stats.sources[spec] = source
+        for block in _blocks(f):
+            if source["format"] == "auto":
+                source["format"] = detect_format(block)
+            blocked, allowed = extract(block, source["format"])
+            keys = to_keys(blocked)
+            source["names"] += len(blocked)
+            source["invalid"] += len(blocked) - len(keys)
+            yield keys, to_keys(allowed)
+    stats.read += source["names"]
+    stats.invalid += source["invalid"]
+
+
+def collapse(keys, stats=None, last="\n"):
+    """Sorted keys without repeats or names beneath a zone already kept; `last` is the key kept
+    just before these ones.
+
+    A key beneath its neighbour is beneath whatever covers the neighbour too, so comparing
+    neighbours settles most keys in one pass in C. Only keys after a covered one can be beneath
+    a zone further back, and those are checked one by one.
+    """
+    if not keys:
+        return []
+    covered = [keys[0].startswith(last), *map(str.startswith, keys[1:], keys[:-1])]
+    end = 0
+    for start in itertools.compress(range(len(keys)), map(operator.lt, [False, *covered], covered)):
+        if start < end:
+            continue
+        zone, end = keys[start - 1] if start else last, start + 1
+        while end < len(keys) and (covered[end] or keys[end].startswith(zone)):
+            covered[end] = True
+            end += 1
+    kept = list(itertools.compress(keys, map(operator.not_, covered)))
+    if stats:
+        duplicates = (keys[0] == last) + sum(map(operator.eq, keys[1:], keys[:-1]))
+        stats.duplicates += duplicates
+        stats.covered += len(keys) - len(kept) - duplicates
+    return kept
+
+
+def _spill(keys, workdir, stats):
+    keys.sort()
+    kept = collapse(keys, stats)
+    fd, path = tempfile.mkstemp(suffix=".run", dir=workdir)
+    with os.fdopen(fd, "w") as f:
+        f.write("\n".join(kept))
+        f.write("\n")
+    stats.runs += 1
+    return path
+
+
+def _run_keys(path):
+    with open(path) as f:
+        yield from map(str.rstrip, f)
+
+
+def _chunks(keys, stats):
+    """Sorted keys collapsed a chunk at a time, so a merge of runs is never held whole."""
+    keys, last = iter(keys), "\n"
+    for chunk in iter(lambda: list(itertools.islice(keys, CHUNK_ZONES)), []):
+        chunk = collapse(chunk, stats, last)
+        if chunk:
+            last = chunk[-1]
+            yield chunk
+
+
+def format_zones(keys, zone_type):
+    """local-zone lines for sorted keys, built from the whole chunk at once."""
+    if not keys:
+        return ""
+    # Reversing the joined keys turns "moc.a.\nmoc.b." into ".b.com\n.a.com"; joining them in
+    # reverse first keeps the key order.
+    names = "\n".join(reversed(keys))[::-1]
+    end = f'." {zone_type}\n'
+    return ZONE_PREFIX + names[1:].replace("\n.", end + ZONE_PREFIX) + end
+
+
+def carve(chunk, allowed, before):
+    """(kept, transparent) for one chunk of sorted, collapsed keys.
+
+    Keys at or beneath an allowed key are dropped. An allowed key inside a kept zone becomes a
+    transparent zone, so Unbound resolves it normally. `allowed` is collapsed too, so the zone
+    containing an allowed key can only be the kept key just before it: `before` (the previous
+    chunk's last key) when it is not in this chunk. Only allowed keys above `before` are placed
+    here; an empty chunk takes all that remain.
+    """
+    first = bisect_right(allowed, before) if before else 0
+    last = bisect_right(allowed, chunk[-1]) if chunk else len(allowed)
+    drops, transparent = [], []
+    # An allowed key placed in an earlier chunk can still cover the start of this one.
+    candidates = allowed[first - 1:last] if first and chunk and chunk[0].startswith(allowed[first - 1]) \
+        else allowed[first:last]
+    for key in candidates:
+        start = bisect_left(chunk, key)
+        drops.append((start, bisect_left(chunk, key + "\x7f")))
+        parent = chunk[start - 1] if start else before
+        if parent and key > (before or "") and key.startswith(parent):
+            transparent.append(key)
+    if not drops:
+        return chunk, transparent
+    kept, position = [], 0
+    for start, end in drops:
+        kept.extend(chunk[position:start])
+        position = max(position, end)
+    kept.extend(chunk[position:])
+    return kept, transparent
+
+
+class _LineKeys:
+    """Keys of sorted local-zone lines, worked out only for the lines a bisection looks at."""
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __getitem__(self, index):
+        line = self.lines[index]
+        return line[len(ZONE_PREFIX):line.index('." ', len(ZONE_PREFIX))][::-1] + "."
+
+
+class PreviousCompile:
+    """The local-zone lines of an earlier compile, handed out in key order as the new one is written."""
+
+    def __init__(self, path):
+        self.file = open(path) if path and os.path.exists(path) else None
+        self.blocks = _blocks(self.file) if self.file else iter(())
+        self.lines = []
+
+    def upto(self, key):
+        """Lines of zones up to and including `key` not handed out yet; all of them when key is None."""
+        lines = []
+        while True:
+            cut = len(self.lines) if key is None else bisect_right(_LineKeys(self.lines), key)
+            lines += self.lines[:cut]
+            del self.lines[:cut]
+            if self.lines or not self._read():
+                return lines
+
+    def _read(self):
+        for block in self.blocks:
+            start = block.find(ZONE_PREFIX)
+            if start < 0:
+                continue
+            self.lines = block[start:].rstrip("\n").split("\n")
+            # Our own output has nothing else after the header; a file edited by hand takes the regex.
+            if not len(self.lines) == block.count(ZONE_PREFIX) == block.count('." '):
+                self.lines = COMPILED_ZONE.findall(block)
+            if self.lines:
+                return True
+        return False
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+def _change_lines(lines, added):
+    """local_zones ("name. type") or local_zones_remove ("name.") input for changed include lines."""
+    text = "\n".join(lines).replace(ZONE_PREFIX, "")
+    text = text.replace('" ', " ") if added else re.sub(r'" \S+', "", text)
+    return text + "\n" if lines else ""
+
+
+def compile_lists(sources, output, zone_type=DEFAULT_ZONE_TYPE, fmt="auto", allow=(), previous=None,
+                  run_size=DEFAULT_RUN_SIZE, changes=None, progress=None):
+    """Compile `sources` into the include file `output` and return CompileStats.
+
+    Keys are sorted in runs of `run_size` and merged from disk, so memory stays bounded by the
+    run size whatever the input size. The new zones are written a chunk at a time and compared
+    with the same key range of `previous` (by default the existing `output`); when nothing
+    changed `output` is left untouched. `changes`, if given, is a directory to write added.txt
+    and removed.txt for unbound-control local_zones and local_zones_remove. A zone whose type
+    changed is in both.
+    """
+    if zone_type not in ZONE_TYPES:
+        raise ValueError(f"Unknown zone type {zone_type!r}; choose from {', '.join(ZONE_TYPES)}")
+    stats = CompileStats()
+    started = time.monotonic()
+    workdir = tempfile.mkdtemp(prefix="unbound-blocklist-")
+    old = PreviousCompile(output if previous is None else previous)
+    try:
+        keys, allowed, runs = [], [], []
+        for spec in [*sources, *allow]:
+            for blocked, exceptions in read_source(spec, fmt, stats):
+                if spec in allow:
+                    allowed += blocked
+                else:
+                    keys += blocked
+                allowed += exceptions
+                if len(keys) >= run_size:
+                    runs.append(_spill(keys, workdir, stats))
+                    keys = []
+            if progress:
+                progress(spec, stats)
+        stats.allowed = len(allowed)
+        allowed = collapse(sorted(allowed))
+        keys.sort()
+        if runs:
+            if keys:
+                runs.append(_spill(keys, workdir, stats))
+            keys = heapq.merge(*map(_run_keys, runs))
+
+        staged = os.path.join(workdir, "output.conf")
+        added = open(os.path.join(changes, "added.txt"), "w") if changes else None
+        removed = open(os.path.join(changes, "removed.txt"), "w") if changes else None
+        try:
+            with open(staged, "w") as f:
+                f.write(HEADER)
+                before = None
+                # The empty chunk at the end places allowed keys above the last zone.
+                for chunk in itertools.chain(_chunks(keys, stats), [[]]):
+                    kept, transparent = carve(chunk, allowed, before) if allowed else (chunk, [])
+                    stats.zones += len(kept)
+                    stats.unblocked += len(chunk) - len(kept)
+                    stats.transparent += len(transparent)
+                    text, position = [], 0
+                    for key in transparent:
+                        split = bisect_left(kept, key, position)
+                        text += [format_zones(kept[position:split], zone_type), format_zones([key], "transparent")]
+                        position = split
+                    text = "".join(text) + format_zones(kept[position:], zone_type)
+                    f.write(text)
+
+                    before = chunk[-1] if chunk else before
+                    previous_lines = old.upto(before if chunk else None)
+                    if "\n".join(previous_lines) == text[:-1]:
+                        continue
+                    new, previous_lines = set(text.split("\n")), set(previous_lines)
+                    new.discard("")
+                    plus, minus = new - previous_lines, previous_lines - new
+                    stats.added += len(plus)
+                    stats.removed += len(minus)
+                    if added:
+                        added.write(_change_lines(plus, True))
+                        removed.write(_change_lines(minus, False))
+        finally:
+            for f in (added, removed):
+                if f:
+                    f.close()
+        stats.changed = not os.path.exists(output) or bool(stats.added or stats.removed)
+        if stats.changed:
+            shutil.copyfile(staged, output + ".new")
+            os.replace(output + ".new", output)
+        stats.seconds = time.monotonic() - started
+        return stats
+    finally:
+        old.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def apply_changes(changes, config=None, use_sudo=None):
+    """Push added.txt and removed.txt from a compile into a running Unbound, without a reload."""
+    def lines(name):
+        with open(os.path.join(changes, name), "rb") as f:
+            yield from f
+
+    replies = {}
+    for command, name in (("local_zones_remove", "removed.txt"), ("local_zones", "added.txt")):
+        if os.path.getsize(os.path.join(changes, name)):
+            reply = b"".join(unbound_control.stream_control(command, data=lines(name), config=config,
+                                                            use_sudo=use_sudo))
+            replies[command] = reply.decode(errors="replace").strip()
+    return replies
+
+
+async def _time_to_answer(process, port, started, timeout=READY_TIMEOUT):
+    while time.monotonic() - started < timeout and process.poll() is None:
+        if (await dns_probe.query("127.0.0.1", "localhost", "A", port, 0.5)).ok:
+            return time.monotonic() - started
+        await asyncio.sleep(0.05)
+    return None
+
+
+def measure_load(include=None, unbound="unbound"):
+    """Seconds until a scratch Unbound answers, and its resident MiB, with `include` loaded (or without)."""
+    workdir = tempfile.mkdtemp(prefix="unbound-blocklist-load-")
+    port = chaos.free_port()
+    text = chaos.scratch_config(config_gen.generate(), workdir, port, [chaos.free_port()])
+    if include:
+        text = text.replace("server:\n", f'server:\n    include: "{os.path.abspath(include)}"\n', 1)
+    path = os.path.join(workdir, "unbound.conf")
+    with open(path, "w") as f:
+        f.write(text)
+    with open(os.path.join(workdir, "stderr.log"), "wb") as log:
+        started = time.monotonic()
+        process = subprocess.Popen([unbound, "-d", "-c", path], stdout=log, stderr=subprocess.STDOUT)
+    try:
+        seconds = asyncio.run(_time_to_answer(process, port, started))
+        if seconds is None:
+            raise OSError(f"Unbound did not answer on port {port}; see {workdir}")
+        rss_mib = autotune.peak_rss_mib(process.pid)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {"seconds": seconds, "rss_mib": rss_mib}
+
+
+def format_stats(stats, output):
+    lines = [f"{source}: {info['names']:,} names ({info['format']}), {info['invalid']:,} invalid"
+             for source, info in stats.sources.items()]
+    lines.append(f"{stats.read:,} names read, {stats.invalid:,} invalid, {stats.duplicates:,} duplicates, "
+                 f"{stats.covered:,} covered by a parent zone, {stats.unblocked:,} unblocked by allow rules")
+    lines.append(f"{stats.zones:,} local-zones and {stats.transparent:,} transparent exceptions "
+                 f"in {stats.seconds:.2f}s ({stats.runs} runs spilled to disk)")
+    if stats.changed:
+        lines.append(f"Wrote {output}: +{stats.added:,} -{stats.removed:,} since the previous compile")
+    else:
+        lines.append(f"{output} is unchanged")
+    return "\n".join(lines)
+
+
+def format_load(baseline, loaded, zones):
+    extra = loaded["rss_mib"] - baseline["rss_mib"]
+    per_zone = extra * 1024 * 1024 / zones if zones else 0.0
+    return (f"Unbound start-up: {loaded['seconds']:.2f}s with the blocklist, {baseline['seconds']:.2f}s without\n"
+            f"Unbound RSS: {loaded['rss_mib']:.0f} MiB with the blocklist, {baseline['rss_mib']:.0f} MiB without "
+            f"({extra:+.0f} MiB, about {per_zone:.0f} bytes per zone)")
+
+
+def add_arguments(parser):
+    parser.add_argument("sources", nargs="+", help="Blocklist files, .gz files, http(s) URLs or - for stdin")
+    parser.add_argument("-o", "--output", default="blocklist.conf", help="Include file to write (and diff against)")
+    parser.add_argument("--format", choices=FORMATS, default="auto", help="Input format (default: detected)")
+    parser.add_argument("--zone-type", choices=ZONE_TYPES, default=DEFAULT_ZONE_TYPE,
+                        help="How Unbound answers blocked names")
+    parser.add_argument("--allow", action="append", default=[], metavar="SOURCE",
+                        help="Names never to block; also taken from @@|| rules")
+    parser.add_argument("--no-diff", action="store_true", help="Replace the output without comparing")
+    parser.add_argument("--run-size", type=int, default=DEFAULT_RUN_SIZE,
+                        help="Names sorted in memory at once; bounds memory use")
+    parser.add_argument("--apply", action="store_true",
+                        help="Also add and remove the changed zones in the running Unbound (no reload)")
+    parser.add_argument("--config", help="unbound.conf for unbound-control with --apply")
+    parser.add_argument("--measure", action="store_true",
+                        help="Start a scratch Unbound with and without the include and compare start-up and RSS")
+    parser.add_argument("--unbound", default="unbound", help="Unbound binary for --measure")
+    parser.add_argument("--json", action="store_true", help="Print the statistics as JSON")
+    return parser
+
+
+def run(args):
+    changes = tempfile.mkdtemp(prefix="unbound-blocklist-changes-") if args.apply else None
+    try:
+        stats = compile_lists(args.sources, args.output, args.zone_type, args.format, args.allow,
+                              "" if args.no_diff else None, args.run_size, changes)
+        report = {"compile": asdict(stats)}
+        if args.apply and stats.changed:
+            report["applied"] = apply_changes(changes, args.config)
+        if args.measure:
+            if not shutil.which(args.unbound):
+                raise OSError(f"{args.unbound} not found; install Unbound to measure the load impact")
+            report["load"] = {"baseline": measure_load(None, args.unbound),
+                              "blocklist": measure_load(args.output, args.unbound)}
+    except (OSError, ValueError, unbound_control.ControlError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if changes:
+            shutil.rmtree(changes, ignore_errors=True)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(format_stats(stats, args.output))
+    for command, reply in report.get("applied", {}).items():
+        print(f"unbound-control {command}: {reply or 'ok'}")
+    if "load" in report:
+        print(format_load(report["load"]["baseline"], report["load"]["blocklist"], stats.zones))
+    if stats.changed and not args.apply:
+        print(f'Add include: "{os.path.abspath(args.output)}" to unbound.conf, then reload Unbound')
+    return 0
+
+
+def main(argv=None):
+    parser = add_arguments(argparse.ArgumentParser(description=__doc__))
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
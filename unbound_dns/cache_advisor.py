@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""Size msg-cache-size and rrset-cache-size from a query trace: a sampled, TTL-aware LRU hit-rate curve."""
+
+import gzip
+import math
+import re
+import struct
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+
+from . import benchmark, config_gen, dns_probe, line_blocks, log_analyzer
+
+MB = 1024 * 1024
+DEFAULT_MAX_KEYS = 1 << 14
+DEFAULT_TTL = 300
+DEFAULT_QPS = 1000.0
+DEFAULT_MAX_TTL = 86400
+BUCKETS_PER_OCTAVE = 16
+EXACT_ENTRIES = 256
+HASH_SPACE = 1 << 24
+BLOCK_SIZE = 4 << 20
+# Rough bytes per entry including Unbound's hash table and lock overhead; --calibrate measures them
+# from a running resolver's mem.cache.* and *.cache.count instead.
+MESSAGE_BYTES = 350
+RRSET_BYTES = 450
+RRSETS_PER_MESSAGE = 2.0
+
+# "[1760781601] unbound[812:0] info: 192.0.2.1 example.com. A IN", the syslog and RFC 3339 forms of
+# the same, and log-replies lines, which add "NOERROR 0.000123 0 45".
+STAMPED_LINE = re.compile(
+    rb"^(?:\[(\d+)(?:\.\d+)?\]|([A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d)|(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d))?"
+    rb"[^\n]*?info: [^ \n]+ ([^ \n]+) ([^ \n]+) [A-Z][A-Z0-9]*( [^ \n]+ \d+\.\d+ \d \d+)?$", re.M)
+MONTHS = {month: number for number, month in enumerate(
+    (b"Jan", b"Feb", b"Mar", b"Apr", b"May", b"Jun", b"Jul", b"Aug", b"Sep", b"Oct", b"Nov", b"Dec"))}
+
+
+def key_hash(key):
+    # crc32 alone keeps too much of the input's structure in its low bits; the multiply spreads it.
+    return (zlib.crc32(key) * 0x9E3779B1 & 0xFFFFFFFF) >> 8
+
+
+def cache_key(name, qtype):
+    if isinstance(name, str):
+        name = name.encode()
+    return (name.rstrip(b".").lower() or b".") + b" " + (qtype.encode() if isinstance(qtype, str) else qtype)
+
+
+def _stamp_seconds(epoch, syslog, iso):
+    if epoch:
+        return float(epoch)
+    if syslog:
+        # Syslog stamps have no year; ordering within one trace is all the simulation needs.
+        day = MONTHS.get(syslog[:3], 0) * 31 + int(syslog[4:6])
+        return day * 86400 + int(syslog[7:9]) * 3600 + int(syslog[10:12]) * 60 + int(syslog[13:15])
+    if iso:
+        return datetime.fromisoformat(iso.decode()).timestamp()
+    return None
+
+
+def _open(path, mode="rb"):
+    """The trace, decompressed on the fly when it is a .gz file."""
+    return (gzip.open if str(path).endswith(".gz") else open)(path, mode)
+
+
+def _blocks(path):
+    with _open(path) as f:
+        for block in line_blocks.read(f, BLOCK_SIZE):
+            yield block if block.endswith(b"\n") else block + b"\n"
+
+
+def detect_format(path):
+    """'pcap', 'log' (log-queries or log-replies lines) or 'list' (benchmark's `name [type]` lines)."""
+    with _open(path) as f:
+        head = f.read(1 << 20)
+    if head[:4] in benchmark.PCAP_MAGIC:
+        return "pcap"
+    return "log" if log_analyzer.detect_source(head) else "list"
+
+
+def _read_log(path, keep, qps):
+    replies = None
+    index, last, now = 0, None, None
+    for block in _blocks(path):
+        if replies is None:
+            replies = log_analyzer.detect_source(block) == "replies"
+        batch = []
+        for epoch, syslog, iso, name, qtype, reply in STAMPED_LINE.findall(block):
+            # With both log-queries and log-replies on, every lookup appears twice; use one of them.
+            if bool(reply) != replies:
+                continue
+            index += 1
+            key = cache_key(name, qtype)
+            if keep and not keep(key, True):
+                continue
+            stamp = epoch or syslog or iso
+            if stamp != last:
+                last, now = stamp, _stamp_seconds(epoch, syslog, iso)
+            batch.append((index / qps if now is None else now, key, None))
+        yield batch
+
+
+def _read_list(path, keep, qps):
+    batch = []
+    with _open(path, "rt") as f:
+        for index, line in enumerate(f, 1):
+            parts = line.split("#", 1)[0].split()
+            if not parts:
+                continue
+            key = cache_key(parts[0], parts[1].upper() if len(parts) > 1 else "A")
+            if not keep or keep(key, True):
+                batch.append((index / qps, key, None))
+            if len(batch) >= 65536:
+                yield batch
+                batch = []
+    yield batch
+
+
+def _pcap_payloads(path):
+    with _open(path) as f:
+        yield from benchmark.iter_pcap(f, responses=True)
+
+
+def _read_pcap(path, keep):
+    batch = []
+    for seconds, payload in _pcap_payloads(path):
+        try:
+            name, end = dns_probe.decode_name(payload, 12)
+            qtype = struct.unpack("!H", payload[end:end + 2])[0]
+        except (dns_probe.DNSError, struct.error):
+            continue
+        key = cache_key(name, dns_probe.QTYPE_NAMES.get(qtype, f"TYPE{qtype}"))
+        reply = payload[2] & 0x80
+        if keep and not keep(key, not reply):
+            continue
+        ttl = None
+        if reply:
+            try:
+                answers = dns_probe.parse_message(payload).answers
+            except (dns_probe.DNSError, struct.error):
+                continue
+            if not answers:
+                continue
+            ttl = min(record.ttl for record in answers)
+        batch.append((seconds, key, ttl))
+        if len(batch) >= 65536:
+            yield batch
+            batch = []
+    yield batch
+
+
+def read_trace(path, keep=None, qps=DEFAULT_QPS):
+    """Batches of (seconds, key, ttl) from a query log, a pcap or a `name [type]` list.
+
+    ttl is None for queries and the smallest answer TTL for replies (pcaps only). Traces without
+    timestamps are paced at `qps`. keep(key, query) is called once per query and reply and can drop
+    it before its timestamp or answers are decoded, which is most of the work when only a sample of
+    keys is simulated.
+    """
+    kind = detect_format(path)
+    if kind == "pcap":
+        return _read_pcap(path, keep)
+    if kind == "log":
+        return _read_log(path, keep, qps)
+    return _read_list(path, keep, qps)
+
+
+def needed_entries(distance):
+    """Smallest LRU cache, in entries, that still holds a key used `distance` distinct keys ago.
+
+    Exact for small caches; above EXACT_ENTRIES it is rounded up to one of BUCKETS_PER_OCTAVE sizes
+    per doubling, which keeps the histogram a few hundred entries long.
+    """
+    if distance < EXACT_ENTRIES:
+        return int(distance) + 1
+    return math.ceil(2 ** (math.ceil(math.log2(distance + 1) * BUCKETS_PER_OCTAVE) / BUCKETS_PER_OCTAVE))
+
+
+class StackSimulator:
+    """Mattson's one-pass LRU stack distances over a spatially hashed sample of keys (SHARDS).
+
+    A reference to a key last used d distinct keys ago hits in every LRU cache holding more than d
+    entries, so one pass gives the hit rate of every cache size. Distances are counted with a
+    Fenwick tree over reference positions, and only keys whose hash is under a threshold are
+    simulated, with distances and counts scaled by the sampling rate. Past `max_keys` keys the
+    threshold is halved, so memory stays bounded however long the trace.
+
+    Past its TTL an entry is a miss at every size unless serve-expired is on; it keeps its place in
+    the LRU order, as Unbound leaves expired entries in the cache until they are evicted or
+    replaced. With prefetch, a hit in the last tenth of the TTL refreshes the entry.
+    """
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS, ttl=DEFAULT_TTL, min_ttl=0, max_ttl=DEFAULT_MAX_TTL,
+                 prefetch=False, serve_expired=False):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.prefetch = prefetch
+        self.serve_expired = serve_expired
+        self.threshold = HASH_SPACE
+        self.entries = {}
+        self.capacity = 4 * max_keys
+        self.tree = [0] * (self.capacity + 1)
+        self.clock = 0
+        self.histogram = Counter()
+        self.references = 0.0
+        self.cold = 0.0
+        self.expired = 0.0
+        self.sampled = 0
+        self.seen = 0
+        self.first = None
+        self.last = None
+
+    @property
+    def rate(self):
+        return self.threshold / HASH_SPACE
+
+    def keep(self, key, query=True):
+        """Whether the key is sampled; every query offered here counts towards the trace's total."""
+        self.seen += query
+        return key_hash(key) < self.threshold
+
+    def clamp(self, ttl):
+        return min(max(ttl, self.min_ttl), self.max_ttl)
+
+    def feed(self, batch):
+        for seconds, key, ttl in batch:
+            if ttl is None:
+                self.access(key, seconds)
+            else:
+                self.learn(key, seconds, ttl)
+
+    def learn(self, key, now, ttl):
+        """Take an entry's lifetime from a reply: what is left of it, and at least that when refilled."""
+        entry = self.entries.get(key)
+        if entry:
+            entry[2] = now + self.clamp(ttl)
+            entry[3] = max(entry[3] or 0, ttl)
+
+    def access(self, key, now):
+        h = key_hash(key)
+        if h >= self.threshold:
+            return
+        if self.first is None:
+            self.first = now
+        self.last = now
+        if self.clock == self.capacity:
+            self._compact()
+        scale = HASH_SPACE / self.threshold
+        self.references += scale
+        self.sampled += 1
+        entry = self.entries.get(key)
+        if entry is None:
+            self.cold += scale
+            if len(self.entries) >= self.max_keys:
+                self._shrink()
+                if h >= self.threshold:
+                    return
+            self.entries[key] = [h, self._push(), now + self.clamp(self.ttl), None]
+            return
+
+        tree, position = self.tree, entry[1] + 1
+        before = 0
+        while position:
+            before += tree[position]
+            position &= position - 1
+        distance = (len(self.entries) - before) * scale
+        self._remove(entry[1])
+        entry[1] = self._push()
+
+        ttl = self.clamp(self.ttl if entry[3] is None else entry[3])
+        if now >= entry[2] and not self.serve_expired:
+            self.expired += scale
+            entry[2] = now + ttl
+            return
+        if now >= entry[2] or (self.prefetch and entry[2] - now < ttl / 10):
+            entry[2] = now + ttl
+        self.histogram[needed_entries(distance)] += scale
+
+    def _push(self):
+        position = self.clock
+        self.clock += 1
+        tree, index = self.tree, position + 1
+        while index <= self.capacity:
+            tree[index] += 1
+            index += index & -index
+        return position
+
+    def _remove(self, position):
+        tree, index = self.tree, position + 1
+        while index <= self.capacity:
+            tree[index] -= 1
+            index += index & -index
+
+    def _compact(self):
+        # Positions only grow; renumber the live ones 0..n-1 and rebuild the tree in O(n).
+        entries = sorted(self.entries.values(), key=lambda entry: entry[1])
+        tree = [0] * (self.capacity + 1)
+        for position, entry in enumerate(entries):
+            entry[1] = position
+            tree[position + 1] += 1
+        for index in range(1, self.capacity + 1):
+            parent = index + (index & -index)
+            if parent <= self.capacity:
+                tree[parent] += tree[index]
+        self.tree = tree
+        self.clock = len(entries)
+
+    def _shrink(self):
+        while len(self.entries) >= self.max_keys and self.threshold > 1:
+            self.threshold //= 2
+            for key in [key for key, entry in self.entries.items() if entry[0] >= self.threshold]:
+                self._remove(self.entries.pop(key)[1])
+
+    def curve(self):
+        histogram = Counter(self.histogram)
+        total = self.references
+        if self.seen:
+            # SHARDS-adj: a hot key in or out of the sample skews the sampled count of references;
+            # the difference from the real count is mostly hits on that key, at the smallest distance.
+            histogram[1] += self.seen - self.references
+            total = self.seen
+        sizes, hit_rates, hits = [], [], 0.0
+        for size in sorted(histogram):
+            hits += histogram[size]
+            sizes.append(size)
+            hit_rates.append(min(max(hits / total, 0.0), 1.0))
+        return CacheCurve(sizes, hit_rates, total, self.cold, self.expired, self.rate,
+                          len(self.entries), self.sampled, (self.last or 0) - (self.first or 0))
+
+
+@dataclass
+class CacheCurve:
+    sizes: list
+    hit_rates: list
+    references: float
+    cold: float
+    expired: float
+    rate: float
+    tracked: int
+    sampled: int
+    span: float
+    seconds: float = 0.0
+
+    @property
+    def max_hit_rate(self):
+        return self.hit_rates[-1] if self.hit_rates else 0.0
+
+    def hit_rate_at(self, entries):
+        rate = 0.0
+        for size, hit_rate in zip(self.sizes, self.hit_rates):
+            if size > entries:
+                break
+            rate = hit_rate
+        return rate
+
+    def entries_for(self, target):
+        """Smallest cache, in entries, whose hit rate reaches `target`; None if no size does."""
+        return next((size for size, rate in zip(self.sizes, self.hit_rates) if rate >= target), None)
+
+    def as_dict(self):
+        return {"references": round(self.references), "distinct": round(self.cold),
+                "expired": round(self.expired), "max_hit_rate": self.max_hit_rate,
+                "sampling_rate": self.rate, "sampled": self.sampled, "tracked": self.tracked,
+                "trace_seconds": self.span, "seconds": self.seconds,
+                "curve": [{"entries": size, "hit_rate": rate} for size, rate in zip(self.sizes, self.hit_rates)]}
+
+
+@dataclass
+class EntrySizes:
+    message: float = MESSAGE_BYTES
+    rrset: float = RRSET_BYTES
+    rrsets_per_message: float = RRSETS_PER_MESSAGE
+
+    @classmethod
+    def from_stats(cls, values):
+        """Bytes per entry measured from stats output (mem.cache.* over *.cache.count), where present."""
+        sizes = cls()
+        messages, rrsets = values.get("msg.cache.count"), values.get("rrset.cache.count")
+        if messages and values.get("mem.cache.message"):
+            sizes.message = values["mem.cache.message"] / messages
+        if rrsets and values.get("mem.cache.rrset"):
+            sizes.rrset = values["mem.cache.rrset"] / rrsets
+        if messages and rrsets:
+            sizes.rrsets_per_message = rrsets / messages
+        return sizes
+
+    def message_cache(self, entries):
+        return entries * self.message
+
+    def rrset_cache(self, entries):
+        return entries * self.rrsets_per_message * self.rrset
+
+    def entries(self, msg_bytes, rrset_bytes):
+        # A cached answer needs both its message and its rrsets, so the smaller cache bounds hits.
+        return min(msg_bytes / self.message, rrset_bytes / (self.rrsets_per_message * self.rrset))
+
+
+def format_size(nbytes):
+    return f"{max(1, math.ceil(nbytes / MB))}m"
+
+
+def recommend(curve, target=None, sizes=None):
+    """Smallest msg/rrset cache sizes reaching `target`, by default one point under the best possible.
+
+    Cold and expired references miss at any size, so a target above curve.max_hit_rate cannot be
+    reached; the recommendation then falls back to the default target and says so.
+    """
+    sizes = sizes or EntrySizes()
+    best = curve.max_hit_rate
+    goal = target if target is not None and target <= best else max(0.0, best - 0.01)
+    entries = curve.entries_for(goal) or 1
+    msg, rrset = sizes.message_cache(entries), sizes.rrset_cache(entries)
+    return {"target": target, "reachable": target is None or target <= best, "goal": goal,
+            "entries": entries, "hit_rate": curve.hit_rate_at(entries),
+            "msg-cache-size": format_size(msg), "rrset-cache-size": format_size(rrset),
+            "msg_bytes": msg, "rrset_bytes": rrset}
+
+
+def current(curve, settings, sizes=None):
+    """Predicted hit rate of the msg-cache-size/rrset-cache-size in `settings` (Unbound's 4m default)."""
+    sizes = sizes or EntrySizes()
+    msg = config_gen.parse_size(settings.get("msg-cache-size", "4m"))
+    rrset = config_gen.parse_size(settings.get("rrset-cache-size", "4m"))
+    entries = sizes.entries(msg, rrset)
+    return {"msg-cache-size": settings.get("msg-cache-size", "4m"),
+            "rrset-cache-size": settings.get("rrset-cache-size", "4m"),
+            "entries": int(entries), "hit_rate": curve.hit_rate_at(entries)}
+
+
+def simulator_for(settings=None, **overrides):
+    """A StackSimulator honouring cache-min-ttl, cache-max-ttl, prefetch and serve-expired from `settings`."""
+    settings = settings or {}
+    options = {"min_ttl": int(settings.get("cache-min-ttl", 0)),
+               "max_ttl": int(settings.get("cache-max-ttl", DEFAULT_MAX_TTL)),
+               "prefetch": settings.get("prefetch", "no") == "yes",
+               "serve_expired": settings.get("serve-expired", "no") == "yes"}
+    options.update({name: value for name, value in overrides.items() if value is not None})
+    return StackSimulator(**options)
+
+
+def simulate(paths, simulator=None, qps=DEFAULT_QPS, progress=None):
+    """Run a trace (one or more files, in order) through `simulator` and return its CacheCurve."""
+    paths = [paths] if isinstance(paths, str) else list(paths)
+    simulator = simulator or StackSimulator()
+    started = time.monotonic()
+    for path in paths:
+        for batch in read_trace(path, simulator.keep, qps):
+            simulator.feed(batch)
+            if progress:
+                progress(simulator)
+    curve = simulator.curve()
+    curve.seconds = time.monotonic() - started
+    return curve
+
+
+def format_trace(curve):
+    if not curve.references:
+        return "No queries found in the trace"
+    return (f"Trace:        {curve.references:,.0f} queries, {curve.cold:,.0f} distinct names/types over "
+            f"{curve.span / 3600:.1f}h (simulated {curve.rate * 100:.3g}% of keys in {curve.seconds:.1f}s)\n"
+            f"Misses:       {curve.cold / curve.references * 100:.1f}% first sight, "
+            f"{curve.expired / curve.references * 100:.1f}% expired; best possible hit rate "
+            f"{curve.max_hit_rate * 100:.1f}%")
+
+
+def format_advice(advice, now=None):
+    lines = []
+    if not advice["reachable"]:
+        lines.append(f"A {advice['target'] * 100:.1f}% hit rate is out of reach for this trace; "
+                     f"aiming for {advice['goal'] * 100:.1f}% instead")
+    lines.append(f"Recommended:  msg-cache-size: {advice['msg-cache-size']}  rrset-cache-size: "
+                 f"{advice['rrset-cache-size']}  (~{advice['entries']:,} entries, "
+                 f"{advice['hit_rate'] * 100:.1f}% hits)")
+    if now:
+        lines.append(f"Configured:   msg-cache-size: {now['msg-cache-size']}  rrset-cache-size: "
+                     f"{now['rrset-cache-size']}  (~{now['entries']:,} entries, {now['hit_rate'] * 100:.1f}% hits)")
+    return "\n".join(lines)
+
+
+def format_report(curve, advice, now=None, sizes=None, rows=12):
+    sizes = sizes or EntrySizes()
+    if not curve.references:
+        return format_trace(curve)
+    lines = [format_trace(curve), "", f"{'Entries':>12} {'msg-cache':>10} {'rrset-cache':>12} {'Hit rate':>9}"]
+    # Rows at evenly spaced powers between the smallest and largest size, since the curve is
+    # read on a log scale: where it flattens matters more than its first few hundred entries.
+    low, high = curve.sizes[0], curve.sizes[-1]
+    grid = [low * (high / low) ** (row / (rows - 1)) for row in range(rows)] if rows > 1 else [high]
+    picked = sorted({next(i for i, size in enumerate(curve.sizes) if size >= point * 0.999) for point in grid})
+    for i in picked:
+        size, rate = curve.sizes[i], curve.hit_rates[i]
+        lines.append(f"{size:>12,} {format_size(sizes.message_cache(size)):>10} "
+                     f"{format_size(sizes.rrset_cache(size)):>12} {rate * 100:8.1f}%  {'#' * round(rate * 30)}")
+    lines += ["", format_advice(advice, now)]
+    return "\n".join(lines)
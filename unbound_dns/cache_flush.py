@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Targeted Unbound cache flushes through unbound-control, with before/after latency probes."""
+
+import statistics
+import time
+from dataclasses import dataclass, field
+
+from . import unbound_control
+
+DEFAULT_PROBE_NAMES = ("google.com", "cloudflare.com", "github.com")
+
+
+@dataclass(frozen=True)
+class FlushKind:
+    label: str
+    commands: tuple
+    needs_name: bool = False
+    needs_type: bool = False
+    description: str = ""
+
+
+FLUSH_KINDS = {
+    "name": FlushKind("Name", (("flush", "{name}"),), needs_name=True,
+                      description="A, AAAA, NS, SOA, CNAME, DNAME, MX, PTR, SRV and NAPTR for one name"),
+    "type": FlushKind("Name and type", (("flush_type", "{name}", "{rtype}"),), needs_name=True,
+                      needs_type=True, description="One record type for one name"),
+    "zone": FlushKind("Zone", (("flush_zone", "{name}"),), needs_name=True,
+                      description="Everything at or below a domain"),
+    "bogus": FlushKind("Bogus", (("flush_bogus",),),
+                       description="Answers that failed DNSSEC validation"),
+    "negative": FlushKind("Negative", (("flush_negative",),),
+                          description="NXDOMAIN, NODATA and SERVFAIL answers"),
+    "infra": FlushKind("Infrastructure", (("flush_infra", "all"),),
+                       description="Upstream round-trip and lameness data; cached answers are kept"),
+    "all": FlushKind("Everything (keep serving)",
+                     (("flush_zone", "."), ("flush_negative",), ("flush_infra", "all")),
+                     description="Empty all caches without restarting or dropping in-flight queries"),
+    "reload": FlushKind("Reload config, keep cache", (("reload_keep_cache",),),
+                        description="Re-read unbound.conf without discarding cached answers"),
+}
+
+
+@dataclass
+class FlushResult:
+    kind: str
+    ok: bool = True
+    outputs: list = field(default_factory=list)
+    seconds: float = 0.0
+
+
+@dataclass
+class FlushImpact:
+    result: FlushResult
+    before: list
+    after: list
+
+    def median(self, results):
+        rtts = [r.rtt_ms for r in results if r.ok]
+        return statistics.median(rtts) if rtts else None
+
+
+def commands_for(kind, name=None, rtype="A"):
+    spec = FLUSH_KINDS[kind]
+    if spec.needs_name and not name:
+        raise ValueError(f"'{kind}' flush needs a domain name")
+    values = {"name": name, "rtype": (rtype or "A").upper()}
+    return [tuple(arg.format(**values) for arg in command) for command in spec.commands]
+
+
+def flush(kind, name=None, rtype="A", config=None, use_sudo=None):
+    result = FlushResult(kind)
+    started = time.monotonic()
+    for command, *args in commands_for(kind, name, rtype):
+        control = unbound_control.run_control(command, *args, config=config, use_sudo=use_sudo)
+        result.outputs.append(f"{' '.join([command, *args])}: {control.output}")
+        if not control.ok:
+            result.ok = False
+            break
+    result.seconds = time.monotonic() - started
+    return result
+
+
+def probe_names(name=None, extra=DEFAULT_PROBE_NAMES):
+    names = [name.rstrip(".")] if name and name.strip(".") else []
+    seen = {n.lower() for n in names}
+    return names + [n for n in extra if n.lower() not in seen]
+
+
+def measure_impact(kind, name=None, rtype="A", names=None, server="127.0.0.1", port=53,
+                   config=None, use_sudo=None, timeout=3.0):
+    # Imported here so plain flushes (and the CLI) don't pay for asyncio.
+    from . import dns_probe
+
+    names = names or probe_names(name)
+    qtype = rtype if kind == "type" else "A"
+    # The first pass also makes sure every probe name is cached, so 'before' is a warm baseline.
+    dns_probe.run_probes([server], names, qtype, port, timeout)
+    before = dns_probe.run_probes([server], names, qtype, port, timeout)
+    result = flush(kind, name, rtype, config, use_sudo)
+    after = dns_probe.run_probes([server], names, qtype, port, timeout) if result.ok else []
+    return FlushImpact(result, before, after)
+
+
+def format_result(result):
+    status = "ok" if result.ok else "FAILED"
+    lines = [f"{FLUSH_KINDS[result.kind].label} flush {status} in {result.seconds * 1000:.0f}ms"]
+    lines += [f"  {line}" for line in result.outputs]
+    return "\n".join(lines)
+
+
+def format_impact(impact):
+    lines = [format_result(impact.result)]
+    if not impact.after:
+        return "\n".join(lines)
+    lines.append(f"{'Name':<30} {'Before':>10} {'After':>10} {'Change':>10}")
+    for b, a in zip(impact.before, impact.after):
+        before = f"{b.rtt_ms:.1f}ms" if b.ok else "error"
+        after = f"{a.rtt_ms:.1f}ms" if a.ok else (a.error or a.rcode or "error")
+        change = f"{a.rtt_ms - b.rtt_ms:+.1f}ms" if a.ok and b.ok else ""
+        lines.append(f"{a.name:<30} {before:>10} {after:>10} {change:>10}")
+    before, after = impact.median(impact.before), impact.median(impact.after)
+    if before is not None and after is not None:
+        lines.append(f"{'Median':<30} {before:>8.1f}ms {after:>8.1f}ms {after - before:>+8.1f}ms")
+    return "\n".join(lines)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Cold-vs-warm cache latency profiling."""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from . import dns_probe
+from . import unbound_control
+
+CACHE_SETTINGS = (
+    "cache-min-ttl", "cache-max-ttl", "prefetch", "prefetch-key", "serve-expired",
+    "serve-expired-ttl", "serve-expired-client-timeout", "rrset-cache-size", "msg-cache-size",
+)
+
+PROFILE_DIR = os.path.expanduser("~/.unbound_cache_profiles")
+
+
+@dataclass
+class DomainProfile:
+    domain: str
+    cold_ms: float
+    warm_ms: float
+    cold_ttl: int
+    warm_ttl: int
+    error: str = ""
+
+    @property
+    def speedup(self):
+        return self.cold_ms / self.warm_ms if self.warm_ms else 0.0
+
+
+def read_cache_settings(config_path):
+    settings = {}
+    if not config_path or not os.path.exists(config_path):
+        return settings
+    pattern = re.compile(r"^\s*(" + "|".join(map(re.escape, CACHE_SETTINGS)) + r")\s*:\s*(\S+)")
+    with open(config_path) as f:
+        for line in f:
+            match = pattern.match(line)
+            if match:
+                settings[match.group(1)] = match.group(2).strip('"')
+    return settings
+
+
+def config_digest(config_path):
+    if not config_path or not os.path.exists(config_path):
+        return None
+    with open(config_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def _ttl(result):
+    return min((r.ttl for r in result.answers), default=0)
+
+
+def flush_domains(domains, config=None):
+    errors = []
+    for domain in domains:
+        result = unbound_control.run_control("flush_zone", domain, config=config)
+        if not result.ok:
+            errors.append(f"{domain}: {result.output}")
+    return errors
+
+
+async def profile_async(domains, server="127.0.0.1", port=53, qtype="A", timeout=5.0):
+    cold = await dns_probe.probe_many([server], domains, qtype, port, timeout)
+    warm = await dns_probe.probe_many([server], domains, qtype, port, timeout)
+    rows = []
+    for c, w in zip(cold, warm):
+        error = c.error or w.error
+        if not error and c.rcode != "NOERROR":
+            error = c.rcode
+        rows.append(DomainProfile(c.name, c.rtt_ms, w.rtt_ms, _ttl(c), _ttl(w), error))
+    return rows
+
+
+def aggregate(rows):
+    good = [r for r in rows if not r.error]
+    if not good:
+        return {"domains": len(rows), "failed": len(rows)}
+    cold = [r.cold_ms for r in good]
+    warm = [r.warm_ms for r in good]
+    median_cold = statistics.median(cold)
+    median_warm = statistics.median(warm)
+    return {
+        "domains": len(rows),
+        "failed": len(rows) - len(good),
+        "cold_median_ms": round(median_cold, 3),
+        "warm_median_ms": round(median_warm, 3),
+        "cold_mean_ms": round(statistics.fmean(cold), 3),
+        "warm_mean_ms": round(statistics.fmean(warm), 3),
+        "median_speedup": round(median_cold / median_warm, 1) if median_warm else 0.0,
+    }
+
+
+def profile_cache(domains, server="127.0.0.1", port=53, qtype="A", timeout=5.0,
+                  flush=False, config_path=None):
+    flush_errors = flush_domains(domains, config_path) if flush else []
+    started = time.time()
+    rows = asyncio.run(profile_async(domains, server, port, qtype, timeout))
+    return {
+        "timestamp": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+        "server": server,
+        "port": port,
+        "qtype": qtype,
+        "flushed": flush and not flush_errors,
+        "flush_errors": flush_errors,
+        "config": {
+            "path": config_path,
+            "sha256": config_digest(config_path),
+            "settings": read_cache_settings(config_path),
+        },
+        "results": [dict(asdict(r), speedup=round(r.speedup, 1)) for r in rows],
+        "aggregate": aggregate(rows),
+    }
+
+
+def save_profile(profile, path=None):
+    if path is None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(PROFILE_DIR, f"profile_{stamp}.json")
+    with open(path, "w") as f:
+        json.dump(profile, f, indent=2)
+    return path
+
+
+def load_profile(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def format_profile(profile):
+    lines = [f"{'Domain':<28} {'Cold ms':>9} {'Warm ms':>9} {'Speedup':>8} {'TTL':>6}"]
+    for r in profile["results"]:
+        if r["error"]:
+            lines.append(f"{r['domain']:<28} {'FAILED: ' + r['error']}")
+        else:
+            lines.append(f"{r['domain']:<28} {r['cold_ms']:>9.3f} {r['warm_ms']:>9.3f} "
+                         f"{r['speedup']:>7.1f}x {r['warm_ttl']:>6}")
+    agg = profile["aggregate"]
+    if "cold_median_ms" in agg:
+        lines.append("")
+        lines.append(f"Median cold {agg['cold_median_ms']:.3f}ms, median warm {agg['warm_median_ms']:.3f}ms "
+                     f"({agg['median_speedup']:.1f}x faster), {agg['failed']} of {agg['domains']} failed")
+    settings = profile["config"]["settings"]
+    if settings:
+        lines.append("Config: " + ", ".join(f"{k}={v}" for k, v in settings.items()))
+    for error in profile["flush_errors"]:
+        lines.append(f"flush_zone failed for {error}")
+    return "\n".join(lines)
+
+
+def compare_profiles(old, new):
+    a, b = old["aggregate"], new["aggregate"]
+    lines = [f"{'':<16} {'before':>10} {'after':>10} {'change':>9}"]
+    for key in ("cold_median_ms", "warm_median_ms", "median_speedup"):
+        if key in a and key in b:
+            change = (b[key] - a[key]) / a[key] * 100 if a[key] else 0.0
+            lines.append(f"{key:<16} {a[key]:>10.3f} {b[key]:>10.3f} {change:>+8.1f}%")
+    before, after = old["config"]["settings"], new["config"]["settings"]
+    for key in sorted(set(before) | set(after)):
+        if before.get(key) != after.get(key):
+            lines.append(f"{key}: {before.get(key, '-')} -> {after.get(key, '-')}")
+    return "\n".join(lines)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Persist Unbound's cache across restarts with dump_cache/load_cache and pre-resolve top domains."""
+
+import gzip
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import stats
+from . import unbound_control
+
+DUMP_DIR = Path.home() / ".unbound_cache_dumps"
+DEFAULT_DUMP = DUMP_DIR / "cache.dump.gz"
+DEFAULT_TOP_FILE = DUMP_DIR / "top_domains.txt"
+DEFAULT_MAX_AGE = 3600
+DEFAULT_TOP_N = 100
+
+QUERY_LOG = re.compile(r"info: \S+ (\S+?)\.? (\S+) IN\b")
+
+
+@dataclass
+class CacheDump:
+    path: str
+    rrsets: int = 0
+    messages: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class WarmupReport:
+    ready_seconds: float = 0.0
+    loaded: CacheDump = None
+    skipped: str = None
+    warmed: int = 0
+    failed: int = 0
+    warm_seconds: float = 0.0
+    time_to_warm: float = 0.0
+    hit_rate_before: float = None
+    hit_rate_after: float = None
+
+
+def dump_age(path=DEFAULT_DUMP):
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _count(line, dump):
+    if line.startswith(b";rrset"):
+        dump.rrsets += 1
+    elif line.startswith(b"msg "):
+        dump.messages += 1
+
+
+def save_cache(path=DEFAULT_DUMP, config=None, use_sudo=None):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+    dump = CacheDump(str(path))
+    started = time.monotonic()
+    last = b""
+    try:
+        with gzip.open(partial, "wb") as out:
+            for line in unbound_control.stream_control("dump_cache", config=config, use_sudo=use_sudo):
+                _count(line, dump)
+                dump.bytes += len(line)
+                out.write(line)
+                last = line
+    except unbound_control.ControlError:
+        partial.unlink(missing_ok=True)
+        raise
+    if last.strip() != b"EOF":
+        partial.unlink(missing_ok=True)
+        raise unbound_control.ControlError("unbound-control dump_cache failed: incomplete dump")
+    # Only replace the previous dump once this one is known to be complete.
+    os.replace(partial, path)
+    dump.seconds = time.monotonic() - started
+    return dump
+
+
+def load_cache(path=DEFAULT_DUMP, config=None, use_sudo=None, max_age=DEFAULT_MAX_AGE):
+    age = dump_age(path)
+    if age is None:
+        raise FileNotFoundError(f"No cache dump at {path}")
+    # load_cache treats the stored TTLs as relative to now, so an old dump would resurrect stale answers.
+    if max_age and age > max_age:
+        raise unbound_control.ControlError(
+            f"Cache dump is {age / 60:.0f} minutes old (limit {max_age / 60:.0f}); not loading it")
+
+    dump = CacheDump(str(path))
+    started = time.monotonic()
+
+    def lines():
+        with gzip.open(path, "rb") as src:
+            for line in src:
+                _count(line, dump)
+                dump.bytes += len(line)
+                yield line
+
+    # The reply is a single "ok"; reading it to the end is what raises if Unbound rejected the dump.
+    b"".join(unbound_control.stream_control("load_cache", data=lines(), config=config, use_sudo=use_sudo))
+    dump.seconds = time.monotonic() - started
+    return dump
+
+
+def wait_until_ready(config=None, timeout=15.0, use_sudo=None):
+    started = time.monotonic()
+    while True:
+        try:
+            if unbound_control.run_control("status", config=config, use_sudo=use_sudo, timeout=5).ok:
+                return time.monotonic() - started
+        except unbound_control.ControlError:
+            pass
+        if time.monotonic() - started > timeout:
+            raise unbound_control.ControlError(f"Unbound did not answer unbound-control within {timeout:g}s")
+        time.sleep(0.2)
+
+
+def top_domains(paths=None, n=DEFAULT_TOP_N):
+    """Most frequent names in Unbound query logs (log-queries: yes) or plain 'name [type]' lists."""
+    paths = [p for p in (paths or [DEFAULT_TOP_FILE]) if os.path.exists(p)]
+    if not paths:
+        from .benchmark import DEFAULT_DOMAINS
+        return list(DEFAULT_DOMAINS[:n])
+    counts = Counter()
+    for path in paths:
+        opener = gzip.open if str(path).endswith(".gz") else open
+        with opener(path, "rt", errors="replace") as f:
+            for line in f:
+                match = QUERY_LOG.search(line)
+                if match:
+                    counts[(match.group(1).lower(), match.group(2).upper())] += 1
+                    continue
+                fields = line.split("#", 1)[0].split()
+                if fields:
+                    counts[(fields[0].rstrip(".").lower(), fields[1].upper() if len(fields) > 1 else "A")] += 1
+    return [name if qtype == "A" else (name, qtype) for (name, qtype), _ in counts.most_common(n)]
+
+
+def warm_up(names, server="127.0.0.1", port=53, concurrency=50, timeout=3.0):
+    from . import dns_probe
+
+    started = time.monotonic()
+    by_type = {}
+    for entry in names:
+        name, qtype = entry if isinstance(entry, tuple) else (entry, "A")
+        by_type.setdefault(qtype, []).append(name)
+    results = []
+    for qtype, group in by_type.items():
+        results += dns_probe.run_probes([server], group, qtype, port, timeout, concurrency)
+    return results, time.monotonic() - started
+
+
+def measured_warm_up(names, server="127.0.0.1", port=53, config=None, fetch=None,
+                     concurrency=50, timeout=3.0):
+    """Warm up and return (results, seconds, hit_rate); hit_rate is the share answered from cache."""
+    collector = stats.StatsCollector(fetch or (lambda: stats.fetch_stats(config)))
+    try:
+        collector.poll()
+    except unbound_control.ControlError:
+        collector = None
+    results, seconds = warm_up(names, server, port, concurrency, timeout)
+    hit_rate = None
+    if collector:
+        try:
+            interval = collector.poll()
+            hit_rate = interval.hit_rate if interval.queries else None
+        except unbound_control.ControlError:
+            pass
+    return results, seconds, hit_rate
+
+
+def restore(path=DEFAULT_DUMP, names=None, config=None, server="127.0.0.1", port=53,
+            max_age=DEFAULT_MAX_AGE, use_sudo=None, ready_timeout=15.0, fetch=None):
+    report = WarmupReport()
+    report.ready_seconds = wait_until_ready(config, ready_timeout, use_sudo)
+    started = time.monotonic()
+    try:
+        report.loaded = load_cache(path, config, use_sudo, max_age)
+    except (FileNotFoundError, unbound_control.ControlError) as e:
+        report.skipped = str(e)
+    if names:
+        results, report.warm_seconds, report.hit_rate_after = measured_warm_up(
+            names, server, port, config, fetch)
+        report.failed = sum(not r.ok for r in results)
+        report.warmed = len(results) - report.failed
+    report.time_to_warm = time.monotonic() - started
+    return report
+
+
+def format_dump(dump, verb="Saved"):
+    return (f"{verb} {dump.rrsets} RRsets and {dump.messages} messages "
+            f"({dump.bytes / 1024:.0f} KiB uncompressed) in {dump.seconds:.2f}s: {dump.path}")
+
+
+def format_report(report):
+    lines = [f"Unbound ready after {report.ready_seconds:.2f}s"]
+    if report.loaded:
+        lines.append(format_dump(report.loaded, "Loaded"))
+    elif report.skipped:
+        lines.append(f"Cache not restored: {report.skipped}")
+    if report.warmed or report.failed:
+        lines.append(f"Pre-resolved {report.warmed} names in {report.warm_seconds:.2f}s"
+                     + (f" ({report.failed} failed)" if report.failed else ""))
+    lines.append(f"Time to warm: {report.time_to_warm:.2f}s")
+    rate = lambda r: "n/a" if r is None else f"{r * 100:.1f}%"
+    if report.hit_rate_before is not None or report.hit_rate_after is not None:
+        lines.append(f"Cache hit rate for top names: {rate(report.hit_rate_before)} before restart, "
+                     f"{rate(report.hit_rate_after)} after")
+    return "\n".join(lines)
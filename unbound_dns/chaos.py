@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""Run a real Unbound against local stand-in upstreams while injecting latency, loss and outages."""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+from . import config_gen, dns_probe, fake_dns, upstreams
+
+NAMES = tuple(f"host{i}.chaos.test" for i in range(20))
+TLS_NAME = "upstream.chaos.test"
+# Upstream answers carry UPSTREAM_TTL, answers served from expired cache carry STALE_REPLY_TTL,
+# so the TTL a client sees tells a fresh answer from a stale one.
+UPSTREAM_TTL = 2
+STALE_REPLY_TTL = 30
+CLIENT_TIMEOUT = 5.0
+DEFAULT_RATE = 40.0
+OUTCOMES = ("fresh", "stale", "servfail", "timeout", "error")
+
+# Kept small so several variants fit in one CI job; latencies are what Unbound adds, not the host.
+HARNESS_HARDWARE = config_gen.Hardware(cpus=1, memory_total=512 * config_gen.MB,
+                                       memory_available=512 * config_gen.MB, fd_soft=1024, fd_hard=1024)
+
+
+@dataclass
+class Phase:
+    name: str
+    seconds: float
+    delay: float = 0.0
+    loss: float = 0.0
+
+    @classmethod
+    def parse(cls, spec):
+        """"name:seconds[:delay=MS][:loss=FRACTION]", e.g. "outage:30:loss=1"."""
+        name, seconds, *faults = spec.split(":")
+        phase = cls(name, float(seconds))
+        for fault in faults:
+            key, _, value = fault.partition("=")
+            if key == "delay":
+                phase.delay = float(value) / 1000.0
+            elif key == "loss":
+                phase.loss = float(value)
+            else:
+                raise ValueError(f"Unknown fault {key!r} in phase {spec!r}; use delay=MS or loss=FRACTION")
+        return phase
+
+
+@dataclass
+class Variant:
+    name: str
+    options: dict = field(default_factory=dict)
+
+    @classmethod
+    def parse(cls, spec):
+        """"name:option=value,option=value", e.g. "fast-stale:serve-expired-client-timeout=0"."""
+        name, _, options = spec.partition(":")
+        pairs = [option.partition("=") for option in options.split(",") if option]
+        return cls(name, {key.strip(): value.strip() for key, _, value in pairs})
+
+
+DEFAULT_PHASES = (
+    Phase("baseline", 15),
+    Phase("latency", 15, delay=0.25),
+    Phase("loss", 15, loss=0.3),
+    Phase("outage", 30, loss=1.0),
+    Phase("recovery", 20),
+)
+DEFAULT_VARIANTS = (
+    Variant("shipped"),
+    Variant("client-timeout-0", {"serve-expired-client-timeout": "0"}),
+    Variant("no-serve-expired", {"serve-expired": "no"}),
+)
+
+
+@dataclass
+class Sample:
+    at: float
+    phase: str
+    rtt: float
+    outcome: str
+
+
+def classify(result):
+    if result.timed_out:
+        return "timeout"
+    if result.error:
+        return "error"
+    if result.rcode == "SERVFAIL":
+        return "servfail"
+    ttls = [record.ttl for record in result.answers if record.rtype == "A"]
+    if result.rcode != "NOERROR" or not ttls:
+        return "error"
+    return "stale" if min(ttls) > UPSTREAM_TTL else "fresh"
+
+
+def set_options(text, section, options, drop=()):
+    """Replace (or add) `options` in every `section:` clause; list values repeat the key."""
+    out = []
+    current = None
+    pending = False
+
+    def flush():
+        blank = []
+        while out and not out[-1].strip():
+            blank.append(out.pop())
+        for key, value in options.items():
+            for item in value if isinstance(value, (list, tuple)) else [value]:
+                out.append(f"    {key}: {item}\n")
+        out.extend(blank)
+
+    for line in text.splitlines(True):
+        stripped = line.strip()
+        if stripped and not line[0].isspace() and stripped.endswith(":"):
+            if pending:
+                flush()
+            current = stripped[:-1]
+            pending = current == section
+            out.append(line)
+            continue
+        key = stripped.partition(":")[0].strip()
+        if current == section and (key in options or key in drop):
+            continue
+        out.append(line)
+    if pending:
+        flush()
+    return "".join(out)
+
+
+def scratch_config(text, workdir, port, upstream_ports, tls_bundle=None, options=None):
+    """`text` moved onto 127.0.0.1:`port`, unprivileged and under `workdir`, forwarding to local upstreams."""
+    server = {
+        "interface": "127.0.0.1", "port": port, "do-ip6": "no",
+        "username": '""', "chroot": '""', "directory": f'"{workdir}"',
+        "pidfile": f'"{os.path.join(workdir, "unbound.pid")}"',
+        "logfile": f'"{os.path.join(workdir, "unbound.log")}"', "use-syslog": "no",
+    }
+    if tls_bundle:
+        server["tls-cert-bundle"] = f'"{tls_bundle}"'
+    server.update(options or {})
+    text = set_options(text, "server", server)
+    text = set_options(text, "remote-control", {"control-enable": "no"}, drop=("control-interface",
+                                                                             "control-use-cert"))
+    text = set_options(text, "forward-zone", {"forward-tls-upstream": "yes" if tls_bundle else "no"})
+    ordered = [upstreams.Upstream("127.0.0.1", upstream_port, TLS_NAME if tls_bundle else None)
+               for upstream_port in upstream_ports]
+    return upstreams.rewrite_forward_zone(text, ordered)
+
+
+def harness_config(variant, workdir, port, upstream_ports, tls_bundle=None):
+    """The shipped config as a scratch instance (see scratch_config), plus `variant`'s options."""
+    # Upstream answers must be allowed to expire within a phase.
+    options = {"cache-min-ttl": 0, "serve-expired-reply-ttl": STALE_REPLY_TTL, **variant.options}
+    return scratch_config(config_gen.generate(hw=HARNESS_HARDWARE), workdir, port, upstream_ports, tls_bundle,
+                          options)
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+        udp.bind(("127.0.0.1", 0))
+        port = udp.getsockname()[1]
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as tcp:
+        tcp.bind(("127.0.0.1", port))
+    return port
+
+
+def make_certificate(workdir):
+    """A self-signed certificate for TLS_NAME, or None without openssl."""
+    cert, key = os.path.join(workdir, "upstream.pem"), os.path.join(workdir, "upstream.key")
+    try:
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                        "-subj", f"/CN={TLS_NAME}", "-addext", f"subjectAltName=DNS:{TLS_NAME}",
+                        "-keyout", key, "-out", cert], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return cert, key
+
+
+class ChaosHarness:
+    """Local upstreams whose faults change per phase, and a steady client load against a resolver."""
+
+    def __init__(self, upstream_count=2, tls=None, cert=None, rate=DEFAULT_RATE, timeout=CLIENT_TIMEOUT,
+                 seed=None):
+        self.tls = tls
+        self.cert = cert
+        self.rate = rate
+        self.timeout = timeout
+        self.upstreams = [fake_dns.FakeDNSServer(ttl=UPSTREAM_TTL, seed=None if seed is None else seed + i,
+                                                 tls=tls) for i in range(upstream_count)]
+
+    async def start(self):
+        for upstream in self.upstreams:
+            await upstream.start()
+        return self
+
+    async def stop(self):
+        for upstream in self.upstreams:
+            await upstream.stop()
+
+    @property
+    def ports(self):
+        return [upstream.port for upstream in self.upstreams]
+
+    def inject(self, phase):
+        for upstream in self.upstreams:
+            upstream.delay = phase.delay
+            upstream.drop = phase.loss
+
+    async def wait_ready(self, port, timeout=15.0):
+        started = time.monotonic()
+        while time.monotonic() - started < timeout:
+            result = await dns_probe.query("127.0.0.1", NAMES[0], "A", port, 0.5)
+            if result.ok:
+                return True
+            await asyncio.sleep(0.1)
+        return False
+
+    async def drive(self, port, phases):
+        """Query NAMES round-robin at `rate` per second through every phase; one Sample per query."""
+        samples = []
+        pending = set()
+        started = time.monotonic()
+
+        async def one(name, phase, sent):
+            result = await dns_probe.query("127.0.0.1", name, "A", port, self.timeout)
+            rtt = self.timeout if result.timed_out else result.rtt_ns / 1e9
+            samples.append(Sample(sent - started, phase.name, rtt, classify(result)))
+
+        count = 0
+        for phase in phases:
+            self.inject(phase)
+            phase_end = time.monotonic() + phase.seconds
+            while time.monotonic() < phase_end:
+                sent = time.monotonic()
+                task = asyncio.ensure_future(one(NAMES[count % len(NAMES)], phase, sent))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                count += 1
+                await asyncio.sleep(max(0.0, started + count / self.rate - time.monotonic()))
+        if pending:
+            await asyncio.gather(*pending)
+        self.inject(Phase("idle", 0))
+        samples.sort(key=lambda s: s.at)
+        return samples
+
+
+async def run_variant(harness, variant, phases, unbound="unbound", workdir=None):
+    workdir = tempfile.mkdtemp(prefix=f"chaos-{variant.name}-", dir=workdir)
+    port = free_port()
+    path = os.path.join(workdir, "unbound.conf")
+    with open(path, "w") as f:
+        f.write(harness_config(variant, workdir, port, harness.ports, harness.cert))
+    with open(os.path.join(workdir, "stderr.log"), "wb") as log:
+        process = subprocess.Popen([unbound, "-d", "-c", path], stdout=log, stderr=subprocess.STDOUT)
+    try:
+        if not await harness.wait_ready(port):
+            raise RuntimeError(f"Unbound did not answer on port {port}; see {workdir}/unbound.log")
+        for name in NAMES:
+            await dns_probe.query("127.0.0.1", name, "A", port, harness.timeout)
+        return await harness.drive(port, phases)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples):
+    """{"queries", "p50", "p99", and a rate per outcome} for a list of Samples."""
+    total = len(samples)
+    summary = {"queries": total, "p50": _percentile([s.rtt for s in samples], 0.5),
+               "p99": _percentile([s.rtt for s in samples], 0.99)}
+    for outcome in OUTCOMES:
+        summary[outcome] = sum(s.outcome == outcome for s in samples) / total if total else 0.0
+    return summary
+
+
+def by_phase(samples, phases):
+    return {phase.name: summarize([s for s in samples if s.phase == phase.name]) for phase in phases}
+
+
+def timeline(samples, bucket=5.0):
+    """[(start second, phase, summary)] per `bucket` seconds of send time."""
+    rows = {}
+    for sample in samples:
+        rows.setdefault(int(sample.at // bucket), []).append(sample)
+    return [(index * bucket, group[0].phase, summarize(group)) for index, group in sorted(rows.items())]
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+def format_report(results, phases):
+    """`results` holds (Variant, Samples) pairs; one table row per variant and phase."""
+    lines = [f"{'variant':<20} {'phase':<10} {'queries':>7} {'p50':>7} {'p99':>7} "
+             f"{'fresh':>6} {'stale':>6} {'servfail':>8} {'timeout':>7}"]
+    for variant, samples in results:
+        for name, summary in by_phase(samples, phases).items():
+            lines.append(f"{variant.name:<20} {name:<10} {summary['queries']:>7} {_ms(summary['p50']):>7} "
+                         f"{_ms(summary['p99']):>7} {summary['fresh'] * 100:5.1f}% {summary['stale'] * 100:5.1f}% "
+                         f"{summary['servfail'] * 100:7.1f}% {summary['timeout'] * 100:6.1f}%")
+    return "\n".join(lines)
+
+
+def format_timeline(samples, bucket=5.0):
+    lines = []
+    for start, phase, summary in timeline(samples, bucket):
+        failed = summary["servfail"] + summary["timeout"] + summary["error"]
+        lines.append(f"  {start:5.0f}s {phase:<10} p99 {_ms(summary['p99']):>7}  stale {summary['stale'] * 100:5.1f}%  "
+                     f"failed {failed * 100:5.1f}%  {'#' * round(failed * 20)}")
+    return "\n".join(lines)
+
+
+def report_dict(results, phases, bucket=5.0):
+    return {variant.name: {"options": variant.options,
+                           "phases": by_phase(samples, phases),
+                           "timeline": [{"at": at, "phase": phase, **summary}
+                                        for at, phase, summary in timeline(samples, bucket)]}
+            for variant, samples in results}
+
+
+def survival_failures(results, phases, outage="outage", max_failed=0.05):
+    """Variants that serve expired answers but still failed more than `max_failed` of queries during `outage`."""
+    failures = []
+    for variant, samples in results:
+        if variant.options.get("serve-expired", "yes") != "yes" or outage not in {p.name for p in phases}:
+            continue
+        summary = by_phase(samples, phases)[outage]
+        failed = summary["servfail"] + summary["timeout"] + summary["error"]
+        if failed > max_failed:
+            failures.append(f"{variant.name}: {failed * 100:.1f}% of queries failed during {outage}")
+    return failures
+
+
+async def run_all(args, phases, variants):
+    workdir = tempfile.mkdtemp(prefix="unbound-chaos-")
+    tls = cert = None
+    if not args.no_tls:
+        cert = make_certificate(workdir)
+        if cert:
+            tls = fake_dns.server_context(*cert)
+        else:
+            print("openssl not found; upstreams serve plain DNS", file=sys.stderr)
+    harness = await ChaosHarness(args.upstreams, tls, cert and cert[0], args.rate, args.timeout, args.seed).start()
+    results = []
+    try:
+        for variant in variants:
+            print(f"Running {variant.name} for {sum(p.seconds for p in phases):.0f}s...", file=sys.stderr, flush=True)
+            results.append((variant, await run_variant(harness, variant, phases, args.unbound, workdir)))
+    finally:
+        await harness.stop()
+    return results
+
+
+def add_arguments(parser):
+    parser.add_argument("--unbound", default="unbound", help="Unbound binary to run")
+    parser.add_argument("--phase", action="append", metavar="NAME:SECONDS[:delay=MS][:loss=FRACTION]",
+                        help="Replace the default baseline/latency/loss/outage/recovery scenario")
+    parser.add_argument("--variant", action="append", metavar="NAME:OPTION=VALUE,...",
+                        help="Config variants to compare (default: shipped, client-timeout-0, no-serve-expired)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every phase duration")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Client queries per second")
+    parser.add_argument("--timeout", type=float, default=CLIENT_TIMEOUT, help="Client query timeout in seconds")
+    parser.add_argument("--upstreams", type=int, default=2, help="Number of stand-in upstreams")
+    parser.add_argument("--no-tls", action="store_true", help="Forward over plain DNS instead of DNS-over-TLS")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="FILE", help="Also write the report as JSON")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit 1 if a serve-expired variant fails more than 5%% of queries during the outage")
+    return parser
+
+
+def run(args):
+    try:
+        phases = [Phase.parse(spec) for spec in args.phase] if args.phase else list(DEFAULT_PHASES)
+        variants = [Variant.parse(spec) for spec in args.variant] if args.variant else list(DEFAULT_VARIANTS)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    if not shutil.which(args.unbound):
+        print(f"ERROR: {args.unbound} not found; install Unbound to run the chaos harness", file=sys.stderr)
+        return 1
+    for phase in phases:
+        phase.seconds *= args.scale
+
+    try:
+        results = asyncio.run(run_all(args, phases, variants))
+    except RuntimeError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    print(format_report(results, phases))
+    for variant, samples in results:
+        print(f"\n{variant.name} {variant.options or ''}".rstrip())
+        print(format_timeline(samples))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report_dict(results, phases), f, indent=2)
+
+    failures = survival_failures(results, phases) if args.check else []
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = add_arguments(argparse.ArgumentParser(description=__doc__))
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,750 @@
+#!/usr/bin/env python3
+"""unbound-dns: the GUI's tools for headless hosts.
+
+Feature modules are imported inside each command so that starting the CLI only pays for
+what that command uses; tkinter is loaded by the gui command alone.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+DEFAULT_DOMAINS = ["google.com", "cloudflare.com", "github.com"]
+
+
+def cmd_status(args):
+    from . import status_probe
+
+    os_type = "macos" if sys.platform == "darwin" else "linux"
+    status = status_probe.probe(os_type, args.proc_root)
+    print(status_probe.describe(status))
+    return 0 if status.running else 1
+
+
+def cmd_test(args):
+    from . import dns_probe
+
+    results = dns_probe.run_probes(args.server or ["127.0.0.1"], args.domains or DEFAULT_DOMAINS,
+                                   args.qtype, args.port, args.timeout)
+    for result in results:
+        print(dns_probe.format_result(result))
+    failed = [r for r in results if not r.ok]
+    print(f"{len(results) - len(failed)}/{len(results)} queries succeeded")
+    return 1 if failed else 0
+
+
+def cmd_benchmark(args):
+    from . import benchmark
+
+    if args.pcap:
+        queries = benchmark.load_pcap(args.pcap)
+    elif args.queries:
+        queries = benchmark.load_query_file(args.queries)
+    elif args.domains:
+        queries = [(d, "A") for d in args.domains]
+    else:
+        queries = benchmark.load_queries()
+
+    fake = None
+    if args.fake:
+        fake = {"delay": args.fake_delay_ms / 1000.0, "drop": args.fake_drop,
+                "rcode": args.fake_rcode, "seed": 0}
+    report = benchmark.benchmark(queries, fake=fake, server=args.server, port=args.port,
+                                 qps=args.qps, concurrency=None if args.qps else args.concurrency,
+                                 duration=args.duration, count=args.count, timeout=args.timeout)
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+    else:
+        print(benchmark.format_report(report))
+    return 0 if report.answered else 1
+
+
+def cmd_profile_cache(args):
+    from . import benchmark, cache_profiler
+
+    domains = args.domains or benchmark.DEFAULT_DOMAINS
+    profile = cache_profiler.profile_cache(domains, args.server, args.port, args.qtype,
+                                           args.timeout, args.flush, args.config)
+    print(cache_profiler.format_profile(profile))
+    if not args.no_save:
+        print(f"\nSaved to {cache_profiler.save_profile(profile, args.output)}")
+    if args.compare:
+        print("\nCompared with " + args.compare + ":")
+        print(cache_profiler.compare_profiles(cache_profiler.load_profile(args.compare), profile))
+    return 0 if profile["aggregate"].get("failed", 1) == 0 else 1
+
+
+def cmd_stats(args):
+    from . import stats, unbound_control
+
+    collector = stats.StatsCollector(lambda: stats.fetch_stats(args.config))
+    store = None
+    if args.store is not None:
+        from . import metrics_store
+
+        store = metrics_store.MetricsStore(args.store or metrics_store.DEFAULT_DB)
+    if args.from_file:
+        for path in args.from_file:
+            with open(path) as f:
+                interval = collector.add(f.read())
+            if interval:
+                print(stats.format_interval(interval))
+                if store:
+                    store.add_interval(interval)
+        return 0
+
+    try:
+        collector.poll()
+        for _ in range(args.count) if args.count else itertools.count():
+            time.sleep(args.interval)
+            interval = collector.poll()
+            print(stats.format_interval(interval), flush=True)
+            if store:
+                store.add_interval(interval)
+    except unbound_control.ControlError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_histogram(args):
+    from . import histogram, stats, unbound_control
+
+    try:
+        if args.action == "record":
+            if os.path.exists(args.file):
+                series = histogram.HistogramSeries.load(args.file, append=True)
+            else:
+                series = histogram.HistogramSeries(path=args.file)
+            series.record(stats.parse_stats(stats.fetch_stats(args.config)))
+            for _ in range(args.count) if args.count else itertools.count():
+                time.sleep(args.interval)
+                counts = series.record(stats.parse_stats(stats.fetch_stats(args.config)))
+                print(time.strftime("%H:%M:%S"), histogram.format_percentiles(series.bounds, counts), flush=True)
+            return 0
+
+        series = histogram.HistogramSeries.load(args.file)
+        after = series.last(args.window)
+        if args.action == "show":
+            print(f"Last {args.window:g}s of {len(series)} samples in {args.file}:")
+            print(histogram.format_cdf(series.bounds, after))
+            print(histogram.format_percentiles(series.bounds, after))
+            return 0
+
+        if args.against:
+            baseline = histogram.HistogramSeries.load(args.against)
+            if baseline.bounds != series.bounds:
+                raise ValueError(f"{args.against} uses different histogram buckets")
+            before = baseline.last(args.window)
+        else:
+            before = series.last(args.window, args.ago or args.window)
+        comparison = histogram.compare(series.bounds, before, after, args.threshold)
+        print(histogram.format_comparison(comparison))
+        return 1 if comparison.regressions else 0
+    except (OSError, ValueError, unbound_control.ControlError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+
+
+def cmd_history(args):
+    import sqlite3
+
+    from . import metrics_store
+
+    try:
+        store = metrics_store.MetricsStore(args.db)
+        end = time.time()
+        start = end - metrics_store.parse_duration(args.since)
+        if args.csv:
+            count = store.export_csv(args.csv, args.table, start, end)
+            print(f"Wrote {count} {args.table} rows to {args.csv}")
+        if args.columns:
+            count = store.export_columns(args.columns, args.table, start, end)
+            print(f"Wrote {count} {args.table} rows to {args.columns}")
+        if not (args.csv or args.columns):
+            print(metrics_store.format_series(store.query(start, end), args.rows))
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_upstreams(args):
+    import asyncio
+
+    from . import config_apply, config_gen, unbound_control, upstreams
+
+    with open(args.config) as f:
+        current = f.read()
+    targets = ([upstreams.Upstream.parse(spec) for spec in args.upstream]
+               or upstreams.forward_addrs(current) + upstreams.pruned_addrs(current))
+    if not targets:
+        print(f"ERROR: no forward-addr lines in {args.config}", file=sys.stderr)
+        return 1
+
+    def progress(round_number, measurements):
+        ok = sum(m.ok for m in measurements)
+        print(f"round {round_number}: {ok}/{len(measurements)} upstreams answered", flush=True)
+
+    evaluator = upstreams.UpstreamEvaluator(targets, args.names or upstreams.DEFAULT_NAMES,
+                                            timeout=args.timeout,
+                                            context=upstreams.client_context(args.cafile))
+    ranking = asyncio.run(evaluator.run(args.rounds, args.interval, progress))
+    print()
+    for entry in ranking:
+        print(upstreams.format_stats(entry))
+
+    kept, pruned = upstreams.plan(ranking, args.slow_factor, args.max_loss) if args.prune else (ranking, [])
+    for entry, reason in pruned:
+        print(f"prune {entry.upstream.spec}: {reason}")
+    updated = upstreams.rewrite_forward_zone(current, [s.upstream for s in kept],
+                                             [(s.upstream, reason) for s, reason in pruned])
+    if not args.apply:
+        print()
+        print(config_gen.diff_config(current, updated, args.config, "reordered") or "Order unchanged")
+        return 0
+    try:
+        print(config_apply.format_result(upstreams.apply(args.config, kept, pruned)))
+    except (OSError, config_apply.ConfigError, unbound_control.ControlError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_cache(args):
+    import subprocess
+
+    from . import cache_warmup, config_apply, unbound_control
+
+    names = cache_warmup.top_domains(args.names_from, args.top) if args.top else None
+    try:
+        if args.action == "save":
+            print(cache_warmup.format_dump(cache_warmup.save_cache(args.file, args.config)))
+        elif args.action == "load":
+            print(cache_warmup.format_dump(cache_warmup.load_cache(args.file, args.config, max_age=args.max_age),
+                                           "Loaded"))
+        elif args.action == "warm":
+            results, seconds, hit_rate = cache_warmup.measured_warm_up(
+                names or cache_warmup.top_domains(args.names_from), args.server, args.port, args.config)
+            failed = sum(not r.ok for r in results)
+            print(f"Pre-resolved {len(results) - failed}/{len(results)} names in {seconds:.2f}s"
+                  + ("" if hit_rate is None else f", {hit_rate * 100:.1f}% already cached"))
+        else:
+            before = None
+            if names:
+                before = cache_warmup.measured_warm_up(names, args.server, args.port, args.config)[2]
+            print(cache_warmup.format_dump(cache_warmup.save_cache(args.file, args.config)))
+            command = args.restart_command or config_apply.default_restart_command()
+            print(f"Running: {command}", flush=True)
+            if subprocess.run(command, shell=True).returncode != 0:
+                print("ERROR: restart command failed", file=sys.stderr)
+                return 1
+            report = cache_warmup.restore(args.file, names, args.config, args.server, args.port,
+                                          args.max_age)
+            report.hit_rate_before = before
+            print(cache_warmup.format_report(report))
+    except (OSError, unbound_control.ControlError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_flush(args):
+    from . import cache_flush, unbound_control
+
+    try:
+        if args.measure:
+            impact = cache_flush.measure_impact(args.kind, args.name, args.qtype, args.probe,
+                                                args.server, args.port, args.config)
+            print(cache_flush.format_impact(impact))
+            return 0 if impact.result.ok else 1
+        result = cache_flush.flush(args.kind, args.name, args.qtype, args.config)
+    except (ValueError, unbound_control.ControlError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    print(cache_flush.format_result(result))
+    return 0 if result.ok else 1
+
+
+def cmd_fleet(args):
+    from . import fleet
+
+    try:
+        hosts = fleet.load_inventory(args.inventory)
+        if args.host:
+            unknown = set(args.host) - {host.name for host in hosts}
+            if unknown:
+                raise ValueError(f"Not in {args.inventory}: {', '.join(sorted(unknown))}")
+            hosts = [host for host in hosts if host.name in args.host]
+        kwargs = {"timeout": args.timeout}
+        if args.action == "apply":
+            if not args.file:
+                raise ValueError("apply needs --file with the unbound.conf to install")
+            with open(args.file) as f:
+                kwargs["text"] = f.read()
+        elif args.action == "flush":
+            kwargs.update(kind=args.kind, domain=args.name, rtype=args.qtype)
+        fn = fleet.action(args.action, **kwargs)
+        transport = fleet.make_transport(args.transport)
+    except (OSError, ValueError, ImportError, AttributeError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    results = fleet.run_fleet(hosts, fn, transport, args.workers,
+                              on_done=lambda result: print(fleet.format_result(result), flush=True),
+                              max_failures=args.max_failures)
+    summary = fleet.summarize(results)
+    print(fleet.format_summary(summary))
+    return 0 if summary["ok"] == summary["hosts"] else 1
+
+
+def cmd_apply_config(args):
+    from . import config_apply, unbound_control
+
+    try:
+        if args.source:
+            with open(args.source) if args.source != "-" else sys.stdin as f:
+                text = f.read()
+            result = config_apply.apply_config(text, args.target, args.config, args.restart_command,
+                                               force_restart=args.force_restart, port=args.port)
+        else:
+            result = config_apply.reload_config(args.target, args.config, args.restart_command,
+                                                port=args.port)
+    except (OSError, config_apply.ConfigError, unbound_control.ControlError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    print(config_apply.format_result(result))
+    return 0
+
+
+def cmd_logs(args):
+    from . import log_analyzer
+
+    try:
+        if args.follow:
+            report = lambda stats: print(log_analyzer.format_summary(stats, args.top) + "\n", flush=True)
+            try:
+                stats = log_analyzer.follow(args.logs[0], log_analyzer.LogStats(args.capacity),
+                                            from_start=args.from_start, report=report,
+                                            report_every=args.interval)
+            except KeyboardInterrupt:
+                return 0
+        else:
+            stats = log_analyzer.analyze(args.logs, args.jobs, args.capacity)
+    except OSError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(stats.as_dict(args.top), indent=2))
+    else:
+        print(log_analyzer.format_summary(stats, args.top))
+    return 0
+
+
+def cmd_cache_advisor(args):
+    from . import cache_advisor, cache_profiler, stats, unbound_control
+
+    settings = cache_profiler.read_cache_settings(args.config)
+    try:
+        sizes = cache_advisor.EntrySizes()
+        if args.calibrate:
+            sizes = cache_advisor.EntrySizes.from_stats(stats.parse_stats(stats.fetch_stats(args.config)))
+        simulator = cache_advisor.simulator_for(settings, max_keys=args.max_keys, ttl=args.ttl,
+                                                prefetch=args.prefetch, serve_expired=args.serve_expired)
+        curve = cache_advisor.simulate(args.traces, simulator, args.qps or cache_advisor.DEFAULT_QPS)
+    except (OSError, ValueError, unbound_control.ControlError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    advice = cache_advisor.recommend(curve, args.target, sizes)
+    configured = cache_advisor.current(curve, settings, sizes) if args.config else None
+    if args.json:
+        print(json.dumps({"curve": curve.as_dict(), "recommended": advice, "configured": configured,
+                          "entry_bytes": vars(sizes)}, indent=2))
+    else:
+        print(cache_advisor.format_report(curve, advice, configured, sizes))
+    return 0 if curve.references else 1
+
+
+def cmd_exporter(args):
+    import asyncio
+
+    from . import exporter
+
+    listen = args.listen or exporter.DEFAULT_LISTEN
+    ttl = exporter.DEFAULT_TTL if args.cache_ttl is None else args.cache_ttl
+    metrics = exporter.Exporter(ttl=ttl, config=args.config)
+    ready = lambda server: print(f"Serving /metrics on {listen}", flush=True)
+    try:
+        asyncio.run(exporter.serve(metrics, listen, ready))
+    except OSError as e:
+        print(f"ERROR: cannot listen on {listen}: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_config(args):
+    from . import config_gen
+
+    return config_gen.run(args)
+
+
+def cmd_preflight(args):
+    from . import preflight
+
+    return preflight.run(args)
+
+
+def cmd_chaos(args):
+    from . import chaos
+
+    return chaos.run(args)
+
+
+def cmd_autotune(args):
+    from . import autotune
+
+    return autotune.run(args)
+
+
+def cmd_blocklist(args):
+    from . import blocklist
+
+    return blocklist.run(args)
+
+
+def cmd_config_edit(args):
+    from . import config_model
+
+    return config_model.run(args)
+
+
+def cmd_gui(args):
+    try:
+        from . import gui
+    except ImportError as e:
+        print(f"ERROR: the GUI needs tkinter ({e}); the other commands work without it", file=sys.stderr)
+        return 1
+    try:
+        gui.main()
+    except gui.tk.TclError as e:
+        print(f"ERROR: cannot open a window: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def build_parser(commands=None):
+    """Build the parser, setting up arguments only for `commands` (default: all of them).
+
+    Some subcommands take choices and defaults from their feature module, and importing
+    those modules costs more than the rest of startup, so main() only sets up the one it runs.
+    """
+    wanted = lambda name: commands is None or name in commands
+    parser = argparse.ArgumentParser(prog="unbound-dns", description="Unbound DNS management tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    status = sub.add_parser("status", help="Show whether Unbound is running and who owns port 53")
+    status.add_argument("--proc-root", default="/proc", help=argparse.SUPPRESS)
+    status.set_defaults(func=cmd_status)
+
+    test = sub.add_parser("test", help="Resolve domains concurrently and report per-query RTT")
+    test.add_argument("domains", nargs="*")
+    test.add_argument("-s", "--server", action="append",
+                      help="DNS server to query (repeatable, default 127.0.0.1)")
+    test.add_argument("-p", "--port", type=int, default=53)
+    test.add_argument("-t", "--qtype", default="A")
+    test.add_argument("--timeout", type=float, default=3.0)
+    test.set_defaults(func=cmd_test)
+
+    bench = sub.add_parser("benchmark", aliases=["bench"], help="Replay queries against a resolver and report QPS/latency")
+    bench.add_argument("domains", nargs="*")
+    bench.add_argument("-s", "--server", default="127.0.0.1")
+    bench.add_argument("-p", "--port", type=int, default=53)
+    source = bench.add_mutually_exclusive_group()
+    source.add_argument("-f", "--queries", help="File with one 'name [type]' per line")
+    source.add_argument("--pcap", help="Replay the DNS queries found in a pcap capture")
+    load = bench.add_mutually_exclusive_group()
+    load.add_argument("-Q", "--qps", type=float, help="Open-loop target queries per second")
+    load.add_argument("-c", "--concurrency", type=int, default=10,
+                      help="Closed-loop number of queries in flight (default 10)")
+    bench.add_argument("-d", "--duration", type=float, default=10.0)
+    bench.add_argument("-n", "--count", type=int, help="Stop after sending this many queries")
+    bench.add_argument("--timeout", type=float, default=2.0)
+    bench.add_argument("--json", action="store_true")
+    bench.add_argument("--fake", action="store_true",
+                       help="Run against the bundled fake responder instead of --server")
+    bench.add_argument("--fake-delay-ms", type=float, default=0.0)
+    bench.add_argument("--fake-drop", type=float, default=0.0)
+    bench.add_argument("--fake-rcode", type=int, default=0)
+    bench.set_defaults(func=cmd_benchmark)
+
+    profile = sub.add_parser("profile-cache",
+                             help="Query domains cold then warm and report what the cache buys")
+    profile.add_argument("domains", nargs="*")
+    profile.add_argument("-s", "--server", default="127.0.0.1")
+    profile.add_argument("-p", "--port", type=int, default=53)
+    profile.add_argument("-t", "--qtype", default="A")
+    profile.add_argument("--timeout", type=float, default=5.0)
+    profile.add_argument("--flush", action="store_true",
+                         help="Run 'unbound-control flush_zone' on each domain first")
+    profile.add_argument("--config", help="unbound.conf to record cache settings from")
+    profile.add_argument("-o", "--output", help="JSON file to write (default ~/.unbound_cache_profiles)")
+    profile.add_argument("--no-save", action="store_true")
+    profile.add_argument("--compare", help="Earlier profile JSON to compare against")
+    profile.set_defaults(func=cmd_profile_cache)
+
+    stat = sub.add_parser("stats", help="Poll 'unbound-control stats_noreset' and print per-interval rates")
+    stat.add_argument("-i", "--interval", type=float, default=5.0)
+    stat.add_argument("-n", "--count", type=int, help="Number of intervals to print (default: forever)")
+    stat.add_argument("--config", help="unbound.conf passed to unbound-control -c")
+    stat.add_argument("--from-file", nargs="+", metavar="FILE",
+                      help="Replay saved stats_noreset outputs instead of polling")
+    stat.add_argument("--store", nargs="?", const="", metavar="DB",
+                      help="Also record every interval in the metrics store (default ~/.unbound_metrics/metrics.db)")
+    stat.set_defaults(func=cmd_stats)
+
+    history = sub.add_parser("history", help="Show or export QPS, hit-rate and latency trends from the metrics store")
+    if wanted("history"):
+        from . import metrics_store
+
+        history.add_argument("--db", default=str(metrics_store.DEFAULT_DB), help="Metrics store file")
+        history.add_argument("-s", "--since", default="24h", help="How far back to look, e.g. 90m, 24h, 7d")
+        history.add_argument("-r", "--rows", type=int, default=24, help="Rows to print")
+        history.add_argument("--csv", metavar="FILE", help="Export the stored rows as CSV instead of printing")
+        history.add_argument("--columns", metavar="FILE",
+                             help="Export the stored rows as a columnar float64 file (see metrics_store.read_columns)")
+        history.add_argument("--table", choices=["samples", "rollups"], default="samples",
+                             help="Export raw samples (last 24h) or 1-minute rollups (last 30 days)")
+    history.set_defaults(func=cmd_history)
+
+    hist = sub.add_parser("histogram", help="Record the extended-statistics recursion-time histogram, "
+                                            "show its CDF and compare tail latency between windows")
+    if wanted("histogram"):
+        from . import histogram
+
+        hist.add_argument("action", choices=["record", "show", "compare"])
+        hist.add_argument("-f", "--file", default=str(histogram.DEFAULT_FILE), help="Series file")
+        hist.add_argument("-i", "--interval", type=float, default=histogram.DEFAULT_INTERVAL,
+                          help="Seconds between samples when recording")
+        hist.add_argument("-n", "--count", type=int, help="Samples to record (default: forever)")
+        hist.add_argument("--config", help="unbound.conf passed to unbound-control -c")
+        hist.add_argument("-w", "--window", type=float, default=300.0,
+                          help="Seconds of the newest samples to show or compare")
+        hist.add_argument("--ago", type=float,
+                          help="Compare with the window this many seconds earlier (default: the previous window)")
+        hist.add_argument("--against", help="Compare with the newest window of another series file instead")
+        hist.add_argument("--threshold", type=float, default=histogram.REGRESSION_THRESHOLD,
+                          help="Flag percentiles that grew by more than this fraction")
+    hist.set_defaults(func=cmd_histogram)
+
+    ups = sub.add_parser("upstreams",
+                         help="Measure DNS-over-TLS upstreams and reorder or prune forward-addr lines")
+    ups.add_argument("--config", required=True, help="unbound.conf containing the forward-zone")
+    ups.add_argument("-u", "--upstream", action="append", default=[], metavar="ADDR@PORT#NAME",
+                     help="Measure these instead of the config's forward-addr lines")
+    ups.add_argument("-n", "--names", nargs="+", help="Domains to query (rotated per round)")
+    ups.add_argument("-r", "--rounds", type=int, default=5)
+    ups.add_argument("-i", "--interval", type=float, default=2.0)
+    ups.add_argument("--timeout", type=float, default=3.0)
+    ups.add_argument("--cafile", help="CA bundle for verifying upstream certificates")
+    ups.add_argument("--prune", action="store_true", help="Comment out slow or lossy upstreams")
+    ups.add_argument("--slow-factor", type=float, default=3.0,
+                     help="Prune upstreams slower than this multiple of the median RTT")
+    ups.add_argument("--max-loss", type=float, default=0.5)
+    ups.add_argument("--apply", action="store_true",
+                     help="Write the new order to --config (default: print a diff)")
+    ups.set_defaults(func=cmd_upstreams)
+
+    flush = sub.add_parser("flush", help="Flush part of Unbound's cache without restarting it",
+                           formatter_class=argparse.RawDescriptionHelpFormatter)
+    if wanted("flush"):
+        from . import cache_flush
+
+        flush.epilog = "\n".join(f"  {kind:<9} {spec.description}"
+                                 for kind, spec in cache_flush.FLUSH_KINDS.items())
+        flush.add_argument("kind", choices=list(cache_flush.FLUSH_KINDS))
+        flush.add_argument("name", nargs="?", help="Domain for the name, type and zone kinds")
+        flush.add_argument("-t", "--qtype", default="A", help="Record type for the type kind")
+        flush.add_argument("--config", help="unbound.conf passed to unbound-control -c")
+        flush.add_argument("--measure", action="store_true",
+                           help="Probe latency before and after the flush and show the difference")
+        flush.add_argument("--probe", nargs="+", help="Names to probe with --measure")
+        flush.add_argument("-s", "--server", default="127.0.0.1")
+        flush.add_argument("-p", "--port", type=int, default=53)
+    flush.set_defaults(func=cmd_flush)
+
+    fleet_cmd = sub.add_parser("fleet", help="Run status, stats, apply or flush on every host in an inventory, "
+                                             "several at a time")
+    if wanted("fleet"):
+        from . import cache_flush, fleet
+
+        fleet_cmd.add_argument("action", choices=fleet.ACTIONS)
+        fleet_cmd.add_argument("-i", "--inventory", required=True,
+                               help="One host per line: name [target=user@address] [port=22] [config=PATH] [sudo=no]")
+        fleet_cmd.add_argument("--host", action="append", help="Only this inventory host (repeatable)")
+        fleet_cmd.add_argument("-j", "--workers", type=int, default=fleet.DEFAULT_WORKERS,
+                               help="Hosts to work on at once")
+        fleet_cmd.add_argument("--transport", default="ssh",
+                               help=f"{', '.join(fleet.TRANSPORTS)} or module:Class (default: ssh)")
+        fleet_cmd.add_argument("--timeout", type=float, default=fleet.DEFAULT_TIMEOUT, help="Seconds per command")
+        fleet_cmd.add_argument("--max-failures", type=int,
+                               help="Skip hosts not yet started once this many have failed")
+        fleet_cmd.add_argument("-f", "--file", help="unbound.conf to install with apply")
+        fleet_cmd.add_argument("--kind", choices=list(cache_flush.FLUSH_KINDS), default="zone",
+                               help="What flush removes")
+        fleet_cmd.add_argument("--name", help="Domain for the name, type and zone flush kinds")
+        fleet_cmd.add_argument("-t", "--qtype", default="A", help="Record type for the type flush kind")
+    fleet_cmd.set_defaults(func=cmd_fleet)
+
+    cache = sub.add_parser("cache", help="Save/restore Unbound's cache across restarts and pre-resolve top names")
+    if wanted("cache"):
+        from . import cache_warmup
+
+        cache.add_argument("action", choices=["save", "load", "warm", "restart"])
+        cache.add_argument("-f", "--file", default=str(cache_warmup.DEFAULT_DUMP), help="Compressed cache dump")
+        cache.add_argument("--config", help="unbound.conf passed to unbound-control -c")
+        cache.add_argument("--max-age", type=float, default=cache_warmup.DEFAULT_MAX_AGE,
+                           help="Refuse to load dumps older than this many seconds (0 = no limit)")
+        cache.add_argument("--top", type=int, default=cache_warmup.DEFAULT_TOP_N,
+                           help="Pre-resolve this many of the most frequent names after restoring (0 = none)")
+        cache.add_argument("--names-from", nargs="+", metavar="FILE",
+                           help="Query logs or domain lists to rank names from "
+                                f"(default {cache_warmup.DEFAULT_TOP_FILE})")
+        cache.add_argument("-s", "--server", default="127.0.0.1")
+        cache.add_argument("-p", "--port", type=int, default=53)
+        cache.add_argument("--restart-command", help="Command that restarts Unbound (restart action)")
+    cache.set_defaults(func=cmd_cache)
+
+    apply = sub.add_parser("apply-config",
+                           help="Validate and install a config, then reload Unbound keeping its cache")
+    if wanted("apply-config"):
+        from . import config_apply
+
+        apply.add_argument("source", nargs="?",
+                           help="New config ('-' for stdin); omit to validate and reload --target as is")
+        apply.add_argument("--target", required=True, help="unbound.conf to replace")
+        apply.add_argument("--config", help="unbound.conf passed to unbound-control -c (default --target)")
+        apply.add_argument("--restart-command", help="Used when a change needs a restart "
+                                                     f"(default '{config_apply.default_restart_command()}')")
+        apply.add_argument("--force-restart", action="store_true")
+        apply.add_argument("-p", "--port", type=int, default=53, help="Port polled for readiness")
+    apply.set_defaults(func=cmd_apply_config)
+
+    logs = sub.add_parser("logs", help="Summarise log-queries/log-replies output: top names, clients, "
+                                       "types, rcodes and latency")
+    if wanted("logs"):
+        from . import log_analyzer
+
+        logs.add_argument("logs", nargs="+", metavar="LOG", help="Unbound logfile or syslog file (.gz allowed)")
+        logs.add_argument("-n", "--top", type=int, default=log_analyzer.DEFAULT_TOP_N)
+        logs.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                          help="Processes to split large files across")
+        logs.add_argument("--capacity", type=int, default=log_analyzer.DEFAULT_CAPACITY,
+                          help="Names and clients tracked exactly before counts become approximate")
+        logs.add_argument("-f", "--follow", action="store_true",
+                          help="Keep reading the first LOG as it grows and print a summary every --interval")
+        logs.add_argument("--from-start", action="store_true", help="With --follow, include existing lines")
+        logs.add_argument("-i", "--interval", type=float, default=10.0)
+        logs.add_argument("--json", action="store_true")
+    logs.set_defaults(func=cmd_logs)
+
+    # The advisor reads pcaps with the benchmark's decoder, which loads asyncio; its defaults are
+    # applied in cmd_cache_advisor and cache_advisor.simulator_for.
+    advisor = sub.add_parser("cache-advisor", help="Simulate a query trace to find the smallest msg/rrset "
+                                                   "cache sizes that reach a target hit rate")
+    advisor.add_argument("traces", nargs="+", metavar="TRACE",
+                         help="Query log (log-queries/log-replies), pcap, or 'name [type]' list; .gz allowed")
+    advisor.add_argument("-t", "--target", type=float,
+                         help="Hit rate to reach, e.g. 0.9 (default: within one point of the best possible)")
+    advisor.add_argument("--config", help="unbound.conf whose cache-min-ttl, cache-max-ttl, prefetch and "
+                                          "serve-expired are simulated, and whose cache sizes are compared")
+    advisor.add_argument("--ttl", type=int, help="TTL assumed for names without a reply in the trace (default 300)")
+    advisor.add_argument("--qps", type=float, help="Pace of traces without timestamps (default 1000)")
+    advisor.add_argument("--max-keys", type=int,
+                         help="Keys simulated before sampling gets sparser; bounds memory (default 16384)")
+    advisor.add_argument("--prefetch", action="store_true", default=None)
+    advisor.add_argument("--serve-expired", action="store_true", default=None)
+    advisor.add_argument("--calibrate", action="store_true",
+                         help="Measure bytes per cache entry from the running Unbound's stats")
+    advisor.add_argument("--json", action="store_true")
+    advisor.set_defaults(func=cmd_cache_advisor)
+
+    # Importing the exporter loads asyncio, so its defaults are applied in cmd_exporter instead.
+    export = sub.add_parser("exporter", help="Serve stats_noreset counters as Prometheus/OpenMetrics on /metrics")
+    export.add_argument("-l", "--listen", metavar="HOST:PORT", help="Address to serve on (default 127.0.0.1:9167)")
+    export.add_argument("--config", help="unbound.conf passed to unbound-control -c")
+    export.add_argument("--cache-ttl", type=float,
+                        help="Seconds a stats_noreset result answers scrapes before it is fetched again (default 5)")
+    export.set_defaults(func=cmd_exporter)
+
+    config = sub.add_parser("config", help="Generate unbound.conf sized for this host's CPUs, memory and fd limit")
+    if wanted("config"):
+        from . import config_gen
+
+        config_gen.add_arguments(config)
+    config.set_defaults(func=cmd_config)
+
+    check = sub.add_parser("preflight", help="Check socket buffer sysctls and fd limits against the config and "
+                                             "watch Unbound's UDP drops")
+    if wanted("preflight"):
+        from . import preflight
+
+        preflight.add_arguments(check)
+    check.set_defaults(func=cmd_preflight)
+
+    harness = sub.add_parser("chaos", help="Run Unbound against local upstreams while injecting latency, loss "
+                                           "and outages, and compare config variants")
+    if wanted("chaos"):
+        from . import chaos
+
+        chaos.add_arguments(harness)
+    harness.set_defaults(func=cmd_chaos)
+
+    tune = sub.add_parser("autotune", help="Benchmark a scratch Unbound over a grid of thread, slab and buffer "
+                                           "settings and write the best config")
+    if wanted("autotune"):
+        from . import autotune
+
+        autotune.add_arguments(tune)
+    tune.set_defaults(func=cmd_autotune)
+
+    block = sub.add_parser("blocklist", help="Compile hosts, adblock and domain lists into a deduplicated "
+                                             "local-zone include and apply the changes")
+    if wanted("blocklist"):
+        from . import blocklist
+
+        blocklist.add_arguments(block)
+    block.set_defaults(func=cmd_blocklist)
+
+    edit = sub.add_parser("config-edit", help="Read, search and patch unbound.conf together with the files it "
+                                              "includes")
+    if wanted("config-edit"):
+        from . import config_model
+
+        config_model.add_arguments(edit)
+    edit.set_defaults(func=cmd_config_edit)
+
+    gui = sub.add_parser("gui", help="Open the installer GUI (needs a display and tkinter)")
+    gui.set_defaults(func=cmd_gui)
+
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # The first positional argument names the subcommand; no top-level option takes a value.
+    command = next((arg for arg in argv if not arg.startswith("-")), None)
+    args = build_parser({command}).parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
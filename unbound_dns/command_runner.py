@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Run a command and stream its output line by line, with phase timings from [INFO] markers."""
+
+import os
+import queue
+import re
+import signal
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+MARKER = re.compile(r"^\[(INFO|WARN|ERROR|SUCCESS)\]\s*(.*)")
+
+DEFAULT_INACTIVITY_TIMEOUT = 300
+# Seconds between SIGTERM and SIGKILL when a command is cancelled or stalls.
+KILL_GRACE = 5
+
+
+@dataclass
+class Phase:
+    label: str
+    started: float
+    seconds: float = 0.0
+
+
+@dataclass
+class CommandResult:
+    returncode: int = None
+    timed_out: bool = False
+    cancelled: bool = False
+    seconds: float = 0.0
+    phases: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+
+def strip_ansi(text):
+    return ANSI_ESCAPE.sub("", text)
+
+
+def classify(stream, line):
+    match = MARKER.match(line)
+    if match:
+        return match.group(1)
+    return "STDERR" if stream == "stderr" else None
+
+
+class StreamingCommand:
+    def __init__(self, command, shell=True, inactivity_timeout=DEFAULT_INACTIVITY_TIMEOUT,
+                 env=None, cwd=None):
+        self.command = command
+        self.shell = shell
+        self.inactivity_timeout = inactivity_timeout
+        self.env = env
+        self.cwd = cwd
+        self.result = CommandResult()
+        self.process = None
+        self._killed_at = None
+        self._cancel = threading.Event()
+        self._queue = queue.SimpleQueue()
+
+    def _reader(self, pipe, stream):
+        try:
+            for line in iter(pipe.readline, ""):
+                self._queue.put((stream, line))
+        finally:
+            pipe.close()
+            self._queue.put((stream, None))
+
+    def cancel(self):
+        self._cancel.set()
+        self._kill()
+
+    def _signal(self, sig):
+        try:
+            os.killpg(self.process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _kill(self):
+        # The child leads its own process group, so this also reaches grandchildren that hold the
+        # pipes open, such as apt or dpkg under "sudo bash script"; sudo relays it to root's side.
+        if self.process and self._killed_at is None:
+            self._killed_at = time.monotonic()
+            self._signal(signal.SIGTERM)
+
+    def _start_phase(self, label, now):
+        self._end_phase(now)
+        self.result.phases.append(Phase(label, now))
+
+    def _end_phase(self, now):
+        if self.result.phases and not self.result.phases[-1].seconds:
+            phase = self.result.phases[-1]
+            phase.seconds = now - phase.started
+
+    def lines(self):
+        started = time.monotonic()
+        self.process = subprocess.Popen(
+            self.command, shell=self.shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, bufsize=1, errors="replace", env=self.env, cwd=self.cwd, start_new_session=True)
+        for pipe, stream in ((self.process.stdout, "stdout"), (self.process.stderr, "stderr")):
+            threading.Thread(target=self._reader, args=(pipe, stream), daemon=True).start()
+
+        open_streams = 2
+        last_output = started
+        while open_streams:
+            try:
+                stream, line = self._queue.get(timeout=0.25)
+            except queue.Empty:
+                if self._cancel.is_set():
+                    self.result.cancelled = True
+                    self._kill()
+                elif self.inactivity_timeout and time.monotonic() - last_output > self.inactivity_timeout:
+                    self.result.timed_out = True
+                    self._kill()
+                if self._killed_at is not None:
+                    waited = time.monotonic() - self._killed_at
+                    if waited > KILL_GRACE:
+                        self._signal(signal.SIGKILL)
+                    if waited > 2 * KILL_GRACE and self.process.poll() is not None:
+                        # Whatever still holds the pipes could not be signalled; stop waiting for it.
+                        break
+                continue
+            if line is None:
+                open_streams -= 1
+                continue
+            now = time.monotonic()
+            last_output = now
+            line = strip_ansi(line.rstrip("\n"))
+            kind = classify(stream, line)
+            if kind == "INFO":
+                self._start_phase(MARKER.match(line).group(2), now)
+            yield stream, line, kind
+
+        self.result.returncode = self.process.wait()
+        if self._cancel.is_set():
+            self.result.cancelled = True
+        now = time.monotonic()
+        self._end_phase(now)
+        self.result.seconds = now - started
+
+
+def format_phases(phases, limit=None):
+    ordered = sorted(phases, key=lambda p: p.seconds, reverse=True)[:limit] if limit else phases
+    return "\n".join(f"{p.seconds:8.2f}s  {p.label}" for p in ordered)
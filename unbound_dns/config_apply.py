@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""Validate, atomically install and hot-apply unbound.conf, measuring the resolution gap."""
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from . import status_probe
+from . import unbound_control
+
+# Sockets, privileges and the chroot are set up once at startup; a reload cannot change them.
+RESTART_OPTIONS = frozenset({
+    "interface", "port", "interface-automatic", "ip-transparent", "ip-freebind",
+    "do-ip4", "do-ip6", "do-udp", "do-tcp", "so-reuseport", "so-rcvbuf", "so-sndbuf",
+    "chroot", "username", "directory", "pidfile", "control-enable", "control-interface",
+    "control-port", "control-use-cert", "tls-port", "tls-service-key", "tls-service-pem",
+})
+
+COMMENT = re.compile(r"(^|\s)#.*")
+READY_NAME = "localhost"
+
+
+class ConfigError(Exception):
+    pass
+
+
+@dataclass
+class ApplyResult:
+    path: str
+    backup: str = None
+    changed: list = field(default_factory=list)
+    method: str = None
+    ready_seconds: float = None
+    gap_seconds: float = None
+    probes: int = 0
+    failed_probes: int = 0
+    # Why Unbound was restarted when the changed options alone did not need it.
+    reason: str = None
+
+
+def default_restart_command():
+    if sys.platform == "darwin":
+        return "sudo brew services restart unbound"
+    return "sudo systemctl restart unbound"
+
+
+def _entries(text):
+    clause = None
+    entries = Counter()
+    for line in text.splitlines():
+        stripped = COMMENT.sub("", line).strip()
+        if not stripped:
+            continue
+        key, _, value = stripped.partition(":")
+        if not line[0].isspace() and not value.strip():
+            clause = key.strip()
+            continue
+        entries[(clause, key.strip(), value.strip())] += 1
+    return entries
+
+
+def changed_options(old, new):
+    before, after = _entries(old or ""), _entries(new or "")
+    return sorted({key for _, key, _ in (before - after) + (after - before)})
+
+
+def needs_restart(changed):
+    return sorted(RESTART_OPTIONS.intersection(changed))
+
+
+def check_config(path, use_sudo=None):
+    if use_sudo is None:
+        use_sudo = unbound_control.default_use_sudo()
+    argv = (["sudo"] if use_sudo else []) + [shutil.which("unbound-checkconf") or "unbound-checkconf", path]
+    try:
+        result = subprocess.run(argv, capture_output=True, text=True, timeout=30)
+    except FileNotFoundError:
+        raise ConfigError("unbound-checkconf not found; is Unbound installed?")
+    except subprocess.TimeoutExpired:
+        raise ConfigError("unbound-checkconf timed out")
+    output = (result.stdout + result.stderr).strip()
+    if result.returncode != 0:
+        raise ConfigError(f"Configuration is invalid:\n{output}")
+    return output
+
+
+def _sudo(*argv):
+    result = subprocess.run(["sudo", *argv], capture_output=True, text=True, timeout=30)
+    if result.returncode != 0:
+        raise ConfigError(result.stderr.strip() or f"{' '.join(argv)} failed")
+
+
+def install_config(text, path, use_sudo=None, backup=True, check=True):
+    """Validate text as a temp file, back up path, then rename the temp file over it.
+
+    `check=False` skips the validation, for an included file that is not a config on its own.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    writable = os.access(directory, os.W_OK) and (not os.path.exists(path) or os.access(path, os.W_OK))
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_path = f"{path}.backup.{stamp}" if backup and os.path.exists(path) else None
+
+    # Same directory as the target so the final rename is atomic.
+    fd, temp = tempfile.mkstemp(prefix=".unbound.conf.", dir=directory if writable else None)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path) and writable:
+            shutil.copymode(path, temp)
+        else:
+            os.chmod(temp, 0o644)
+        if check:
+            check_config(temp, use_sudo)
+
+        if writable:
+            if backup_path:
+                shutil.copy2(path, backup_path)
+            os.replace(temp, path)
+        else:
+            if backup_path:
+                _sudo("cp", "-p", path, backup_path)
+            staged = f"{path}.new"
+            _sudo("cp", temp, staged)
+            _sudo("mv", "-f", staged, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return backup_path
+
+
+def _responds(server, port, timeout):
+    import asyncio
+
+    from . import dns_probe
+
+    result = asyncio.run(dns_probe.query(server, READY_NAME, "A", port, timeout))
+    return not result.error
+
+
+def wait_for_port(server="127.0.0.1", port=53, timeout=15.0, interval=0.05):
+    """Poll until a DNS query gets any answer; returns seconds waited or None on timeout."""
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if _responds(server, port, 0.25):
+            return time.monotonic() - started
+        time.sleep(interval)
+    return None
+
+
+def wait_for_stop(timeout=10.0, interval=0.05, proc_root="/proc"):
+    os_type = "macos" if sys.platform == "darwin" else "linux"
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if not status_probe.probe(os_type, proc_root).running:
+            return time.monotonic() - started
+        time.sleep(interval)
+    return None
+
+
+class GapMonitor:
+    """Probe the resolver continuously and report the longest stretch without an answer."""
+
+    def __init__(self, server="127.0.0.1", port=53, interval=0.05, timeout=0.25):
+        self.server = server
+        self.port = port
+        self.interval = interval
+        self.timeout = timeout
+        self.samples = []
+        self.started = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gap-monitor", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            ok = _responds(self.server, self.port, self.timeout)
+            self.samples.append((time.monotonic(), ok))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self, tail=0.2):
+        time.sleep(tail)
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def failed(self):
+        return sum(not ok for _, ok in self.samples)
+
+    def longest_gap(self):
+        gap = 0.0
+        last_ok = self.started
+        failing = False
+        for timestamp, ok in self.samples:
+            if ok:
+                if failing:
+                    gap = max(gap, timestamp - last_ok)
+                last_ok, failing = timestamp, False
+            else:
+                failing = True
+        if failing:
+            gap = max(gap, self.samples[-1][0] - last_ok)
+        return gap
+
+
+def control_responds(config=None, use_sudo=None):
+    try:
+        return unbound_control.run_control("status", config=config, use_sudo=use_sudo).ok
+    except unbound_control.ControlError:
+        return False
+
+
+def process_running():
+    os_type = "macos" if sys.platform == "darwin" else "linux"
+    return status_probe.probe(os_type).running
+
+
+def is_running(config=None, use_sudo=None):
+    """True when unbound-control reaches Unbound or, failing that, an unbound process exists."""
+    return control_responds(config, use_sudo) or process_running()
+
+
+def _run_restart(restart):
+    if callable(restart):
+        return restart()
+    return subprocess.run(restart or default_restart_command(), shell=True).returncode == 0
+
+
+def transition(result, restart_required, config=None, restart=None, use_sudo=None,
+               server="127.0.0.1", port=53, ready_timeout=15.0):
+    monitor = GapMonitor(server, port).start()
+    try:
+        if restart_required:
+            result.method = "restart"
+            if not _run_restart(restart):
+                raise ConfigError("Restart command failed")
+        else:
+            result.method = "reload_keep_cache"
+            reload = unbound_control.run_control("reload_keep_cache", config=config, use_sudo=use_sudo)
+            if not reload.ok:
+                # Older Unbound releases only have a plain reload, which also drops the cache.
+                if "unknown command" not in reload.output.lower():
+                    raise ConfigError(f"unbound-control reload_keep_cache failed: {reload.output}")
+                result.method = "reload"
+                unbound_control.control("reload", config=config, use_sudo=use_sudo)
+        result.ready_seconds = wait_for_port(server, port, ready_timeout)
+    finally:
+        monitor.stop()
+    result.probes = len(monitor.samples)
+    result.failed_probes = monitor.failed
+    result.gap_seconds = monitor.longest_gap()
+    if result.ready_seconds is None:
+        raise ConfigError(f"Unbound did not answer on {server}:{port} within {ready_timeout:g}s")
+    return result
+
+
+def activate(result, restart_required, config=None, restart=None, use_sudo=None,
+             server="127.0.0.1", port=53, ready_timeout=15.0):
+    """Move a running Unbound onto the config just installed; a stopped one is left for its next start."""
+    control = control_responds(config, use_sudo)
+    if not control:
+        if not process_running():
+            return result
+        # Unbound is up but unbound-control can't reach it (no remote-control, permissions,
+        # certificates), so the only way onto the new config is the restart command.
+        result.reason = "unbound-control could not reach Unbound"
+    return transition(result, restart_required or not control, config, restart, use_sudo, server, port,
+                      ready_timeout)
+
+
+def apply_config(text, path, config=None, restart=None, use_sudo=None, server="127.0.0.1",
+                 port=53, force_restart=False, ready_timeout=15.0):
+    current = None
+    if os.path.exists(path):
+        with open(path) as f:
+            current = f.read()
+    result = ApplyResult(path)
+    result.changed = changed_options(current, text)
+    if current == text and not force_restart:
+        return result
+
+    result.backup = install_config(text, path, use_sudo)
+    return activate(result, force_restart or bool(needs_restart(result.changed)), config or path,
+                    restart, use_sudo, server, port, ready_timeout)
+
+
+def reload_config(path, config=None, restart=None, use_sudo=None, server="127.0.0.1", port=53):
+    check_config(path, use_sudo)
+    return transition(ApplyResult(path), False, config or path, restart, use_sudo, server, port)
+
+
+def format_result(result):
+    if not result.changed and result.method is None:
+        return f"{result.path} unchanged"
+    lines = []
+    if result.changed:
+        lines.append(f"Changed options: {', '.join(result.changed)}")
+    if result.backup:
+        lines.append(f"Backup: {result.backup}")
+    if result.method is None:
+        lines.append(f"Installed {result.path}; Unbound is not running, so it will be used on next start")
+        return "\n".join(lines)
+    restart = needs_restart(result.changed)
+    how = result.method
+    if result.method == "restart" and restart:
+        how = f"restart (needed for {', '.join(restart)})"
+    elif result.method == "restart" and result.reason:
+        how = f"restart ({result.reason})"
+    lines.append(f"Applied with {how}; answering again after {result.ready_seconds:.2f}s")
+    lines.append(f"Resolution gap: {result.gap_seconds * 1000:.0f}ms "
+                 f"({result.failed_probes}/{result.probes} probes unanswered)")
+    return "\n".join(lines)
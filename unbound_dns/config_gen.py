@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""Generate unbound.conf with threads, slabs, caches and socket limits sized for this host."""
+
+import argparse
+import difflib
+import os
+import platform
+import resource
+import subprocess
+import sys
+from dataclasses import dataclass
+
+MB = 1024 * 1024
+
+PROFILES = ("default", "high-performance", "low-memory")
+
+MAX_OUTGOING_RANGE = 8192
+FD_RESERVE = 256
+# DNSKEY and DS sets of the zones being validated. These are a few KB per zone and don't grow
+# with query volume like the message and RRset caches, so each profile gets a fixed amount.
+# Unbound's own default is 4m.
+KEY_CACHE = {"default": 16 * MB, "high-performance": 64 * MB, "low-memory": 4 * MB}
+# A local socket instead of TCP: Unbound makes it mode 0660, owned by root and the unbound
+# user's group, so only those can flush, dump or reconfigure the resolver.
+CONTROL_INTERFACE = "/var/run/unbound.ctl" if platform.system() == "Darwin" else "/run/unbound.ctl"
+
+
+@dataclass
+class Hardware:
+    cpus: int
+    memory_total: int
+    memory_available: int
+    fd_soft: int
+    fd_hard: int
+
+
+def _meminfo():
+    values = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            values[key] = int(rest.split()[0]) * 1024
+    return values.get("MemTotal", 0), values.get("MemAvailable", values.get("MemFree", 0))
+
+
+def _sysctl_memory():
+    result = subprocess.run(["sysctl", "-n", "hw.memsize"], capture_output=True, text=True, timeout=5)
+    total = int(result.stdout.strip())
+    return total, total // 2
+
+
+def detect_hardware():
+    try:
+        total, available = _meminfo() if platform.system() == "Linux" else _sysctl_memory()
+    except (OSError, ValueError, subprocess.SubprocessError):
+        total = available = 0
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    unlimited = 1 << 20
+    return Hardware(
+        cpus=os.cpu_count() or 1,
+        memory_total=total,
+        memory_available=available or total,
+        fd_soft=unlimited if soft == resource.RLIM_INFINITY else soft,
+        fd_hard=unlimited if hard == resource.RLIM_INFINITY else hard,
+    )
+
+
+def power_of_two_at_least(n):
+    power = 1
+    while power < n:
+        power *= 2
+    return power
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def _size(nbytes):
+    return f"{max(1, nbytes // MB)}m"
+
+
+def parse_size(text):
+    """Bytes in an unbound.conf size option: plain bytes or a k, m or g suffix."""
+    text = str(text).strip().lower()
+    units = {"k": 1024, "m": MB, "g": 1024 * MB}
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def tune(hw, profile="default", extended_statistics=False):
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile {profile!r}; choose from {', '.join(PROFILES)}")
+
+    if profile == "low-memory":
+        threads = 1
+        msg = 25 * MB
+        neg = 4 * MB
+    else:
+        threads = max(1, hw.cpus)
+        available = hw.memory_available or 1024 * MB
+        if profile == "high-performance":
+            msg = _clamp(available // 16, 128 * MB, 4096 * MB)
+            neg = 32 * MB
+        else:
+            msg = _clamp(available // 64, 50 * MB, 256 * MB)
+            neg = 10 * MB
+    rrset = 2 * msg
+    key = KEY_CACHE[profile]
+
+    # Caches grow on demand up to these limits. Keep them within half of the available memory,
+    # so that a busy resolver whose caches fill up doesn't push the host into swap.
+    budget = (hw.memory_available or 0) // 2
+    total = rrset + msg + key + neg
+    if budget and total > budget:
+        scale = budget / total
+        msg = max(4 * MB, int(msg * scale))
+        rrset = 2 * msg
+        key = max(4 * MB, int(key * scale))
+        neg = max(1 * MB, int(neg * scale))
+
+    # Unbound raises its own descriptor limit up to the hard limit when started as root.
+    fd_budget = max(hw.fd_hard, hw.fd_soft) - FD_RESERVE
+    outgoing = _clamp(fd_budget // threads, 64, MAX_OUTGOING_RANGE)
+    if profile == "low-memory":
+        outgoing = min(outgoing, 1024)
+    slabs = power_of_two_at_least(threads)
+
+    return {
+        "num-threads": threads,
+        "msg-cache-slabs": slabs,
+        "rrset-cache-slabs": slabs,
+        "infra-cache-slabs": slabs,
+        "key-cache-slabs": slabs,
+        "rrset-cache-size": _size(rrset),
+        "msg-cache-size": _size(msg),
+        "key-cache-size": _size(key),
+        "neg-cache-size": _size(neg),
+        "outgoing-range": outgoing,
+        "num-queries-per-thread": outgoing // 2,
+        "so-reuseport": "yes" if threads > 1 else "no",
+        # The recursion-time histogram and per-type/rcode counters; cumulative keeps other
+        # "unbound-control stats" callers from resetting the counters the histogram is built from.
+        "extended-statistics": "yes" if extended_statistics else "no",
+        "statistics-cumulative": "yes" if extended_statistics else "no",
+        "control-interface": CONTROL_INTERFACE,
+    }
+
+
+CONFIG_TEMPLATE = """server:
+    verbosity: 1
+    interface: 127.0.0.1
+    interface: ::1
+    port: 53
+
+    do-ip4: yes
+    do-ip6: yes
+    do-udp: yes
+    do-tcp: yes
+
+    access-control: 127.0.0.0/8 allow
+    access-control: ::1 allow
+    access-control: 0.0.0.0/0 refuse
+    access-control: ::/0 refuse
+
+    hide-identity: yes
+    hide-version: yes
+    harden-glue: yes
+    harden-dnssec-stripped: yes
+    harden-referral-path: yes
+    harden-algo-downgrade: yes
+
+    use-caps-for-id: yes
+    qname-minimisation: yes
+
+    cache-min-ttl: 3600
+    cache-max-ttl: 86400
+    prefetch: yes
+    prefetch-key: yes
+
+    serve-expired: yes
+    serve-expired-ttl: 86400
+    serve-expired-client-timeout: 1800
+
+    rrset-cache-size: {rrset-cache-size}
+    msg-cache-size: {msg-cache-size}
+    key-cache-size: {key-cache-size}
+    neg-cache-size: {neg-cache-size}
+
+    num-threads: {num-threads}
+    msg-cache-slabs: {msg-cache-slabs}
+    rrset-cache-slabs: {rrset-cache-slabs}
+    infra-cache-slabs: {infra-cache-slabs}
+    key-cache-slabs: {key-cache-slabs}
+
+    outgoing-range: {outgoing-range}
+    num-queries-per-thread: {num-queries-per-thread}
+    so-reuseport: {so-reuseport}
+    so-rcvbuf: 4m
+    so-sndbuf: 4m
+
+    edns-buffer-size: 1232
+
+    unwanted-reply-threshold: 10000
+    do-not-query-localhost: no
+
+    val-clean-additional: yes
+
+    logfile: ""
+    use-syslog: yes
+    log-queries: no
+    log-replies: no
+
+    extended-statistics: {extended-statistics}
+    statistics-cumulative: {statistics-cumulative}
+
+remote-control:
+    control-enable: yes
+    control-interface: {control-interface}
+
+forward-zone:
+    name: "."
+
+    forward-tls-upstream: yes
+    forward-first: no
+
+    forward-addr: 1.1.1.1@853#cloudflare-dns.com
+    forward-addr: 1.0.0.1@853#cloudflare-dns.com
+
+    forward-addr: 9.9.9.9@853#dns.quad9.net
+    forward-addr: 149.112.112.112@853#dns.quad9.net
+
+    forward-addr: 8.8.8.8@853#dns.google
+    forward-addr: 8.8.4.4@853#dns.google
+"""
+
+
+def render_config(settings):
+    text = CONFIG_TEMPLATE
+    for key, value in settings.items():
+        text = text.replace("{" + key + "}", str(value))
+    return text
+
+
+def generate(profile="default", hw=None, extended_statistics=False):
+    return render_config(tune(hw or detect_hardware(), profile, extended_statistics))
+
+
+def diff_config(old_text, new_text, old_name="current", new_name="generated"):
+    return "".join(difflib.unified_diff(old_text.splitlines(True), new_text.splitlines(True),
+                                        old_name, new_name))
+
+
+def describe_hardware(hw):
+    return (f"{hw.cpus} CPUs, {hw.memory_available // MB} MB of {hw.memory_total // MB} MB memory available, "
+            f"file descriptors {hw.fd_soft} soft / {hw.fd_hard} hard")
+
+
+def add_arguments(parser):
+    parser.add_argument("--profile", choices=PROFILES, default="default")
+    parser.add_argument("-o", "--output", help="Write the config here instead of stdout")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print a diff against --output (or --against) instead of writing")
+    parser.add_argument("--against", help="Existing config to diff against in --dry-run mode")
+    parser.add_argument("--extended-statistics", action="store_true",
+                        help="Enable extended-statistics and statistics-cumulative (recursion-time histogram)")
+    return parser
+
+
+def run(args):
+    hw = detect_hardware()
+    text = generate(args.profile, hw, args.extended_statistics)
+    print(f"# {describe_hardware(hw)}; profile {args.profile}", file=sys.stderr)
+
+    if args.dry_run:
+        target = args.against or args.output
+        old = ""
+        if target and os.path.exists(target):
+            with open(target) as f:
+                old = f.read()
+        sys.stdout.write(diff_config(old, text, target or "/dev/null", "generated") or "No changes\n")
+        return 0
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+def main(argv=None):
+    parser = add_arguments(argparse.ArgumentParser(description=__doc__))
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""Parsed unbound.conf with its includes: clauses, options and line numbers, refreshed and edited in place."""
+
+import argparse
+import glob
+import os
+import re
+import sys
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+from . import config_apply, control_socket, line_blocks, unbound_control
+
+CLAUSES = frozenset({"server", "remote-control", "forward-zone", "stub-zone", "auth-zone", "view", "python",
+                     "dynlib", "cachedb", "dnscrypt", "dnstap", "rpz", "ipset"})
+# Clauses that may repeat, told apart by their name: option.
+NAMED_CLAUSES = frozenset({"forward-zone", "stub-zone", "auth-zone", "view", "rpz"})
+# Options that add an entry each time they appear instead of replacing the earlier value.
+MULTI_VALUED = frozenset({
+    "interface", "outgoing-interface", "access-control", "access-control-tag", "access-control-view",
+    "private-address", "private-domain", "domain-insecure", "trust-anchor", "trust-anchor-file",
+    "auto-trust-anchor-file", "trusted-keys-file", "local-zone", "local-data", "local-data-ptr",
+    "local-zone-tag", "local-zone-override", "define-tag", "response-ip", "response-ip-data",
+    "ratelimit-for-domain", "ratelimit-below-domain", "caps-exempt", "tcp-connection-limit",
+    "forward-addr", "forward-host", "stub-addr", "stub-host", "primary", "master", "url", "allow-notify",
+    "python-script", "dynlib-file", "include", "include-toplevel",
+})
+INCLUDES = ("include", "include-toplevel")
+BLOCK_SIZE = 4 << 20
+INDENT = "    "
+
+# Start of every line that sets an option. A block where each line sets the same option (a
+# blocklist, say) is indexed as one span without splitting it into lines.
+OPTION_START = re.compile(rb"\n[ \t]*([A-Za-z][\w-]*):")
+
+
+@dataclass
+class Clause:
+    name: str
+    path: str
+    line: int
+    label: str = None
+    # Last line of the clause in its own file; new options go after it.
+    last: int = None
+
+
+@dataclass
+class Span:
+    """Lines start to stop - 1 of path, each setting the same option in the same clause."""
+    path: str
+    start: int
+    stop: int
+    clause: Clause
+
+
+@dataclass
+class Option:
+    clause: str
+    key: str
+    value: str
+    path: str
+    line: int
+    label: str = None
+
+
+@dataclass
+class Patch:
+    """Replace line `line` of path (old is what it must still say), remove it (new is None) or,
+    with old None, insert `new` before it."""
+    path: str
+    line: int
+    old: str = None
+    new: str = None
+
+
+@dataclass
+class ParsedFile:
+    path: str
+    stamp: tuple
+    # ("clause", name, line), ("include", key, pattern, line) and ("option", key, start, stop).
+    items: list = field(default_factory=list)
+    # (first line, byte offset, size) of each block, and the first lines alone for bisecting.
+    blocks: list = field(default_factory=list)
+    firsts: list = field(default_factory=list)
+    lines: int = 0
+
+
+def unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def split_line(text):
+    """(indent, key, value, comment) of an option line; the value keeps any quotes.
+
+    On a line that also opens its clause ("server: verbosity: 1") the header is part of the
+    indent, so a line rebuilt from these keeps it.
+    """
+    match = config_apply.COMMENT.search(text)
+    comment = text[match.start():] if match else ""
+    body = text[:len(text) - len(comment)].rstrip()
+    key, _, value = body.strip().partition(":")
+    if key.strip() in CLAUSES and ":" in value:
+        key, _, rest = value.lstrip().partition(":")
+        return body[:len(body) - len(value.lstrip())], key.strip(), rest.strip(), comment
+    return body[:len(body) - len(body.lstrip())], key.strip(), value.strip(), comment
+
+
+def _same_label(label, wanted):
+    return label is not None and label.rstrip(".") == wanted.rstrip(".")
+
+
+def _add_option(items, key, start, stop):
+    last = items[-1] if items else None
+    if last and last[0] == "option" and last[1] == key and last[3] == start:
+        items[-1] = ("option", key, last[2], stop)
+    else:
+        items.append(("option", key, start, stop))
+
+
+def _parse_lines(text, first, items):
+    for number, line in enumerate(text.split("\n"), first):
+        body = config_apply.COMMENT.sub("", line).strip()
+        if not body:
+            continue
+        key, _, value = body.partition(":")
+        key, value = key.strip(), value.strip()
+        if key in CLAUSES and (not value or ":" in value):
+            items.append(("clause", key, number))
+            if not value:
+                continue
+            # "server: verbosity: 1" opens the clause and sets an option on one line.
+            key, _, value = value.partition(":")
+            key, value = key.strip(), value.strip()
+        if key in INCLUDES:
+            items.append(("include", key, unquote(value), number))
+        else:
+            _add_option(items, key, number, number + 1)
+
+
+def parse_file(path):
+    """ParsedFile for one file, not following its includes."""
+    stat = os.stat(path)
+    parsed = ParsedFile(path, (stat.st_size, stat.st_mtime_ns))
+    line, offset = 1, 0
+    with open(path, "rb") as f:
+        for block in line_blocks.read(f, BLOCK_SIZE):
+            count = block.count(b"\n") + (not block.endswith(b"\n"))
+            parsed.blocks.append((line, offset, len(block)))
+            parsed.firsts.append(line)
+            keys = OPTION_START.findall(b"\n" + block)
+            key = keys[0].decode() if keys else None
+            if (len(keys) == count and keys.count(keys[0]) == count and key not in CLAUSES
+                    and key not in INCLUDES and key != "name"):
+                _add_option(parsed.items, key, line, line + count)
+            else:
+                _parse_lines(block.decode(errors="replace"), line, parsed.items)
+            line += count
+            offset += len(block)
+    parsed.lines = line - 1
+    return parsed
+
+
+def patch_text(text, patches):
+    """`text` with `patches` for its file applied; a line that no longer says `old` raises ValueError."""
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    inserts, edits = {}, {}
+    for patch in patches:
+        if patch.old is None:
+            inserts.setdefault(patch.line, []).append(patch.new)
+        else:
+            edits[patch.line] = patch
+    out = []
+    for number, line in enumerate(lines, 1):
+        out += inserts.get(number, [])
+        patch = edits.get(number)
+        if patch is None:
+            out.append(line)
+            continue
+        if patch.old != line:
+            raise ValueError(f"{patch.path}:{number} changed since it was read")
+        if patch.new is not None:
+            out.append(patch.new)
+    out += inserts.get(len(lines) + 1, [])
+    return "\n".join(out) + "\n" if out else ""
+
+
+def patch_keys(patches):
+    """Option names the patches add, change or remove."""
+    keys = set()
+    for patch in patches:
+        for text in (patch.old, patch.new):
+            for line in (text or "").split("\n"):
+                key = split_line(line)[1]
+                if key and key not in CLAUSES:
+                    keys.add(key)
+    return sorted(keys)
+
+
+class ConfigModel:
+    """unbound.conf and every file it includes, indexed by clause and option in the order Unbound reads them.
+
+    Each file is parsed once; refresh() stats the files and reparses only those whose size or
+    mtime changed. Values are read back from the files when asked for, a block at a time, so a
+    multi-hundred-MB include costs its block offsets and a span per run of identical options.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._parsed = {}
+        self._cache = None
+        self.refresh()
+
+    def refresh(self):
+        """Reparse the files that changed and rebuild the index; returns the paths reparsed."""
+        self.files, self.clauses, self.index, self.errors, self.changed = [], [], {}, [], []
+        self._walk(self.path, None, ())
+        for path in set(self._parsed) - set(self.files):
+            del self._parsed[path]
+        return self.changed
+
+    def _parse(self, path):
+        stat = os.stat(path)
+        parsed = self._parsed.get(path)
+        if parsed is None or parsed.stamp != (stat.st_size, stat.st_mtime_ns):
+            parsed = self._parsed[path] = parse_file(path)
+            self.changed.append(path)
+            self._cache = None
+        return parsed
+
+    def _resolve(self, pattern, path, line):
+        # Unbound resolves relative names against its working directory; for the model that is
+        # taken to be the directory of the main config.
+        full = os.path.join(os.path.dirname(self.path), os.path.expanduser(pattern))
+        if glob.has_magic(full):
+            return sorted(map(os.path.abspath, glob.glob(full)))
+        if not os.path.exists(full):
+            self.errors.append(f"{path}:{line}: included file {pattern} not found")
+            return []
+        return [os.path.abspath(full)]
+
+    def _walk(self, path, clause, stack):
+        if path in stack:
+            self.errors.append(f"{stack[-1]}: {path} includes itself")
+            return clause
+        try:
+            parsed = self._parse(path)
+        except OSError as e:
+            if not stack:
+                raise
+            self.errors.append(f"{stack[-1]}: {e}")
+            return clause
+        if path not in self.files:
+            self.files.append(path)
+        for item in parsed.items:
+            if item[0] == "clause":
+                clause = Clause(item[1], path, item[2], last=item[2])
+                self.clauses.append(clause)
+            elif item[0] == "include":
+                _, key, pattern, line = item
+                toplevel = key == "include-toplevel"
+                for child in self._resolve(pattern, path, line):
+                    clause = self._walk(child, None if toplevel else clause, stack + (path,))
+                # include-toplevel ends the clause it appears in.
+                clause = None if toplevel else clause
+            else:
+                _, key, start, stop = item
+                if clause is None:
+                    self.errors.append(f"{path}:{start}: {key} is outside any clause")
+                    continue
+                self.index.setdefault((clause.name, key), []).append(Span(path, start, stop, clause))
+                if key == "name" and clause.name in NAMED_CLAUSES:
+                    clause.label = unquote(split_line(self.line(path, start))[2])
+                if path == clause.path:
+                    clause.last = max(clause.last, stop - 1)
+        return clause
+
+    def file_lines(self, path):
+        return self._parsed[path].lines
+
+    def _block(self, parsed, index):
+        cache = self._cache
+        if cache is None or cache[:2] != (parsed.path, index):
+            first, offset, size = parsed.blocks[index]
+            with open(parsed.path, "rb") as f:
+                f.seek(offset)
+                lines = f.read(size).decode(errors="replace").split("\n")
+            if lines[-1] == "":
+                lines.pop()
+            cache = (parsed.path, index, lines)
+            self._cache = cache
+        return cache[2]
+
+    def lines(self, path, start, count):
+        """Up to `count` lines of `path` from line `start` (1-based), read only from the blocks holding them."""
+        parsed = self._parsed[path]
+        found = []
+        count = min(count, parsed.lines - start + 1)
+        while count > 0:
+            index = bisect_right(parsed.firsts, start) - 1
+            chunk = self._block(parsed, index)[start - parsed.firsts[index]:][:count]
+            found += chunk
+            start += len(chunk)
+            count -= len(chunk)
+        return found
+
+    def line(self, path, number):
+        return self.lines(path, number, 1)[0]
+
+    def spans(self, key, clause="server", label=None):
+        spans = self.index.get((clause, key), [])
+        if label is not None:
+            spans = [span for span in spans if _same_label(span.clause.label, label)]
+        return spans
+
+    def count(self, key, clause="server", label=None):
+        return sum(span.stop - span.start for span in self.spans(key, clause, label))
+
+    def options(self, key, clause="server", label=None, limit=None):
+        """Options setting `key`, in the order Unbound reads them (the first `limit` of them)."""
+        found = []
+        for span in self.spans(key, clause, label):
+            stop = span.stop if limit is None else min(span.stop, span.start + limit - len(found))
+            for number, text in enumerate(self.lines(span.path, span.start, stop - span.start), span.start):
+                found.append(Option(clause, key, unquote(split_line(text)[2]), span.path, number, span.clause.label))
+            if limit is not None and len(found) >= limit:
+                break
+        return found
+
+    def get(self, key, clause="server", label=None, default=None):
+        """The value Unbound uses for a single-valued option: the one it reads last."""
+        spans = self.spans(key, clause, label)
+        if not spans:
+            return default
+        return unquote(split_line(self.line(spans[-1].path, spans[-1].stop - 1))[2])
+
+    def clause(self, name, label=None):
+        """The last clause called `name` (with that name: for zones and views), or None."""
+        for clause in reversed(self.clauses):
+            if clause.name == name and (label is None or _same_label(clause.label, label)):
+                return clause
+        return None
+
+    def search(self, text, path=None, limit=1000):
+        """([(path, line)] of the first `limit` lines containing `text`, total matches), ignoring case.
+
+        Whole blocks are searched as bytes, so only matching lines cost Python work.
+        """
+        needle = text.lower().encode()
+        found, total = [], 0
+        for name in [path] if path else self.files:
+            parsed = self._parsed[name]
+            with open(name, "rb") as f:
+                for first, offset, size in parsed.blocks:
+                    f.seek(offset)
+                    data = f.read(size).lower()
+                    hits = data.count(needle)
+                    total += hits
+                    start, line = 0, first
+                    while hits and len(found) < limit:
+                        hit = data.find(needle, start)
+                        if hit < 0:
+                            break
+                        line += data.count(b"\n", start, hit)
+                        found.append((name, line))
+                        end = data.find(b"\n", hit)
+                        if end < 0:
+                            break
+                        start, line = end + 1, line + 1
+        return found, total
+
+    def set(self, key, value, clause="server", label=None):
+        """Patches giving `key` the value `value`: the line Unbound reads last is rewritten in place,
+        keeping its indent and comment; otherwise the option is added to the clause."""
+        spans = self.spans(key, clause, label)
+        if not spans:
+            return self.add(key, value, clause, label)
+        path, number = spans[-1].path, spans[-1].stop - 1
+        old = self.line(path, number)
+        indent, _, current, comment = split_line(old)
+        if unquote(current) == unquote(value):
+            return []
+        return [Patch(path, number, old, f"{indent}{key}: {value}{comment and ' ' + comment.lstrip()}")]
+
+    def add(self, key, value, clause="server", label=None):
+        """A patch adding `key: value` after the last option of the clause, or the clause itself
+        at the end of the main file."""
+        target = self.clause(clause, label)
+        if target is None:
+            name = f'{INDENT}name: "{label}"\n' if label is not None else ""
+            text = f"\n{clause}:\n{name}{INDENT}{key}: {value}"
+            return [Patch(self.path, self.file_lines(self.path) + 1, None, text)]
+        indent = split_line(self.line(target.path, target.last))[0] if target.last != target.line else ""
+        return [Patch(target.path, target.last + 1, None, f"{indent or INDENT}{key}: {value}")]
+
+    def unset(self, key, clause="server", label=None):
+        """Patches removing every line that sets `key`; a clause header on the same line is kept."""
+        return [Patch(span.path, number, text, split_line(text)[0].strip() or None)
+                for span in self.spans(key, clause, label)
+                for number, text in enumerate(self.lines(span.path, span.start, span.stop - span.start), span.start)]
+
+    def patched(self, patches):
+        """{path: new text} for each file the patches touch."""
+        texts = {}
+        for path in dict.fromkeys(patch.path for patch in patches):
+            with open(path) as f:
+                texts[path] = patch_text(f.read(), [patch for patch in patches if patch.path == path])
+        return texts
+
+
+def read_text_options(text):
+    """[(clause, label, key, value)] of config text, values as written, for comparing a generated config
+    with a model."""
+    items, entries = [], []
+    _parse_lines(text, 1, items)
+    lines = text.split("\n")
+    clause = label = None
+    for item in items:
+        if item[0] == "clause":
+            clause, label = item[1], None
+        elif item[0] == "option":
+            for number in range(item[2], item[3]):
+                value = split_line(lines[number - 1])[2]
+                if item[1] == "name" and clause in NAMED_CLAUSES:
+                    label = unquote(value)
+                else:
+                    entries.append((clause, label, item[1], value))
+    return entries
+
+
+def plan_generated(model, text):
+    """Patches bringing `model` in line with the generated config `text` without dropping anything
+    else: single-valued options are set in place, list options are added only where the clause has
+    none of that option yet, and a missing clause is appended whole."""
+    patches, grouped = [], {}
+    for clause, label, key, value in read_text_options(text):
+        grouped.setdefault((clause, label), {}).setdefault(key, []).append(value)
+    for (clause, label), options in grouped.items():
+        if model.clause(clause, label) is None:
+            name = f'{INDENT}name: "{label}"\n' if label is not None else ""
+            body = "".join(f"{INDENT}{key}: {value}\n" for key, values in options.items() for value in values)
+            text = f"\n{clause}:\n{name}{body}".rstrip("\n")
+            patches.append(Patch(model.path, model.file_lines(model.path) + 1, None, text))
+            continue
+        for key, values in options.items():
+            if key not in MULTI_VALUED:
+                patches += model.set(key, values[-1], clause, label)
+            elif not model.spans(key, clause, label):
+                for value in values:
+                    patches += model.add(key, value, clause, label)
+    return patches
+
+
+def _replace(path, text, use_sudo):
+    return config_apply.install_config(text, path, use_sudo, check=False)
+
+
+def apply_patches(model, patches, config=None, restart=None, use_sudo=None, server="127.0.0.1", port=53):
+    """Write the patched files and apply them like config_apply.apply_config.
+
+    Included files are replaced first, each with a backup. The main file then goes through
+    install_config, whose unbound-checkconf run covers the includes too (or is checked as is when
+    only includes changed); if that fails the included files are put back.
+    """
+    texts = model.patched(patches)
+    result = config_apply.ApplyResult(model.path, changed=patch_keys(patches))
+    if not texts:
+        return result
+    backups = {}
+    try:
+        for path, text in texts.items():
+            if path != model.path:
+                backups[path] = _replace(path, text, use_sudo)
+        if model.path in texts:
+            result.backup = config_apply.install_config(texts[model.path], model.path, use_sudo)
+        else:
+            config_apply.check_config(model.path, use_sudo)
+    except config_apply.ConfigError:
+        for path, backup in backups.items():
+            with open(backup) as f:
+                config_apply.install_config(f.read(), path, use_sudo, backup=False, check=False)
+        raise
+    result.backup = ", ".join(filter(None, [result.backup, *backups.values()])) or None
+    model.refresh()
+    return config_apply.activate(result, bool(config_apply.needs_restart(result.changed)), config or model.path,
+                                 restart, use_sudo, server, port)
+
+
+def format_patches(patches):
+    lines = []
+    for patch in patches:
+        lines.append(f"@@ {patch.path}:{patch.line}")
+        if patch.old is not None:
+            lines.append(f"-{patch.old}")
+        if patch.new is not None:
+            lines += [f"+{line}" for line in patch.new.split("\n")]
+    return "\n".join(lines)
+
+
+def format_summary(model):
+    lines = [f"{path}: {model.file_lines(path):,} lines" for path in model.files]
+    clauses = {}
+    for clause in model.clauses:
+        name = f"{clause.name} {clause.label}" if clause.label is not None else clause.name
+        clauses[name] = clauses.get(name, 0) + 1
+    options = sum(span.stop - span.start for spans in model.index.values() for span in spans)
+    lines.append(f"{options:,} options in {len(model.clauses)} clauses: "
+                 + ", ".join(f"{name} x{count}" if count > 1 else name for name, count in clauses.items()))
+    lines += [f"ERROR: {error}" for error in model.errors]
+    return "\n".join(lines)
+
+
+def _key_value(text):
+    key, sep, value = text.partition("=")
+    if not sep or not key:
+        raise ValueError(f"Expected KEY=VALUE, got {text!r}")
+    return key, value
+
+
+def add_arguments(parser):
+    parser.add_argument("--config", help="unbound.conf to read (default: the one unbound-control uses)")
+    parser.add_argument("--clause", default="server", help="Clause for --get, --set, --add and --unset")
+    parser.add_argument("--zone", help="name: of the forward-zone, stub-zone, auth-zone or view in --clause")
+    parser.add_argument("--get", action="append", default=[], metavar="KEY",
+                        help="Print where KEY is set and the value Unbound uses")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Change KEY where it is set, or add it to the clause")
+    parser.add_argument("--add", action="append", default=[], metavar="KEY=VALUE",
+                        help="Add another KEY line, for options that take a list")
+    parser.add_argument("--unset", action="append", default=[], metavar="KEY", help="Remove every KEY line")
+    parser.add_argument("--search", metavar="TEXT", help="Print the lines containing TEXT in every file")
+    parser.add_argument("--limit", type=int, default=50, help="Lines printed per --get or --search")
+    parser.add_argument("--apply", action="store_true",
+                        help="Install the patches and reload Unbound; without it they are only printed")
+    return parser
+
+
+def run(args):
+    path = args.config or control_socket.default_config()
+    if not path:
+        print("ERROR: No unbound.conf found; pass --config", file=sys.stderr)
+        return 1
+    try:
+        model = ConfigModel(path)
+        patches = []
+        for text in args.set:
+            patches += model.set(*_key_value(text), args.clause, args.zone)
+        for text in args.add:
+            patches += model.add(*_key_value(text), args.clause, args.zone)
+        for key in args.unset:
+            patches += model.unset(key, args.clause, args.zone)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    if args.search:
+        found, total = model.search(args.search, limit=args.limit)
+        for name, number in found:
+            print(f"{name}:{number}: {model.line(name, number).strip()}")
+        print(f"{total:,} matches")
+    for key in args.get:
+        options = model.options(key, args.clause, args.zone, limit=args.limit)
+        for option in options:
+            print(f"{option.path}:{option.line}: {key}: {option.value}")
+        count = model.count(key, args.clause, args.zone)
+        if not count:
+            print(f"{key} is not set in {args.clause}")
+        elif count > len(options):
+            print(f"... {count - len(options):,} more {key} lines")
+        if count > 1 and key not in MULTI_VALUED:
+            print(f"Unbound uses {key}: {model.get(key, args.clause, args.zone)}")
+
+    if patches:
+        print(format_patches(patches))
+        if not args.apply:
+            return 0
+        try:
+            result = apply_patches(model, patches)
+        except (OSError, ValueError, config_apply.ConfigError, unbound_control.ControlError) as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        print(config_apply.format_result(result))
+    elif args.set or args.add or args.unset:
+        print("No changes")
+    if not (args.search or args.get or args.set or args.add or args.unset):
+        print(format_summary(model))
+        return 1 if model.errors else 0
+    return 0
+
+
+def main(argv=None):
+    parser = add_arguments(argparse.ArgumentParser(description=__doc__))
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
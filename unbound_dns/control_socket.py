@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Speak Unbound's remote-control protocol directly instead of running unbound-control."""
+
+import os
+import shutil
+import socket
+import ssl
+from dataclasses import dataclass
+
+from .unbound_control import ControlError, ControlResult
+
+DEFAULT_PORT = 8953
+VERSION_PREFIX = b"UBCT1 "
+# These commands read their input up to an end-of-transmission line; load_cache stops at the dump's own EOF line.
+EOT_COMMANDS = {"local_zones", "local_zones_remove", "local_datas", "local_datas_remove",
+                "view_local_datas", "view_local_datas_remove"}
+END_OF_INPUT = b"\x04\n"
+# Once a command is on the wire, a failure must not fall back to unbound-control and run it twice.
+_SOCKET_ERRORS = (ConnectionError, socket.timeout, ssl.SSLError)
+
+
+@dataclass
+class Endpoint:
+    address: str = "127.0.0.1"
+    port: int = DEFAULT_PORT
+    use_cert: bool = True
+    server_cert: str = None
+    control_key: str = None
+    control_cert: str = None
+
+    @property
+    def is_unix(self):
+        return self.address.startswith("/")
+
+    @property
+    def tls(self):
+        # Unbound never uses TLS on a local socket, whatever control-use-cert says.
+        return self.use_cert and not self.is_unix
+
+    def usable(self):
+        """True when this process can talk to the socket itself, without sudo or unbound-control."""
+        if self.is_unix:
+            return os.access(self.address, os.R_OK | os.W_OK)
+        if not self.tls:
+            return True
+        return all(os.access(path, os.R_OK) for path in (self.server_cert, self.control_key, self.control_cert))
+
+    def __str__(self):
+        return self.address if self.is_unix else f"{self.address}@{self.port}"
+
+
+def default_config():
+    """unbound-control's own default: the config next to its install prefix, else /etc/unbound."""
+    candidates = []
+    binary = shutil.which("unbound-control")
+    if binary:
+        prefix = os.path.dirname(os.path.dirname(os.path.abspath(binary)))
+        candidates.append(os.path.join(prefix, "etc", "unbound", "unbound.conf"))
+    candidates.append("/etc/unbound/unbound.conf")
+    return next((path for path in candidates if os.path.exists(path)), None)
+
+
+def read_endpoint(config):
+    """Endpoint from the remote-control section of `config`, or None if remote control is off."""
+    try:
+        with open(config) as f:
+            text = f.read()
+    except OSError:
+        return None
+    settings = {}
+    section = None
+    for raw in text.splitlines():
+        line = raw.split("#", 1)[0].strip()
+        key, _, value = line.partition(":")
+        value = value.strip().strip('"')
+        if not line:
+            continue
+        if not value:
+            section = key.strip()
+        elif section == "remote-control":
+            # control-interface may repeat; unbound-control uses the first one.
+            settings.setdefault(key.strip(), value)
+    if settings.get("control-enable") != "yes":
+        return None
+
+    directory = os.path.dirname(os.path.abspath(config))
+    path = lambda key, default: os.path.join(directory, settings.get(key, default))
+    return Endpoint(settings.get("control-interface", "127.0.0.1"),
+                    int(settings.get("control-port", DEFAULT_PORT)),
+                    settings.get("control-use-cert", "yes") == "yes",
+                    path("server-cert-file", "unbound_server.pem"),
+                    path("control-key-file", "unbound_control.key"),
+                    path("control-cert-file", "unbound_control.pem"))
+
+
+class ControlClient:
+    """Unbound answers one command per connection, so what is kept between calls is the TLS
+    context (certificate loading dominates a handshake) and the session for resumption."""
+
+    def __init__(self, endpoint, timeout=10):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.connections = 0
+        self.resumed = 0
+        self._context = None
+        self._session = None
+
+    def context(self):
+        if self._context is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            # unbound-control-setup certificates name "unbound" only in the CN, which Python won't match.
+            context.check_hostname = False
+            context.load_verify_locations(self.endpoint.server_cert)
+            context.load_cert_chain(self.endpoint.control_cert, self.endpoint.control_key)
+            self._context = context
+        return self._context
+
+    def connect(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        if self.endpoint.is_unix:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            try:
+                sock.connect(self.endpoint.address)
+            except OSError:
+                sock.close()
+                raise
+        else:
+            sock = socket.create_connection((self.endpoint.address, self.endpoint.port), timeout)
+        if self.endpoint.tls:
+            try:
+                sock = self.context().wrap_socket(sock, session=self._session)
+            except OSError:
+                sock.close()
+                raise
+            self.resumed += sock.session_reused
+        self.connections += 1
+        return sock
+
+    def send(self, command, *args, data=None, timeout=None):
+        """Connect and send one command plus its input; the reply is read from the returned socket."""
+        sock = self.connect(timeout)
+        try:
+            sock.sendall(VERSION_PREFIX + " ".join([command, *map(str, args)]).encode() + b"\n")
+            if data is not None:
+                for chunk in data:
+                    sock.sendall(chunk)
+                if command in EOT_COMMANDS:
+                    sock.sendall(END_OF_INPUT)
+        except _SOCKET_ERRORS as e:
+            sock.close()
+            raise ControlError(f"unbound-control {command} failed: {e}") from e
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def _finish(self, sock):
+        if self.endpoint.tls and sock.session is not None:
+            self._session = sock.session
+        sock.close()
+
+    def _reply(self, command, sock):
+        try:
+            with sock.makefile("rb") as reply:
+                output = reply.read()
+        except _SOCKET_ERRORS as e:
+            raise ControlError(f"unbound-control {command} failed: {e}") from e
+        finally:
+            self._finish(sock)
+        output = output.decode(errors="replace").strip()
+        return ControlResult(command, not output.startswith("error"), output)
+
+    def _lines(self, command, sock):
+        try:
+            with sock.makefile("rb") as reply:
+                first = reply.readline()
+                if first.startswith(b"error"):
+                    detail = (first + reply.read()).decode(errors="replace").strip()
+                    raise ControlError(f"unbound-control {command} failed: {detail}")
+                if first:
+                    yield first
+                yield from reply
+        except _SOCKET_ERRORS as e:
+            raise ControlError(f"unbound-control {command} failed: {e}") from e
+        finally:
+            self._finish(sock)
+
+    def lines(self, command, *args, data=None, timeout=None):
+        """Send now and return an iterator over the reply's lines (bytes), for large output such as dump_cache."""
+        return self._lines(command, self.send(command, *args, data=data, timeout=timeout))
+
+    def run(self, command, *args, data=None, timeout=None):
+        return self._reply(command, self.send(command, *args, data=data, timeout=timeout))
+
+    def control(self, command, *args, **kwargs):
+        result = self.run(command, *args, **kwargs)
+        if not result.ok:
+            raise ControlError(f"unbound-control {command} failed: {result.output}")
+        return result.output
+
+    def pipeline(self, commands, timeout=None):
+        """Send every command before reading any reply, so Unbound works through them back to back.
+
+        `commands` holds (command, *args) tuples; returns one ControlResult per command, in order.
+        """
+        sockets = []
+        try:
+            for command, *args in commands:
+                sockets.append((command, self.send(command, *args, timeout=timeout)))
+        except BaseException:
+            for _, sock in sockets:
+                sock.close()
+            raise
+        results = []
+        try:
+            for command, sock in sockets:
+                results.append(self._reply(command, sock))
+        finally:
+            for _, sock in sockets[len(results) + 1:]:
+                sock.close()
+        return results
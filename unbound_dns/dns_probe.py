@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""Minimal asyncio DNS client used to time queries without forking dig."""
+
+import asyncio
+import random
+import socket
+import struct
+import time
+from dataclasses import dataclass, field
+
+QTYPES = {
+    "A": 1, "NS": 2, "CNAME": 5, "SOA": 6, "PTR": 12, "MX": 15, "TXT": 16,
+    "AAAA": 28, "SRV": 33, "OPT": 41, "DS": 43, "RRSIG": 46, "DNSKEY": 48,
+    "HTTPS": 65, "ANY": 255,
+}
+QTYPE_NAMES = {v: k for k, v in QTYPES.items()}
+
+RCODES = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED"}
+
+FLAG_QR = 0x8000
+FLAG_AA = 0x0400
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+FLAG_RA = 0x0080
+
+EDNS_PAYLOAD = 1232
+
+
+class DNSError(Exception):
+    pass
+
+
+@dataclass
+class Record:
+    name: str
+    rtype: str
+    ttl: int
+    data: str
+
+
+@dataclass
+class Message:
+    id: int
+    flags: int
+    rcode: int
+    question: tuple
+    answers: list = field(default_factory=list)
+
+    @property
+    def truncated(self):
+        return bool(self.flags & FLAG_TC)
+
+    @property
+    def rcode_name(self):
+        return RCODES.get(self.rcode, str(self.rcode))
+
+
+@dataclass
+class ProbeResult:
+    server: str
+    port: int
+    name: str
+    qtype: str
+    rtt_ns: int = 0
+    rcode: str = ""
+    answers: list = field(default_factory=list)
+    transport: str = "udp"
+    error: str = ""
+    timed_out: bool = False
+
+    @property
+    def ok(self):
+        return not self.error and self.rcode == "NOERROR" and bool(self.answers)
+
+    @property
+    def rtt_ms(self):
+        return self.rtt_ns / 1e6
+
+
+def qtype_code(qtype):
+    if isinstance(qtype, int):
+        return qtype
+    qtype = qtype.upper()
+    if qtype in QTYPES:
+        return QTYPES[qtype]
+    if qtype.startswith("TYPE") and qtype[4:].isdigit():
+        return int(qtype[4:])
+    raise DNSError(f"Unknown query type: {qtype}")
+
+
+def encode_name(name):
+    out = bytearray()
+    for label in name.rstrip(".").split("."):
+        if not label:
+            continue
+        try:
+            raw = label.encode("idna") if not label.isascii() else label.encode("ascii")
+        except UnicodeError:
+            raise DNSError(f"Invalid label in {name!r}") from None
+        if len(raw) > 63:
+            raise DNSError(f"Label too long in {name!r}")
+        out.append(len(raw))
+        out += raw
+    out.append(0)
+    if len(out) > 255:
+        raise DNSError(f"Name too long: {name!r}")
+    return bytes(out)
+
+
+def build_query(name, qtype="A", qid=None, rd=True, edns=True):
+    if qid is None:
+        qid = random.getrandbits(16)
+    flags = FLAG_RD if rd else 0
+    header = struct.pack("!HHHHHH", qid, flags, 1, 0, 0, 1 if edns else 0)
+    question = encode_name(name) + struct.pack("!HH", qtype_code(qtype), 1)
+    if edns:
+        question += b"\x00" + struct.pack("!HHIH", QTYPES["OPT"], EDNS_PAYLOAD, 0, 0)
+    return header + question
+
+
+def decode_name(data, offset):
+    labels = []
+    jumped = False
+    end = offset
+    hops = 0
+    while True:
+        if offset >= len(data):
+            raise DNSError("Name runs past end of message")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(data):
+                raise DNSError("Truncated compression pointer")
+            if not jumped:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            jumped = True
+            hops += 1
+            if hops > 64:
+                raise DNSError("Compression loop")
+            continue
+        if length == 0:
+            if not jumped:
+                end = offset + 1
+            break
+        offset += 1
+        labels.append(data[offset:offset + length].decode("ascii", "replace"))
+        offset += length
+    return ".".join(labels) + ".", end
+
+
+def _format_rdata(data, rtype, start, length):
+    rdata = data[start:start + length]
+    if rtype == 1 and length == 4:
+        return socket.inet_ntop(socket.AF_INET, rdata)
+    if rtype == 28 and length == 16:
+        return socket.inet_ntop(socket.AF_INET6, rdata)
+    if rtype in (2, 5, 12):
+        return decode_name(data, start)[0]
+    if rtype == 15:
+        if length < 3:
+            raise DNSError("Truncated MX rdata")
+        pref = struct.unpack("!H", rdata[:2])[0]
+        return f"{pref} {decode_name(data, start + 2)[0]}"
+    if rtype == 16:
+        parts, i = [], 0
+        while i < length:
+            n = rdata[i]
+            parts.append('"' + rdata[i + 1:i + 1 + n].decode("utf-8", "replace") + '"')
+            i += 1 + n
+        return " ".join(parts)
+    return rdata.hex()
+
+
+def parse_message(data):
+    if len(data) < 12:
+        raise DNSError("Message shorter than header")
+    qid, flags, qdcount, ancount, _nscount, _arcount = struct.unpack("!HHHHHH", data[:12])
+    offset = 12
+    question = ()
+    for _ in range(qdcount):
+        qname, offset = decode_name(data, offset)
+        if offset + 4 > len(data):
+            raise DNSError("Truncated question")
+        qtype, qclass = struct.unpack("!HH", data[offset:offset + 4])
+        offset += 4
+        question = (qname, qtype, qclass)
+
+    answers = []
+    for _ in range(ancount):
+        rname, offset = decode_name(data, offset)
+        if offset + 10 > len(data):
+            raise DNSError("Truncated resource record")
+        rtype, _rclass, ttl, rdlen = struct.unpack("!HHIH", data[offset:offset + 10])
+        offset += 10
+        if offset + rdlen > len(data):
+            raise DNSError("Truncated rdata")
+        answers.append(Record(rname, QTYPE_NAMES.get(rtype, f"TYPE{rtype}"), ttl,
+                              _format_rdata(data, rtype, offset, rdlen)))
+        offset += rdlen
+
+    return Message(qid, flags, flags & 0x000F, question, answers)
+
+
+class _UDPQuery(asyncio.DatagramProtocol):
+    def __init__(self, qid, future):
+        self.qid = qid
+        self.future = future
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        received = time.perf_counter_ns()
+        if len(data) >= 2 and struct.unpack("!H", data[:2])[0] == self.qid and not self.future.done():
+            self.future.set_result((data, received))
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+    def connection_lost(self, exc):
+        if exc and not self.future.done():
+            self.future.set_exception(exc)
+
+
+async def _query_udp(server, port, packet, qid, timeout):
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    family = socket.AF_INET6 if ":" in server else socket.AF_INET
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _UDPQuery(qid, future), remote_addr=(server, port), family=family)
+    try:
+        sent = time.perf_counter_ns()
+        transport.sendto(packet)
+        data, received = await asyncio.wait_for(future, timeout)
+        return data, received - sent
+    finally:
+        transport.close()
+
+
+async def _query_tcp(server, port, packet, timeout):
+    sent = time.perf_counter_ns()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(server, port), timeout)
+    try:
+        writer.write(struct.pack("!H", len(packet)) + packet)
+        await writer.drain()
+        length = struct.unpack("!H", await asyncio.wait_for(reader.readexactly(2), timeout))[0]
+        data = await asyncio.wait_for(reader.readexactly(length), timeout)
+        return data, time.perf_counter_ns() - sent
+    finally:
+        writer.close()
+
+
+async def query(server, name, qtype="A", port=53, timeout=3.0, tcp=False):
+    result = ProbeResult(server, port, name, str(qtype).upper())
+    qid = random.getrandbits(16)
+    try:
+        packet = build_query(name, qtype, qid)
+        if tcp:
+            result.transport = "tcp"
+            data, rtt = await _query_tcp(server, port, packet, timeout)
+        else:
+            data, rtt = await _query_udp(server, port, packet, qid, timeout)
+        message = parse_message(data)
+        if message.truncated and not tcp:
+            result.transport = "tcp"
+            data, tcp_rtt = await _query_tcp(server, port, packet, timeout)
+            rtt += tcp_rtt
+            message = parse_message(data)
+        result.rtt_ns = rtt
+        result.rcode = message.rcode_name
+        result.answers = message.answers
+    except asyncio.TimeoutError:
+        result.error = f"timeout after {timeout:g}s"
+        result.timed_out = True
+    except (OSError, DNSError, asyncio.IncompleteReadError) as e:
+        result.error = str(e) or e.__class__.__name__
+    return result
+
+
+async def probe_many(servers, names, qtype="A", port=53, timeout=3.0, concurrency=None):
+    semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+
+    async def one(server, name):
+        if semaphore is None:
+            return await query(server, name, qtype, port, timeout)
+        async with semaphore:
+            return await query(server, name, qtype, port, timeout)
+
+    return await asyncio.gather(*(one(s, n) for s in servers for n in names))
+
+
+def run_probes(servers, names, qtype="A", port=53, timeout=3.0, concurrency=None):
+    return asyncio.run(probe_many(servers, names, qtype, port, timeout, concurrency))
+
+
+def format_result(result):
+    target = f"@{result.server}" + (f":{result.port}" if result.port != 53 else "")
+    if result.error:
+        return f"{result.name} {target} {result.qtype} ERROR {result.error}"
+    values = ", ".join(r.data for r in result.answers if r.rtype == result.qtype) or \
+        ", ".join(r.data for r in result.answers)
+    return (f"{result.name} {target} {result.qtype} {result.rcode} "
+            f"{result.rtt_ms:.3f}ms {result.transport} {values}").rstrip()
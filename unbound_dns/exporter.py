@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""Serve 'unbound-control stats_noreset' as Prometheus/OpenMetrics on a small asyncio HTTP server."""
+
+import asyncio
+import gzip
+import re
+import time
+from dataclasses import dataclass
+
+from . import histogram
+from . import stats
+from . import unbound_control
+
+DEFAULT_LISTEN = "127.0.0.1:9167"
+DEFAULT_TTL = 5.0
+PREFIX = "unbound_"
+
+OPENMETRICS = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TEXT = "text/plain; version=0.0.4; charset=utf-8"
+
+# Per-thread keys ("thread0.num.queries"); the "total." copies are left to PromQL sums.
+THREAD_METRICS = {
+    "num.queries": ("queries", "counter", "Queries received"),
+    "num.queries_ip_ratelimited": ("queries_ip_ratelimited", "counter", "Queries dropped by ip-ratelimit"),
+    "num.cachehits": ("cache_hits", "counter", "Queries answered from the cache"),
+    "num.cachemiss": ("cache_misses", "counter", "Queries that needed recursion"),
+    "num.prefetch": ("prefetches", "counter", "Cache prefetches performed"),
+    "num.expired": ("expired_replies", "counter", "Replies served from expired cache entries"),
+    "num.recursivereplies": ("recursive_replies", "counter", "Replies sent after recursion"),
+    "requestlist.overwritten": ("request_list_overwritten", "counter",
+                                "Requests dropped from a full request list for newer ones"),
+    "requestlist.exceeded": ("request_list_exceeded", "counter", "Requests dropped because the list was full"),
+    "requestlist.avg": ("request_list_avg", "gauge", "Average request list length since the last reset"),
+    "requestlist.max": ("request_list_max", "gauge", "Longest request list since the last reset"),
+    "requestlist.current.all": ("request_list_current", "gauge", "Requests waiting for recursion now"),
+    "requestlist.current.user": ("request_list_current_user", "gauge",
+                                 "Client requests (not prefetches) waiting for recursion now"),
+    "recursion.time.avg": ("recursion_time_avg_seconds", "gauge", "Average recursion time since the last reset"),
+    "recursion.time.median": ("recursion_time_median_seconds", "gauge", "Median recursion time"),
+    "tcpusage": ("tcp_buffers_in_use", "gauge", "Incoming TCP buffers in use"),
+}
+
+# (key pattern, metric, type, help, label); group 1 of the pattern is the label value.
+PATTERNS = (
+    (r"num\.query\.type\.(.+)", "query_types", "counter", "Queries by type", "type"),
+    (r"num\.query\.class\.(.+)", "query_classes", "counter", "Queries by class", "class"),
+    (r"num\.query\.opcode\.(.+)", "query_opcodes", "counter", "Queries by opcode", "opcode"),
+    (r"num\.query\.flags\.(.+)", "query_flags", "counter", "Queries with each header flag set", "flag"),
+    (r"num\.query\.edns\.(.+)", "query_edns", "counter", "Queries with EDNS present or the DO bit set", "field"),
+    (r"num\.query\.(tcp|tcpout|tls|tls\.resume|ipv6|https|ratelimited|dnscrypt\.\w+)", "query_transport",
+     "counter", "Queries by transport or handling (tcpout counts upstream TCP queries)", "kind"),
+    (r"num\.answer\.rcode\.(.+)", "answer_rcodes", "counter", "Answers by response code", "rcode"),
+    (r"num\.answer\.(secure|bogus)", "answers_dnssec", "counter", "Answers that were DNSSEC secure or bogus",
+     "result"),
+    (r"num\.rrset\.(bogus)", "rrsets_dnssec", "counter", "RRsets marked bogus by the validator", "result"),
+    (r"unwanted\.(queries|replies)", "unwanted", "counter", "Refused queries and unsolicited replies", "kind"),
+    (r"mem\.(.+)", "memory_bytes", "gauge", "Memory in use", "component"),
+    (r"(\w+)\.cache\.count", "cache_entries", "gauge", "Entries in each cache", "cache"),
+    (r"time\.(up)", "uptime_seconds", "gauge", "Seconds since Unbound started", None),
+)
+_PATTERNS = tuple((re.compile(f"^{pattern}$"), *rest) for pattern, *rest in PATTERNS)
+_THREAD_KEY = re.compile(r"^thread(\d+)\.(.+)$")
+
+
+@dataclass
+class Snapshot:
+    taken: float
+    values: dict
+    seconds: float = 0.0
+    error: str = None
+
+
+class Family:
+    def __init__(self, name, kind, help):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.samples = []
+
+    def add(self, value, suffix="", **labels):
+        self.samples.append((suffix, labels, value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _le(seconds):
+    return f"{seconds:.6f}".rstrip("0").rstrip(".")
+
+
+def families(values):
+    """Group parsed stats_noreset values into metric families, in a stable order."""
+    found = {}
+
+    def family(metric, kind, help):
+        if metric not in found:
+            found[metric] = Family(PREFIX + metric, kind, help)
+        return found[metric]
+
+    for key, value in values.items():
+        match = _THREAD_KEY.match(key)
+        if match:
+            spec = THREAD_METRICS.get(match.group(2))
+            if spec:
+                family(*spec).add(value, thread=match.group(1))
+            continue
+        for pattern, metric, kind, help, label in _PATTERNS:
+            match = pattern.match(key)
+            if match:
+                family(metric, kind, help).add(value, **({label: match.group(1)} if label else {}))
+                break
+
+    buckets = histogram.buckets(values)
+    if buckets:
+        # Unbound reports per-bucket counts of recursive replies; Prometheus wants them cumulative.
+        response_time = family("response_time_seconds", "histogram", "Recursive reply time (extended-statistics)")
+        total = 0.0
+        for _, upper, count in buckets:
+            total += count
+            response_time.add(total, "_bucket", le=_le(upper))
+        response_time.add(total, "_bucket", le="+Inf")
+        response_time.add(total, "_count")
+        average = values.get("total.recursion.time.avg")
+        if average is not None:
+            response_time.add(average * values.get("total.num.recursivereplies", 0.0), "_sum")
+    return list(found.values())
+
+
+def render(metric_families, openmetrics=False):
+    lines = []
+    for f in metric_families:
+        # OpenMetrics names the counter family without _total; the 0.0.4 text format names the sample.
+        name = f.name + "_total" if f.kind == "counter" and not openmetrics else f.name
+        lines.append(f"# HELP {name} {f.help}")
+        lines.append(f"# TYPE {name} {f.kind}")
+        for suffix, labels, value in f.samples:
+            if f.kind == "counter":
+                suffix = suffix or "_total"
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{f.name}{suffix}{{{label_text}}} {_number(value)}" if label_text
+                         else f"{f.name}{suffix} {_number(value)}")
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class Exporter:
+    """Caches the last stats_noreset for `ttl` seconds; scrapes arriving during a fetch share it."""
+
+    def __init__(self, fetch=None, ttl=DEFAULT_TTL, config=None):
+        self.fetch = fetch or (lambda: stats.fetch_stats(config))
+        self.ttl = ttl
+        self.snapshot = None
+        self.scrapes = 0
+        self.control_calls = 0
+        self.control_errors = 0
+        self._pending = None
+
+    async def _refresh(self):
+        self.control_calls += 1
+        started = time.monotonic()
+        try:
+            text = await asyncio.get_running_loop().run_in_executor(None, self.fetch)
+            snapshot = Snapshot(time.monotonic(), stats.parse_stats(text))
+        except (OSError, unbound_control.ControlError) as e:
+            self.control_errors += 1
+            snapshot = Snapshot(time.monotonic(), {}, error=str(e))
+        snapshot.seconds = snapshot.taken - started
+        self.snapshot = snapshot
+        return snapshot
+
+    async def sample(self):
+        if self.snapshot and time.monotonic() - self.snapshot.taken < self.ttl:
+            return self.snapshot
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._refresh())
+            self._pending.add_done_callback(lambda _: setattr(self, "_pending", None))
+        return await asyncio.shield(self._pending)
+
+    async def metrics(self, openmetrics=False):
+        self.scrapes += 1
+        snapshot = await self.sample()
+        result = families(snapshot.values)
+        own = [
+            (Family(PREFIX + "up", "gauge", "Whether the last unbound-control stats_noreset succeeded"),
+             0 if snapshot.error else 1),
+            (Family(PREFIX + "exporter_control_seconds", "gauge", "Time the last stats_noreset took"),
+             snapshot.seconds),
+            (Family(PREFIX + "exporter_scrapes", "counter", "Scrapes served"), self.scrapes),
+            (Family(PREFIX + "exporter_control_calls", "counter", "stats_noreset calls made"),
+             self.control_calls),
+            (Family(PREFIX + "exporter_control_errors", "counter", "stats_noreset calls that failed"),
+             self.control_errors),
+        ]
+        for f, value in own:
+            f.add(value)
+            result.append(f)
+        return render(result, openmetrics)
+
+    async def handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            request, *header_lines = head.decode("latin-1").split("\r\n")
+            method, target, _ = request.split(" ", 2)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            writer.close()
+            return
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        path = target.split("?", 1)[0]
+        content_type = "text/plain; charset=utf-8"
+        if method not in ("GET", "HEAD"):
+            status, body = "405 Method Not Allowed", "Only GET is supported\n"
+        elif path == "/metrics":
+            openmetrics = "application/openmetrics-text" in headers.get("accept", "")
+            status, body = "200 OK", await self.metrics(openmetrics)
+            content_type = OPENMETRICS if openmetrics else PROMETHEUS_TEXT
+        elif path == "/":
+            status, body = "200 OK", "Unbound exporter: see /metrics\n"
+        else:
+            status, body = "404 Not Found", "Not found\n"
+
+        payload = body.encode()
+        extra = ""
+        if "gzip" in headers.get("accept-encoding", "") and len(payload) > 1024:
+            payload = gzip.compress(payload, 5)
+            extra = "Content-Encoding: gzip\r\n"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n{extra}"
+                     f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode())
+        if method != "HEAD":
+            writer.write(payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def start(self, host="127.0.0.1", port=9167):
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def parse_listen(listen):
+    host, _, port = listen.rpartition(":")
+    return host.strip("[]") or "0.0.0.0", int(port)
+
+
+async def serve(exporter, listen=DEFAULT_LISTEN, ready=None):
+    server = await exporter.start(*parse_listen(listen))
+    if ready:
+        ready(server)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Local stand-in for Unbound's remote-control socket, for exercising control_socket offline."""
+
+import argparse
+import asyncio
+import ssl
+
+from .control_socket import END_OF_INPUT, EOT_COMMANDS, VERSION_PREFIX
+from .fake_dns import server_context
+
+OK_COMMANDS = {"flush", "flush_type", "flush_bogus", "flush_negative", "flush_infra", "flush_requestlist",
+               "reload", "reload_keep_cache", "verbosity"}
+
+
+class FakeControlServer:
+    """Answers like Unbound: one command per connection, then the connection is closed.
+
+    `dump` is the dump_cache output: bytes, or a callable returning an iterable of lines for
+    dumps too large to hold in memory.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, path=None, tls=None, stats="", dump=b"EOF\n", delay=0.0):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.tls = tls
+        self.stats = stats
+        self.dump = dump
+        self.delay = delay
+        self.commands = []
+        self.loaded = []
+        self.connections = 0
+        self._server = None
+
+    async def start(self):
+        if self.path:
+            self._server = await asyncio.start_unix_server(self._handle, self.path)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port, ssl=self.tls)
+            self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _read_input(self, reader, last):
+        """Input lines up to and including `last`, or until the client stops sending."""
+        lines = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                return lines
+            lines.append(line)
+            if line == last:
+                return lines
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            line = await reader.readline()
+            if not line.startswith(VERSION_PREFIX):
+                writer.write(b"error version mismatch\n")
+                return
+            command, *args = line[len(VERSION_PREFIX):].decode().split()
+            self.commands.append(" ".join([command, *args]))
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            if command == "load_cache":
+                self.loaded = await self._read_input(reader, b"EOF\n")
+                writer.write(b"ok\n")
+            elif command in EOT_COMMANDS:
+                self.loaded = await self._read_input(reader, END_OF_INPUT)
+                writer.write(b"ok\n")
+            elif command == "dump_cache":
+                if callable(self.dump):
+                    for chunk in self.dump():
+                        writer.write(chunk)
+                        await writer.drain()
+                else:
+                    writer.write(self.dump)
+            elif command in ("stats", "stats_noreset"):
+                writer.write(self.stats.encode())
+            elif command == "status":
+                writer.write(b"version: 1.19.0\nverbosity: 1\nthreads: 2\nmodules: 2 [ validator iterator ]\n"
+                             b"uptime: 3600 seconds\nunbound (pid 4242) is running...\n")
+            elif command == "flush_zone":
+                writer.write(b"ok removed 3 rrsets, 2 messages and 0 key entries\n")
+            elif command in OK_COMMANDS:
+                writer.write(b"ok\n")
+            else:
+                writer.write(f"error unknown command '{command}'\n".encode())
+            await writer.drain()
+        except (ConnectionError, ssl.SSLError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    tls = None
+    if args.server_cert:
+        tls = server_context(args.server_cert, args.server_key)
+        if args.control_cert:
+            tls.verify_mode = ssl.CERT_REQUIRED
+            tls.load_verify_locations(args.control_cert)
+    stats = open(args.stats).read() if args.stats else ""
+    dump = open(args.dump, "rb").read() if args.dump else b"EOF\n"
+    server = FakeControlServer(args.host, args.port, args.unix, tls, stats, dump, args.delay_ms / 1000.0)
+    await server.start()
+    print(f"Fake remote control listening on {args.unix or f'{server.host}@{server.port}'}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Unbound remote-control server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8953)
+    parser.add_argument("--unix", metavar="PATH", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--server-cert", help="Serve TLS with this certificate (as with control-use-cert: yes)")
+    parser.add_argument("--server-key", help="Private key for --server-cert if not in the same file")
+    parser.add_argument("--control-cert", help="Require clients to present this certificate")
+    parser.add_argument("--stats", help="File whose contents answer stats and stats_noreset")
+    parser.add_argument("--dump", help="File whose contents answer dump_cache")
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
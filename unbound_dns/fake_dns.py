@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Local stand-in DNS responder for exercising the probe and benchmark code offline."""
+
+import argparse
+import asyncio
+import random
+import socket
+import ssl
+import struct
+import zlib
+
+from .dns_probe import FLAG_QR, FLAG_RA, FLAG_RD, FLAG_TC, DNSError, QTYPES, decode_name
+
+
+def synth_address(name, qtype):
+    digest = zlib.crc32(name.lower().encode())
+    if qtype == QTYPES["AAAA"]:
+        return socket.inet_pton(socket.AF_INET6, f"fd00::{digest >> 16:x}:{digest & 0xFFFF:x}")
+    return struct.pack("!BBBB", 10, (digest >> 16) & 0xFF, (digest >> 8) & 0xFF, (digest & 0xFF) or 1)
+
+
+class FakeDNSServer:
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, ttl=300, rcode=0,
+                 truncate=False, drop=0.0, seed=None, miss_delay=0.0, tls=None):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.ttl = ttl
+        self.rcode = rcode
+        self.truncate = truncate
+        self.drop = drop
+        self.miss_delay = miss_delay
+        self.tls = tls
+        self.cached = set()
+        self.queries = 0
+        self.random = random.Random(seed)
+        self._udp = None
+        self._tcp = None
+
+    def delay_for(self, packet):
+        if not self.miss_delay:
+            return self.delay
+        key = bytes(packet[12:]).lower()
+        if key in self.cached:
+            return self.delay
+        self.cached.add(key)
+        return self.delay + self.miss_delay
+
+    def answer(self, packet, over_tcp=False):
+        if len(packet) < 12:
+            return None
+        qid, flags, qdcount = struct.unpack("!HHH", packet[:6])
+        if qdcount != 1:
+            return struct.pack("!HHHHHH", qid, FLAG_QR | 1, 0, 0, 0, 0)
+        try:
+            qname, end = decode_name(packet, 12)
+        except DNSError:
+            return struct.pack("!HHHHHH", qid, FLAG_QR | 1, 0, 0, 0, 0)
+        qtype = struct.unpack("!H", packet[end:end + 2])[0]
+        question = packet[12:end + 4]
+
+        rcode = self.rcode
+        if not rcode and qname.rstrip(".").endswith(".invalid"):
+            rcode = 3
+        out_flags = FLAG_QR | FLAG_RA | (flags & FLAG_RD) | rcode
+        answers = b""
+        ancount = 0
+        if rcode == 0 and qtype in (QTYPES["A"], QTYPES["AAAA"]):
+            if self.truncate and not over_tcp:
+                out_flags |= FLAG_TC
+            else:
+                rdata = synth_address(qname, qtype)
+                answers = b"\xc0\x0c" + struct.pack("!HHIH", qtype, 1, self.ttl, len(rdata)) + rdata
+                ancount = 1
+        header = struct.pack("!HHHHHH", qid, out_flags, 1, ancount, 0, 0)
+        return header + question + answers
+
+    def should_drop(self):
+        return self.drop > 0 and self.random.random() < self.drop
+
+    async def start(self):
+        if self.tls:
+            self._tcp = await asyncio.start_server(self._handle_tcp, self.host, self.port, ssl=self.tls)
+            self.port = self._tcp.sockets[0].getsockname()[1]
+            return self
+
+        loop = asyncio.get_running_loop()
+        server = self
+
+        class UDPProtocol(asyncio.DatagramProtocol):
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def datagram_received(self, data, addr):
+                server.queries += 1
+                if server.should_drop():
+                    return
+                response = server.answer(data)
+                if response is None:
+                    return
+                delay = server.delay_for(data)
+                if delay:
+                    loop.call_later(delay, self.transport.sendto, response, addr)
+                else:
+                    self.transport.sendto(response, addr)
+
+        self._udp, _ = await loop.create_datagram_endpoint(
+            UDPProtocol, local_addr=(self.host, self.port))
+        self.port = self._udp.get_extra_info("sockname")[1]
+        self._tcp = await asyncio.start_server(self._handle_tcp, self.host, self.port)
+        return self
+
+    async def _handle_tcp(self, reader, writer):
+        try:
+            while True:
+                length = struct.unpack("!H", await reader.readexactly(2))[0]
+                packet = await reader.readexactly(length)
+                self.queries += 1
+                if self.should_drop():
+                    continue
+                response = self.answer(packet, over_tcp=True)
+                if response is None:
+                    continue
+                delay = self.delay_for(packet)
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(struct.pack("!H", len(response)) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        if self._udp:
+            self._udp.close()
+        if self._tcp:
+            self._tcp.close()
+            await self._tcp.wait_closed()
+
+
+def server_context(certfile, keyfile=None):
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+async def serve(args):
+    tls = server_context(args.tls_cert, args.tls_key) if args.tls_cert else None
+    server = FakeDNSServer(args.host, args.port, args.delay_ms / 1000.0, args.ttl,
+                           args.rcode, args.truncate, args.drop, args.seed,
+                           args.miss_delay_ms / 1000.0, tls)
+    await server.start()
+    transport = "DNS-over-TLS" if tls else "DNS"
+    print(f"Fake {transport} listening on {server.host}:{server.port}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake DNS responder")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5353)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    parser.add_argument("--ttl", type=int, default=300)
+    parser.add_argument("--rcode", type=int, default=0)
+    parser.add_argument("--truncate", action="store_true",
+                        help="Set TC on UDP answers to force TCP fallback")
+    parser.add_argument("--drop", type=float, default=0.0,
+                        help="Fraction of queries to silently drop")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--miss-delay-ms", type=float, default=0.0,
+                        help="Extra delay for the first query of each name, mimicking a cache miss")
+    parser.add_argument("--tls-cert", help="Serve DNS-over-TLS (TCP only) with this certificate")
+    parser.add_argument("--tls-key", help="Private key for --tls-cert if not in the same file")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
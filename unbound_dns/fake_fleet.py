@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Simulated fleet transport: answers like N Unbound hosts over ssh, with varied latency and failures."""
+
+import argparse
+import random
+import threading
+import time
+import zlib
+
+from .fleet import Completed, DEFAULT_TIMEOUT
+
+STATUS = ("version: 1.19.0\nverbosity: 1\nthreads: {threads}\nmodules: 2 [ validator iterator ]\n"
+          "uptime: {uptime} seconds\nunbound (pid {pid}) is running...\n")
+
+
+class SimulatedTransport:
+    """Each host gets a fixed round-trip time between `latency` bounds (seconds), derived from its
+    name so runs are repeatable. Hosts in `unreachable` fail like a refused ssh connection, and a
+    config containing "BROKEN" fails unbound-checkconf. Records every call and the peak number of
+    hosts being talked to at once, so a test can check the worker pool's bound."""
+
+    def __init__(self, latency=(0.01, 0.2), unreachable=(), seed=0):
+        self.latency = latency
+        self.unreachable = set(unreachable)
+        self.seed = seed
+        self.calls = []
+        self.configs = {}
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def delay(self, host):
+        low, high = self.latency
+        return low + (high - low) * random.Random(zlib.crc32(host.name.encode()) + self.seed).random()
+
+    def run(self, host, argv, input=None, timeout=DEFAULT_TIMEOUT):
+        with self._lock:
+            self.calls.append((host.name, tuple(argv)))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            delay = self.delay(host)
+            time.sleep(min(delay, timeout))
+            if delay > timeout:
+                return Completed(124, "", f"timed out after {timeout:g}s")
+            if host.name in self.unreachable:
+                return Completed(255, "", f"ssh: connect to host {host.destination} port 22: Connection refused")
+            return self.answer(host, list(argv), input)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def answer(self, host, argv, input):
+        while argv and argv[0] in ("sudo", "-n"):
+            argv.pop(0)
+        if argv[:2] == ["sh", "-c"]:
+            if "BROKEN" in (input or ""):
+                return Completed(1, "", f"{host.config}.new:1: error: syntax error\nread {host.config}.new failed")
+            with self._lock:
+                self.configs[host.name] = input
+            return Completed(0, "ok\n")
+        command = argv[3]
+        number = zlib.crc32(host.name.encode())
+        if command == "status":
+            return Completed(0, STATUS.format(threads=1 + number % 4, uptime=3600 + number % 86400,
+                                              pid=1000 + number % 30000))
+        if command == "stats_noreset":
+            queries = 10000 + number % 90000
+            hits = int(queries * (0.7 + (number % 25) / 100))
+            recursion = (number % 90 + 10) / 1000
+            return Completed(0, f"total.num.queries={queries}\ntotal.num.cachehits={hits}\n"
+                                f"total.num.cachemiss={queries - hits}\ntotal.recursion.time.avg={recursion}\n"
+                                f"time.up={3600 + number % 86400}\n")
+        if command == "flush_zone":
+            return Completed(0, "ok removed 3 rrsets, 2 messages and 0 key entries\n")
+        if command.startswith("flush") or command.startswith("reload"):
+            return Completed(0, "ok\n")
+        return Completed(1, f"error unknown command '{command}'\n")
+
+
+def inventory(count, prefix="unbound"):
+    """Inventory text for `count` simulated hosts."""
+    return "".join(f"{prefix}{i:02d} target=admin@10.0.{i // 250}.{i % 250 + 1}\n" for i in range(1, count + 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print an inventory of simulated hosts for "
+                                                 "'unbound-dns fleet --transport fake'")
+    parser.add_argument("count", type=int, nargs="?", default=20)
+    parser.add_argument("--prefix", default="unbound")
+    args = parser.parse_args()
+    print(inventory(args.count, args.prefix), end="")
+
+
+if __name__ == "__main__":
+    main()
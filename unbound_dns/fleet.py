@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Run status, stats, config apply and cache flushes across many Unbound hosts at once."""
+
+import importlib
+import os
+import shlex
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from . import cache_flush, stats
+
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_CONFIG = "/etc/unbound/unbound.conf"
+ACTIONS = ("status", "stats", "apply", "flush")
+TRANSPORTS = {"ssh": "unbound_dns.fleet:SSHTransport", "local": "unbound_dns.fleet:LocalTransport",
+              "fake": "unbound_dns.fake_fleet:SimulatedTransport"}
+
+# Written to PATH.new and checked before it replaces PATH, so a bad config never reaches Unbound;
+# reload_keep_cache needs Unbound 1.18, older versions fall back to a plain reload.
+APPLY_SCRIPT = ('cat > "$1.new" && unbound-checkconf "$1.new" && { cp -p "$1" "$1.bak" 2>/dev/null; '
+                'mv "$1.new" "$1"; } || { rm -f "$1.new"; exit 1; }; '
+                'unbound-control -c "$1" reload_keep_cache || unbound-control -c "$1" reload')
+
+
+@dataclass
+class Host:
+    name: str
+    target: str = None
+    port: int = None
+    config: str = DEFAULT_CONFIG
+    sudo: bool = True
+
+    @property
+    def destination(self):
+        return self.target or self.name
+
+
+def parse_inventory(text):
+    """Hosts from lines of `name [target=user@address] [port=22] [config=PATH] [sudo=no]`; # starts a comment."""
+    hosts = []
+    for number, raw in enumerate(text.splitlines(), 1):
+        words = raw.split("#", 1)[0].split()
+        if not words:
+            continue
+        host = Host(words[0])
+        for word in words[1:]:
+            key, sep, value = word.partition("=")
+            if not sep or key not in ("target", "port", "config", "sudo"):
+                raise ValueError(f"line {number}: expected target=, port=, config= or sudo=, got {word!r}")
+            if key == "port":
+                host.port = int(value)
+            elif key == "sudo":
+                host.sudo = value.lower() in ("yes", "true", "1")
+            else:
+                setattr(host, key, value)
+        hosts.append(host)
+    names = [host.name for host in hosts]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate hosts in inventory: {', '.join(duplicates)}")
+    return hosts
+
+
+def load_inventory(path):
+    with open(path) as f:
+        return parse_inventory(f.read())
+
+
+@dataclass
+class Completed:
+    returncode: int
+    stdout: str = ""
+    stderr: str = ""
+
+
+class SSHTransport:
+    """The system ssh, non-interactively. Connections are multiplexed with ControlMaster, so
+    running status, then stats, then an apply on a host pays for one handshake."""
+
+    def __init__(self, ssh="ssh", options=(), connect_timeout=10, control_dir=None):
+        self.ssh = ssh
+        self.options = list(options)
+        self.connect_timeout = connect_timeout
+        self.control_dir = control_dir or tempfile.mkdtemp(prefix="unbound-fleet-")
+
+    def argv(self, host, argv):
+        command = [self.ssh, "-o", "BatchMode=yes", "-o", f"ConnectTimeout={self.connect_timeout}",
+                   "-o", "ControlMaster=auto", "-o", f"ControlPath={os.path.join(self.control_dir, '%C')}",
+                   "-o", "ControlPersist=60"]
+        if host.port:
+            command += ["-p", str(host.port)]
+        return command + self.options + [host.destination, "--", shlex.join(argv)]
+
+    def run(self, host, argv, input=None, timeout=DEFAULT_TIMEOUT):
+        return _run(self.argv(host, argv), input, timeout)
+
+
+class LocalTransport:
+    """Runs the commands on this machine, e.g. to include localhost in a fleet without ssh."""
+
+    def run(self, host, argv, input=None, timeout=DEFAULT_TIMEOUT):
+        return _run(argv, input, timeout)
+
+
+def _run(argv, input, timeout):
+    # Without input the command gets no stdin, so concurrent ssh clients can't read the terminal.
+    stdin = subprocess.DEVNULL if input is None else None
+    try:
+        completed = subprocess.run(argv, input=input, stdin=stdin, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return Completed(124, "", f"timed out after {timeout:g}s")
+    except OSError as e:
+        return Completed(127, "", str(e))
+    return Completed(completed.returncode, completed.stdout, completed.stderr)
+
+
+def make_transport(spec, **kwargs):
+    """A transport from TRANSPORTS or a "module:Class" path; anything with run(host, argv, input, timeout) works."""
+    module, _, name = TRANSPORTS.get(spec, spec).partition(":")
+    if not name:
+        raise ValueError(f"Unknown transport {spec!r}; choose from {', '.join(TRANSPORTS)} or give module:Class")
+    return getattr(importlib.import_module(module), name)(**kwargs)
+
+
+@dataclass
+class HostResult:
+    host: Host
+    action: str
+    ok: bool = False
+    skipped: bool = False
+    seconds: float = 0.0
+    summary: str = ""
+    output: str = ""
+    data: dict = field(default_factory=dict)
+
+
+def control_argv(host, command, *args):
+    return (["sudo", "-n"] if host.sudo else []) + ["unbound-control", "-c", host.config, command,
+                                                    *map(str, args)]
+
+
+def _failure(completed):
+    detail = (completed.stderr or completed.stdout).strip().splitlines()
+    return detail[-1] if detail else f"exit status {completed.returncode}"
+
+
+def do_status(transport, host, timeout=DEFAULT_TIMEOUT):
+    result = HostResult(host, "status")
+    completed = transport.run(host, control_argv(host, "status"), timeout=timeout)
+    result.output = completed.stdout
+    if completed.returncode != 0:
+        result.summary = _failure(completed)
+        return result
+    for line in completed.stdout.splitlines():
+        key, sep, value = line.partition(":")
+        if sep and key.strip() in ("version", "uptime", "threads"):
+            result.data[key.strip()] = value.strip().split()[0]
+    result.ok = True
+    result.summary = (f"running {result.data.get('version', '?')}, up {result.data.get('uptime', '?')}s, "
+                      f"{result.data.get('threads', '?')} threads")
+    return result
+
+
+def do_stats(transport, host, timeout=DEFAULT_TIMEOUT):
+    result = HostResult(host, "stats")
+    completed = transport.run(host, control_argv(host, "stats_noreset"), timeout=timeout)
+    result.output = completed.stdout
+    values = stats.parse_stats(completed.stdout)
+    if completed.returncode != 0 or "total.num.queries" not in values:
+        result.summary = _failure(completed) if completed.returncode else "no total.num.queries in stats output"
+        return result
+    queries = values["total.num.queries"]
+    result.data = {"queries": queries, "cachehits": values.get("total.num.cachehits", 0.0),
+                   "cachemiss": values.get("total.num.cachemiss", 0.0), "uptime": values.get("time.up", 0.0),
+                   "recursion_avg": values.get("total.recursion.time.avg", 0.0)}
+    hit_rate = result.data["cachehits"] / queries if queries else 0.0
+    result.ok = True
+    result.summary = (f"{queries:,.0f} queries, {hit_rate * 100:.1f}% cache hits, "
+                      f"recursion {result.data['recursion_avg'] * 1000:.1f}ms")
+    return result
+
+
+def do_apply(transport, host, text, timeout=DEFAULT_TIMEOUT):
+    result = HostResult(host, "apply")
+    argv = (["sudo", "-n"] if host.sudo else []) + ["sh", "-c", APPLY_SCRIPT, "sh", host.config]
+    completed = transport.run(host, argv, input=text, timeout=timeout)
+    result.output = completed.stdout + completed.stderr
+    result.ok = completed.returncode == 0
+    result.summary = f"installed {host.config} and reloaded" if result.ok else _failure(completed)
+    return result
+
+
+def do_flush(transport, host, kind, name=None, rtype="A", timeout=DEFAULT_TIMEOUT):
+    result = HostResult(host, "flush")
+    outputs = []
+    for command, *args in cache_flush.commands_for(kind, name, rtype):
+        completed = transport.run(host, control_argv(host, command, *args), timeout=timeout)
+        outputs.append(f"{' '.join([command, *args])}: {completed.stdout.strip() or _failure(completed)}")
+        if completed.returncode != 0:
+            result.summary = outputs[-1]
+            result.output = "\n".join(outputs)
+            return result
+    result.ok = True
+    result.output = "\n".join(outputs)
+    result.summary = "; ".join(outputs)
+    return result
+
+
+def action(name, timeout=DEFAULT_TIMEOUT, text=None, kind=None, domain=None, rtype="A"):
+    """fn(transport, host) for one of ACTIONS; apply installs `text`, flush removes `kind` (see cache_flush)."""
+    if name == "status":
+        fn = lambda transport, host: do_status(transport, host, timeout)
+    elif name == "stats":
+        fn = lambda transport, host: do_stats(transport, host, timeout)
+    elif name == "apply":
+        if not text:
+            raise ValueError("apply needs the unbound.conf text to install")
+        fn = lambda transport, host: do_apply(transport, host, text, timeout)
+    elif name == "flush":
+        # Checked once here rather than failing identically on every host.
+        cache_flush.commands_for(kind, domain, rtype)
+        fn = lambda transport, host: do_flush(transport, host, kind, domain, rtype, timeout)
+    else:
+        raise ValueError(f"Unknown action {name!r}; choose from {', '.join(ACTIONS)}")
+    fn.action = name
+    return fn
+
+
+def run_fleet(hosts, fn, transport, workers=DEFAULT_WORKERS, on_start=None, on_done=None, max_failures=None):
+    """Run fn(transport, host) on every host with at most `workers` at a time.
+
+    on_start(host) and on_done(result) are called from the worker threads as hosts begin and
+    finish. After `max_failures` failed hosts, hosts not yet started are skipped rather than
+    touched, so a bad config stops spreading. Results come back in inventory order.
+    """
+    name = getattr(fn, "action", "")
+    stop = threading.Event()
+    lock = threading.Lock()
+    failures = []
+
+    def one(host):
+        if stop.is_set():
+            result = HostResult(host, name, skipped=True, summary=f"skipped after {max_failures} failed hosts")
+        else:
+            if on_start:
+                on_start(host)
+            started = time.monotonic()
+            try:
+                result = fn(transport, host)
+            except Exception as e:
+                result = HostResult(host, name, summary=f"{type(e).__name__}: {e}")
+            result.seconds = time.monotonic() - started
+            if not result.ok and max_failures:
+                with lock:
+                    failures.append(host)
+                    if len(failures) >= max_failures:
+                        stop.set()
+        if on_done:
+            on_done(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(one, host) for host in hosts]
+    return [future.result() for future in futures]
+
+
+def summarize(results):
+    done = [r for r in results if not r.skipped]
+    seconds = [r.seconds for r in done]
+    summary = {"hosts": len(results), "ok": sum(r.ok for r in results),
+               "failed": sum(not r.ok for r in done), "skipped": len(results) - len(done),
+               "median_seconds": statistics.median(seconds) if seconds else 0.0,
+               "slowest": max(done, key=lambda r: r.seconds).host.name if done else None}
+    with_stats = [r.data for r in results if r.ok and "queries" in r.data]
+    if with_stats:
+        queries = sum(d["queries"] for d in with_stats)
+        summary["queries"] = queries
+        summary["hit_rate"] = sum(d["cachehits"] for d in with_stats) / queries if queries else 0.0
+    return summary
+
+
+def format_result(result):
+    state = "SKIPPED" if result.skipped else "OK" if result.ok else "FAILED"
+    return f"{result.host.name:<24} {state:<8} {result.seconds:6.2f}s  {result.summary}"
+
+
+def format_summary(summary):
+    line = (f"{summary['ok']}/{summary['hosts']} hosts OK, {summary['failed']} failed, "
+            f"{summary['skipped']} skipped; median {summary['median_seconds']:.2f}s")
+    if summary["slowest"]:
+        line += f", slowest {summary['slowest']}"
+    if "queries" in summary:
+        line += f"\nFleet: {summary['queries']:,.0f} queries, {summary['hit_rate'] * 100:.1f}% cache hits"
+    return line
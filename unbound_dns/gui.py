@@ -0,0 +1,2080 @@
+#!/usr/bin/env python3
+
+import asyncio
+import math
+import tkinter as tk
+from tkinter import ttk, scrolledtext, messagebox, filedialog
+import subprocess
+import threading
+import os
+import platform
+import re
+import sqlite3
+from pathlib import Path
+from datetime import datetime
+
+from . import benchmark
+from . import cache_advisor
+from . import cache_flush
+from . import cache_profiler
+from . import cache_warmup
+from . import command_runner
+from . import config_apply
+from . import config_gen
+from . import config_model
+from . import dns_probe
+from . import fleet
+from . import histogram
+from . import log_analyzer
+from . import log_sink
+from . import metrics_store
+from . import preflight
+from . import stats
+from . import status_probe
+from . import unbound_control
+from . import upstreams
+
+LINE_COLORS = {
+    "SUCCESS": "#28a745",
+    "WARN": "#ffa500",
+    "ERROR": "#ff6b6b",
+    "STDERR": "#ff6b6b",
+}
+
+class UnboundInstallerGUI:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Unbound DNS Installer")
+        self.root.geometry("900x700")
+        self.root.resizable(True, True)
+
+        self.is_installing = False
+        self.current_command = None
+        self.last_command_result = None
+        self.os_type = self.detect_os()
+        self.auto_refresh = tk.BooleanVar(value=False)
+        self.config_path = None
+        self.config_model = None
+        self.drop_monitor = preflight.DropMonitor() if self.os_type == "linux" else None
+        self.drop_advice_shown = False
+        self.status_monitor = status_probe.StatusMonitor(self.on_status, self.os_type).start()
+        self.show_stats = tk.BooleanVar(value=False)
+        self.preserve_cache = tk.BooleanVar(value=True)
+        self.stats_collector = stats.StatsCollector(lambda: stats.fetch_stats(self.config_path))
+        self.stats_job = None
+        self.stats_polling = False
+        try:
+            self.metrics = metrics_store.MetricsStore()
+        except (OSError, sqlite3.Error):
+            self.metrics = None
+
+        self.setup_styles()
+        self.create_widgets()
+        self.check_status()
+        self.detect_config_path()
+
+    def setup_styles(self):
+        style = ttk.Style()
+        style.theme_use('clam')
+
+        bg_color = '#f0f0f0'
+        accent_color = '#0066cc'
+        success_color = '#28a745'
+        error_color = '#dc3545'
+        warning_color = '#ffa500'
+
+        style.configure('Title.TLabel', font=('Helvetica', 18, 'bold'), foreground=accent_color)
+        style.configure('Subtitle.TLabel', font=('Helvetica', 10), foreground='#666666')
+        style.configure('Status.TLabel', font=('Helvetica', 10, 'bold'))
+        style.configure('Success.TLabel', foreground=success_color, font=('Helvetica', 10, 'bold'))
+        style.configure('Error.TLabel', foreground=error_color, font=('Helvetica', 10, 'bold'))
+        style.configure('Warning.TLabel', foreground=warning_color, font=('Helvetica', 10, 'bold'))
+        style.configure('Primary.TButton', font=('Helvetica', 10, 'bold'), padding=5)
+        style.configure('Secondary.TButton', font=('Helvetica', 9), padding=3)
+
+    def detect_os(self):
+        system = platform.system()
+        if system == "Darwin":
+            return "macos"
+        elif system == "Linux":
+            return "linux"
+        else:
+            return "unknown"
+
+    def create_widgets(self):
+        self.create_menu()
+
+        main_frame = ttk.Frame(self.root, padding="20")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.rowconfigure(3, weight=1)
+
+        header_frame = ttk.Frame(main_frame)
+        header_frame.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 15))
+
+        title_label = ttk.Label(header_frame, text="Unbound DNS Installer", style='Title.TLabel')
+        title_label.grid(row=0, column=0, sticky=tk.W)
+
+        subtitle_label = ttk.Label(header_frame,
+                                   text="Resilient DNS with Automatic Failover & DoT Support",
+                                   style='Subtitle.TLabel')
+        subtitle_label.grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+
+        status_frame = ttk.LabelFrame(main_frame, text="Status", padding="10")
+        status_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        status_frame.columnconfigure(1, weight=1)
+
+        ttk.Label(status_frame, text="Operating System:").grid(row=0, column=0, sticky=tk.W, pady=3)
+        self.os_label = ttk.Label(status_frame, text=self.os_type.upper())
+        self.os_label.grid(row=0, column=1, sticky=tk.W, pady=3)
+
+        ttk.Label(status_frame, text="Unbound Status:").grid(row=1, column=0, sticky=tk.W, pady=3)
+        self.status_label = ttk.Label(status_frame, text="Checking...", style='Status.TLabel')
+        self.status_label.grid(row=1, column=1, sticky=tk.W, pady=3)
+
+        ttk.Label(status_frame, text="Port 53:").grid(row=2, column=0, sticky=tk.W, pady=3)
+        self.port_label = ttk.Label(status_frame, text="Checking...")
+        self.port_label.grid(row=2, column=1, sticky=tk.W, pady=3)
+
+        ttk.Label(status_frame, text="UDP Drops:").grid(row=3, column=0, sticky=tk.W, pady=3)
+        self.drops_label = ttk.Label(status_frame, text="Checking..." if self.drop_monitor else "Not available")
+        self.drops_label.grid(row=3, column=1, sticky=tk.W, pady=3)
+
+        ttk.Label(status_frame, text="Config File:").grid(row=4, column=0, sticky=tk.W, pady=3)
+        self.config_label = ttk.Label(status_frame, text="Not detected")
+        self.config_label.grid(row=4, column=1, sticky=tk.W, pady=3)
+
+        ttk.Label(status_frame, text="Last Check:").grid(row=5, column=0, sticky=tk.W, pady=3)
+        self.last_check_label = ttk.Label(status_frame, text="Never")
+        self.last_check_label.grid(row=5, column=1, sticky=tk.W, pady=3)
+
+        refresh_check = ttk.Checkbutton(status_frame, text="Auto-refresh (5s)",
+                                       variable=self.auto_refresh,
+                                       command=self.toggle_auto_refresh)
+        refresh_check.grid(row=6, column=0, sticky=tk.W, pady=(5, 0))
+
+        stats_check = ttk.Checkbutton(status_frame, text="Live statistics",
+                                      variable=self.show_stats,
+                                      command=self.toggle_stats)
+        stats_check.grid(row=6, column=1, sticky=tk.W, pady=(5, 0))
+
+        cache_check = ttk.Checkbutton(status_frame, text="Preserve cache across restarts",
+                                      variable=self.preserve_cache)
+        cache_check.grid(row=7, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+
+        self.create_stats_pane(main_frame)
+
+        output_frame = ttk.LabelFrame(main_frame, text="Output", padding="10")
+        output_frame.grid(row=3, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+        output_frame.columnconfigure(0, weight=1)
+        output_frame.rowconfigure(0, weight=1)
+
+        self.output_text = scrolledtext.ScrolledText(output_frame, height=15, wrap=tk.WORD,
+                                                     font=('Courier', 9), bg='#1e1e1e', fg='#d4d4d4')
+        self.output_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.log_pump = log_sink.TextLogPump(self.root, self.output_text).start()
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=4, column=0, sticky=(tk.W, tk.E))
+        button_frame.columnconfigure(0, weight=1)
+        button_frame.columnconfigure(1, weight=1)
+        button_frame.columnconfigure(2, weight=1)
+        button_frame.columnconfigure(3, weight=1)
+        button_frame.columnconfigure(4, weight=1)
+
+        self.install_btn = ttk.Button(button_frame, text="Install",
+                                      command=self.install_unbound, style='Primary.TButton')
+        self.install_btn.grid(row=0, column=0, padx=3, pady=5, sticky=(tk.W, tk.E))
+
+        self.start_btn = ttk.Button(button_frame, text="Start",
+                                    command=self.start_unbound, state='disabled')
+        self.start_btn.grid(row=0, column=1, padx=3, pady=5, sticky=(tk.W, tk.E))
+
+        self.stop_btn = ttk.Button(button_frame, text="Stop",
+                                   command=self.stop_unbound, state='disabled')
+        self.stop_btn.grid(row=0, column=2, padx=3, pady=5, sticky=(tk.W, tk.E))
+
+        self.restart_btn = ttk.Button(button_frame, text="Restart",
+                                     command=self.restart_unbound, state='disabled')
+        self.restart_btn.grid(row=0, column=3, padx=3, pady=5, sticky=(tk.W, tk.E))
+
+        self.test_btn = ttk.Button(button_frame, text="Test DNS",
+                                   command=self.test_dns)
+        self.test_btn.grid(row=0, column=4, padx=3, pady=5, sticky=(tk.W, tk.E))
+
+        utility_frame = ttk.Frame(main_frame)
+        utility_frame.grid(row=5, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+        utility_frame.columnconfigure(0, weight=1)
+        utility_frame.columnconfigure(1, weight=1)
+        utility_frame.columnconfigure(2, weight=1)
+
+        self.refresh_btn = ttk.Button(utility_frame, text="Refresh Status",
+                                      command=self.manual_refresh, style='Secondary.TButton')
+        self.refresh_btn.grid(row=0, column=0, padx=3, pady=2, sticky=(tk.W, tk.E))
+
+        self.view_config_btn = ttk.Button(utility_frame, text="View Config",
+                                         command=self.view_config, style='Secondary.TButton',
+                                         state='disabled')
+        self.view_config_btn.grid(row=0, column=1, padx=3, pady=2, sticky=(tk.W, tk.E))
+
+        self.clear_btn = ttk.Button(utility_frame, text="Clear Output",
+                                    command=self.clear_output, style='Secondary.TButton')
+        self.clear_btn.grid(row=0, column=2, padx=3, pady=2, sticky=(tk.W, tk.E))
+
+        self.log("GUI initialized. Ready to install Unbound DNS.")
+        self.log(f"Detected OS: {self.os_type.upper()}")
+
+    def create_stats_pane(self, parent):
+        self.stats_frame = ttk.LabelFrame(parent, text="Resolver Statistics", padding="10")
+        self.stats_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        self.stats_frame.columnconfigure(2, weight=1)
+        self.stats_frame.columnconfigure(5, weight=1)
+
+        metrics = [
+            ("qps", "Queries/s"),
+            ("hit_rate", "Cache hit rate"),
+            ("recursion_median", "Recursion median"),
+            ("requestlist_avg", "Request list avg"),
+        ]
+        self.stats_labels = {}
+        self.stats_sparklines = {}
+        for index, (name, title) in enumerate(metrics):
+            row, column = divmod(index, 2)
+            column *= 3
+            ttk.Label(self.stats_frame, text=f"{title}:").grid(row=row, column=column, sticky=tk.W, pady=3)
+            value = ttk.Label(self.stats_frame, text="-", width=10, style='Status.TLabel')
+            value.grid(row=row, column=column + 1, sticky=tk.W, padx=(5, 5), pady=3)
+            canvas = tk.Canvas(self.stats_frame, height=24, width=140, bg='#1e1e1e',
+                               highlightthickness=0)
+            canvas.grid(row=row, column=column + 2, sticky=(tk.W, tk.E), padx=(0, 15), pady=3)
+            self.stats_labels[name] = value
+            self.stats_sparklines[name] = canvas
+
+        self.stats_threads_label = ttk.Label(self.stats_frame, text="", foreground='#666666')
+        self.stats_threads_label.grid(row=2, column=0, columnspan=6, sticky=tk.W, pady=(3, 0))
+        self.stats_frame.grid_remove()
+
+    def create_menu(self):
+        menubar = tk.Menu(self.root)
+        self.root.config(menu=menubar)
+
+        file_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="File", menu=file_menu)
+        file_menu.add_command(label="Export Log", command=self.export_log)
+        file_menu.add_separator()
+        file_menu.add_command(label="Exit", command=self.root.quit)
+
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+        tools_menu.add_command(label="View Config", command=self.view_config)
+        tools_menu.add_command(label="Fix Config (Regenerate)", command=self.fix_config)
+        tools_menu.add_command(label="Reload Config (Keep Cache)", command=self.reload_config)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="View System DNS", command=self.view_system_dns)
+        tools_menu.add_command(label="Check Port 53", command=self.check_port_53)
+        tools_menu.add_command(label="Socket Buffer Preflight", command=self.socket_preflight)
+        tools_menu.add_command(label="Test Multiple Servers", command=self.test_multiple_dns)
+        tools_menu.add_command(label="Benchmark Resolver", command=self.benchmark_resolver)
+        tools_menu.add_command(label="Profile Cache (Cold vs Warm)", command=self.profile_cache)
+        tools_menu.add_command(label="Evaluate Upstreams", command=self.evaluate_upstreams)
+        tools_menu.add_command(label="Analyze Query Log", command=self.analyze_query_log)
+        tools_menu.add_command(label="Latency Histogram", command=self.latency_histogram)
+        tools_menu.add_command(label="Metrics History", command=self.metrics_history)
+        tools_menu.add_command(label="Cache Size Advisor", command=self.cache_size_advisor)
+        tools_menu.add_command(label="Fleet...", command=self.manage_fleet)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Flush DNS Cache", command=self.flush_cache)
+
+        help_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Help", menu=help_menu)
+        help_menu.add_command(label="About", command=self.show_about)
+        help_menu.add_command(label="Documentation", command=self.show_docs)
+
+    def log(self, message, color=None):
+        self.log_pump.sink.push(message, color)
+
+    def clear_log(self):
+        self.log_pump.clear()
+
+    def run_command(self, command, shell=True, show_command=True,
+                    inactivity_timeout=command_runner.DEFAULT_INACTIVITY_TIMEOUT):
+        if show_command:
+            self.log(f"$ {command if isinstance(command, str) else ' '.join(command)}", "#888888")
+
+        runner = command_runner.StreamingCommand(command, shell=shell,
+                                                 inactivity_timeout=inactivity_timeout)
+        self.current_command = runner
+        try:
+            for stream, line, kind in runner.lines():
+                self.log(line, LINE_COLORS.get(kind))
+        except FileNotFoundError:
+            self.log(f"Command not found: {command}", "#ff6b6b")
+            return False
+        except Exception as e:
+            self.log(f"Error executing command: {str(e)}", "#ff6b6b")
+            return False
+        finally:
+            self.current_command = None
+
+        self.last_command_result = runner.result
+        if runner.result.timed_out:
+            self.log(f"Command produced no output for {inactivity_timeout} seconds and was stopped", "#ff6b6b")
+        elif runner.result.cancelled:
+            self.log("Command cancelled", "#ffa500")
+        return runner.result.ok
+
+    def cancel_command(self):
+        if self.current_command:
+            self.log("Cancelling...", "#ffa500")
+            self.current_command.cancel()
+
+    def check_status(self):
+        self.status_monitor.request()
+
+    def on_status(self, status, changed):
+        self.record_metrics("add_status", status)
+        drops = self.drop_monitor.poll() if self.drop_monitor and status.running else None
+        self.root.after(0, self.apply_status, status, changed, drops)
+
+    def record_metrics(self, method, sample):
+        # Called from the polling threads; a locked or full disk must not stop the polling.
+        if self.metrics:
+            try:
+                getattr(self.metrics, method)(sample)
+            except sqlite3.Error:
+                pass
+
+    def apply_status(self, status, changed, drops=None):
+        if changed:
+            self.update_status(status.running, status.port_in_use, status.error)
+        else:
+            self.last_check_label.config(text=datetime.now().strftime("%H:%M:%S"))
+        if self.drop_monitor:
+            self.update_drops(status.running, drops)
+
+    def update_drops(self, running, drops):
+        if not running:
+            self.drops_label.config(text="-", foreground='#999999')
+            return
+        if drops is None:
+            # The first sample after start-up has nothing to compare against.
+            return
+        if drops.unreadable and not drops.watched:
+            self.drops_label.config(text=f"Unknown (no access to /proc/{drops.unreadable[0]}/fd)",
+                                    foreground='#999999')
+            return
+        if not drops.socket_drops:
+            # Without access to Unbound's fds the sockets are matched by owner and port instead.
+            matched = ", by owner/port" if drops.unreadable else ""
+            self.drops_label.config(text=f"None ({drops.seconds:.0f}s{matched})", foreground='#28a745')
+            return
+        color = '#ffa500' if drops.drop_ratio < preflight.DROP_WARN_RATIO else '#ff6b6b'
+        self.drops_label.config(text=f"{drops.drop_rate:.1f}/s ({drops.drop_ratio * 100:.2f}% of UDP)",
+                                foreground=color)
+        if not self.drop_advice_shown:
+            self.drop_advice_shown = True
+            self.log(f"Unbound dropped {drops.socket_drops:.0f} UDP queries in {drops.seconds:.0f}s "
+                     f"(socket receive buffer full)", "#ffa500")
+            try:
+                settings = preflight.load_settings(self.config_path)[1] if self.config_path else None
+            except OSError:
+                settings = None
+            for advice in preflight.drop_advice(drops, settings):
+                self.log(f"  Fix: {advice}", "#ffa500")
+            self.log("  Tools > Socket Buffer Preflight checks the kernel limits", "#ffa500")
+
+    def update_status(self, is_running, port_in_use, error=None):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.last_check_label.config(text=timestamp)
+
+        if error:
+            self.status_label.config(text=f"Error: {error}", style='Error.TLabel')
+            self.start_btn.config(state='disabled')
+            self.stop_btn.config(state='disabled')
+            self.restart_btn.config(state='disabled')
+        elif is_running:
+            self.status_label.config(text="Running", style='Success.TLabel')
+            self.start_btn.config(state='disabled')
+            self.stop_btn.config(state='normal')
+            self.restart_btn.config(state='normal')
+        else:
+            self.status_label.config(text="Not Running", style='Error.TLabel')
+            self.start_btn.config(state='normal')
+            self.stop_btn.config(state='disabled')
+            self.restart_btn.config(state='disabled')
+
+        if port_in_use:
+            self.port_label.config(text="In Use", foreground='#ffa500')
+        else:
+            self.port_label.config(text="Available", foreground='#28a745')
+
+    def detect_config_path(self):
+        possible_paths = []
+
+        if self.os_type == "macos":
+            try:
+                brew_prefix = subprocess.run(['brew', '--prefix'],
+                                            capture_output=True, text=True, timeout=5)
+                if brew_prefix.returncode == 0:
+                    prefix = brew_prefix.stdout.strip()
+                    possible_paths.append(f"{prefix}/etc/unbound/unbound.conf")
+            except:
+                pass
+        else:
+            possible_paths.append("/etc/unbound/unbound.conf")
+
+        for path in possible_paths:
+            if os.path.exists(path):
+                self.config_path = path
+                self.config_label.config(text=path, foreground='#28a745')
+                self.view_config_btn.config(state='normal')
+                return
+
+        self.config_label.config(text="Not found", foreground='#999999')
+
+    def toggle_auto_refresh(self):
+        self.status_monitor.set_interval(5.0 if self.auto_refresh.get() else None)
+
+    def toggle_stats(self):
+        if self.show_stats.get():
+            self.stats_frame.grid()
+            self.poll_stats()
+        else:
+            self.stats_frame.grid_remove()
+            if self.stats_job:
+                self.root.after_cancel(self.stats_job)
+                self.stats_job = None
+
+    def poll_stats(self):
+        if not self.show_stats.get():
+            return
+
+        if not self.stats_polling:
+            self.stats_polling = True
+
+            def poll():
+                try:
+                    interval = self.stats_collector.poll()
+                    if interval:
+                        self.record_metrics("add_interval", interval)
+                    self.root.after(0, self.update_stats_pane, interval, None)
+                except unbound_control.ControlError as e:
+                    self.root.after(0, self.update_stats_pane, None, str(e))
+                finally:
+                    self.stats_polling = False
+
+            threading.Thread(target=poll, daemon=True).start()
+
+        self.stats_job = self.root.after(5000, self.poll_stats)
+
+    def update_stats_pane(self, interval, error=None):
+        if error:
+            self.stats_threads_label.config(text=f"Error: {error}", foreground='#dc3545')
+            return
+        if interval is None:
+            self.stats_threads_label.config(text="Collecting first interval...", foreground='#666666')
+            return
+
+        self.stats_labels["qps"].config(text=f"{interval.qps:.1f}")
+        self.stats_labels["hit_rate"].config(text=f"{interval.hit_rate * 100:.1f}%")
+        self.stats_labels["recursion_median"].config(text=f"{interval.recursion_median * 1000:.1f}ms")
+        self.stats_labels["requestlist_avg"].config(text=f"{interval.requestlist_avg:.2f}")
+        for name, canvas in self.stats_sparklines.items():
+            self.draw_sparkline(canvas, self.stats_collector.series(name))
+
+        threads = "  ".join(f"thread{tid}: {t['qps']:.0f} qps, {t['hit_rate'] * 100:.0f}% hit, "
+                            f"{t['requestlist_current']:.0f} pending"
+                            for tid, t in interval.threads.items())
+        self.stats_threads_label.config(text=threads, foreground='#666666')
+
+    def draw_sparkline(self, canvas, values):
+        canvas.delete("all")
+        width = canvas.winfo_width() if canvas.winfo_width() > 1 else int(canvas["width"])
+        height = int(canvas["height"])
+        values = values[-(width // 2):]
+        if len(values) < 2:
+            return
+        low, high = min(values), max(values)
+        span = (high - low) or 1.0
+        step = (width - 2) / (len(values) - 1)
+        points = []
+        for i, value in enumerate(values):
+            points.append(1 + i * step)
+            points.append(height - 2 - (value - low) / span * (height - 4))
+        canvas.create_line(*points, fill='#28a745', width=1)
+
+    def manual_refresh(self):
+        self.log("Refreshing status...", "#0066cc")
+        self.check_status()
+        self.detect_config_path()
+
+    def clear_output(self):
+        self.clear_log()
+        self.log("Output cleared.")
+
+    def load_config_model(self, then):
+        """Parse (or re-stat) the config and its includes off the UI thread, then call then(model, error)."""
+        def load():
+            try:
+                model = self.config_model
+                if model is None or model.path != os.path.abspath(self.config_path):
+                    model = self.config_model = config_model.ConfigModel(self.config_path)
+                else:
+                    model.refresh()
+                self.root.after(0, then, model, None)
+            except OSError as e:
+                self.root.after(0, then, None, e)
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def view_config(self):
+        if not self.config_path or not os.path.exists(self.config_path):
+            messagebox.showerror("Error", "Configuration file not found.")
+            return
+
+        config_window = tk.Toplevel(self.root)
+        config_window.title(f"Unbound Configuration - {self.config_path}")
+        config_window.geometry("860x600")
+
+        frame = ttk.Frame(config_window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(1, weight=1)
+
+        controls = ttk.Frame(frame)
+        controls.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 5))
+        ttk.Label(controls, text="File:").pack(side=tk.LEFT)
+        file_var = tk.StringVar(value=self.config_path)
+        file_box = ttk.Combobox(controls, textvariable=file_var, state='readonly', width=45)
+        file_box.pack(side=tk.LEFT, padx=(5, 15))
+        ttk.Label(controls, text="Search:").pack(side=tk.LEFT)
+        search_var = tk.StringVar()
+        search_entry = ttk.Entry(controls, textvariable=search_var, width=24)
+        search_entry.pack(side=tk.LEFT, padx=(5, 5))
+
+        # Only the lines in view are ever in the Text widget; the scrollbar is driven by hand.
+        body = ttk.Frame(frame)
+        body.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        body.columnconfigure(1, weight=1)
+        body.rowconfigure(0, weight=1)
+        gutter = tk.Text(body, width=9, wrap=tk.NONE, font=('Courier', 10), bg='#f0f0f0', fg='#999999',
+                         borderwidth=0, takefocus=0)
+        gutter.grid(row=0, column=0, sticky=(tk.N, tk.S))
+        text = tk.Text(body, wrap=tk.NONE, font=('Courier', 10), borderwidth=0)
+        text.grid(row=0, column=1, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(body, orient=tk.VERTICAL)
+        scrollbar.grid(row=0, column=2, sticky=(tk.N, tk.S))
+        across = ttk.Scrollbar(body, orient=tk.HORIZONTAL, command=text.xview)
+        across.grid(row=1, column=1, sticky=(tk.W, tk.E))
+        text.config(xscrollcommand=across.set)
+        text.tag_config("match", background='#ffe08a')
+        text.tag_config("current", background='#ffa500')
+        text.tag_config("comment", foreground='#999999')
+
+        info = ttk.Label(frame, text="Loading...", foreground='#666666')
+        info.grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=2, column=0, sticky=tk.E, pady=(5, 0))
+        ttk.Button(button_frame, text="Close", command=config_window.destroy).pack(side=tk.RIGHT)
+
+        state = {"model": None, "top": 1, "matches": [], "total": 0, "index": -1, "search": 0, "job": None}
+
+        line_height = max(1, int(text.tk.call("font", "metrics", text.cget("font"), "-linespace")))
+
+        def rows():
+            return max(1, text.winfo_height() // line_height)
+
+        def file_lines():
+            return state["model"].file_lines(file_var.get()) if state["model"] else 0
+
+        def render(*_):
+            model = state["model"]
+            if model is None:
+                return
+            path, total, count = file_var.get(), file_lines(), rows()
+            state["top"] = top = max(1, min(state["top"], total - count + 1))
+            lines = model.lines(path, top, count)
+            for widget in (gutter, text):
+                widget.config(state='normal')
+                widget.delete(1.0, tk.END)
+            gutter.insert(1.0, "\n".join(f"{number:>8}" for number in range(top, top + len(lines))))
+            text.insert(1.0, "\n".join(lines))
+            for row, line in enumerate(lines, 1):
+                match = config_apply.COMMENT.search(line)
+                if match:
+                    text.tag_add("comment", f"{row}.{match.start()}", f"{row}.end")
+            needle = search_var.get()
+            if needle:
+                start = "1.0"
+                while True:
+                    start = text.search(needle, start, tk.END, nocase=True)
+                    if not start:
+                        break
+                    end = f"{start}+{len(needle)}c"
+                    text.tag_add("match", start, end)
+                    start = end
+            if 0 <= state["index"] < len(state["matches"]):
+                match_path, number = state["matches"][state["index"]]
+                if match_path == path and top <= number < top + len(lines):
+                    text.tag_add("current", f"{number - top + 1}.0", f"{number - top + 1}.end")
+            for widget in (gutter, text):
+                widget.config(state='disabled')
+            scrollbar.set((top - 1) / max(total, 1), min(1.0, (top - 1 + count) / max(total, 1)))
+
+        def scroll(action, amount, unit=None):
+            if action == "moveto":
+                state["top"] = int(float(amount) * file_lines()) + 1
+            else:
+                state["top"] += int(amount) * (rows() - 1 if unit == "pages" else 1)
+            render()
+
+        def wheel(event):
+            steps = -1 if event.num == 4 or event.delta > 0 else 1
+            scroll("scroll", steps * 3)
+            return "break"
+
+        def show_match(step):
+            matches = state["matches"]
+            if not matches:
+                return
+            state["index"] = (state["index"] + step) % len(matches)
+            path, number = matches[state["index"]]
+            file_var.set(path)
+            state["top"] = number - rows() // 2
+            shown = f"{len(matches):,}" if state["total"] == len(matches) else f"first {len(matches):,}"
+            info.config(text=f"Match {state['index'] + 1} of {shown} ({state['total']:,} in all) - "
+                             f"{path}:{number}", foreground='#666666')
+            render()
+
+        def searched(generation, matches, total):
+            if generation != state["search"] or not config_window.winfo_exists():
+                return
+            state["matches"], state["total"], state["index"] = matches, total, -1
+            if matches:
+                show_match(1)
+            else:
+                info.config(text="No matches", foreground='#999999')
+                render()
+
+        def search(*_):
+            state["job"] = None
+            state["search"] += 1
+            generation, needle = state["search"], search_var.get()
+            if not needle or state["model"] is None:
+                state["matches"], state["index"] = [], -1
+                render()
+                return
+            info.config(text="Searching...", foreground='#0066cc')
+
+            def work():
+                try:
+                    matches, total = state["model"].search(needle, limit=10000)
+                except OSError as e:
+                    config_window.after(0, lambda error=f"Error: {e}": info.config(text=error, foreground='#ff6b6b'))
+                    return
+                config_window.after(0, searched, generation, matches, total)
+
+            threading.Thread(target=work, daemon=True).start()
+
+        def search_soon(*_):
+            # Wait for a pause in typing so each keystroke does not start a scan of every file.
+            if state["job"]:
+                config_window.after_cancel(state["job"])
+            state["job"] = config_window.after(250, search)
+
+        def loaded(model, error):
+            if not config_window.winfo_exists():
+                return
+            if error:
+                info.config(text=f"Error: {error}", foreground='#ff6b6b')
+                return
+            state["model"] = model
+            file_box.config(values=model.files)
+            file_var.set(model.path)
+            lines = sum(model.file_lines(path) for path in model.files)
+            summary = f"{len(model.files)} files, {lines:,} lines, {len(model.clauses)} clauses"
+            if model.errors:
+                info.config(text=f"{summary} - {model.errors[0]}", foreground='#ffa500')
+            else:
+                info.config(text=summary, foreground='#666666')
+            render()
+
+        def change_file(*_):
+            state["top"] = 1
+            render()
+
+        scrollbar.config(command=scroll)
+        text.bind("<Configure>", render)
+        for widget in (text, gutter):
+            widget.bind("<MouseWheel>", wheel)
+            widget.bind("<Button-4>", wheel)
+            widget.bind("<Button-5>", wheel)
+        config_window.bind("<Prior>", lambda _: scroll("scroll", -1, "pages"))
+        config_window.bind("<Next>", lambda _: scroll("scroll", 1, "pages"))
+        config_window.bind("<Control-Home>", lambda _: scroll("moveto", 0))
+        config_window.bind("<Control-End>", lambda _: scroll("moveto", 1))
+        search_entry.bind("<Return>", lambda _: show_match(1))
+        search_entry.bind("<Shift-Return>", lambda _: show_match(-1))
+        ttk.Button(controls, text="Previous", command=lambda: show_match(-1)).pack(side=tk.LEFT)
+        ttk.Button(controls, text="Next", command=lambda: show_match(1)).pack(side=tk.LEFT, padx=(5, 0))
+        file_box.bind("<<ComboboxSelected>>", change_file)
+        search_var.trace_add("write", search_soon)
+        self.load_config_model(loaded)
+
+    def fix_config(self):
+        if not self.config_path:
+            messagebox.showerror("Error", "Configuration path not detected.\nPlease install Unbound first.")
+            return
+        if os.path.exists(self.config_path):
+            self.load_config_model(self.fix_config_dialog)
+        else:
+            self.fix_config_dialog(None, None)
+
+    def fix_config_dialog(self, model, error):
+        if error:
+            messagebox.showerror("Error", f"Failed to read config file:\n{str(error)}")
+            return
+        hardware = config_gen.detect_hardware()
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Fix Configuration")
+        dialog.geometry("760x560")
+        dialog.transient(self.root)
+
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.columnconfigure(1, weight=1)
+        frame.rowconfigure(3, weight=1)
+
+        ttk.Label(frame, text="Host:").grid(row=0, column=0, sticky=tk.W)
+        ttk.Label(frame, text=config_gen.describe_hardware(hardware),
+                 foreground='#666666').grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
+
+        ttk.Label(frame, text="Profile:").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        profile_var = tk.StringVar(value="default")
+        ttk.Combobox(frame, textvariable=profile_var, values=config_gen.PROFILES, state='readonly',
+                     width=20).grid(row=1, column=1, sticky=tk.W, padx=(10, 0), pady=(5, 0))
+        extended_var = tk.BooleanVar(value=bool(model) and model.get("extended-statistics") == "yes")
+        ttk.Checkbutton(frame, text="Extended statistics (latency histogram)", variable=extended_var).grid(
+            row=1, column=1, sticky=tk.E, pady=(5, 0))
+
+        # An existing config is patched line by line, so includes, blocklists and zones added by hand stay.
+        ttk.Label(frame, text="Lines that will change (a backup of each file will be created):").grid(
+            row=2, column=0, columnspan=2, sticky=tk.W, pady=(10, 5))
+        diff_text = scrolledtext.ScrolledText(frame, wrap=tk.NONE, font=('Courier', 10))
+        diff_text.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+        diff_text.tag_config("add", foreground='#28a745')
+        diff_text.tag_config("remove", foreground='#ff6b6b')
+        diff_text.tag_config("location", foreground='#0066cc')
+
+        generated = {}
+
+        def preview(*_):
+            generated['content'] = config_gen.generate(profile_var.get(), hardware, extended_var.get())
+            if model:
+                generated['patches'] = config_model.plan_generated(model, generated['content'])
+                diff = config_model.format_patches(generated['patches'])
+            else:
+                diff = config_gen.diff_config("", generated['content'], self.config_path, "generated")
+            diff_text.config(state='normal')
+            diff_text.delete(1.0, tk.END)
+            for line in (diff or "No changes").splitlines():
+                tag = ("add" if line.startswith("+") else "remove" if line.startswith("-")
+                       else "location" if line.startswith("@@") else ())
+                diff_text.insert(tk.END, line + "\n", tag)
+            diff_text.config(state='disabled')
+
+        profile_var.trace_add("write", preview)
+        extended_var.trace_add("write", preview)
+        preview()
+
+        def apply():
+            dialog.destroy()
+            self.clear_log()
+            self.log(f"Regenerating Unbound configuration ({profile_var.get()} profile)...", "#0066cc")
+            self.log(config_gen.describe_hardware(hardware))
+            threading.Thread(target=fix, args=(generated['content'], generated.get('patches')),
+                             daemon=True).start()
+
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=4, column=0, columnspan=2, sticky=tk.E, pady=(10, 0))
+        ttk.Button(button_frame, text="Apply", command=apply).pack(side=tk.RIGHT)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT, padx=(0, 5))
+
+        def fix(config_content, patches):
+            try:
+                self.log("Validating with unbound-checkconf and installing atomically...", "#0066cc")
+                if model:
+                    result = config_model.apply_patches(model, patches, restart=self.restart_service)
+                else:
+                    result = config_apply.apply_config(config_content, self.config_path,
+                                                       restart=self.restart_service)
+            except (OSError, ValueError, config_apply.ConfigError, unbound_control.ControlError) as e:
+                self.log(f"ERROR: {str(e)}", "#ff6b6b")
+                messagebox.showerror("Error", f"Failed to apply configuration:\n{str(e)}")
+                return
+
+            self.log(config_apply.format_result(result), "#28a745")
+            if not result.changed and result.method is None:
+                return
+            self.root.after(0, self.check_status)
+            if result.method is None:
+                messagebox.showinfo("Success",
+                                  "Configuration regenerated successfully!\n\n"
+                                  "The config no longer requires the 'unbound' user.\n\n"
+                                  "Click Start to launch Unbound with the new config.")
+            else:
+                messagebox.showinfo("Success",
+                                  "Configuration regenerated and applied.\n\n"
+                                  f"Resolution gap: {result.gap_seconds * 1000:.0f}ms")
+
+    def view_system_dns(self):
+        self.clear_log()
+        self.log("Checking system DNS configuration...", "#0066cc")
+
+        def check():
+            if self.os_type == "macos":
+                self.run_command("scutil --dns | grep 'nameserver'")
+            else:
+                self.run_command("cat /etc/resolv.conf")
+
+        threading.Thread(target=check, daemon=True).start()
+
+    def check_port_53(self):
+        self.clear_log()
+        self.log("Checking what's using port 53...", "#0066cc")
+        self.log("=" * 50, "#0066cc")
+
+        def check():
+            self.log("\nChecking TCP port 53:")
+            self.run_command("sudo lsof -i :53 -sTCP:LISTEN")
+
+            self.log("\nChecking UDP port 53:")
+            self.run_command("sudo lsof -i :53 -sUDP:Idle")
+
+            self.log("\nChecking for Unbound process:")
+            result = subprocess.run(['pgrep', '-fl', 'unbound'],
+                                   capture_output=True, text=True, timeout=5)
+            if result.returncode == 0:
+                self.log(result.stdout.strip(), "#28a745")
+            else:
+                self.log("No Unbound process found", "#ff6b6b")
+
+            self.log("\n" + "=" * 50, "#0066cc")
+            self.log("Diagnostic complete", "#0066cc")
+
+        threading.Thread(target=check, daemon=True).start()
+
+    def socket_preflight(self):
+        self.clear_log()
+        self.log("Checking socket buffers and descriptor limits...", "#0066cc")
+        self.log("=" * 50, "#0066cc")
+
+        def check():
+            try:
+                source, settings = preflight.load_settings(self.config_path)
+                pids = status_probe.find_pids("unbound")
+                checks = preflight.preflight(settings, pid=pids[0] if pids else None)
+                sample = preflight.sample_drops(pids=pids)
+            except (OSError, ValueError) as e:
+                self.log(f"Error: {e}", "#ff6b6b")
+                return
+            self.log(f"\nChecking {source}:")
+            for result in checks:
+                self.log(f"{'OK' if result.ok else 'FAIL':<5} {result.name}: {result.detail}",
+                         "#28a745" if result.ok else "#ff6b6b")
+                if result.fix:
+                    self.log(f"      Fix: {result.fix}", "#ffa500")
+            self.log("\n" + preflight.format_drops(sample))
+            self.log("\n" + "=" * 50, "#0066cc")
+            self.log("Preflight complete", "#0066cc")
+
+        threading.Thread(target=check, daemon=True).start()
+
+    def test_multiple_dns(self):
+        self.clear_log()
+        self.log("Testing multiple DNS servers...", "#0066cc")
+
+        def test():
+            servers = [
+                ("Local Unbound", "127.0.0.1"),
+                ("Cloudflare", "1.1.1.1"),
+                ("Google", "8.8.8.8"),
+                ("Quad9", "9.9.9.9")
+            ]
+
+            results = dns_probe.run_probes([server for _, server in servers], ["google.com"],
+                                           timeout=3.0)
+
+            for (name, server), result in zip(servers, results):
+                self.log(f"\nTesting {name} ({server}):", "#0066cc")
+                if result.ok:
+                    self.log(f"Response time: {result.rtt_ms:.1f}ms", "#28a745")
+                    self.log(f"Result: {', '.join(r.data for r in result.answers)[:50]}")
+                else:
+                    self.log(f"Failed: {result.error or result.rcode}", "#ff6b6b")
+
+        threading.Thread(target=test, daemon=True).start()
+
+    def benchmark_resolver(self):
+        window = tk.Toplevel(self.root)
+        window.title("Benchmark Resolver")
+        window.geometry("700x520")
+
+        form = ttk.Frame(window, padding="10")
+        form.pack(fill=tk.X)
+        form.columnconfigure(1, weight=1)
+
+        server_var = tk.StringVar(value="127.0.0.1")
+        port_var = tk.StringVar(value="53")
+        file_var = tk.StringVar(value="")
+        mode_var = tk.StringVar(value="concurrency")
+        load_var = tk.StringVar(value="10")
+        duration_var = tk.StringVar(value="10")
+        fake_var = tk.BooleanVar(value=False)
+
+        ttk.Label(form, text="Server:").grid(row=0, column=0, sticky=tk.W, pady=3)
+        ttk.Entry(form, textvariable=server_var, width=20).grid(row=0, column=1, sticky=tk.W, pady=3)
+        ttk.Label(form, text="Port:").grid(row=0, column=2, sticky=tk.W, padx=(10, 0), pady=3)
+        ttk.Entry(form, textvariable=port_var, width=6).grid(row=0, column=3, sticky=tk.W, pady=3)
+
+        ttk.Label(form, text="Query file:").grid(row=1, column=0, sticky=tk.W, pady=3)
+        ttk.Entry(form, textvariable=file_var).grid(row=1, column=1, columnspan=2,
+                                                    sticky=(tk.W, tk.E), pady=3)
+
+        def browse():
+            path = filedialog.askopenfilename(
+                filetypes=[("Domain lists", "*.txt"), ("Packet captures", "*.pcap"),
+                           ("All files", "*.*")])
+            if path:
+                file_var.set(path)
+
+        ttk.Button(form, text="Browse...", command=browse,
+                   style='Secondary.TButton').grid(row=1, column=3, sticky=tk.W, pady=3)
+
+        ttk.Radiobutton(form, text="Concurrent queries", variable=mode_var,
+                        value="concurrency").grid(row=2, column=0, sticky=tk.W, pady=3)
+        ttk.Radiobutton(form, text="Target QPS", variable=mode_var,
+                        value="qps").grid(row=2, column=1, sticky=tk.W, pady=3)
+        ttk.Entry(form, textvariable=load_var, width=8).grid(row=2, column=2, sticky=tk.W, pady=3)
+
+        ttk.Label(form, text="Duration (s):").grid(row=3, column=0, sticky=tk.W, pady=3)
+        ttk.Entry(form, textvariable=duration_var, width=8).grid(row=3, column=1, sticky=tk.W, pady=3)
+        ttk.Checkbutton(form, text="Use built-in fake responder (offline)",
+                        variable=fake_var).grid(row=3, column=2, columnspan=2, sticky=tk.W, pady=3)
+
+        results = scrolledtext.ScrolledText(window, height=14, wrap=tk.WORD,
+                                            font=('Courier', 9), bg='#1e1e1e', fg='#d4d4d4')
+        results.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        button_frame = ttk.Frame(window, padding="10")
+        button_frame.pack(fill=tk.X)
+
+        def show(text):
+            if window.winfo_exists():
+                results.delete(1.0, tk.END)
+                results.insert(tk.END, text + "\n")
+                run_btn.config(state='normal')
+
+        def run():
+            try:
+                queries = benchmark.load_queries(file_var.get().strip() or None)
+                load = float(load_var.get())
+                options = {
+                    "server": server_var.get().strip(),
+                    "port": int(port_var.get()),
+                    "duration": float(duration_var.get()),
+                    "qps": load if mode_var.get() == "qps" else None,
+                    "concurrency": None if mode_var.get() == "qps" else int(load),
+                }
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Benchmark", f"Invalid benchmark settings:\n{str(e)}", parent=window)
+                return
+
+            fake = {"seed": 0} if fake_var.get() else None
+            run_btn.config(state='disabled')
+            results.delete(1.0, tk.END)
+            results.insert(tk.END, f"Replaying {len(queries)} distinct queries for "
+                                   f"{options['duration']:g}s...\n")
+
+            def work():
+                try:
+                    report = benchmark.benchmark(queries, fake=fake, **options)
+                    text = benchmark.format_report(report)
+                except Exception as e:
+                    text = f"Benchmark failed: {str(e)}"
+                self.root.after(0, show, text)
+                self.root.after(0, self.log, "Benchmark complete:\n" + text, "#0066cc")
+
+            threading.Thread(target=work, daemon=True).start()
+
+        run_btn = ttk.Button(button_frame, text="Run Benchmark", command=run, style='Primary.TButton')
+        run_btn.pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Close", command=window.destroy).pack(side=tk.RIGHT)
+
+    def profile_cache(self):
+        flush = messagebox.askyesnocancel("Profile Cache",
+                                          "Flush the test domains from Unbound's cache first\n"
+                                          "(unbound-control flush_zone) so the first pass is truly cold?")
+        if flush is None:
+            return
+
+        self.clear_log()
+        self.log("Profiling cold vs warm cache latency...", "#0066cc")
+        self.log("=" * 70, "#0066cc")
+
+        def profile():
+            try:
+                result = cache_profiler.profile_cache(benchmark.DEFAULT_DOMAINS, flush=flush,
+                                                      config_path=self.config_path)
+            except Exception as e:
+                self.log(f"ERROR: {str(e)}", "#ff6b6b")
+                return
+
+            self.log(cache_profiler.format_profile(result))
+            path = cache_profiler.save_profile(result)
+            self.log(f"\nResults saved to {path}", "#28a745")
+
+        threading.Thread(target=profile, daemon=True).start()
+
+    def evaluate_upstreams(self):
+        if not self.config_path or not os.path.exists(self.config_path):
+            messagebox.showerror("Error", "Configuration file not found.")
+            return
+
+        try:
+            with open(self.config_path, 'r') as f:
+                current = f.read()
+            # Upstreams pruned on an earlier run are measured again and restored if they recovered.
+            targets = upstreams.forward_addrs(current) + upstreams.pruned_addrs(current)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to read config file:\n{str(e)}")
+            return
+        if not targets:
+            messagebox.showerror("Error", "No forward-addr lines found in the configuration.")
+            return
+
+        self.clear_log()
+        self.log(f"Measuring {len(targets)} DNS-over-TLS upstreams (5 rounds)...", "#0066cc")
+        self.log("=" * 70, "#0066cc")
+
+        def progress(round_number, measurements):
+            ok = sum(m.ok for m in measurements)
+            self.log(f"Round {round_number}: {ok}/{len(measurements)} upstreams answered",
+                     "#28a745" if ok == len(measurements) else "#ffa500")
+
+        def evaluate():
+            evaluator = upstreams.UpstreamEvaluator(targets)
+            ranking = asyncio.run(evaluator.run(5, 2.0, progress))
+            self.log("")
+            for entry in ranking:
+                self.log(upstreams.format_stats(entry),
+                         "#28a745" if entry.failures == 0 else "#ff6b6b" if entry.rtt_ms is None else "#ffa500")
+            kept, pruned = upstreams.plan(ranking)
+            for entry, reason in pruned:
+                self.log(f"Slow or failing: {entry.upstream.spec} ({reason})", "#ff6b6b")
+            self.root.after(0, lambda: self.confirm_upstream_order(kept, pruned))
+
+        threading.Thread(target=evaluate, daemon=True).start()
+
+    def confirm_upstream_order(self, kept, pruned):
+        summary = "\n".join(f"{i}. {entry.upstream.spec}" for i, entry in enumerate(kept, 1))
+        if pruned:
+            summary += "\n\nComment out:\n" + "\n".join(entry.upstream.spec for entry, _ in pruned)
+        if not messagebox.askyesno("Evaluate Upstreams",
+                                   f"Rewrite forward-zone in this order and reload Unbound?\n\n{summary}"):
+            return
+
+        def apply():
+            try:
+                self.log(config_apply.format_result(upstreams.apply(self.config_path, kept, pruned)),
+                         "#28a745")
+            except (OSError, config_apply.ConfigError, unbound_control.ControlError) as e:
+                self.log(f"ERROR: {str(e)}", "#ff6b6b")
+
+        threading.Thread(target=apply, daemon=True).start()
+
+    def analyze_query_log(self):
+        default = "/var/log/unbound.log"
+        path = filedialog.askopenfilename(
+            title="Unbound log with log-queries or log-replies enabled",
+            initialdir=os.path.dirname(default) if os.path.isdir(os.path.dirname(default)) else None,
+            filetypes=[("Log files", "*.log *.log.* *.gz"), ("All files", "*.*")])
+        if not path:
+            return
+
+        self.clear_log()
+        self.log(f"Analyzing {path}...", "#0066cc")
+        self.log("=" * 70, "#0066cc")
+
+        def analyze():
+            try:
+                summary = log_analyzer.analyze(path, jobs=os.cpu_count() or 1)
+            except (OSError, ValueError) as e:
+                self.log(f"ERROR: {str(e)}", "#ff6b6b")
+                return
+            for line in log_analyzer.format_summary(summary).splitlines():
+                self.log(line, "#ffa500" if line.startswith("No query") else None)
+
+        threading.Thread(target=analyze, daemon=True).start()
+
+    def latency_histogram(self):
+        window = tk.Toplevel(self.root)
+        window.title("Latency Histogram (extended-statistics)")
+        window.geometry("760x520")
+
+        frame = ttk.Frame(window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(1, weight=1)
+
+        spans = {"1 minute": 60, "5 minutes": 300, "1 hour": 3600, "24 hours": 86400, "All": None}
+        span_var = tk.StringVar(value="5 minutes")
+        controls = ttk.Frame(frame)
+        controls.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        ttk.Label(controls, text="Window:").pack(side=tk.LEFT)
+        ttk.Combobox(controls, textvariable=span_var, values=list(spans), state='readonly',
+                     width=12).pack(side=tk.LEFT, padx=(5, 15))
+        snapshot_label = ttk.Label(controls, text="No snapshot", foreground='#666666')
+
+        canvas = tk.Canvas(frame, bg='#1e1e1e', highlightthickness=0)
+        canvas.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 5))
+        summary = ttk.Label(frame, text="Waiting for two stats samples...", font=('Courier', 10),
+                            justify=tk.LEFT)
+        summary.grid(row=2, column=0, sticky=tk.W)
+
+        try:
+            series = histogram.HistogramSeries.load(histogram.DEFAULT_FILE, append=True)
+        except (OSError, ValueError):
+            series = histogram.HistogramSeries(path=histogram.DEFAULT_FILE)
+        state = {"snapshot": None, "job": None, "polling": False}
+
+        def current():
+            span = spans[span_var.get()]
+            return series.last(span) if span else series.window()
+
+        def capture():
+            if not len(series):
+                return
+            state["snapshot"] = current()
+            snapshot_label.config(text=f"Snapshot {datetime.now():%H:%M:%S} ({span_var.get()})")
+            redraw()
+
+        ttk.Button(controls, text="Capture Snapshot", command=capture).pack(side=tk.LEFT)
+        snapshot_label.pack(side=tk.LEFT, padx=(10, 0))
+
+        def to_x(seconds, low, high, width):
+            return 50 + (width - 70) * (math.log10(seconds) - low) / ((high - low) or 1)
+
+        def draw_curve(counts, color, low, high, width, height):
+            points = []
+            for upper, fraction in histogram.cdf(series.bounds, counts):
+                points += [to_x(upper, low, high, width), height - 30 - fraction * (height - 50)]
+            if len(points) >= 4:
+                canvas.create_line(*points, fill=color, width=2)
+
+        def draw_marker(counts, color, low, high, width, height, dash=()):
+            p99 = histogram.percentile(series.bounds, counts, 0.99)
+            if p99:
+                x = to_x(p99, low, high, width)
+                canvas.create_line(x, 20, x, height - 30, fill=color, dash=dash)
+                canvas.create_text(x + 4, 24, text=f"p99 {p99 * 1000:.1f}ms", fill=color, anchor=tk.NW)
+
+        def redraw(*_):
+            canvas.delete("all")
+            width, height = max(canvas.winfo_width(), 200), max(canvas.winfo_height(), 150)
+            counts = current() if series.bounds else []
+            snapshot = state["snapshot"]
+            used = [u for c in filter(None, (counts, snapshot)) for u, _ in histogram.cdf(series.bounds, c)]
+            if not used:
+                return
+            low = math.log10(min(used) / 2)
+            high = math.log10(max(used))
+            for decade in range(math.floor(low), math.ceil(high) + 1):
+                x = to_x(10 ** decade, low, high, width)
+                if 50 <= x <= width - 20:
+                    canvas.create_line(x, 20, x, height - 30, fill='#333333')
+                    canvas.create_text(x, height - 20, text=f"{10 ** decade * 1000:g}ms", fill='#999999')
+            for fraction in (0, 0.5, 0.9, 1.0):
+                y = height - 30 - fraction * (height - 50)
+                canvas.create_text(45, y, text=f"{fraction * 100:g}%", fill='#999999', anchor=tk.E)
+
+            lines = [f"Window:   {histogram.format_percentiles(series.bounds, counts)}"]
+            color = '#28a745'
+            if snapshot:
+                comparison = histogram.compare(series.bounds, snapshot, counts)
+                if comparison.regressions:
+                    color = '#ff6b6b'
+                draw_curve(snapshot, '#0066cc', low, high, width, height)
+                draw_marker(snapshot, '#0066cc', low, high, width, height, dash=(3, 3))
+                lines.insert(0, f"Snapshot: {histogram.format_percentiles(series.bounds, snapshot)}")
+                if 0.99 in comparison.regressions:
+                    change = comparison.after[0.99] / comparison.before[0.99] - 1
+                    lines.append(f"p99 regression: {change * 100:+.0f}% against the snapshot")
+            draw_curve(counts, color, low, high, width, height)
+            draw_marker(counts, color, low, high, width, height)
+            summary.config(text="\n".join(lines), foreground='#dc3545' if color == '#ff6b6b' else '#000000')
+
+        def poll():
+            if not window.winfo_exists():
+                return
+            if not state["polling"]:
+                state["polling"] = True
+
+                def fetch():
+                    try:
+                        series.record(stats.parse_stats(stats.fetch_stats(self.config_path)))
+                        window.after(0, redraw)
+                    except (unbound_control.ControlError, OSError, ValueError) as e:
+                        window.after(0, lambda error=f"Error: {e}": summary.config(text=error,
+                                                                                   foreground='#dc3545'))
+                    finally:
+                        state["polling"] = False
+
+                threading.Thread(target=fetch, daemon=True).start()
+            state["job"] = window.after(int(histogram.DEFAULT_INTERVAL * 1000), poll)
+
+        def close():
+            if state["job"]:
+                window.after_cancel(state["job"])
+            window.destroy()
+
+        span_var.trace_add("write", redraw)
+        canvas.bind("<Configure>", redraw)
+        window.protocol("WM_DELETE_WINDOW", close)
+        poll()
+
+    def cache_size_advisor(self):
+        path = filedialog.askopenfilename(
+            title="Query trace: Unbound log with log-queries or log-replies, pcap, or name list",
+            filetypes=[("Query traces", "*.log *.log.* *.gz *.pcap *.cap *.txt"), ("All files", "*.*")])
+        if not path:
+            return
+        window = tk.Toplevel(self.root)
+        window.title(f"Cache Size Advisor - {os.path.basename(path)}")
+        window.geometry("760x520")
+
+        frame = ttk.Frame(window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(1, weight=1)
+
+        target_var = tk.StringVar(value="Auto")
+        controls = ttk.Frame(frame)
+        controls.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        ttk.Label(controls, text="Target hit rate:").pack(side=tk.LEFT)
+        ttk.Combobox(controls, textvariable=target_var, state='readonly', width=8,
+                     values=["Auto", "70%", "80%", "85%", "90%", "95%", "98%"]).pack(side=tk.LEFT, padx=(5, 15))
+
+        canvas = tk.Canvas(frame, bg='#1e1e1e', highlightthickness=0)
+        canvas.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 5))
+        summary = ttk.Label(frame, text="Simulating...", font=('Courier', 10), justify=tk.LEFT)
+        summary.grid(row=2, column=0, sticky=tk.W)
+
+        settings = cache_profiler.read_cache_settings(self.config_path)
+        state = {"curve": None}
+
+        def to_x(entries, high, width):
+            return 50 + (width - 70) * math.log10(entries) / (high or 1)
+
+        def redraw(*_):
+            curve = state["curve"]
+            if not curve or not curve.sizes:
+                return
+            canvas.delete("all")
+            width, height = max(canvas.winfo_width(), 200), max(canvas.winfo_height(), 150)
+            to_y = lambda rate: height - 30 - rate * (height - 50)
+            high = math.log10(max(curve.sizes[-1], 10))
+            for decade in range(0, math.ceil(high) + 1):
+                x = to_x(10 ** decade, high, width)
+                if x <= width - 20:
+                    canvas.create_line(x, 20, x, height - 30, fill='#333333')
+                    size = cache_advisor.format_size(cache_advisor.EntrySizes().message_cache(10 ** decade))
+                    canvas.create_text(x, height - 20, text=f"{10 ** decade:,}", fill='#999999')
+                    canvas.create_text(x, height - 8, text=size, fill='#666666')
+            for fraction in (0, 0.5, 0.9, 1.0):
+                canvas.create_text(45, to_y(fraction), text=f"{fraction * 100:g}%", fill='#999999', anchor=tk.E)
+            points = []
+            for size, rate in zip(curve.sizes, curve.hit_rates):
+                points += [to_x(size, high, width), to_y(rate)]
+            if len(points) >= 4:
+                canvas.create_line(*points, fill='#28a745', width=2)
+
+            choice = target_var.get()
+            advice = cache_advisor.recommend(curve, None if choice == "Auto" else float(choice[:-1]) / 100)
+            y = to_y(advice["goal"])
+            canvas.create_line(50, y, width - 20, y, fill='#ffa500', dash=(3, 3))
+            x = to_x(advice["entries"], high, width)
+            canvas.create_line(x, 20, x, height - 30, fill='#0066cc')
+            canvas.create_text(x + 4, 24, fill='#0066cc', anchor=tk.NW,
+                               text=f"msg {advice['msg-cache-size']} / rrset {advice['rrset-cache-size']}")
+            configured = cache_advisor.current(curve, settings)
+            x = to_x(max(configured["entries"], 1), high, width)
+            if x <= width - 20:
+                canvas.create_line(x, 20, x, height - 30, fill='#999999', dash=(2, 4))
+            summary.config(foreground='#000000', text=f"{cache_advisor.format_trace(curve)}\n"
+                                                      f"{cache_advisor.format_advice(advice, configured)}")
+
+        def progress(simulator):
+            window.after(0, lambda: summary.config(text=f"Simulating... {simulator.seen:,} queries read",
+                                                   foreground='#666666'))
+
+        def simulate():
+            try:
+                curve = cache_advisor.simulate(path, cache_advisor.simulator_for(settings), progress=progress)
+            except (OSError, ValueError) as e:
+                window.after(0, lambda error=f"Error: {e}": summary.config(text=error, foreground='#dc3545'))
+                return
+            state["curve"] = curve
+            if not curve.references:
+                window.after(0, lambda: summary.config(text="No queries found in the trace", foreground='#dc3545'))
+                return
+            window.after(0, redraw)
+
+        target_var.trace_add("write", redraw)
+        canvas.bind("<Configure>", redraw)
+        threading.Thread(target=simulate, daemon=True).start()
+
+    def metrics_history(self):
+        if not self.metrics:
+            messagebox.showerror("Metrics History", f"Could not open {metrics_store.DEFAULT_DB}")
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Metrics History")
+        window.geometry("820x540")
+
+        frame = ttk.Frame(window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(2, weight=1)
+        frame.rowconfigure(4, weight=1)
+
+        spans = {"1 hour": 3600, "24 hours": 86400, "7 days": 7 * 86400, "30 days": 30 * 86400}
+        span_var = tk.StringVar(value="24 hours")
+        controls = ttk.Frame(frame)
+        controls.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        ttk.Label(controls, text="Range:").pack(side=tk.LEFT)
+        ttk.Combobox(controls, textvariable=span_var, values=list(spans), state='readonly',
+                     width=10).pack(side=tk.LEFT, padx=(5, 15))
+        info = ttk.Label(frame, text="Loading...", foreground='#666666')
+        info.grid(row=5, column=0, sticky=tk.W, pady=(5, 0))
+
+        charts = {}
+        for row, (name, label) in ((1, ("qps", "Queries per second")), (3, ("hit_rate", "Cache hit rate"))):
+            ttk.Label(frame, text=label, font=('Arial', 10, 'bold')).grid(row=row, column=0, sticky=tk.W,
+                                                                          pady=(10, 2))
+            charts[name] = tk.Canvas(frame, bg='#1e1e1e', highlightthickness=0, height=160)
+            charts[name].grid(row=row + 1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        state = {"series": None, "job": None, "loading": False}
+
+        def draw(canvas, series, values, text):
+            canvas.delete("all")
+            width, height = max(canvas.winfo_width(), 200), max(canvas.winfo_height(), 80)
+            known = [v for v in values if v is not None]
+            if not known:
+                canvas.create_text(width / 2, height / 2, text="No samples in this range", fill='#999999')
+                return
+            high = max(known) or 1.0
+            span = series.end - series.start
+            canvas.create_text(55, 12, text=text(high), fill='#999999', anchor=tk.E)
+            canvas.create_text(55, height - 12, text=text(0), fill='#999999', anchor=tk.E)
+            segment = []
+            for t, value in zip(series.times, values):
+                if value is None:
+                    if len(segment) >= 4:
+                        canvas.create_line(*segment, fill='#28a745')
+                    segment = []
+                    continue
+                segment += [60 + (width - 70) * (t - series.start) / span,
+                            height - 10 - value / high * (height - 20)]
+            if len(segment) >= 4:
+                canvas.create_line(*segment, fill='#28a745')
+
+        def redraw(*_):
+            series = state["series"]
+            if series:
+                draw(charts["qps"], series, series.qps, lambda v: f"{v:.0f}")
+                draw(charts["hit_rate"], series, series.hit_rate, lambda v: f"{v * 100:.0f}%")
+
+        def loaded(series):
+            state["series"] = series
+            info.config(text=f"{len(series.times)} points from {series.rows:,} {series.source} rows "
+                             f"in {series.seconds * 1000:.0f}ms", foreground='#666666')
+            redraw()
+
+        def load(*_):
+            if state["loading"]:
+                return
+            state["loading"] = True
+            span = spans[span_var.get()]
+
+            def fetch():
+                try:
+                    now = datetime.now().timestamp()
+                    series = self.metrics.query(now - span, now)
+                    window.after(0, loaded, series)
+                except sqlite3.Error as e:
+                    window.after(0, lambda error=f"Error: {e}": info.config(text=error, foreground='#dc3545'))
+                finally:
+                    state["loading"] = False
+
+            threading.Thread(target=fetch, daemon=True).start()
+
+        def export(columnar):
+            table = "samples" if spans[span_var.get()] <= metrics_store.RAW_RETENTION else "rollups"
+            path = filedialog.asksaveasfilename(
+                defaultextension=".ubcol" if columnar else ".csv",
+                filetypes=[("Column files", "*.ubcol")] if columnar else [("CSV files", "*.csv")],
+                initialfile=f"unbound_{table}_{datetime.now():%Y%m%d_%H%M%S}")
+            if not path:
+                return
+            start = datetime.now().timestamp() - spans[span_var.get()]
+            try:
+                write = self.metrics.export_columns if columnar else self.metrics.export_csv
+                count = write(path, table, start)
+                self.log(f"Exported {count} {table} rows to {path}", "#28a745")
+            except (OSError, sqlite3.Error) as e:
+                messagebox.showerror("Export Failed", str(e))
+
+        ttk.Button(controls, text="Export CSV", command=lambda: export(False)).pack(side=tk.LEFT)
+        ttk.Button(controls, text="Export Columns", command=lambda: export(True)).pack(side=tk.LEFT, padx=(5, 0))
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            load()
+            state["job"] = window.after(30000, refresh)
+
+        def close():
+            if state["job"]:
+                window.after_cancel(state["job"])
+            window.destroy()
+
+        span_var.trace_add("write", load)
+        for canvas in charts.values():
+            canvas.bind("<Configure>", redraw)
+        window.protocol("WM_DELETE_WINDOW", close)
+        refresh()
+
+    def manage_fleet(self):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Fleet")
+        dialog.geometry("560x360")
+        dialog.transient(self.root)
+
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.columnconfigure(1, weight=1)
+
+        inventory_var = tk.StringVar(value="")
+        action_var = tk.StringVar(value="status")
+        transport_var = tk.StringVar(value="ssh")
+        workers_var = tk.IntVar(value=fleet.DEFAULT_WORKERS)
+        max_failures_var = tk.StringVar(value="")
+        config_var = tk.StringVar(value="")
+        kind_var = tk.StringVar(value="zone")
+        name_var = tk.StringVar(value="")
+
+        def browse(var, title):
+            path = filedialog.askopenfilename(parent=dialog, title=title)
+            if path:
+                var.set(path)
+
+        rows = [
+            ("Inventory:", ttk.Entry(frame, textvariable=inventory_var),
+             lambda: browse(inventory_var, "Inventory: one host per line")),
+            ("Action:", ttk.Combobox(frame, textvariable=action_var, values=list(fleet.ACTIONS),
+                                     state='readonly', width=12), None),
+            ("Transport:", ttk.Combobox(frame, textvariable=transport_var, values=list(fleet.TRANSPORTS),
+                                        width=12), None),
+            ("Hosts at once:", ttk.Spinbox(frame, from_=1, to=256, textvariable=workers_var, width=6), None),
+            ("Stop after failures:", ttk.Entry(frame, textvariable=max_failures_var, width=6), None),
+            ("Config to apply:", ttk.Entry(frame, textvariable=config_var),
+             lambda: browse(config_var, "unbound.conf to install on every host")),
+            ("Flush:", ttk.Combobox(frame, textvariable=kind_var, values=list(cache_flush.FLUSH_KINDS),
+                                    state='readonly', width=12), None),
+            ("Name / zone:", ttk.Entry(frame, textvariable=name_var), None),
+        ]
+        for i, (label, widget, command) in enumerate(rows):
+            ttk.Label(frame, text=label).grid(row=i, column=0, sticky=tk.W, pady=3)
+            widget.grid(row=i, column=1, sticky=tk.W if isinstance(widget, (ttk.Combobox, ttk.Spinbox))
+                        else (tk.W, tk.E), padx=(10, 0), pady=3)
+            if command:
+                ttk.Button(frame, text="Browse...", command=command).grid(row=i, column=2, padx=(5, 0))
+
+        progress = ttk.Label(frame, text="", foreground='#666666')
+        progress.grid(row=len(rows), column=0, columnspan=3, sticky=tk.W, pady=(10, 0))
+
+        def run():
+            try:
+                hosts = fleet.load_inventory(inventory_var.get())
+                text = None
+                if action_var.get() == "apply":
+                    with open(config_var.get()) as f:
+                        text = f.read()
+                fn = fleet.action(action_var.get(), text=text, kind=kind_var.get(),
+                                  domain=name_var.get().strip() or None)
+                transport = fleet.make_transport(transport_var.get())
+                max_failures = int(max_failures_var.get()) if max_failures_var.get().strip() else None
+                # Read on this thread: Tk variables must not be touched from the worker.
+                try:
+                    workers = workers_var.get()
+                except tk.TclError:
+                    workers = 0
+                if workers < 1:
+                    raise ValueError("Hosts at once must be a whole number of at least 1")
+            except (OSError, ValueError, ImportError, AttributeError) as e:
+                messagebox.showerror("Fleet", str(e), parent=dialog)
+                return
+            if action_var.get() == "apply" and not messagebox.askyesno(
+                    "Fleet", f"Install {config_var.get()} and reload Unbound on {len(hosts)} hosts?", parent=dialog):
+                return
+
+            run_btn.config(state='disabled')
+            self.clear_log()
+            self.log(f"Fleet {action_var.get()} on {len(hosts)} hosts, {workers} at a time", "#0066cc")
+            self.log("=" * 70, "#0066cc")
+            done = []
+
+            def on_done(result):
+                done.append(result)
+                color = '#28a745' if result.ok else '#ffa500' if result.skipped else '#ff6b6b'
+                self.log(fleet.format_result(result), color)
+                failed = sum(not r.ok for r in done)
+                dialog.after(0, lambda: progress.config(text=f"{len(done)}/{len(hosts)} done, {failed} not OK"))
+
+            def work():
+                try:
+                    results = fleet.run_fleet(hosts, fn, transport, workers, on_done=on_done,
+                                              max_failures=max_failures)
+                    summary = fleet.summarize(results)
+                    for line in fleet.format_summary(summary).splitlines():
+                        self.log(line, "#28a745" if summary["ok"] == summary["hosts"] else "#ffa500")
+                finally:
+                    dialog.after(0, lambda: run_btn.config(state='normal'))
+
+            threading.Thread(target=work, daemon=True).start()
+
+        buttons = ttk.Frame(frame)
+        buttons.grid(row=len(rows) + 1, column=0, columnspan=3, sticky=tk.E, pady=(10, 0))
+        run_btn = ttk.Button(buttons, text="Run", command=run)
+        run_btn.pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Close", command=dialog.destroy).pack(side=tk.LEFT, padx=(5, 0))
+
+    def flush_cache(self):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Flush DNS Cache")
+        dialog.geometry("520x460")
+        dialog.transient(self.root)
+
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.columnconfigure(1, weight=1)
+
+        kind_var = tk.StringVar(value="name")
+        name_var = tk.StringVar(value="")
+        type_var = tk.StringVar(value="A")
+        measure_var = tk.BooleanVar(value=True)
+        system_var = tk.BooleanVar(value=self.os_type == "macos")
+
+        ttk.Label(frame, text="Scope:").grid(row=0, column=0, sticky=tk.NW)
+        scopes = ttk.Frame(frame)
+        scopes.grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
+        for i, (kind, spec) in enumerate(cache_flush.FLUSH_KINDS.items()):
+            ttk.Radiobutton(scopes, text=spec.label, variable=kind_var, value=kind).grid(
+                row=i, column=0, sticky=tk.W)
+            ttk.Label(scopes, text=spec.description, foreground='#666666',
+                      font=('Arial', 8)).grid(row=i, column=1, sticky=tk.W, padx=(10, 0))
+
+        ttk.Label(frame, text="Name / zone:").grid(row=1, column=0, sticky=tk.W, pady=(10, 3))
+        name_entry = ttk.Entry(frame, textvariable=name_var)
+        name_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=(10, 0), pady=(10, 3))
+        ttk.Label(frame, text="Type:").grid(row=2, column=0, sticky=tk.W, pady=3)
+        type_box = ttk.Combobox(frame, textvariable=type_var, width=8,
+                                values=sorted(dns_probe.QTYPES))
+        type_box.grid(row=2, column=1, sticky=tk.W, padx=(10, 0), pady=3)
+
+        ttk.Checkbutton(frame, text="Measure latency impact", variable=measure_var).grid(
+            row=3, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
+        ttk.Checkbutton(frame, text="Also flush the system resolver cache", variable=system_var).grid(
+            row=4, column=0, columnspan=2, sticky=tk.W)
+
+        def update_fields(*_):
+            spec = cache_flush.FLUSH_KINDS[kind_var.get()]
+            name_entry.config(state='normal' if spec.needs_name else 'disabled')
+            type_box.config(state='normal' if spec.needs_type else 'disabled')
+
+        kind_var.trace_add("write", update_fields)
+        update_fields()
+
+        def apply():
+            kind, name, rtype = kind_var.get(), name_var.get().strip(), type_var.get().strip()
+            if cache_flush.FLUSH_KINDS[kind].needs_name and not name:
+                messagebox.showerror("Flush DNS Cache", "Enter a domain name for this scope.", parent=dialog)
+                return
+            measure, flush_system = measure_var.get(), system_var.get()
+            dialog.destroy()
+            self.clear_log()
+            self.log(f"Flushing DNS cache ({cache_flush.FLUSH_KINDS[kind].label.lower()})...", "#0066cc")
+            threading.Thread(target=flush, args=(kind, name, rtype, measure, flush_system),
+                             daemon=True).start()
+
+        def flush(kind, name, rtype, measure, flush_system):
+            try:
+                if measure:
+                    impact = cache_flush.measure_impact(kind, name, rtype, config=self.config_path)
+                    ok = impact.result.ok
+                    self.log(cache_flush.format_impact(impact), "#28a745" if ok else "#ff6b6b")
+                else:
+                    result = cache_flush.flush(kind, name, rtype, self.config_path)
+                    ok = result.ok
+                    self.log(cache_flush.format_result(result), "#28a745" if ok else "#ff6b6b")
+            except unbound_control.ControlError as e:
+                self.log(f"ERROR: {str(e)}", "#ff6b6b")
+                ok = False
+
+            if flush_system:
+                if self.os_type == "macos":
+                    self.run_command("sudo dscacheutil -flushcache")
+                    self.run_command("sudo killall -HUP mDNSResponder")
+                else:
+                    self.run_command("resolvectl flush-caches")
+
+            if ok:
+                self.log("DNS cache flushed", "#28a745")
+
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=5, column=0, columnspan=2, sticky=tk.E, pady=(15, 0))
+        ttk.Button(button_frame, text="Flush", command=apply).pack(side=tk.RIGHT)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT, padx=(0, 5))
+
+    def export_log(self):
+        self.log_pump.flush()
+        content = self.output_text.get(1.0, tk.END)
+
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".txt",
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+            initialfile=f"unbound_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        )
+
+        if filename:
+            try:
+                with open(filename, 'w') as f:
+                    f.write(content)
+                messagebox.showinfo("Success", f"Log exported to:\n{filename}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to export log:\n{str(e)}")
+
+    def show_about(self):
+        about_text = """Unbound DNS Installer GUI
+Version 2.0
+
+A modern interface for installing and managing
+Unbound DNS with automatic failover and DoT support.
+
+Features:
+- Cross-platform support
+- Real-time monitoring
+- DNS-over-TLS encryption
+- Automatic failover
+- DNSSEC validation
+
+Supports: macOS, Debian, Ubuntu, Fedora, Arch Linux"""
+
+        messagebox.showinfo("About", about_text)
+
+    def show_docs(self):
+        docs_text = """Quick Start Guide:
+
+1. Install: Click Install button to set up Unbound
+2. Monitor: Check status indicators for service health
+3. Test: Use Test DNS to verify functionality
+4. Manage: Use Start/Stop/Restart as needed
+
+Menu Options:
+- File > Export Log: Save output to file
+- Tools > View Config: Browse unbound.conf and its includes, however
+  large, and search every file as you type
+- Tools > Fix Config: Regenerate settings for this host, patching only
+  the lines that change
+- Tools > Reload Config: Validate and apply unbound.conf without a restart
+- Tools > View System DNS: Check DNS settings
+- Tools > Socket Buffer Preflight: so-rcvbuf/so-sndbuf and fd limits vs.
+  the kernel, and UDP queries Unbound dropped
+- Tools > Test Multiple Servers: Compare performance
+- Tools > Benchmark Resolver: Measure QPS and latency
+- Tools > Profile Cache: Compare cold and warm latency
+- Tools > Evaluate Upstreams: Rank DNS-over-TLS upstreams by latency
+- Tools > Analyze Query Log: Top names, clients, types, rcodes and latency
+- Tools > Latency Histogram: Recursion-time CDF; snapshot and compare p99
+- Tools > Metrics History: QPS and hit-rate trends over up to 30 days
+- Tools > Cache Size Advisor: Hit rate vs. cache size from a query log or
+  pcap, and the smallest msg/rrset-cache-size reaching a target
+- Tools > Fleet: Status, stats, config apply or flush on many hosts over ssh
+- Preserve cache across restarts: Dump the cache before Stop/Restart
+  and load it back after Start, then pre-resolve top domains
+- Tools > Flush DNS Cache: Flush a name, zone or cache without restarting
+
+Tips:
+- Enable Auto-refresh for live monitoring
+- Check Last Check timestamp for freshness
+- Use Clear Output to reset the log window"""
+
+        messagebox.showinfo("Documentation", docs_text)
+
+    def restart_unbound(self):
+        self.clear_log()
+        self.log("Restarting Unbound DNS service...")
+
+        def restart():
+            hit_rate_before = self.save_cache() if self.preserve_cache.get() else None
+
+            success = self.restart_service()
+            if success:
+                ready = config_apply.wait_for_port()
+                if ready is None:
+                    self.log("WARNING: Unbound is not answering on port 53 yet", "#ffa500")
+                else:
+                    self.log(f"Answering on port 53 after {ready:.2f}s")
+
+            if success:
+                self.log("Unbound restarted successfully", "#28a745")
+                if self.preserve_cache.get():
+                    self.restore_cache(hit_rate_before)
+            else:
+                self.log("Failed to restart Unbound", "#ff6b6b")
+
+            self.root.after(0, self.check_status)
+
+        threading.Thread(target=restart, daemon=True).start()
+
+    def restart_service(self):
+        if self.os_type == "macos":
+            self.run_command("sudo killall unbound")
+            config_apply.wait_for_stop()
+            try:
+                brew_prefix = subprocess.run(['brew', '--prefix'],
+                                            capture_output=True, text=True, timeout=5)
+                if brew_prefix.returncode != 0:
+                    return False
+                prefix = brew_prefix.stdout.strip()
+                config_path = f"{prefix}/etc/unbound/unbound.conf"
+                return self.run_command(f"sudo {prefix}/sbin/unbound -c {config_path} &")
+            except (OSError, subprocess.SubprocessError):
+                return False
+        return self.run_command("sudo systemctl restart unbound")
+
+    def reload_config(self):
+        if not self.config_path or not os.path.exists(self.config_path):
+            messagebox.showerror("Error", "Configuration file not found.")
+            return
+
+        self.clear_log()
+        self.log("Reloading configuration without restarting...", "#0066cc")
+
+        def reload():
+            try:
+                result = config_apply.reload_config(self.config_path, restart=self.restart_service)
+                self.log(config_apply.format_result(result), "#28a745")
+            except (config_apply.ConfigError, unbound_control.ControlError) as e:
+                self.log(f"ERROR: {str(e)}", "#ff6b6b")
+            self.root.after(0, self.check_status)
+
+        threading.Thread(target=reload, daemon=True).start()
+
+    def save_cache(self, measure=True):
+        hit_rate = None
+        if measure:
+            names = cache_warmup.top_domains()
+            hit_rate = cache_warmup.measured_warm_up(names, config=self.config_path)[2]
+        try:
+            self.log("Saving DNS cache (unbound-control dump_cache)...", "#0066cc")
+            self.log(cache_warmup.format_dump(cache_warmup.save_cache(config=self.config_path)), "#28a745")
+        except (OSError, unbound_control.ControlError) as e:
+            self.log(f"WARNING: Could not save cache: {str(e)}", "#ffa500")
+        return hit_rate
+
+    def restore_cache(self, hit_rate_before=None):
+        self.log("Restoring DNS cache and pre-resolving top domains...", "#0066cc")
+        try:
+            report = cache_warmup.restore(names=cache_warmup.top_domains(), config=self.config_path)
+        except unbound_control.ControlError as e:
+            self.log(f"WARNING: Could not restore cache: {str(e)}", "#ffa500")
+            return
+        report.hit_rate_before = hit_rate_before
+        self.log(cache_warmup.format_report(report), "#ffa500" if report.skipped else "#28a745")
+
+    def install_unbound(self):
+        if self.is_installing:
+            messagebox.showwarning("Busy", "Installation is already in progress")
+            return
+
+        if self.os_type == "macos":
+            confirm_msg = ("This will install Unbound DNS and modify system DNS settings.\n\n"
+                          "The script will request sudo privileges when needed.\n\n"
+                          "Continue?")
+        else:
+            confirm_msg = ("This will install Unbound DNS and modify system DNS settings.\n\n"
+                          "The script requires sudo privileges.\n\n"
+                          "Continue?")
+
+        response = messagebox.askyesno("Confirm Installation", confirm_msg)
+        if not response:
+            return
+
+        self.is_installing = True
+        self.install_btn.config(text="Cancel", command=self.cancel_command)
+        self.clear_log()
+
+        def install():
+            self.log("=" * 70, "#0066cc")
+            self.log("STARTING UNBOUND DNS INSTALLATION", "#0066cc")
+            self.log("=" * 70, "#0066cc")
+            self.log("")
+
+            script_path = Path(__file__).resolve().parent.parent / "unbound_dns.sh"
+
+            if not script_path.exists():
+                self.log("ERROR: unbound_dns.sh not found!", "#ff6b6b")
+                self.log("Please ensure the bash script is in the same directory.", "#ff6b6b")
+                self.log(f"Looking for: {script_path}", "#ff6b6b")
+                self.root.after(0, self.installation_complete, False)
+                return
+
+            self.log(f"Found installation script: {script_path}", "#28a745")
+            self.log("Starting installation process...\n")
+
+            if self.os_type == "macos":
+                success = self.run_command(f"bash {script_path}")
+            else:
+                success = self.run_command(f"sudo bash {script_path}")
+
+            self.log("")
+            result = self.last_command_result
+            if result and result.phases:
+                self.log(f"Phase timings ({result.seconds:.1f}s total):", "#0066cc")
+                self.log(command_runner.format_phases(result.phases))
+                self.log("")
+
+            if success:
+                self.log("=" * 70, "#28a745")
+                self.log("INSTALLATION COMPLETED SUCCESSFULLY", "#28a745")
+                self.log("=" * 70, "#28a745")
+                self.log("\nYour system is now using Unbound DNS with:", "#28a745")
+                self.log("  - DNS-over-TLS encryption", "#28a745")
+                self.log("  - Automatic failover", "#28a745")
+                self.log("  - DNSSEC validation", "#28a745")
+            else:
+                self.log("=" * 70, "#ff6b6b")
+                self.log("INSTALLATION FAILED", "#ff6b6b")
+                self.log("=" * 70, "#ff6b6b")
+                self.log("\nPlease check the error messages above.", "#ff6b6b")
+
+            self.root.after(0, self.installation_complete, success)
+
+        threading.Thread(target=install, daemon=True).start()
+
+    def installation_complete(self, success):
+        self.is_installing = False
+        self.current_command = None
+        self.last_command_result = None
+        self.install_btn.config(state='normal')
+        self.check_status()
+        self.detect_config_path()
+
+        if success:
+            messagebox.showinfo("Success",
+                              "Unbound DNS installed successfully!\n\n"
+                              "Your system is now using secure DNS with:\n"
+                              "  • Automatic failover\n"
+                              "  • DNS-over-TLS encryption\n"
+                              "  • DNSSEC validation\n\n"
+                              "Use 'Test DNS' to verify functionality.")
+        else:
+            messagebox.showerror("Installation Failed",
+                               "The installation did not complete successfully.\n\n"
+                               "Please check the output window for details.")
+
+    def start_unbound(self):
+        self.clear_log()
+        self.log("Starting Unbound DNS service...")
+
+        def start():
+            if self.os_type == "macos":
+                self.log("Checking for existing Unbound processes...")
+                kill_result = subprocess.run(['pgrep', '-x', 'unbound'], capture_output=True)
+                if kill_result.returncode == 0:
+                    self.log("Stopping existing Unbound process...")
+                    self.run_command("sudo killall unbound")
+                    config_apply.wait_for_stop()
+
+                try:
+                    brew_prefix = subprocess.run(['brew', '--prefix'],
+                                                capture_output=True, text=True, timeout=5)
+                    if brew_prefix.returncode == 0:
+                        prefix = brew_prefix.stdout.strip()
+                        unbound_bin = f"{prefix}/sbin/unbound"
+                        config_path = f"{prefix}/etc/unbound/unbound.conf"
+
+                        self.log(f"Using Unbound binary: {unbound_bin}")
+                        self.log(f"Using config: {config_path}")
+
+                        if not os.path.exists(unbound_bin):
+                            self.log(f"ERROR: Unbound binary not found at {unbound_bin}", "#ff6b6b")
+                            success = False
+                        elif not os.path.exists(config_path):
+                            self.log(f"ERROR: Config file not found at {config_path}", "#ff6b6b")
+                            success = False
+                        else:
+                            self.log("Starting Unbound with sudo...")
+                            result = subprocess.run(
+                                ['sudo', unbound_bin, '-c', config_path],
+                                capture_output=True, text=True, timeout=10
+                            )
+
+                            if result.returncode != 0:
+                                self.log(f"ERROR: Unbound failed to start", "#ff6b6b")
+                                if result.stderr:
+                                    self.log(f"Error output: {result.stderr}", "#ff6b6b")
+                                if result.stdout:
+                                    self.log(f"Output: {result.stdout}")
+                                success = False
+                            else:
+                                check = subprocess.run(['pgrep', '-x', 'unbound'], capture_output=True)
+                                success = check.returncode == 0
+
+                                if not success:
+                                    self.log("WARNING: Command succeeded but process not found", "#ffa500")
+                    else:
+                        self.log("ERROR: Could not determine Homebrew prefix", "#ff6b6b")
+                        success = False
+                except Exception as e:
+                    self.log(f"ERROR: Exception while starting: {str(e)}", "#ff6b6b")
+                    success = False
+            else:
+                success = self.run_command("sudo systemctl start unbound")
+
+            if success:
+                ready = config_apply.wait_for_port()
+                if ready is None:
+                    self.log("WARNING: Unbound is not answering on port 53 yet", "#ffa500")
+                else:
+                    self.log(f"Answering on port 53 after {ready:.2f}s")
+                self.log("Unbound started successfully", "#28a745")
+                if self.preserve_cache.get() and cache_warmup.dump_age() is not None:
+                    self.restore_cache()
+                self.log("Verifying Unbound is running...")
+                if self.os_type == "macos":
+                    verify = subprocess.run(['pgrep', '-x', 'unbound'], capture_output=True)
+                    if verify.returncode == 0:
+                        self.log("Verified: Unbound process is running", "#28a745")
+                    else:
+                        self.log("WARNING: Unbound process not found after start", "#ffa500")
+            else:
+                self.log("Failed to start Unbound", "#ff6b6b")
+                self.log("\nTroubleshooting:", "#ffa500")
+                self.log("1. Try running manually: sudo $(brew --prefix)/sbin/unbound -c $(brew --prefix)/etc/unbound/unbound.conf", "#ffa500")
+                self.log("2. Check config syntax: sudo unbound-checkconf", "#ffa500")
+                self.log("3. View errors with: Tools > Check Port 53", "#ffa500")
+
+            self.root.after(0, self.check_status)
+
+        threading.Thread(target=start, daemon=True).start()
+
+    def stop_unbound(self):
+        self.clear_log()
+        self.log("Stopping Unbound DNS service...")
+
+        def stop():
+            if self.preserve_cache.get():
+                self.save_cache(measure=False)
+
+            if self.os_type == "macos":
+                success = self.run_command("sudo killall unbound")
+            else:
+                success = self.run_command("sudo systemctl stop unbound")
+
+            if success:
+                config_apply.wait_for_stop()
+
+            if success:
+                self.log("Unbound stopped successfully", "#28a745")
+            else:
+                self.log("Failed to stop Unbound", "#ff6b6b")
+
+            self.root.after(0, self.check_status)
+
+        threading.Thread(target=stop, daemon=True).start()
+
+    def test_dns(self):
+        self.clear_log()
+        self.log("Testing DNS resolution...", "#0066cc")
+        self.log("=" * 50, "#0066cc")
+
+        def test():
+            self.log("\nChecking if Unbound is running...")
+            status = status_probe.probe(self.os_type)
+
+            if not status.running:
+                self.log("ERROR: Unbound is not running!", "#ff6b6b")
+                self.log("Please start Unbound first using the Start button.", "#ff6b6b")
+                return
+
+            self.log("Unbound is running. Checking port 53...", "#28a745")
+            if status.port_in_use:
+                self.log("Port 53 is in use (good!)", "#28a745")
+                if status.owned_by_unbound:
+                    self.log("Unbound is listening on port 53", "#28a745")
+                elif status.owned_by_unbound is False:
+                    self.log("WARNING: Another process is using port 53", "#ffa500")
+                    self.log(status_probe.describe(status))
+            else:
+                self.log("WARNING: Port 53 check inconclusive", "#ffa500")
+
+            test_domains = ["google.com", "cloudflare.com", "github.com"]
+            all_passed = True
+
+            self.log(f"\nQuerying {', '.join(test_domains)} via local Unbound (127.0.0.1)...")
+            results = dns_probe.run_probes(["127.0.0.1"], test_domains, timeout=5.0)
+
+            for result in results:
+                self.log(f"\n{result.name}:")
+                if result.ok:
+                    self.log(f"SUCCESS - Response time: {result.rtt_ms:.1f}ms ({result.transport})", "#28a745")
+                    for record in result.answers[:3]:
+                        self.log(f"  → {record.data}")
+                elif result.timed_out:
+                    self.log(f"FAILED - Query timed out (>5s)", "#ff6b6b")
+                    self.log("This suggests Unbound is not responding on 127.0.0.1:53", "#ff6b6b")
+                    all_passed = False
+                else:
+                    self.log(f"FAILED - {result.error or result.rcode}", "#ff6b6b")
+                    all_passed = False
+
+            self.log("\n" + "=" * 50, "#0066cc")
+            if all_passed:
+                self.log("DNS TEST RESULT: ALL TESTS PASSED", "#28a745")
+                self.log("Your DNS is working correctly!", "#28a745")
+            else:
+                self.log("DNS TEST RESULT: SOME TESTS FAILED", "#ff6b6b")
+                self.log("\nTroubleshooting steps:", "#ffa500")
+                self.log("1. Check if Unbound is running (Status panel)", "#ffa500")
+                self.log("2. Try restarting Unbound", "#ffa500")
+                self.log("3. Check config with 'View Config' button", "#ffa500")
+                if self.os_type == "macos":
+                    self.log("4. Run: sudo lsof -i :53", "#ffa500")
+                else:
+                    self.log("4. Run: sudo systemctl status unbound", "#ffa500")
+
+        threading.Thread(target=test, daemon=True).start()
+
+def main():
+    root = tk.Tk()
+    app = UnboundInstallerGUI(root)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
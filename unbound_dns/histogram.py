@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Recursion-time histograms from extended-statistics: recording, CDFs and tail comparisons."""
+
+import os
+import re
+import struct
+import time
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from . import stats
+
+DEFAULT_FILE = Path.home() / ".unbound_histograms" / "recursion.hist"
+DEFAULT_INTERVAL = 10.0
+PERCENTILES = (0.5, 0.9, 0.99, 0.999)
+REGRESSION_THRESHOLD = 0.2
+
+MAGIC = b"UBHIST1\n"
+_BUCKET_KEY = re.compile(r"^histogram\.(\d+)\.(\d+)\.to\.(\d+)\.(\d+)$")
+
+
+def buckets(values):
+    """[(lower, upper, count)] in seconds from parsed stats values; empty without extended-statistics."""
+    found = []
+    for key, value in values.items():
+        match = _BUCKET_KEY.match(key)
+        if match:
+            low_s, low_us, high_s, high_us = map(int, match.groups())
+            found.append((low_s + low_us / 1e6, high_s + high_us / 1e6, value))
+    return sorted(found)
+
+
+def percentile(bounds, counts, q):
+    """The q-quantile, interpolated linearly inside its bucket; None for an empty histogram."""
+    total = sum(counts)
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for (lower, upper), count in zip(bounds, counts):
+        if count and seen + count >= target:
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return bounds[-1][1]
+
+
+def cdf(bounds, counts):
+    """[(upper bound, fraction of replies at or below it)] for the buckets that hold any replies."""
+    total = sum(counts)
+    points = []
+    seen = 0
+    for (_, upper), count in zip(bounds, counts):
+        seen += count
+        if count and total:
+            points.append((upper, seen / total))
+    return points
+
+
+class HistogramSeries:
+    """Per-interval bucket counts, kept as flat arrays so days of 10-second samples stay small.
+
+    In memory a sample is 8 bytes of timestamp and 4 per bucket. With `path` set, every
+    sample is also appended there as timestamp, nonzero bucket indexes and their counts, so a
+    typical sample with a dozen busy buckets takes about 70 bytes (about 600 KB a day).
+    """
+
+    def __init__(self, bounds=(), path=None):
+        self.bounds = [tuple(b) for b in bounds]
+        self.path = Path(path) if path else None
+        self.times = array("d")
+        self.counts = array("I")
+        self._last = None
+
+    def __len__(self):
+        return len(self.times)
+
+    def record(self, values, timestamp=None):
+        """Add the interval since the previous stats sample; returns its counts, or None for the first sample."""
+        current = buckets(values)
+        if not current:
+            raise ValueError("No histogram.* counters; enable extended-statistics in unbound.conf")
+        bounds = [(lower, upper) for lower, upper, _ in current]
+        if not self.bounds:
+            self.bounds = bounds
+        elif bounds != self.bounds:
+            raise ValueError("Histogram buckets changed between samples")
+        cumulative = [count for _, _, count in current]
+        previous, self._last = self._last, cumulative
+        if previous is None:
+            return None
+        counts = [int(stats.counter_delta(p, c)) for p, c in zip(previous, cumulative)]
+        self.append(time.time() if timestamp is None else timestamp, counts)
+        return counts
+
+    def append(self, timestamp, counts):
+        self.times.append(timestamp)
+        self.counts.extend(counts)
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "ab") as f:
+                if f.tell() == 0:
+                    f.write(self._header())
+                f.write(_pack_sample(timestamp, counts))
+
+    def sample(self, index):
+        n = len(self.bounds)
+        return self.counts[index * n:(index + 1) * n].tolist()
+
+    def window(self, start=None, end=None):
+        """Summed bucket counts of the samples taken in (start, end]; each covers the interval ending then."""
+        n = len(self.bounds)
+        lo = 0 if start is None else bisect_right(self.times, start)
+        hi = len(self.times) if end is None else bisect_right(self.times, end)
+        if lo >= hi:
+            return [0] * n
+        return [sum(self.counts[lo * n + j:hi * n:n]) for j in range(n)]
+
+    def last(self, seconds, offset=0.0):
+        """Counts for the `seconds` ending `offset` seconds before the newest sample."""
+        if not self.times:
+            return [0] * len(self.bounds)
+        end = self.times[-1] - offset
+        return self.window(end - seconds, end)
+
+    def _header(self):
+        flat = array("d", [edge for bound in self.bounds for edge in bound])
+        return MAGIC + struct.pack("<H", len(self.bounds)) + flat.tobytes()
+
+    def save(self, path):
+        """Write every sample to `path` (replacing it), e.g. to keep a snapshot for later comparison."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.name + ".partial")
+        with open(partial, "wb") as f:
+            f.write(self._header())
+            for i, timestamp in enumerate(self.times):
+                f.write(_pack_sample(timestamp, self.sample(i)))
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path, append=False):
+        """Read a series file; with `append`, newly recorded samples go to the same file."""
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{path} is not a histogram series file")
+        offset = len(MAGIC)
+        (n,) = struct.unpack_from("<H", data, offset)
+        offset += 2
+        flat = array("d")
+        flat.frombytes(data[offset:offset + 16 * n])
+        offset += 16 * n
+        series = cls(zip(flat[::2], flat[1::2]), path if append else None)
+        while offset < len(data):
+            try:
+                timestamp, used = struct.unpack_from("<dB", data, offset)
+                indexes = struct.unpack_from(f"<{used}B", data, offset + 9)
+                values = struct.unpack_from(f"<{used}I", data, offset + 9 + used)
+            except struct.error:
+                break  # a sample cut short by a crash mid-write
+            offset += 9 + 5 * used
+            counts = [0] * n
+            for index, value in zip(indexes, values):
+                counts[index] = value
+            series.times.append(timestamp)
+            series.counts.extend(counts)
+        if append and offset < len(data):
+            # Drop the torn sample, or the next one appended would be read from its middle.
+            os.truncate(path, offset)
+        return series
+
+
+def _pack_sample(timestamp, counts):
+    nonzero = [(i, c) for i, c in enumerate(counts) if c]
+    return struct.pack(f"<dB{len(nonzero)}B{len(nonzero)}I", timestamp, len(nonzero),
+                       *(i for i, _ in nonzero), *(c for _, c in nonzero))
+
+
+@dataclass
+class Comparison:
+    before: dict
+    after: dict
+    before_replies: int
+    after_replies: int
+    threshold: float = REGRESSION_THRESHOLD
+    regressions: list = field(default_factory=list)
+
+
+def compare(bounds, before, after, threshold=REGRESSION_THRESHOLD):
+    """Percentiles of two windows, flagging those that got more than `threshold` slower."""
+    result = Comparison({q: percentile(bounds, before, q) for q in PERCENTILES},
+                        {q: percentile(bounds, after, q) for q in PERCENTILES},
+                        sum(before), sum(after), threshold)
+    for q in PERCENTILES:
+        old, new = result.before[q], result.after[q]
+        if old and new and new > old * (1 + threshold):
+            result.regressions.append(q)
+    return result
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.2f}ms"
+
+
+def _label(q):
+    return f"p{q * 100:g}"
+
+
+def format_percentiles(bounds, counts):
+    return "  ".join(f"{_label(q)} {_ms(percentile(bounds, counts, q))}" for q in PERCENTILES) + \
+        f"  ({sum(counts):,} replies)"
+
+
+def format_cdf(bounds, counts, width=40):
+    lines = []
+    for upper, fraction in cdf(bounds, counts):
+        lines.append(f"  <= {_ms(upper):>10}  {fraction * 100:6.2f}%  {'#' * round(fraction * width)}")
+    return "\n".join(lines) or "  No recursive replies in this window"
+
+
+def format_comparison(comparison):
+    lines = [f"{'':>7} {'before':>10} {'after':>10}  change",
+             f"{'replies':>7} {comparison.before_replies:>10,} {comparison.after_replies:>10,}"]
+    for q in PERCENTILES:
+        old, new = comparison.before[q], comparison.after[q]
+        change = f"{(new / old - 1) * 100:+.0f}%" if old and new else ""
+        flag = "  REGRESSION" if q in comparison.regressions else ""
+        lines.append(f"{_label(q):>7} {_ms(old):>10} {_ms(new):>10}  {change}{flag}")
+    return "\n".join(lines)
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""Large files read in big pieces that end on a line boundary, for tools that scan them with bytes or regex ops."""
+
+BLOCK_SIZE = 4 << 20
+
+
+def read(f, size=BLOCK_SIZE):
+    """Pieces of about `size` from `f` (bytes or text), each ending with a newline except perhaps the last."""
+    tail = None
+    while True:
+        block = f.read(size)
+        if not block:
+            if tail:
+                yield tail
+            return
+        block = tail + block if tail else block
+        cut = block.rfind("\n" if isinstance(block, str) else b"\n") + 1
+        if cut:
+            tail = block[cut:]
+            yield block[:cut]
+        else:
+            tail = block
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Thread-safe log queue drained into a Tk text widget in batches from the Tk thread."""
+
+import queue
+
+DEFAULT_COLORS = ("#888888", "#ff6b6b", "#28a745", "#0066cc", "#ffa500")
+DEFAULT_MAX_LINES = 5000
+DEFAULT_INTERVAL_MS = 50
+DEFAULT_BATCH = 5000
+
+
+class LogSink:
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def push(self, message, color=None):
+        self._queue.put((message, color))
+
+    def drain(self, limit=DEFAULT_BATCH):
+        records = []
+        try:
+            while len(records) < limit:
+                records.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return records
+
+    def discard(self):
+        dropped = 0
+        try:
+            while True:
+                self._queue.get_nowait()
+                dropped += 1
+        except queue.Empty:
+            pass
+        return dropped
+
+
+class TextLogPump:
+    def __init__(self, root, widget, sink=None, max_lines=DEFAULT_MAX_LINES,
+                 interval_ms=DEFAULT_INTERVAL_MS, batch=DEFAULT_BATCH, colors=DEFAULT_COLORS):
+        self.root = root
+        self.widget = widget
+        self.sink = sink or LogSink()
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        self.batch = batch
+        self.tags = set()
+        self._job = None
+        for color in colors:
+            self._tag(color)
+
+    def _tag(self, color):
+        name = f"color_{color}"
+        if color not in self.tags:
+            self.widget.tag_config(name, foreground=color)
+            self.tags.add(color)
+        return name
+
+    def start(self):
+        self._job = self.root.after(self.interval_ms, self._tick)
+        return self
+
+    def stop(self):
+        if self._job:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+    def _tick(self):
+        self.flush()
+        self._job = self.root.after(self.interval_ms, self._tick)
+
+    def flush(self):
+        records = self.sink.drain(self.batch)
+        drained = len(records)
+        if not drained:
+            return 0
+        if self.max_lines and drained > self.max_lines:
+            records = records[-self.max_lines:]
+
+        args = []
+        for message, color in records:
+            args.append(message + "\n")
+            args.append((self._tag(color),) if color else ())
+        self.widget.insert("end", *args)
+        self.trim()
+        self.widget.see("end")
+        return drained
+
+    def trim(self):
+        if not self.max_lines:
+            return
+        lines = int(self.widget.index("end-1c").split(".")[0]) - 1
+        if lines > self.max_lines:
+            self.widget.delete("1.0", f"{lines - self.max_lines + 1}.0")
+
+    def clear(self):
+        self.sink.discard()
+        self.widget.delete("1.0", "end")
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Append-only SQLite (WAL) store of stats and status samples, with 1-minute rollups and retention."""
+
+import csv
+import json
+import math
+import re
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+
+DEFAULT_DB = Path.home() / ".unbound_metrics" / "metrics.db"
+RAW_RETENTION = 24 * 3600
+ROLLUP_RETENTION = 30 * 86400
+ROLLUP_SECONDS = 60
+DEFAULT_POINTS = 800
+
+COLUMNS_MAGIC = b"UBCOL1\n"
+SAMPLE_FIELDS = ("ts", "seconds", "queries", "cachehits", "cachemiss",
+                 "requestlist_avg", "recursion_avg", "recursion_median")
+ROLLUP_FIELDS = ("minute", "samples", "seconds", "queries", "cachehits", "cachemiss", "requestlist_sum",
+                 "recursion_sum", "recursion_median_max", "qps_max", "status_samples", "running_samples")
+
+# Rollups keep sums rather than averages so any coarser bucket can be recomputed exactly;
+# the two averages are weighted by cache misses, as Unbound weights them by recursions.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    ts REAL PRIMARY KEY, seconds REAL, queries REAL, cachehits REAL, cachemiss REAL,
+    requestlist_avg REAL, recursion_avg REAL, recursion_median REAL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS status (
+    ts REAL PRIMARY KEY, running INTEGER, port_in_use INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollups (
+    minute INTEGER PRIMARY KEY, samples INTEGER, seconds REAL, queries REAL, cachehits REAL, cachemiss REAL,
+    requestlist_sum REAL, recursion_sum REAL, recursion_median_max REAL, qps_max REAL,
+    status_samples INTEGER, running_samples INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL) WITHOUT ROWID;
+"""
+
+ROLLUP_SQL = """
+INSERT OR REPLACE INTO rollups
+SELECT minute, SUM(n), SUM(seconds), SUM(queries), SUM(cachehits), SUM(cachemiss), SUM(rl), SUM(rc),
+       MAX(median), MAX(qps), SUM(sn), SUM(running)
+FROM (
+    SELECT CAST(ts / 60 AS INTEGER) * 60 AS minute, 1 AS n, seconds, queries, cachehits, cachemiss,
+           requestlist_avg * cachemiss AS rl, recursion_avg * cachemiss AS rc, recursion_median AS median,
+           queries / seconds AS qps, 0 AS sn, 0 AS running
+    FROM samples WHERE ts >= :start AND ts < :end
+    UNION ALL
+    SELECT CAST(ts / 60 AS INTEGER) * 60, 0, 0, 0, 0, 0, 0, 0, NULL, NULL, 1, running
+    FROM status WHERE ts >= :start AND ts < :end
+) GROUP BY minute
+"""
+
+# Both sources reduced to the same sums so one GROUP BY can bucket them together;
+# a row stamped exactly at the end of the range goes in the last bucket.
+RAW_ROWS = """
+SELECT ts AS t, seconds, queries, cachehits, cachemiss, requestlist_avg * cachemiss AS rl,
+       recursion_avg * cachemiss AS rc, 0 AS sn, 0 AS running
+FROM samples WHERE ts > :start AND ts <= :end AND ts >= :raw_from
+UNION ALL
+SELECT ts, 0, 0, 0, 0, 0, 0, 1, running FROM status WHERE ts > :start AND ts <= :end AND ts >= :raw_from
+"""
+ROLLUP_ROWS = """
+SELECT minute + 60 AS t, seconds, queries, cachehits, cachemiss, requestlist_sum AS rl, recursion_sum AS rc,
+       status_samples AS sn, running_samples AS running
+FROM rollups WHERE minute + 60 > :start AND minute < :end AND minute < :raw_from
+"""
+BUCKET_SQL = """
+SELECT MIN(CAST((t - :start) / :step AS INTEGER), :last) AS bucket, SUM(seconds), SUM(queries), SUM(cachehits),
+       SUM(cachemiss), SUM(rl), SUM(rc), SUM(sn), SUM(running), COUNT(*)
+FROM ({rows}) GROUP BY bucket ORDER BY bucket
+"""
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)\s*([smhdw]?)$")
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_duration(text):
+    """Seconds in "90", "15m", "24h", "7d" or "2w"."""
+    match = _DURATION.match(str(text).strip().lower())
+    if not match:
+        raise ValueError(f"Invalid duration {text!r}; use e.g. 90s, 15m, 24h or 7d")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+@dataclass
+class Series:
+    start: float
+    end: float
+    step: float
+    source: str
+    rows: int = 0
+    seconds: float = 0.0
+    times: list = field(default_factory=list)
+    qps: list = field(default_factory=list)
+    hit_rate: list = field(default_factory=list)
+    recursion_avg: list = field(default_factory=list)
+    requestlist_avg: list = field(default_factory=list)
+    running: list = field(default_factory=list)
+
+
+class MetricsStore:
+    """One connection shared by the GUI's threads, serialised by a lock; WAL lets other
+    processes (a `stats --store` in a terminal) read and write the same file meanwhile."""
+
+    def __init__(self, path=DEFAULT_DB, raw_retention=RAW_RETENTION, rollup_retention=ROLLUP_RETENTION):
+        self.path = Path(path)
+        self.raw_retention = raw_retention
+        self.rollup_retention = rollup_retention
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._next_maintenance = 0.0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def add_interval(self, interval):
+        """Store one stats.Interval."""
+        self._insert("samples", [(interval.timestamp, interval.seconds, interval.queries, interval.cachehits,
+                                  interval.cachemiss, interval.requestlist_avg, interval.recursion_avg,
+                                  interval.recursion_median)], interval.timestamp)
+
+    def add_status(self, status, timestamp=None):
+        """Store one status_probe.Status."""
+        timestamp = time.time() if timestamp is None else timestamp
+        self._insert("status", [(timestamp, int(bool(status.running)), int(bool(status.port_in_use)))],
+                     timestamp)
+
+    def add_samples(self, rows):
+        """Bulk insert of SAMPLE_FIELDS tuples (imports, benchmarks)."""
+        rows = list(rows)
+        if rows:
+            self._insert("samples", rows, max(row[0] for row in rows))
+
+    def _insert(self, table, rows, now):
+        marks = ",".join("?" * len(rows[0]))
+        with self._lock, self._db:
+            self._db.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({marks})", rows)
+        if now >= self._next_maintenance:
+            self.maintain(now)
+
+    def _meta(self, key, default=0.0):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def maintain(self, now=None):
+        """Roll finished minutes into rollups, then drop raw and rolled-up rows past their retention."""
+        now = time.time() if now is None else now
+        current_minute = math.floor(now / ROLLUP_SECONDS) * ROLLUP_SECONDS
+        with self._lock, self._db:
+            rolled = self._meta("rolled_until")
+            if not rolled:
+                first = self._db.execute("SELECT MIN(m) FROM (SELECT MIN(ts) AS m FROM samples "
+                                         "UNION ALL SELECT MIN(ts) FROM status)").fetchone()[0]
+                rolled = math.floor(first / ROLLUP_SECONDS) * ROLLUP_SECONDS if first else current_minute
+            if current_minute > rolled:
+                self._db.execute(ROLLUP_SQL, {"start": rolled, "end": current_minute})
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('rolled_until', ?)", (current_minute,))
+            self._db.execute("DELETE FROM samples WHERE ts < ?", (now - self.raw_retention,))
+            self._db.execute("DELETE FROM status WHERE ts < ?", (now - self.raw_retention,))
+            self._db.execute("DELETE FROM rollups WHERE minute < ?", (now - self.rollup_retention,))
+        self._next_maintenance = current_minute + ROLLUP_SECONDS
+
+    def query(self, start, end=None, points=DEFAULT_POINTS):
+        """Up to `points` buckets covering (start, end], from raw samples while they still cover
+        the range and from the rollups (plus the not yet rolled-up tail) beyond that."""
+        started = time.perf_counter()
+        end = time.time() if end is None else end
+        step = max((end - start) / points, 1e-3)
+        with self._lock:
+            rolled = self._meta("rolled_until")
+            oldest_raw = self._db.execute("SELECT MIN(ts) FROM samples").fetchone()[0]
+            if oldest_raw is not None and start >= oldest_raw - ROLLUP_SECONDS:
+                source, raw_from, rows = "samples", 0, RAW_ROWS
+            else:
+                source, raw_from, rows = "rollups", rolled, ROLLUP_ROWS + " UNION ALL " + RAW_ROWS
+                step = max(step, ROLLUP_SECONDS)
+            cursor = self._db.execute(BUCKET_SQL.format(rows=rows),
+                                      {"start": start, "end": end, "step": step, "raw_from": raw_from,
+                                       "last": max(math.ceil((end - start) / step) - 1, 0)})
+            buckets = cursor.fetchall()
+
+        series = Series(start, end, step, source)
+        for bucket, seconds, queries, hits, misses, rl, rc, status_samples, running, count in buckets:
+            series.rows += count
+            series.times.append(start + (bucket + 1) * step)
+            series.qps.append(queries / seconds if seconds else None)
+            series.hit_rate.append(hits / queries if queries else None)
+            series.recursion_avg.append(rc / misses if misses else None)
+            series.requestlist_avg.append(rl / misses if misses else None)
+            series.running.append(running / status_samples if status_samples else None)
+        series.seconds = time.perf_counter() - started
+        return series
+
+    def rows(self, table="samples", start=None, end=None):
+        """Every stored row of `table` ("samples" or "rollups") in time order, as tuples."""
+        if table not in ("samples", "rollups"):
+            raise ValueError(f"Unknown table {table!r}")
+        key = "ts" if table == "samples" else "minute"
+        sql = f"SELECT * FROM {table} WHERE {key} >= ? AND {key} <= ? ORDER BY {key}"
+        with self._lock:
+            return self._db.execute(sql, (start or 0, end or math.inf)).fetchall()
+
+    def export_csv(self, path, table="samples", start=None, end=None):
+        rows = self.rows(table, start, end)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(SAMPLE_FIELDS if table == "samples" else ROLLUP_FIELDS)
+            writer.writerows(rows)
+        return len(rows)
+
+    def export_columns(self, path, table="samples", start=None, end=None):
+        """Write one contiguous little-endian float64 array per column, after a JSON header line."""
+        rows = self.rows(table, start, end)
+        names = SAMPLE_FIELDS if table == "samples" else ROLLUP_FIELDS
+        header = {"table": table, "rows": len(rows), "columns": list(names), "type": "float64-le"}
+        with open(path, "wb") as f:
+            f.write(COLUMNS_MAGIC + json.dumps(header).encode() + b"\n")
+            for index in range(len(names)):
+                column = array("d", (math.nan if row[index] is None else row[index] for row in rows))
+                if sys.byteorder == "big":
+                    column.byteswap()
+                f.write(column.tobytes())
+        return len(rows)
+
+
+def read_columns(path):
+    """{column: array('d')} from an export_columns file."""
+    with open(path, "rb") as f:
+        if f.readline() != COLUMNS_MAGIC:
+            raise ValueError(f"{path} is not a column export")
+        header = json.loads(f.readline())
+        columns = {}
+        for name in header["columns"]:
+            column = array("d")
+            column.frombytes(f.read(8 * header["rows"]))
+            if sys.byteorder == "big":
+                column.byteswap()
+            columns[name] = column
+    return columns
+
+
+def format_series(series, limit=24):
+    """A table of at most `limit` rows, merging buckets if the series has more."""
+    lines = [f"{len(series.times)} points of {series.step:.0f}s from {series.rows:,} {series.source} rows "
+             f"in {series.seconds * 1000:.1f}ms",
+             f"{'time':<19} {'qps':>9} {'hit':>7} {'recursion':>10} {'running':>8}"]
+    stride = max(1, math.ceil(len(series.times) / limit))
+    for i in range(0, len(series.times), stride):
+        qps, hit = series.qps[i], series.hit_rate[i]
+        recursion, running = series.recursion_avg[i], series.running[i]
+        lines.append(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(series.times[i])):<19} "
+                     f"{'-' if qps is None else f'{qps:.1f}':>9} "
+                     f"{'-' if hit is None else f'{hit * 100:.1f}%':>7} "
+                     f"{'-' if recursion is None else f'{recursion * 1000:.1f}ms':>10} "
+                     f"{'-' if running is None else f'{running * 100:.0f}%':>8}")
+    return "\n".join(lines)
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""Check kernel socket-buffer and descriptor limits against unbound.conf, and watch Unbound's UDP drops."""
+
+import argparse
+import os
+import re
+import resource
+import sys
+import time
+from dataclasses import dataclass, field
+
+from . import config_gen, status_probe
+
+# Unbound's own defaults for the settings the checks read.
+SOCKET_DEFAULTS = {"num-threads": "1", "outgoing-range": "4096", "so-rcvbuf": "0", "so-sndbuf": "0",
+                   "incoming-num-tcp": "10", "outgoing-num-tcp": "10"}
+SYSCTL_FILE = "/etc/sysctl.d/99-unbound.conf"
+DROP_WARN_RATIO = 0.001
+
+
+@dataclass
+class Check:
+    name: str
+    ok: bool
+    detail: str
+    fix: str = ""
+
+
+def socket_settings(text):
+    """The server: options the checks need from config text, with Unbound's defaults filled in."""
+    settings = dict(SOCKET_DEFAULTS)
+    pattern = re.compile(r"^\s*(" + "|".join(map(re.escape, SOCKET_DEFAULTS)) + r")\s*:\s*(\S+)")
+    section = None
+    for raw in text.splitlines():
+        line = raw.split("#", 1)[0]
+        header = re.match(r"^\s*([\w-]+):\s*$", line)
+        if header:
+            section = header.group(1)
+            continue
+        match = pattern.match(line)
+        if match and section == "server":
+            settings[match.group(1)] = match.group(2).strip('"')
+    return settings
+
+
+def read_sysctl(name, proc_root="/proc"):
+    try:
+        with open(os.path.join(proc_root, "sys", *name.split("."))) as f:
+            return int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _limit(value):
+    return 1 << 20 if value in ("unlimited", resource.RLIM_INFINITY) else int(value)
+
+
+def read_fd_limits(pid=None, proc_root="/proc"):
+    """(soft, hard) open-file limits of `pid`, or of this process when there is no pid to read."""
+    if pid is not None:
+        try:
+            with open(os.path.join(proc_root, str(pid), "limits")) as f:
+                for line in f:
+                    if line.startswith("Max open files"):
+                        soft, hard = line.split()[3:5]
+                        return _limit(soft), _limit(hard)
+        except (OSError, ValueError):
+            pass
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    return _limit(soft), _limit(hard)
+
+
+def fds_needed(settings):
+    """Descriptors Unbound can hold at once: each thread's outgoing ports and TCP slots, plus files and listeners."""
+    per_thread = (int(settings["outgoing-range"]) + int(settings["incoming-num-tcp"])
+                  + int(settings["outgoing-num-tcp"]))
+    return int(settings["num-threads"]) * per_thread + config_gen.FD_RESERVE
+
+
+def _buffer_check(option, sysctl, settings, proc_root):
+    wanted = config_gen.parse_size(settings[option])
+    limit = read_sysctl(sysctl, proc_root)
+    if not wanted:
+        return Check(option, True, "not set; the kernel default applies")
+    if limit is None:
+        return Check(option, True, f"{settings[option]} requested; {sysctl} could not be read")
+    if wanted <= limit:
+        return Check(option, True, f"{settings[option]} requested, {sysctl} is {limit}")
+    return Check(option, False,
+                 f"{settings[option]} requested but {sysctl} is {limit}; unless Unbound starts with "
+                 f"CAP_NET_ADMIN the kernel silently clamps the buffer and bursts are dropped",
+                 f"sysctl -w {sysctl}={wanted} and add '{sysctl} = {wanted}' to {SYSCTL_FILE}")
+
+
+def preflight(settings, proc_root="/proc", pid=None):
+    """Every check of `settings` against this kernel; pid reads the fd limit a running Unbound really has."""
+    checks = [_buffer_check("so-rcvbuf", "net.core.rmem_max", settings, proc_root),
+              _buffer_check("so-sndbuf", "net.core.wmem_max", settings, proc_root)]
+
+    needed = fds_needed(settings)
+    soft, hard = read_fd_limits(pid, proc_root)
+    # A running Unbound has already raised its soft limit as far as it could; before it starts, the hard limit counts.
+    limit, source = (soft, f"pid {pid}") if pid is not None else (hard, "hard limit")
+    nr_open = read_sysctl("fs.nr_open", proc_root)
+    threads = settings["num-threads"]
+    shape = f"{threads} thread{'' if threads == '1' else 's'} x outgoing-range {settings['outgoing-range']}"
+    if needed <= limit:
+        checks.append(Check("open files", True, f"{shape} needs about {needed}; {source} allows {limit}"))
+    else:
+        per_thread = max(64, (limit - config_gen.FD_RESERVE) // int(settings["num-threads"]) - 20)
+        checks.append(Check("open files", False, f"{shape} needs about {needed} but {source} allows {limit}; "
+                                                 f"queries queue once the ports run out",
+                            f"set LimitNOFILE={needed} in the unbound service, or outgoing-range: {per_thread}"))
+    if nr_open is not None and needed > nr_open:
+        checks.append(Check("fs.nr_open", False, f"{needed} descriptors needed but fs.nr_open is {nr_open}",
+                            f"sysctl -w fs.nr_open={needed} and add 'fs.nr_open = {needed}' to {SYSCTL_FILE}"))
+    return checks
+
+
+@dataclass(frozen=True)
+class UdpSocket:
+    proto: str
+    address: str
+    port: int
+    inode: int
+    rx_queue: int
+    drops: int
+
+
+def read_udp_sockets(proc_root="/proc", inodes=None, uids=(), port=None):
+    """Every UDP socket in /proc/net/udp{,6}, or only those whose inode is in `inodes`, whose owner
+    is in `uids` or that are bound to `port`."""
+    sockets = []
+    for proto in ("udp", "udp6"):
+        try:
+            with open(os.path.join(proc_root, "net", proto)) as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 13:
+                        continue
+                    inode = int(fields[9])
+                    address, _, local_port = fields[1].partition(":")
+                    local_port = int(local_port, 16)
+                    if inodes is not None and not (inode in inodes or int(fields[7]) in uids or local_port == port):
+                        continue
+                    sockets.append(UdpSocket(proto, status_probe._decode_address(address, proto == "udp6"),
+                                             local_port, inode, int(fields[4].partition(":")[2], 16),
+                                             int(fields[12])))
+        except FileNotFoundError:
+            continue
+    return sockets
+
+
+def read_udp_counters(proc_root="/proc"):
+    """System-wide UDP counters from /proc/net/snmp and snmp6, IPv4 and IPv6 added together."""
+    counters = {}
+    try:
+        with open(os.path.join(proc_root, "net", "snmp")) as f:
+            lines = [line.split() for line in f if line.startswith("Udp:")]
+        if len(lines) == 2:
+            counters.update((name, int(value)) for name, value in zip(lines[0][1:], lines[1][1:]))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(proc_root, "net", "snmp6")) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 2 and fields[0].startswith("Udp6"):
+                    counters[fields[0][4:]] = counters.get(fields[0][4:], 0) + int(fields[1])
+    except (OSError, ValueError):
+        pass
+    return counters
+
+
+@dataclass
+class DropSample:
+    timestamp: float
+    counters: dict
+    sockets: tuple = ()
+    pids: tuple = ()
+    # Pids whose /proc/<pid>/fd this user may not list; their sockets are matched by owner and port.
+    unreadable: tuple = ()
+
+    @property
+    def socket_drops(self):
+        return sum(s.drops for s in self.sockets)
+
+
+@dataclass
+class DropRate:
+    seconds: float
+    datagrams: float
+    rcvbuf_errors: float
+    in_errors: float
+    socket_drops: float
+    sockets: dict = field(default_factory=dict)
+    watched: int = 0
+    unreadable: tuple = ()
+
+    @property
+    def drop_rate(self):
+        return self.socket_drops / self.seconds if self.seconds else 0.0
+
+    @property
+    def drop_ratio(self):
+        """Unbound's dropped datagrams as a share of the UDP datagrams that arrived in the interval."""
+        received = self.datagrams + self.socket_drops
+        return self.socket_drops / received if received else 0.0
+
+
+def process_uid(pid, proc_root="/proc"):
+    """Real uid of `pid` from /proc/<pid>/status, which any user may read; None if it is gone."""
+    try:
+        with open(os.path.join(proc_root, str(pid), "status")) as f:
+            for line in f:
+                if line.startswith("Uid:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def sample_drops(proc_root="/proc", pids=None, timestamp=None, port=53):
+    """UDP counters now, with the drops of the sockets held by Unbound (found by name unless pids are given).
+
+    Only root and Unbound's own user may list its fds. For anyone else the sockets owned by
+    Unbound's uid stand in, along with those bound to `port`, which Unbound opens as root before
+    dropping privileges; root's own sockets are too many to count as Unbound's.
+    """
+    pids = status_probe.find_pids("unbound", proc_root) if pids is None else pids
+    inodes, uids, unreadable = set(), set(), []
+    for pid in pids:
+        try:
+            inodes |= status_probe.socket_inodes(pid, proc_root)
+        except PermissionError:
+            unreadable.append(pid)
+            uids.add(process_uid(pid, proc_root))
+        except OSError:
+            continue
+    uids -= {None, 0}
+    if unreadable:
+        sockets = tuple(read_udp_sockets(proc_root, inodes, uids, port))
+    else:
+        sockets = tuple(read_udp_sockets(proc_root, inodes)) if inodes else ()
+    return DropSample(time.time() if timestamp is None else timestamp, read_udp_counters(proc_root), sockets,
+                      tuple(pids), tuple(unreadable))
+
+
+def drop_rate(prev, cur):
+    delta = lambda name: max(0, cur.counters.get(name, 0) - prev.counters.get(name, 0))
+    before = {(s.proto, s.address, s.port, s.inode): s.drops for s in prev.sockets}
+    # A socket Unbound opened since the last sample counts from zero; closed ones drop out.
+    sockets = {}
+    for s in cur.sockets:
+        key = (s.proto, s.address, s.port, s.inode)
+        sockets[key] = max(0, s.drops - before.get(key, 0))
+    return DropRate(max(0.0, cur.timestamp - prev.timestamp), delta("InDatagrams"), delta("RcvbufErrors"),
+                    delta("InErrors"), sum(sockets.values()), {key: n for key, n in sockets.items() if n},
+                    len(cur.sockets), cur.unreadable)
+
+
+class DropMonitor:
+    """Drop rates between successive samples, for the status panel or `preflight --watch`."""
+
+    def __init__(self, proc_root="/proc", port=53):
+        self.proc_root = proc_root
+        self.port = port
+        self.last = None
+
+    def poll(self, timestamp=None):
+        """The rate since the previous poll, or None on the first one or after Unbound restarted."""
+        sample = sample_drops(self.proc_root, timestamp=timestamp, port=self.port)
+        prev, self.last = self.last, sample
+        if prev is None or prev.pids != sample.pids or sample.timestamp <= prev.timestamp:
+            return None
+        return drop_rate(prev, sample)
+
+
+def drop_advice(rate, settings=None):
+    """What to change when Unbound is dropping; empty while it is not."""
+    if not rate or not rate.socket_drops:
+        return []
+    advice = []
+    rcvbuf = settings and config_gen.parse_size(settings["so-rcvbuf"])
+    if not rcvbuf or rcvbuf < 8 * 1024 * 1024:
+        advice.append("raise so-rcvbuf (e.g. 8m) and net.core.rmem_max to match, then restart Unbound")
+    else:
+        advice.append("the receive buffer is already large; the threads cannot keep up with the query rate")
+    if settings and settings["num-threads"] == "1":
+        advice.append("run more threads (num-threads, with so-reuseport: yes) so each socket drains faster")
+    return advice
+
+
+def format_check(check):
+    line = f"{'OK' if check.ok else 'FAIL':<5} {check.name:<12} {check.detail}"
+    return line + (f"\n      fix: {check.fix}" if check.fix else "")
+
+
+def format_rate(rate):
+    line = (f"{rate.seconds:6.1f}s  unbound drops {rate.drop_rate:8.1f}/s ({rate.drop_ratio * 100:.2f}%)  "
+            f"system RcvbufErrors {rate.rcvbuf_errors / rate.seconds if rate.seconds else 0:.1f}/s  "
+            f"UDP in {rate.datagrams / rate.seconds if rate.seconds else 0:.0f}/s")
+    if rate.sockets:
+        line += "  " + " ".join(f"{proto} {address}:{port}={n}" for (proto, address, port, _), n in
+                                sorted(rate.sockets.items()))
+    return line
+
+
+def format_drops(sample):
+    if not sample.pids:
+        return "Unbound is not running; no sockets to attribute drops to"
+    if sample.unreadable and not sample.sockets:
+        return (f"Unbound drops unknown: no access to /proc/{sample.unreadable[0]}/fd (run as root); "
+                f"system RcvbufErrors {sample.counters.get('RcvbufErrors', 0)}")
+    lines = [f"Unbound (pid {', '.join(map(str, sample.pids))}) holds {len(sample.sockets)} UDP sockets, "
+             f"{sample.socket_drops} drops since they opened; system RcvbufErrors "
+             f"{sample.counters.get('RcvbufErrors', 0)}"]
+    if sample.unreadable:
+        lines.append(f"      no access to /proc/{sample.unreadable[0]}/fd; sockets matched by owner and port")
+    for s in sorted(sample.sockets, key=lambda s: -s.drops):
+        if s.drops or s.port == 53:
+            lines.append(f"      {s.proto:<5} {s.address}:{s.port:<6} drops {s.drops:<8} rx_queue {s.rx_queue}")
+    return "\n".join(lines)
+
+
+def load_settings(config=None):
+    """Settings from `config`, else from the config Unbound would use, else from what `config` would generate."""
+    if config is None:
+        from . import control_socket
+
+        config = control_socket.default_config()
+    if config:
+        with open(config) as f:
+            return config, socket_settings(f.read())
+    return "generated config", socket_settings(config_gen.generate())
+
+
+def add_arguments(parser):
+    parser.add_argument("--config", help="unbound.conf to check (default: the one unbound-control would use)")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="Keep sampling Unbound's UDP drops at this interval")
+    parser.add_argument("--proc-root", default="/proc", help=argparse.SUPPRESS)
+    return parser
+
+
+def run(args):
+    try:
+        source, settings = load_settings(args.config)
+        pids = status_probe.find_pids("unbound", args.proc_root)
+        checks = preflight(settings, args.proc_root, pids[0] if pids else None)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    print(f"Checking {source}")
+    for check in checks:
+        print(format_check(check))
+    print(format_drops(sample_drops(args.proc_root, pids)))
+    if args.watch:
+        monitor = DropMonitor(args.proc_root)
+        monitor.poll()
+        try:
+            while True:
+                time.sleep(args.watch)
+                rate = monitor.poll()
+                if rate:
+                    print(format_rate(rate), flush=True)
+                    for advice in drop_advice(rate, settings):
+                        print(f"      fix: {advice}")
+        except KeyboardInterrupt:
+            pass
+    return 0 if all(check.ok for check in checks) else 1
+
+
+def main(argv=None):
+    parser = add_arguments(argparse.ArgumentParser(description=__doc__))
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Interval statistics computed from successive 'unbound-control stats_noreset' samples."""
+
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from . import unbound_control
+
+DEFAULT_CAPACITY = 360
+
+# Averages Unbound reports since the last reset, paired with the counter they are weighted by,
+# so the average over one interval can be recovered from two cumulative samples.
+WEIGHTED_AVERAGES = {
+    "requestlist.avg": "num.cachemiss",
+    "recursion.time.avg": "num.recursivereplies",
+}
+
+_THREAD_KEY = re.compile(r"^thread(\d+)\.(.+)$")
+
+
+@dataclass
+class Sample:
+    timestamp: float
+    values: dict
+
+
+@dataclass
+class Interval:
+    timestamp: float
+    seconds: float
+    queries: float
+    cachehits: float
+    cachemiss: float
+    qps: float
+    hit_rate: float
+    requestlist_avg: float
+    recursion_avg: float
+    recursion_median: float
+    threads: dict = field(default_factory=dict)
+
+
+def parse_stats(text):
+    values = {}
+    for line in text.splitlines():
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            continue
+        try:
+            values[key] = float(value)
+        except ValueError:
+            continue
+    return values
+
+
+def counter_delta(prev, cur):
+    # A counter that went backwards means Unbound restarted and started from zero.
+    return cur - prev if cur >= prev else cur
+
+
+def interval_average(prev, cur, prefix, name):
+    weight_key = f"{prefix}.{WEIGHTED_AVERAGES[name]}"
+    avg_key = f"{prefix}.{name}"
+    n_prev, n_cur = prev.get(weight_key, 0.0), cur.get(weight_key, 0.0)
+    a_prev, a_cur = prev.get(avg_key, 0.0), cur.get(avg_key, 0.0)
+    dn = counter_delta(n_prev, n_cur)
+    if dn <= 0:
+        return 0.0
+    if n_cur < n_prev:
+        return a_cur
+    return max(0.0, (a_cur * n_cur - a_prev * n_prev) / dn)
+
+
+def compute_interval(prev, cur):
+    seconds = cur.timestamp - prev.timestamp
+    p, c = prev.values, cur.values
+
+    def delta(key):
+        return counter_delta(p.get(key, 0.0), c.get(key, 0.0))
+
+    threads = {}
+    for key in c:
+        match = _THREAD_KEY.match(key)
+        if match and match.group(2) == "num.queries":
+            tid = int(match.group(1))
+            prefix = f"thread{tid}"
+            queries = delta(f"{prefix}.num.queries")
+            hits = delta(f"{prefix}.num.cachehits")
+            threads[tid] = {
+                "qps": queries / seconds if seconds > 0 else 0.0,
+                "hit_rate": hits / queries if queries else 0.0,
+                "requestlist_avg": interval_average(p, c, prefix, "requestlist.avg"),
+                "requestlist_current": c.get(f"{prefix}.requestlist.current.all", 0.0),
+            }
+
+    queries = delta("total.num.queries")
+    hits = delta("total.num.cachehits")
+    return Interval(
+        timestamp=cur.timestamp,
+        seconds=seconds,
+        queries=queries,
+        cachehits=hits,
+        cachemiss=delta("total.num.cachemiss"),
+        qps=queries / seconds if seconds > 0 else 0.0,
+        hit_rate=hits / queries if queries else 0.0,
+        requestlist_avg=interval_average(p, c, "total", "requestlist.avg"),
+        recursion_avg=interval_average(p, c, "total", "recursion.time.avg"),
+        recursion_median=c.get("total.recursion.time.median", 0.0),
+        threads=dict(sorted(threads.items())),
+    )
+
+
+def fetch_stats(config=None):
+    return unbound_control.control("stats_noreset", config=config)
+
+
+class StatsCollector:
+    def __init__(self, fetch=None, capacity=DEFAULT_CAPACITY):
+        self.fetch = fetch or fetch_stats
+        self.samples = deque(maxlen=capacity)
+        self.intervals = deque(maxlen=capacity)
+
+    def add(self, text, timestamp=None):
+        values = parse_stats(text)
+        if timestamp is None:
+            timestamp = values.get("time.now") or time.time()
+        sample = Sample(timestamp, values)
+        interval = None
+        if self.samples and timestamp > self.samples[-1].timestamp:
+            interval = compute_interval(self.samples[-1], sample)
+            self.intervals.append(interval)
+        self.samples.append(sample)
+        return interval
+
+    def poll(self):
+        return self.add(self.fetch())
+
+    def series(self, name):
+        return [getattr(i, name) for i in self.intervals]
+
+    @property
+    def latest(self):
+        return self.intervals[-1] if self.intervals else None
+
+
+def format_interval(interval):
+    line = (f"{interval.seconds:6.1f}s  qps={interval.qps:9.1f}  hit={interval.hit_rate * 100:5.1f}%  "
+            f"miss={interval.cachemiss:.0f}  reqlist.avg={interval.requestlist_avg:.2f}  "
+            f"recursion.avg={interval.recursion_avg * 1000:.1f}ms  "
+            f"median={interval.recursion_median * 1000:.1f}ms")
+    if interval.threads:
+        line += "  " + " ".join(f"t{tid}={t['qps']:.0f}qps" for tid, t in interval.threads.items())
+    return line
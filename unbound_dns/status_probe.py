@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Cheap Unbound process/listener status checks with a single long-lived monitor thread."""
+
+import os
+import socket
+import struct
+import subprocess
+import threading
+from dataclasses import dataclass
+
+TCP_LISTEN = "0A"
+UDP_UNCONNECTED = "07"
+
+
+@dataclass(frozen=True)
+class Listener:
+    proto: str
+    address: str
+    port: int
+    inode: int
+
+
+@dataclass(frozen=True)
+class Status:
+    running: bool
+    port_in_use: bool
+    pids: tuple = ()
+    listeners: tuple = ()
+    owned_by_unbound: bool = None
+    error: str = None
+
+
+def _decode_address(hex_addr, v6):
+    if v6:
+        raw = b"".join(struct.pack("<I", int(hex_addr[i:i + 8], 16)) for i in range(0, 32, 8))
+        return socket.inet_ntop(socket.AF_INET6, raw)
+    return socket.inet_ntop(socket.AF_INET, struct.pack("<I", int(hex_addr, 16)))
+
+
+def read_listeners(port=53, proc_root="/proc"):
+    listeners = []
+    for proto, state in (("tcp", TCP_LISTEN), ("udp", UDP_UNCONNECTED)):
+        for suffix in ("", "6"):
+            path = os.path.join(proc_root, "net", proto + suffix)
+            try:
+                with open(path) as f:
+                    next(f, None)
+                    for line in f:
+                        fields = line.split()
+                        if len(fields) < 10 or fields[3] != state:
+                            continue
+                        addr, _, hex_port = fields[1].partition(":")
+                        if int(hex_port, 16) != port:
+                            continue
+                        listeners.append(Listener(proto + suffix, _decode_address(addr, bool(suffix)),
+                                                  port, int(fields[9])))
+            except FileNotFoundError:
+                continue
+    return listeners
+
+
+def find_pids(name="unbound", proc_root="/proc"):
+    pids = []
+    for entry in os.listdir(proc_root):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(os.path.join(proc_root, entry, "comm")) as f:
+                if f.read().strip() == name:
+                    pids.append(int(entry))
+        except OSError:
+            continue
+    return sorted(pids)
+
+
+def socket_inodes(pid, proc_root="/proc"):
+    fd_dir = os.path.join(proc_root, str(pid), "fd")
+    inodes = set()
+    for fd in os.listdir(fd_dir):
+        try:
+            target = os.readlink(os.path.join(fd_dir, fd))
+        except OSError:
+            continue
+        if target.startswith("socket:["):
+            inodes.add(int(target[8:-1]))
+    return inodes
+
+
+def probe_proc(port=53, proc_root="/proc"):
+    pids = find_pids("unbound", proc_root)
+    listeners = read_listeners(port, proc_root)
+    owned = None
+    if pids and listeners:
+        try:
+            inodes = set()
+            for pid in pids:
+                inodes |= socket_inodes(pid, proc_root)
+            owned = any(l.inode in inodes for l in listeners)
+        except OSError:
+            owned = None
+    return Status(bool(pids), bool(listeners), tuple(pids), tuple(listeners), owned)
+
+
+def probe_subprocess(os_type):
+    if os_type == "macos":
+        result = subprocess.run(['pgrep', '-x', 'unbound'], capture_output=True, text=True, timeout=5)
+        running = result.returncode == 0
+        pids = tuple(int(p) for p in result.stdout.split())
+    else:
+        result = subprocess.run(['systemctl', 'is-active', 'unbound'],
+                                capture_output=True, text=True, timeout=5)
+        running = result.stdout.strip() == 'active'
+        pids = ()
+    port_check = subprocess.run(['sudo', 'lsof', '-i', ':53', '-sTCP:LISTEN'],
+                                capture_output=True, text=True, timeout=5)
+    owned = 'unbound' in port_check.stdout if port_check.returncode == 0 else None
+    return Status(running, port_check.returncode == 0, pids, (), owned)
+
+
+def probe(os_type="linux", proc_root="/proc"):
+    try:
+        if os.path.isdir(os.path.join(proc_root, "net")):
+            return probe_proc(53, proc_root)
+        return probe_subprocess(os_type)
+    except subprocess.TimeoutExpired:
+        return Status(False, False, error="Timeout checking status")
+    except Exception as e:
+        return Status(False, False, error=str(e))
+
+
+class StatusMonitor:
+    def __init__(self, callback, os_type="linux", interval=None, proc_root="/proc"):
+        self.callback = callback
+        self.os_type = os_type
+        self.interval = interval
+        self.proc_root = proc_root
+        self.last = None
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="status-monitor", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def request(self):
+        self._wake.set()
+
+    def set_interval(self, interval):
+        self.interval = interval
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped:
+                break
+            status = probe(self.os_type, self.proc_root)
+            changed = status != self.last
+            self.last = status
+            self.callback(status, changed)
+
+
+def describe(status):
+    if status.error:
+        return f"Error: {status.error}"
+    text = "running" if status.running else "not running"
+    if status.pids:
+        text += f" (pid {', '.join(map(str, status.pids))})"
+    if status.port_in_use:
+        owner = {True: "Unbound", False: "another process", None: "unknown owner"}[status.owned_by_unbound]
+        ports = ", ".join(sorted({f"{l.proto} {l.address}" for l in status.listeners})) or "port 53"
+        text += f"; port 53 in use by {owner} [{ports}]"
+    else:
+        text += "; port 53 available"
+    return text
+
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Run unbound-control commands, over the control socket when this process can reach it."""
+
+import os
+import shutil
+import socket
+import subprocess
+from dataclasses import dataclass
+
+
+class ControlError(Exception):
+    pass
+
+
+@dataclass
+class ControlResult:
+    command: str
+    ok: bool
+    output: str
+
+
+def control_binary():
+    return shutil.which("unbound-control") or "unbound-control"
+
+
+def default_use_sudo():
+    return os.geteuid() != 0 if hasattr(os, "geteuid") else False
+
+
+def build_command(command, *args, config=None, use_sudo=None):
+    if use_sudo is None:
+        use_sudo = default_use_sudo()
+    argv = ["sudo"] if use_sudo else []
+    argv.append(control_binary())
+    if config:
+        argv += ["-c", config]
+    argv.append(command)
+    argv += [str(a) for a in args]
+    return argv
+
+
+_clients = {}
+
+
+def socket_client(config=None):
+    """Cached control_socket client for `config`, or None if its control socket isn't reachable directly."""
+    from . import control_socket
+
+    config = config or control_socket.default_config()
+    try:
+        key = (config, os.stat(config).st_mtime_ns)
+    except (TypeError, OSError):
+        return None
+    if key not in _clients:
+        endpoint = control_socket.read_endpoint(config)
+        _clients[key] = control_socket.ControlClient(endpoint) if endpoint and endpoint.usable() else None
+    return _clients[key]
+
+
+def _over_socket(call, command):
+    """Run `call` on the socket client; None means fall back to the unbound-control binary."""
+    try:
+        return call()
+    except socket.timeout:
+        raise ControlError(f"unbound-control {command} timed out")
+    except OSError:
+        # Nothing listening where the config says; unbound-control will explain why.
+        return None
+
+
+def run_control(command, *args, config=None, use_sudo=None, timeout=10):
+    client = socket_client(config)
+    if client:
+        result = _over_socket(lambda: client.run(command, *args, timeout=timeout), command)
+        if result:
+            return result
+    argv = build_command(command, *args, config=config, use_sudo=use_sudo)
+    try:
+        result = subprocess.run(argv, capture_output=True, text=True, timeout=timeout)
+    except FileNotFoundError:
+        raise ControlError("unbound-control not found; is Unbound installed?")
+    except subprocess.TimeoutExpired:
+        raise ControlError(f"unbound-control {command} timed out after {timeout}s")
+    output = result.stdout if result.returncode == 0 else (result.stderr or result.stdout)
+    return ControlResult(command, result.returncode == 0, output.strip())
+
+
+def control(command, *args, **kwargs):
+    result = run_control(command, *args, **kwargs)
+    if not result.ok:
+        raise ControlError(f"unbound-control {command} failed: {result.output}")
+    return result.output
+
+
+def stream_control(command, *args, data=None, config=None, use_sudo=None):
+    """Run a command with large input or output, yielding reply lines (bytes) as they arrive.
+
+    `data` is an iterable of bytes sent as the command's input (load_cache, local_datas).
+    """
+    client = socket_client(config)
+    if client:
+        lines = _over_socket(lambda: client.lines(command, *args, data=data), command)
+        if lines:
+            return lines
+    argv = build_command(command, *args, config=config, use_sudo=use_sudo)
+    try:
+        process = subprocess.Popen(argv, stdin=subprocess.DEVNULL if data is None else subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise ControlError("unbound-control not found; is Unbound installed?")
+    if data is not None:
+        try:
+            for chunk in data:
+                process.stdin.write(chunk)
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+    return _process_lines(command, process)
+
+
+def _process_lines(command, process):
+    with process:
+        first = process.stdout.readline()
+        rest = b""
+        if first.startswith(b"error"):
+            rest = process.stdout.read()
+        else:
+            if first:
+                yield first
+            yield from process.stdout
+        error = process.stderr.read().decode(errors="replace").strip()
+        if process.wait() != 0 or first.startswith(b"error"):
+            detail = error or (first + rest).decode(errors="replace").strip()
+            raise ControlError(f"unbound-control {command} failed: {detail}")
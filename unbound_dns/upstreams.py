@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Measure DNS-over-TLS upstreams and reorder or prune the forward-zone by observed latency."""
+
+import asyncio
+import re
+import ssl
+import statistics
+import struct
+import time
+from dataclasses import dataclass
+
+from .dns_probe import DNSError, build_query, parse_message
+from . import config_apply
+
+DEFAULT_ALPHA = 0.3
+DEFAULT_NAMES = ("google.com", "cloudflare.com", "github.com")
+FAILING_RCODES = ("SERVFAIL", "REFUSED")
+
+FORWARD_ADDR = re.compile(r"^(\s*)forward-addr:\s*(\S+)")
+# What rewrite_forward_zone leaves in place of an upstream it prunes.
+PRUNED_ADDR = re.compile(r"^(\s*)#\s*forward-addr:\s*(\S+)\s+#\s*pruned:")
+CLAUSE = re.compile(r"^(\S[^:]*):")
+ZONE_NAME = re.compile(r"^\s*name:\s*\"?([^\"\s]+)\"?")
+
+
+@dataclass(frozen=True)
+class Upstream:
+    address: str
+    port: int = 853
+    tls_name: str = None
+
+    @classmethod
+    def parse(cls, spec):
+        spec, _, tls_name = spec.partition("#")
+        address, _, port = spec.partition("@")
+        return cls(address, int(port) if port else 853, tls_name or None)
+
+    @property
+    def spec(self):
+        return f"{self.address}@{self.port}" + (f"#{self.tls_name}" if self.tls_name else "")
+
+
+@dataclass
+class Measurement:
+    upstream: Upstream
+    handshake_ms: float = None
+    rtt_ms: float = None
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@dataclass
+class UpstreamStats:
+    upstream: Upstream
+    alpha: float = DEFAULT_ALPHA
+    rtt_ms: float = None
+    handshake_ms: float = None
+    loss: float = 0.0
+    samples: int = 0
+    failures: int = 0
+    last_error: str = None
+
+    def _ewma(self, current, value):
+        return value if current is None else self.alpha * value + (1 - self.alpha) * current
+
+    def update(self, measurement):
+        self.samples += 1
+        self.loss = self._ewma(self.loss if self.samples > 1 else None, 0.0 if measurement.ok else 1.0)
+        if measurement.ok:
+            self.rtt_ms = self._ewma(self.rtt_ms, measurement.rtt_ms)
+            self.handshake_ms = self._ewma(self.handshake_ms, measurement.handshake_ms)
+        else:
+            self.failures += 1
+            self.last_error = measurement.error
+
+    def score(self, loss_penalty_ms=1000.0):
+        if self.rtt_ms is None:
+            return float("inf")
+        return self.rtt_ms + self.loss * loss_penalty_ms
+
+
+def client_context(cafile=None):
+    return ssl.create_default_context(cafile=cafile)
+
+
+async def measure(upstream, name="google.com", qtype="A", timeout=3.0, context=None):
+    result = Measurement(upstream)
+    context = context or client_context()
+    writer = None
+    try:
+        started = time.perf_counter_ns()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(upstream.address, upstream.port, ssl=context,
+                                    server_hostname=upstream.tls_name or upstream.address),
+            timeout)
+        result.handshake_ms = (time.perf_counter_ns() - started) / 1e6
+
+        packet = build_query(name, qtype)
+        sent = time.perf_counter_ns()
+        writer.write(struct.pack("!H", len(packet)) + packet)
+        await writer.drain()
+        length = struct.unpack("!H", await asyncio.wait_for(reader.readexactly(2), timeout))[0]
+        data = await asyncio.wait_for(reader.readexactly(length), timeout)
+        result.rtt_ms = (time.perf_counter_ns() - sent) / 1e6
+
+        message = parse_message(data)
+        if message.rcode_name in FAILING_RCODES:
+            result.error = message.rcode_name
+    except asyncio.TimeoutError:
+        result.error = f"timeout after {timeout:g}s"
+    except (OSError, ssl.SSLError, DNSError, asyncio.IncompleteReadError) as e:
+        result.error = str(e) or e.__class__.__name__
+    finally:
+        if writer is not None:
+            writer.close()
+    return result
+
+
+class UpstreamEvaluator:
+    def __init__(self, upstreams, names=DEFAULT_NAMES, alpha=DEFAULT_ALPHA, timeout=3.0,
+                 context=None):
+        self.names = list(names)
+        self.timeout = timeout
+        self.context = context or client_context()
+        self.stats = {u: UpstreamStats(u, alpha) for u in upstreams}
+        self.rounds = 0
+
+    async def evaluate_round(self):
+        name = self.names[self.rounds % len(self.names)]
+        self.rounds += 1
+        measurements = await asyncio.gather(*(
+            measure(u, name, timeout=self.timeout, context=self.context) for u in self.stats))
+        for m in measurements:
+            self.stats[m.upstream].update(m)
+        return measurements
+
+    async def run(self, rounds=5, interval=1.0, progress=None):
+        for i in range(rounds):
+            if i:
+                await asyncio.sleep(interval)
+            measurements = await self.evaluate_round()
+            if progress:
+                progress(self.rounds, measurements)
+        return self.ranking()
+
+    def ranking(self):
+        return sorted(self.stats.values(), key=lambda s: s.score(self.timeout * 1000))
+
+
+def plan(ranking, slow_factor=3.0, max_loss=0.5, min_samples=3, keep=2):
+    """Split a ranking into upstreams to keep (best first) and (stats, reason) pairs to prune."""
+    healthy = [s.rtt_ms for s in ranking if s.rtt_ms is not None and s.loss < max_loss]
+    baseline = statistics.median(healthy) if healthy else None
+    kept, pruned = [], []
+    for s in ranking:
+        reason = None
+        if s.samples >= min_samples:
+            if s.rtt_ms is None or s.loss >= max_loss:
+                reason = f"{s.loss * 100:.0f}% loss"
+            elif baseline and s.rtt_ms > slow_factor * baseline:
+                reason = f"{s.rtt_ms:.1f}ms vs {baseline:.1f}ms median"
+        if reason:
+            pruned.append((s, reason))
+        else:
+            kept.append(s)
+    while len(kept) < keep and pruned:
+        kept.append(pruned.pop(0)[0])
+    return kept, pruned
+
+
+def _zone_spans(lines, zone):
+    """Indexes of the zone's forward-addr lines, and of the ones an earlier run commented out as pruned."""
+    clause = current = None
+    indexes, pruned = [], []
+    for i, line in enumerate(lines):
+        stripped = line.lstrip()
+        if not stripped:
+            continue
+        if stripped.startswith("#"):
+            if clause == "forward-zone" and current == zone and PRUNED_ADDR.match(line):
+                pruned.append(i)
+            continue
+        match = CLAUSE.match(line)
+        if match and line[0] not in " \t":
+            clause, current = match.group(1).strip(), None
+            continue
+        if clause != "forward-zone":
+            continue
+        name = ZONE_NAME.match(line)
+        if name:
+            current = name.group(1).rstrip(".") + "."
+        elif current == zone and FORWARD_ADDR.match(line):
+            indexes.append(i)
+    return indexes, pruned
+
+
+def forward_addrs(text, zone="."):
+    lines = text.splitlines()
+    return [Upstream.parse(FORWARD_ADDR.match(lines[i]).group(2)) for i in _zone_spans(lines, zone)[0]]
+
+
+def pruned_addrs(text, zone="."):
+    """Upstreams an earlier run pruned, to measure again alongside the active ones."""
+    lines = text.splitlines()
+    return [Upstream.parse(PRUNED_ADDR.match(lines[i]).group(2)) for i in _zone_spans(lines, zone)[1]]
+
+
+def rewrite_forward_zone(text, ordered, pruned=(), zone="."):
+    lines = text.splitlines(True)
+    indexes, earlier = _zone_spans(lines, zone)
+    if not indexes:
+        raise ValueError(f"No forward-addr lines found for forward-zone {zone!r}")
+    indent = FORWARD_ADDR.match(lines[indexes[0]]).group(1)
+    block = [f"{indent}forward-addr: {u.spec}\n" for u in ordered]
+    block += [f"{indent}# forward-addr: {u.spec}  # pruned: {reason}\n" for u, reason in pruned]
+    # Earlier pruned lines are replaced by this run's verdict; those it did not measure stay as they were.
+    decided = {u.spec for u in ordered} | {u.spec for u, _ in pruned}
+    block += [lines[i] for i in earlier if PRUNED_ADDR.match(lines[i]).group(2) not in decided]
+
+    replaced = set(indexes) | set(earlier)
+    first, last = min(replaced), max(replaced)
+    kept = [l for i, l in enumerate(lines[first:last + 1], first) if i not in replaced]
+    return "".join(lines[:first] + block + kept + lines[last + 1:])
+
+
+def apply(path, kept, pruned=(), zone=".", config=None, restart=None):
+    with open(path) as f:
+        current = f.read()
+    updated = rewrite_forward_zone(current, [s.upstream for s in kept],
+                                   [(s.upstream, reason) for s, reason in pruned], zone)
+    return config_apply.apply_config(updated, path, config, restart)
+
+
+def format_stats(stats):
+    rtt = f"{stats.rtt_ms:8.1f}ms" if stats.rtt_ms is not None else "       --"
+    handshake = f"{stats.handshake_ms:8.1f}ms" if stats.handshake_ms is not None else "       --"
+    line = (f"{stats.upstream.spec:<40} rtt {rtt}  handshake {handshake}  "
+            f"loss {stats.loss * 100:5.1f}%  ({stats.samples - stats.failures}/{stats.samples} ok)")
+    if stats.last_error and stats.failures:
+        line += f"  last error: {stats.last_error}"
+    return line